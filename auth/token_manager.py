@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Renovação antecipada do token OAuth do Bling, fora do caminho crítico.
+
+O BlingOAuth relê e descriptografa os tokens do storage a cada
+`get_valid_access_token()` e só renova quando o token já está perto de
+expirar, dentro da requisição que precisava dele. O TokenManager mantém o
+token descriptografado em memória e uma thread de fundo que o renova com
+margem de segurança antes de `auth_tokens.expires_at`. Quando várias threads
+precisam renovar ao mesmo tempo (polling, detalhes, webhook), apenas uma
+requisição de renovação é feita e as demais aguardam o resultado dela.
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Renovar 15 minutos antes da expiração: antes da verificação periódica do
+# BlingOAuth (10 minutos), para que as duas não disputem o mesmo refresh token
+DEFAULT_REFRESH_MARGIN = 15 * 60
+
+# Abaixo desta validade o token em cache não é mais entregue sem renovar
+MIN_TOKEN_VALIDITY = 60
+
+
+class TokenManager:
+    """
+    Cache em memória do token de acesso com renovação antecipada e única.
+    """
+
+    def __init__(self, bling_oauth, refresh_margin: int = DEFAULT_REFRESH_MARGIN,
+                 retry_interval: int = 30, check_interval: int = 300):
+        """
+        Args:
+            bling_oauth: Instância do gerenciador de autenticação OAuth do Bling
+            refresh_margin: Antecedência (s) da renovação em relação à expiração
+            retry_interval: Espera (s) entre tentativas após uma renovação com falha
+            check_interval: Intervalo máximo (s) entre verificações da thread de fundo
+        """
+        self.bling_oauth = bling_oauth
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.check_interval = check_interval
+
+        self._access_token: Optional[str] = None
+        self._expires_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._inflight: Optional[threading.Event] = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refresh_count = 0
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Carrega o token salvo e inicia a thread de renovação."""
+        self.load()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="BlingTokenManager", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Encerra a thread de renovação."""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    # ------------------------------------------------------------------
+    # Token
+    # ------------------------------------------------------------------
+
+    def load(self) -> bool:
+        """
+        Copia para o cache o token atual do BlingOAuth (lido do storage).
+
+        Returns:
+            bool: True se há um token carregado
+        """
+        try:
+            self.bling_oauth._load_tokens()
+        except Exception as e:
+            logger.error(f"Erro ao carregar tokens OAuth: {e}")
+        self._update_cache()
+        self._wake_event.set()
+        return self._access_token is not None
+
+    def _update_cache(self) -> None:
+        """Atualiza o cache com o token em memória do BlingOAuth."""
+        with self._lock:
+            self._access_token = getattr(self.bling_oauth, 'access_token', None)
+            self._expires_at = getattr(self.bling_oauth, 'token_expires_at', None)
+
+    def seconds_until_expiry(self) -> Optional[float]:
+        """Validade restante (s) do token em cache, ou None se desconhecida."""
+        with self._lock:
+            if self._expires_at is None:
+                return None
+            return (self._expires_at - datetime.now()).total_seconds()
+
+    def has_valid_token(self) -> bool:
+        """Indica se o token em cache pode ser usado sem renovar."""
+        if not self._access_token:
+            return False
+        remaining = self.seconds_until_expiry()
+        return remaining is None or remaining > MIN_TOKEN_VALIDITY
+
+    def get_token(self) -> Optional[str]:
+        """
+        Retorna um token de acesso válido.
+
+        Em uso normal o token vem do cache; só há renovação aqui se a thread de
+        fundo não conseguiu renovar a tempo.
+
+        Returns:
+            str: Token de acesso ou None se não foi possível obter
+        """
+        if self.has_valid_token():
+            return self._access_token
+        return self.refresh()
+
+    def invalidate(self) -> None:
+        """Descarta o token em cache (ex.: a API respondeu 401)."""
+        with self._lock:
+            self._access_token = None
+            self._expires_at = None
+        logger.info("Token OAuth em cache invalidado")
+
+    def refresh(self, force: bool = False) -> Optional[str]:
+        """
+        Renova o token, compartilhando a renovação em andamento entre as threads.
+
+        Args:
+            force: Renovar mesmo que o token salvo ainda esteja fora da margem
+                (ex.: a API rejeitou o token com 401)
+
+        Returns:
+            str: Novo token de acesso ou None se a renovação falhou
+        """
+        with self._lock:
+            inflight = self._inflight
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight = threading.Event()
+
+        if not leader:
+            logger.debug("Renovação de token já em andamento, aguardando resultado")
+            inflight.wait()
+            return self._access_token if self.has_valid_token() else None
+
+        try:
+            return self._do_refresh(force)
+        finally:
+            with self._lock:
+                self._inflight = None
+            inflight.set()
+            self._wake_event.set()
+
+    def _do_refresh(self, force: bool) -> Optional[str]:
+        """Executa uma renovação (apenas a thread líder chega aqui)."""
+        try:
+            # Outro processo ou o fluxo OAuth pode já ter salvo um token novo
+            self.bling_oauth._load_tokens()
+            self._update_cache()
+            remaining = self.seconds_until_expiry()
+            if not force and self._access_token and remaining is not None and remaining > self.refresh_margin:
+                return self._access_token
+
+            if getattr(self.bling_oauth, 'refresh_token', None) and self.bling_oauth._refresh_token():
+                logger.info("Token OAuth renovado antecipadamente")
+            else:
+                # Sem refresh token válido: cair no fluxo completo do BlingOAuth
+                logger.warning("Renovação pelo refresh token falhou, tentando obter token válido")
+                if not self.bling_oauth.get_valid_access_token():
+                    self.invalidate()
+                    return None
+            self.refresh_count += 1
+            self._update_cache()
+            return self._access_token
+        except Exception as e:
+            logger.error(f"Erro ao renovar token OAuth: {e}")
+            return None
+
+    # ------------------------------------------------------------------
+    # Thread de fundo
+    # ------------------------------------------------------------------
+
+    def _next_check(self) -> float:
+        """Segundos até a próxima renovação prevista."""
+        remaining = self.seconds_until_expiry()
+        if remaining is None:
+            return self.check_interval
+        return min(self.check_interval, max(0.0, remaining - self.refresh_margin))
+
+    def _refresh_loop(self) -> None:
+        """Renova o token quando ele entra na margem de segurança."""
+        while not self._stop_event.is_set():
+            self._wake_event.clear()
+            wait = self._next_check()
+            if wait > 0:
+                self._wake_event.wait(wait)
+                continue
+            if not self._access_token and not getattr(self.bling_oauth, 'refresh_token', None):
+                # Sem token algum: aguardar a autenticação inicial (load() acorda a thread)
+                self._wake_event.wait(self.check_interval)
+                continue
+            if self.refresh() is None:
+                logger.warning(f"Falha na renovação antecipada do token, nova tentativa em {self.retry_interval}s")
+                self._stop_event.wait(self.retry_interval)
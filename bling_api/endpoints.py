@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Endereço base da API do Bling.
+
+Por padrão a aplicação usa a API de produção. Para testes de carga o endereço
+pode ser trocado pelo simulador local (bling_api/simulator.py) pela variável
+de ambiente ACRIPRINT_BLING_API_URL ou pela chave `bling_api_base_url` da
+tabela config.
+"""
+
+import os
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PRODUCTION_API_URL = "https://bling.com.br/Api/v3"
+
+ENV_VAR = "ACRIPRINT_BLING_API_URL"
+CONFIG_KEY = "bling_api_base_url"
+
+
+def resolve_api_base_url(storage=None) -> Optional[str]:
+    """
+    Retorna o endereço alternativo configurado, ou None para usar a produção.
+
+    Args:
+        storage: Storage opcional para consultar a chave de configuração
+    """
+    url = os.environ.get(ENV_VAR)
+    if not url and storage is not None:
+        try:
+            url = storage.get_config(CONFIG_KEY)
+        except Exception as e:
+            logger.error(f"Erro ao ler endereço alternativo da API do Bling: {e}")
+    return url.rstrip('/') if url else None
+
+
+def apply_api_base_url(base_url: Optional[str]) -> None:
+    """
+    Aponta o fluxo OAuth para o endereço informado.
+
+    Os clientes BlingClient são ajustados em `apply_to_client` quando criados.
+
+    Args:
+        base_url: Endereço base (ex.: http://127.0.0.1:8780/Api/v3)
+    """
+    if not base_url:
+        return
+    from auth import bling_oauth
+    bling_oauth.BASE_BLING_URL = base_url
+    bling_oauth.AUTH_ENDPOINT = f"{base_url}/oauth/authorize"
+    bling_oauth.TOKEN_ENDPOINT = f"{base_url}/oauth/token"
+    logger.warning(f"API do Bling redirecionada para {base_url}")
+
+
+def apply_to_client(client, base_url: Optional[str]) -> None:
+    """Ajusta o endereço base de um BlingClient, se houver endereço alternativo."""
+    if base_url and client is not None and client.base_url != base_url:
+        client.base_url = base_url
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Busca concorrente de páginas e detalhes de pedidos na API v3 do Bling.
+
+A listagem de pedidos retorna apenas resumos, então cada pedido novo exige
+uma segunda requisição de detalhe antes de ser impresso. Este pipeline
+executa as páginas da listagem e os detalhes em um pool limitado de threads
+sobre o BlingHttpClient compartilhado (conexões keep-alive, limite de
+requisições por segundo e novas tentativas).
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable
+
+from bling_api.client import TokenExpiredError, RateLimitError
+from bling_api.http_client import BlingHttpClient, get_shared_client
+
+logger = logging.getLogger(__name__)
+
+
+class BlingFetchPipeline:
+    """
+    Executa requisições de leitura ao Bling em paralelo com uma sessão compartilhada.
+    """
+
+    def __init__(self, client, max_workers: int = 4, http: Optional[BlingHttpClient] = None):
+        """
+        Args:
+            client: BlingClient autenticado (fornece base_url, headers e _process_order_data)
+            max_workers: Requisições simultâneas
+            http: Cliente HTTP (padrão: o compartilhado pelo processo)
+        """
+        self.client = client
+        self.max_workers = max_workers
+        self.http = http or get_shared_client()
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="BlingFetch")
+        self._lock = threading.Lock()
+        self.request_count = 0
+
+    def close(self) -> None:
+        """Encerra o pool de threads (as conexões pertencem ao cliente HTTP)."""
+        self._executor.shutdown(wait=False)
+
+    # ------------------------------------------------------------------
+    # Requisição individual
+    # ------------------------------------------------------------------
+
+    def _count_request(self) -> None:
+        with self._lock:
+            self.request_count += 1
+
+    def get(self, endpoint: str, params: Dict = None) -> Dict[str, Any]:
+        """
+        Executa um GET pelo cliente HTTP compartilhado.
+
+        Args:
+            endpoint: Endpoint da API (sem o base_url)
+            params: Parâmetros da query string
+
+        Returns:
+            Dict: Dados da resposta
+
+        Raises:
+            TokenExpiredError: Se o token estiver expirado
+            RateLimitError: Se o limite de requisições continuar excedido após as tentativas
+            BlingAPIError: Para outros erros da API
+        """
+        url = f"{self.client.base_url}/{endpoint.lstrip('/')}"
+        return self.http.get_json(url, headers=self.client.headers, params=params,
+                                  endpoint=endpoint, on_attempt=self._count_request)
+
+    # ------------------------------------------------------------------
+    # Pedidos
+    # ------------------------------------------------------------------
+
+    def fetch_order_detail(self, order_id) -> Optional[Dict[str, Any]]:
+        """Busca e processa o detalhe de um pedido pelo ID."""
+        response = self.get(f"pedidos/vendas/{order_id}")
+        data = response.get("data") if isinstance(response, dict) else None
+        if not data:
+            logger.warning(f"Pedido não encontrado pelo ID: {order_id}")
+            return None
+        return self.client._process_order_data(data)
+
+    def fetch_orders(self, params: Dict[str, Any], page_size: int = 100, max_pages: int = 10,
+                     needs_detail: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Busca as páginas da listagem e os detalhes dos pedidos selecionados.
+
+        A primeira página é buscada sozinha; se vier cheia, as páginas seguintes
+        são buscadas em paralelo em blocos de `max_workers`. Os detalhes são
+        solicitados assim que cada página chega, sem esperar a listagem terminar.
+
+        Args:
+            params: Filtros da listagem (sem paginação)
+            page_size: Pedidos por página (máximo da API: 100)
+            max_pages: Páginas consultadas no máximo
+            needs_detail: Seleciona os resumos que precisam de detalhe (padrão: todos)
+
+        Returns:
+            Dict com 'summaries' (resumos processados), 'details' (detalhes obtidos, na
+            ordem dos resumos) e 'failed' (resumos cujo detalhe falhou; o chamador não
+            deve dar esses pedidos por tratados, e sim buscá-los de novo)
+        """
+        started = time.monotonic()
+        requests_before = self.request_count
+        summaries: List[Dict[str, Any]] = []
+        detail_futures = []
+
+        def list_page(page):
+            response = self.get("pedidos/vendas", dict(params, pagina=page, limite=page_size))
+            return response.get("data", []) if isinstance(response, dict) else []
+
+        def handle_page(raw_orders):
+            for raw in raw_orders:
+                summary = self.client._process_order_data(raw)
+                summaries.append(summary)
+                if needs_detail is None or needs_detail(summary):
+                    detail_futures.append((summary, self._executor.submit(self.fetch_order_detail, summary.get('id'))))
+
+        first_page = list_page(1)
+        handle_page(first_page)
+        page = 2
+        last_full = len(first_page) >= page_size
+
+        while last_full and page <= max_pages:
+            pages = list(range(page, min(page + self.max_workers, max_pages + 1)))
+            futures = [self._executor.submit(list_page, p) for p in pages]
+            for future in futures:
+                raw_orders = future.result()
+                handle_page(raw_orders)
+                last_full = len(raw_orders) >= page_size
+                if not last_full:
+                    break
+            page = pages[-1] + 1
+
+        if last_full and page > max_pages:
+            logger.warning(f"Limite de {max_pages} páginas atingido; o restante fica para o próximo ciclo")
+
+        details, failed = [], []
+        for summary, future in detail_futures:
+            try:
+                detail = future.result()
+            except (TokenExpiredError, RateLimitError):
+                raise
+            except Exception as e:
+                # O resumo não tem itens: não pode ser impresso no lugar do detalhe
+                logger.error(f"Erro ao buscar detalhe do pedido {summary.get('id')}: {e}")
+                failed.append(summary)
+                continue
+            if detail:
+                details.append(detail)
+
+        logger.info(
+            f"{len(summaries)} pedidos listados e {len(details)} detalhes buscados em "
+            f"{time.monotonic() - started:.1f}s ({self.request_count - requests_before} requisições)"
+        )
+        if failed:
+            logger.warning(f"{len(failed)} detalhes de pedidos falharam e serão buscados de novo")
+        return {'summaries': summaries, 'details': details, 'failed': failed}
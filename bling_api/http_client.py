@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Camada HTTP compartilhada para as chamadas à API v3 do Bling.
+
+Concentra o tratamento de limites de requisição que antes ficava espalhado:
+
+- balde de fichas no cliente, com taxa adaptativa: cada 429 reduz a taxa
+  em 30% e as respostas bem-sucedidas a recuperam aos poucos, de modo
+  que uma rajada desacelera suavemente em vez de falhar;
+- leitura dos cabeçalhos de limite (Retry-After, X-RateLimit-Remaining e
+  X-RateLimit-Reset), pausando todas as requisições até a janela reabrir;
+- novas tentativas apenas para métodos idempotentes, com espera exponencial
+  com jitter e limitadas por um orçamento global de tentativas;
+- histogramas de latência e contagem de erros por endpoint.
+
+`install_shared_http()` faz o BlingClient e o fluxo OAuth (troca e
+renovação do token) usarem o mesmo cliente: as chamadas `requests.get/post`
+desses módulos passam pelo balde de fichas, pelas pausas e pelas métricas.
+"""
+
+import re
+import importlib
+import time
+import random
+import logging
+import threading
+from typing import Dict, Any, Optional, Callable, Iterable, List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from bling_api.client import TokenExpiredError, RateLimitError, BlingAPIError
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Limite documentado da API v3: 3 requisições por segundo por conta
+BLING_REQUESTS_PER_SECOND = 3
+
+# Métodos que podem ser repetidos sem efeito colateral
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+# Respostas que justificam nova tentativa
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+# Limites superiores (ms) das faixas do histograma de latência
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def endpoint_label(method: str, path: str) -> str:
+    """Nome do endpoint para as estatísticas, com IDs substituídos (ex.: GET pedidos/vendas/{id})."""
+    path = path.split('?', 1)[0].strip('/')
+    path = re.sub(r'/\d+(?=/|$)', '/{id}', path)
+    return f"{method} {path}"
+
+
+class RetryBudget:
+    """
+    Orçamento global de novas tentativas.
+
+    Cada requisição original deposita `ratio` fichas e o tempo repõe
+    `min_per_second`, até `capacity`. Cada nova tentativa gasta uma ficha; sem
+    saldo, a falha é devolvida ao chamador em vez de multiplicar a carga
+    sobre uma API que já está recusando requisições.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 0.2, capacity: float = 10.0):
+        """
+        Args:
+            ratio: Tentativas extras permitidas por requisição original
+            min_per_second: Reposição mínima por segundo, mesmo sem tráfego
+            capacity: Saldo máximo acumulado
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self._balance = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.exhausted = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._balance = min(self.capacity, self._balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def record_request(self) -> None:
+        """Registra uma requisição original."""
+        with self._lock:
+            self._refill()
+            self._balance = min(self.capacity, self._balance + self.ratio)
+
+    def try_spend(self) -> bool:
+        """
+        Reserva uma nova tentativa.
+
+        Returns:
+            bool: True se há saldo para a tentativa
+        """
+        with self._lock:
+            self._refill()
+            if self._balance >= 1:
+                self._balance -= 1
+                return True
+            self.exhausted += 1
+            return False
+
+    def balance(self) -> float:
+        """Saldo atual de tentativas."""
+        with self._lock:
+            self._refill()
+            return self._balance
+
+
+class EndpointStats:
+    """Contadores e histograma de latência de um endpoint."""
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.errors: Dict[str, int] = {}
+        self.latency_total_ms = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, elapsed_ms: float, error: Optional[str]) -> None:
+        """Registra uma tentativa com sua latência e o erro (status ou exceção), se houver."""
+        self.requests += 1
+        self.latency_total_ms += elapsed_ms
+        index = len(LATENCY_BUCKETS_MS)
+        for i, limit in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= limit:
+                index = i
+                break
+        self.latency_buckets[index] += 1
+        if error:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def percentile(self, p: float) -> Optional[int]:
+        """Limite superior (ms) da faixa que contém o percentil `p`; None acima da última faixa."""
+        target = self.requests * p
+        seen = 0
+        for i, count in enumerate(self.latency_buckets):
+            seen += count
+            if count and seen >= target:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estatísticas em formato serializável."""
+        labels = [f"<={limit}ms" for limit in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'errors': dict(self.errors),
+            'latency_avg_ms': round(self.latency_total_ms / self.requests, 1) if self.requests else None,
+            'latency_p50_ms': self.percentile(0.50),
+            'latency_p95_ms': self.percentile(0.95),
+            'latency_histogram': {label: count for label, count in zip(labels, self.latency_buckets) if count},
+        }
+
+
+class BlingHttpClient:
+    """
+    Cliente HTTP com controle de taxa, novas tentativas e métricas por endpoint.
+    """
+
+    def __init__(self, requests_per_second: float = BLING_REQUESTS_PER_SECOND, burst: float = 1,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_cap: float = 30.0,
+                 timeout: float = 30.0, pool_size: int = 8, retry_budget: Optional[RetryBudget] = None):
+        """
+        Args:
+            requests_per_second: Taxa máxima de requisições
+            burst: Requisições permitidas em rajada (1 = sempre espaçadas)
+            max_retries: Novas tentativas por requisição idempotente
+            backoff_base: Espera base (s) da primeira nova tentativa
+            backoff_cap: Espera máxima (s) entre tentativas
+            timeout: Tempo limite (s) de cada requisição
+            pool_size: Conexões mantidas abertas (keep-alive)
+            retry_budget: Orçamento de tentativas (padrão: um novo, exclusivo deste cliente)
+        """
+        self.max_rate = float(requests_per_second)
+        self.min_rate = min(0.5, self.max_rate)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.retry_budget = retry_budget or RetryBudget()
+        self.bucket = TokenBucket(rate=requests_per_second, capacity=burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._stats: Dict[str, EndpointStats] = {}
+        self.request_count = 0
+
+    def close(self) -> None:
+        """Fecha as conexões."""
+        self.session.close()
+
+    # ------------------------------------------------------------------
+    # Controle de taxa
+    # ------------------------------------------------------------------
+
+    @property
+    def current_rate(self) -> float:
+        """Taxa atual (requisições por segundo) do balde de fichas."""
+        return self.bucket.rate
+
+    def _acquire_slot(self) -> None:
+        """Aguarda uma eventual pausa imposta pela API e uma ficha do balde."""
+        while True:
+            with self._lock:
+                wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        self.bucket.consume(1)
+
+    def _pause(self, seconds: float, reason: str) -> None:
+        """Suspende todas as requisições do cliente por `seconds`."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until <= self._paused_until:
+                return
+            self._paused_until = until
+        logger.warning(f"Requisições ao Bling pausadas por {seconds:.1f}s ({reason})")
+
+    def _slow_down(self) -> None:
+        """Reduz a taxa em 30% após um 429."""
+        rate = max(self.min_rate, self.bucket.rate * 0.7)
+        if rate < self.bucket.rate:
+            self.bucket.set_rate(rate)
+            logger.info(f"Taxa de requisições ao Bling reduzida para {rate:.2f}/s")
+
+    def _speed_up(self) -> None:
+        """Recupera a taxa gradualmente após respostas bem-sucedidas."""
+        if self.bucket.rate < self.max_rate:
+            self.bucket.set_rate(min(self.max_rate, self.bucket.rate + 0.1))
+
+    def _read_rate_limit_headers(self, response: requests.Response) -> Optional[float]:
+        """
+        Aplica os cabeçalhos de limite da resposta.
+
+        Returns:
+            float: Espera (s) indicada pela API, ou None
+        """
+        headers = response.headers
+        retry_after = _parse_seconds(headers.get('Retry-After'))
+        if retry_after is not None:
+            self._pause(retry_after, "Retry-After")
+            return retry_after
+
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = _parse_seconds(headers.get('X-RateLimit-Reset'))
+        if remaining is not None and remaining.strip() == '0' and reset is not None:
+            # Valores grandes são um instante Unix, não um intervalo
+            wait = reset - time.time() if reset > 10 ** 9 else reset
+            if wait > 0:
+                self._pause(wait, "janela de requisições esgotada")
+                return wait
+        return None
+
+    def _backoff(self, attempt: int) -> float:
+        """Espera exponencial com jitter completo para a tentativa `attempt` (1 = primeira repetição)."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    def _observe(self, label: str, elapsed: float, error: Optional[str], retry: bool) -> None:
+        with self._lock:
+            stats = self._stats.get(label)
+            if stats is None:
+                stats = self._stats[label] = EndpointStats()
+            stats.observe(elapsed * 1000, error)
+            if retry:
+                stats.retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Estatísticas acumuladas por endpoint.
+
+        Returns:
+            Dict com 'endpoints' ({rótulo: métricas}), 'rate' e 'retry_budget'
+        """
+        with self._lock:
+            endpoints = {label: stats.snapshot() for label, stats in self._stats.items()}
+        return {
+            'endpoints': endpoints,
+            'rate': round(self.bucket.rate, 2),
+            'retry_budget': round(self.retry_budget.balance(), 1),
+            'retry_budget_exhausted': self.retry_budget.exhausted,
+        }
+
+    def log_stats(self) -> None:
+        """Registra no log um resumo das métricas por endpoint."""
+        for label, data in self.stats()['endpoints'].items():
+            logger.info(
+                f"{label}: {data['requests']} requisições, {data['retries']} repetições, "
+                f"p50={data['latency_p50_ms']}ms p95={data['latency_p95_ms']}ms, erros={data['errors']}"
+            )
+
+    # ------------------------------------------------------------------
+    # Requisições
+    # ------------------------------------------------------------------
+
+    def request(self, method: str, url: str, endpoint: Optional[str] = None,
+                on_attempt: Optional[Callable[[], None]] = None, **kwargs) -> requests.Response:
+        """
+        Executa uma requisição respeitando o limite de taxa, com novas tentativas se idempotente.
+
+        Args:
+            method: Método HTTP
+            url: URL completa
+            endpoint: Caminho usado no rótulo das estatísticas (padrão: derivado da URL)
+            on_attempt: Chamado a cada tentativa enviada (para contabilizar a cota)
+            **kwargs: Repassados a `requests.Session.request`
+
+        Returns:
+            requests.Response: Última resposta recebida
+
+        Raises:
+            requests.RequestException: Se a comunicação falhar em todas as tentativas
+        """
+        method = method.upper()
+        label = endpoint_label(method, endpoint or requests.utils.urlparse(url).path)
+        retries = self.max_retries if method in IDEMPOTENT_METHODS else 0
+        kwargs.setdefault('timeout', self.timeout)
+        self.retry_budget.record_request()
+
+        attempt = 0
+        while True:
+            self._acquire_slot()
+            with self._lock:
+                self.request_count += 1
+            if on_attempt:
+                on_attempt()
+
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                self._observe(label, time.monotonic() - started, type(e).__name__, attempt > 0)
+                if attempt >= retries or not self.retry_budget.try_spend():
+                    raise
+                attempt += 1
+                wait = self._backoff(attempt)
+                logger.warning(f"Falha de comunicação em {label} ({e}), nova tentativa em {wait:.1f}s")
+                time.sleep(wait)
+                continue
+
+            elapsed = time.monotonic() - started
+            error = None if response.ok else str(response.status_code)
+            self._observe(label, elapsed, error, attempt > 0)
+
+            wait = self._read_rate_limit_headers(response)
+            if response.status_code == 429:
+                self._slow_down()
+            elif response.ok:
+                self._speed_up()
+
+            if response.status_code not in RETRYABLE_STATUS or attempt >= retries:
+                return response
+            if not self.retry_budget.try_spend():
+                logger.warning(f"Orçamento de novas tentativas esgotado, devolvendo {response.status_code} de {label}")
+                return response
+
+            attempt += 1
+            if wait is None:
+                wait = self._backoff(attempt)
+                time.sleep(wait)
+            # Com Retry-After, a pausa global já é aplicada em _acquire_slot
+            logger.warning(f"{label} respondeu {response.status_code}, tentativa {attempt + 1} de {retries + 1}")
+
+    def get_json(self, url: str, headers: Dict[str, str] = None, params: Dict = None,
+                 endpoint: Optional[str] = None, on_attempt: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        """
+        Executa um GET e devolve o JSON, convertendo falhas nas exceções do BlingClient.
+
+        Returns:
+            Dict: Dados da resposta
+
+        Raises:
+            TokenExpiredError: Se o token estiver expirado
+            RateLimitError: Se o limite de requisições continuar excedido após as tentativas
+            BlingAPIError: Para outros erros da API
+        """
+        try:
+            response = self.request('GET', url, endpoint=endpoint, on_attempt=on_attempt,
+                                    headers=headers, params=params)
+        except requests.RequestException as e:
+            logger.error(f"Erro de comunicação com a API ({endpoint or url}): {e}")
+            raise BlingAPIError(f"Falha de comunicação com a API: {e}")
+
+        if response.ok:
+            if response.status_code == 204 or not response.content:
+                return {}
+            try:
+                return response.json()
+            except ValueError:
+                raise BlingAPIError("Resposta da API não é JSON válido")
+
+        if response.status_code == 401:
+            raise TokenExpiredError("O token de acesso expirou ou é inválido")
+        if response.status_code == 429:
+            raise RateLimitError(f"Limite de requisições excedido: {response.text[:200]}")
+        raise BlingAPIError(f"Erro na API do Bling: {response.status_code} - {response.text[:200]}")
+
+
+def _parse_seconds(value: Optional[str]) -> Optional[float]:
+    """Converte um cabeçalho numérico em segundos (None se ausente ou não numérico)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value.strip()))
+    except ValueError:
+        return None
+
+
+_shared_client: Optional[BlingHttpClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_client() -> BlingHttpClient:
+    """Cliente HTTP único do processo, compartilhado por polling, detalhes, webhooks, OAuth e BlingClient."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = BlingHttpClient()
+        return _shared_client
+
+
+# Módulos que chamam a API do Bling diretamente com `requests.get/post/put/delete`
+SHARED_HTTP_MODULES = ('bling_api.client', 'auth.bling_oauth')
+
+
+class SharedRequests:
+    """
+    Substituto do módulo `requests` que envia as requisições pelo BlingHttpClient.
+
+    As funções de requisição usam o cliente compartilhado; exceções, `Session`
+    e os demais atributos continuam sendo os do `requests`.
+    """
+
+    def __init__(self, client: Optional[BlingHttpClient] = None):
+        """
+        Args:
+            client: Cliente HTTP (padrão: o compartilhado pelo processo)
+        """
+        self._client = client
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        client = self._client or get_shared_client()
+        return client.request(method, url, **kwargs)
+
+    def get(self, url: str, params=None, **kwargs) -> requests.Response:
+        return self.request('GET', url, params=params, **kwargs)
+
+    def post(self, url: str, data=None, json=None, **kwargs) -> requests.Response:
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def put(self, url: str, data=None, **kwargs) -> requests.Response:
+        return self.request('PUT', url, data=data, **kwargs)
+
+    def patch(self, url: str, data=None, **kwargs) -> requests.Response:
+        return self.request('PATCH', url, data=data, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+def install_shared_http(modules: Iterable[str] = SHARED_HTTP_MODULES,
+                        client: Optional[BlingHttpClient] = None) -> List[str]:
+    """
+    Faz os módulos que usam `requests` diretamente passarem pelo cliente compartilhado.
+
+    Args:
+        modules: Nomes dos módulos cujo atributo `requests` é substituído
+        client: Cliente HTTP (padrão: o compartilhado pelo processo)
+
+    Returns:
+        Lista dos módulos redirecionados
+    """
+    shim = SharedRequests(client)
+    routed = []
+    for name in modules:
+        try:
+            module = importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Módulo {name} indisponível, requisições não redirecionadas: {e}")
+            continue
+        if getattr(module, 'requests', None) is None:
+            continue
+        module.requests = shim
+        routed.append(name)
+    if routed:
+        logger.info(f"Requisições de {', '.join(routed)} passam pelo cliente HTTP compartilhado")
+    return routed
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Simulador local da API v3 do Bling para testes de carga.
+
+Atende os endpoints usados pela aplicação:
+
+- POST /Api/v3/oauth/token           (authorization_code e refresh_token)
+- GET  /Api/v3/pedidos/vendas        (pagina, limite, dataAlteracaoInicial)
+- GET  /Api/v3/pedidos/vendas/{id}
+- GET  /__stats                      (contadores do simulador)
+
+Os pedidos são gerados continuamente a partir de modelos (pedido_*.json)
+na taxa configurada, com latência, respostas 429 e erros 5xx injetáveis.
+Para apontar a aplicação para o simulador:
+
+    python -m bling_api.simulator --porta 8780 --pedidos-por-minuto 60
+    set ACRIPRINT_BLING_API_URL=http://127.0.0.1:8780/Api/v3
+
+O modo --benchmark executa o pipeline de busca contra o simulador e mede
+a latência entre a criação de cada pedido e a obtenção do seu detalhe.
+"""
+
+import os
+import sys
+import copy
+import glob
+import json
+import time
+import random
+import secrets
+import logging
+import argparse
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, Any, List, Optional
+
+from bling_api.endpoints import ENV_VAR
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/Api/v3'
+
+# Diretório raiz da aplicação, onde ficam os pedidos de exemplo
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Campos presentes no resumo da listagem de pedidos
+SUMMARY_FIELDS = ('id', 'numero', 'numeroLoja', 'data', 'dataSaida', 'dataPrevista',
+                  'totalProdutos', 'total', 'contato', 'situacao', 'loja')
+
+
+def load_templates(pattern: str = None) -> List[Dict[str, Any]]:
+    """
+    Carrega os pedidos usados como modelo.
+
+    Args:
+        pattern: Padrão glob dos arquivos (padrão: pedido_*.json na raiz da aplicação)
+    """
+    pattern = pattern or os.path.join(APP_ROOT, 'pedido_*.json')
+    templates = []
+    for path in sorted(glob.glob(pattern)):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                order = json.load(f)
+            if isinstance(order, dict) and order.get('itens'):
+                templates.append(order)
+        except Exception as e:
+            logger.warning(f"Modelo de pedido ignorado ({path}): {e}")
+    if not templates:
+        raise ValueError(f"Nenhum modelo de pedido encontrado em {pattern}")
+    return templates
+
+
+class BlingSimulator:
+    """
+    Servidor que imita a API v3 do Bling.
+    """
+
+    def __init__(self, templates: Optional[List[Dict[str, Any]]] = None, host: str = '127.0.0.1',
+                 port: int = 8780, orders_per_minute: float = 30.0, latency_ms: float = 100.0,
+                 latency_jitter_ms: float = 50.0, error_429_rate: float = 0.0,
+                 error_5xx_rate: float = 0.0, requests_per_second: float = 3.0,
+                 token_ttl: int = 21600, seed: Optional[int] = None):
+        """
+        Args:
+            templates: Pedidos modelo (padrão: pedido_*.json)
+            host: Endereço de escuta
+            port: Porta de escuta (0 escolhe uma livre)
+            orders_per_minute: Taxa de criação de pedidos
+            latency_ms: Latência média adicionada a cada resposta
+            latency_jitter_ms: Variação máxima (±) da latência
+            error_429_rate: Probabilidade de responder 429 a uma requisição
+            error_5xx_rate: Probabilidade de responder 503 a uma requisição
+            requests_per_second: Limite real aplicado por token (acima dele responde 429)
+            token_ttl: Validade (s) dos tokens emitidos
+            seed: Semente do gerador aleatório
+        """
+        self.templates = templates or load_templates()
+        self.host = host
+        self.port = port
+        self.orders_per_minute = orders_per_minute
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_429_rate = error_429_rate
+        self.error_5xx_rate = error_5xx_rate
+        self.requests_per_second = requests_per_second
+        self.token_ttl = token_ttl
+        self.random = random.Random(seed)
+
+        self.orders: Dict[int, Dict[str, Any]] = {}
+        self.created_at: Dict[int, float] = {}
+        self.tokens: Dict[str, float] = {}
+        self.refresh_tokens = set()
+        self.stats = {'requests': 0, 'orders': 0, 'status': {}, 'endpoints': {}}
+
+        self._base_id = 20000000000
+        self._base_number = 200000
+        self._started = time.monotonic()
+        self._generated = 0
+        self._recent_requests: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        """Endereço base a configurar na aplicação."""
+        return f"http://{self.host}:{self.port}{API_PREFIX}"
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Inicia o servidor em uma thread de fundo."""
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_port
+        threading.Thread(target=self._httpd.serve_forever, name="BlingSimulator", daemon=True).start()
+        logger.info(f"Simulador da API do Bling em {self.base_url}")
+
+    def stop(self) -> None:
+        """Encerra o servidor."""
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def issue_token(self) -> Dict[str, Any]:
+        """Emite um par de tokens (também usado para preparar testes sem OAuth)."""
+        access_token = secrets.token_hex(20)
+        refresh_token = secrets.token_hex(20)
+        with self._lock:
+            self.tokens[access_token] = time.time() + self.token_ttl
+            self.refresh_tokens.add(refresh_token)
+        return {
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'expires_in': self.token_ttl,
+            'token_type': 'Bearer',
+            'scope': 'pedidos.read',
+        }
+
+    # ------------------------------------------------------------------
+    # Geração de pedidos
+    # ------------------------------------------------------------------
+
+    def _generate_orders(self) -> None:
+        """Cria os pedidos devidos desde o início, conforme a taxa configurada."""
+        due = int((time.monotonic() - self._started) * self.orders_per_minute / 60)
+        while self._generated < due:
+            self._generated += 1
+            template = self.templates[self._generated % len(self.templates)]
+            order = copy.deepcopy(template)
+            order_id = self._base_id + self._generated
+            now = datetime.now()
+            order['id'] = order_id
+            order['numero'] = self._base_number + self._generated
+            order['numeroLoja'] = f"SIM-{self._generated:06d}"
+            order['data'] = now.strftime("%Y-%m-%d")
+            order['dataAlteracao'] = now.strftime("%Y-%m-%d %H:%M:%S")
+            self.orders[order_id] = order
+            self.created_at[order_id] = time.time()
+            self.stats['orders'] += 1
+
+    def list_orders(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Resumos dos pedidos filtrados e paginados (mais recentes primeiro)."""
+        page = max(1, int(params.get('pagina', 1)))
+        limit = min(100, max(1, int(params.get('limite', 100))))
+        since = params.get('dataAlteracaoInicial')
+        with self._lock:
+            self._generate_orders()
+            orders = [o for o in self.orders.values() if not since or o['dataAlteracao'] >= since]
+        orders.sort(key=lambda o: o['id'], reverse=True)
+        window = orders[(page - 1) * limit: page * limit]
+        return [{field: order.get(field) for field in SUMMARY_FIELDS} for order in window]
+
+    def get_order(self, order_id: int) -> Optional[Dict[str, Any]]:
+        """Pedido completo pelo ID."""
+        with self._lock:
+            self._generate_orders()
+            return copy.deepcopy(self.orders.get(order_id))
+
+    # ------------------------------------------------------------------
+    # Atendimento
+    # ------------------------------------------------------------------
+
+    def _count(self, endpoint: str, status: int) -> None:
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['status'][str(status)] = self.stats['status'].get(str(status), 0) + 1
+            self.stats['endpoints'][endpoint] = self.stats['endpoints'].get(endpoint, 0) + 1
+
+    def _over_limit(self, token: str) -> bool:
+        """Aplica o limite de requisições por segundo do token."""
+        now = time.monotonic()
+        with self._lock:
+            recent = [t for t in self._recent_requests.get(token, []) if now - t < 1.0]
+            limited = len(recent) >= self.requests_per_second
+            if not limited:
+                recent.append(now)
+            self._recent_requests[token] = recent
+        return limited
+
+    def handle(self, method: str, path: str, headers, body: bytes):
+        """
+        Processa uma requisição.
+
+        Returns:
+            tuple: (status, corpo JSON, cabeçalhos extras)
+        """
+        parsed = urlparse(path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        route = parsed.path
+
+        if route == '/__stats':
+            with self._lock:
+                return 200, dict(self.stats, pending_orders=len(self.orders)), {}
+
+        if not route.startswith(API_PREFIX):
+            return 404, {'error': {'type': 'RESOURCE_NOT_FOUND', 'message': 'Recurso não encontrado'}}, {}
+        route = route[len(API_PREFIX):]
+
+        delay = max(0.0, self.latency_ms + self.random.uniform(-1, 1) * self.latency_jitter_ms) / 1000
+        time.sleep(delay)
+
+        if method == 'POST' and route == '/oauth/token':
+            form = parse_qs(body.decode('utf-8'))
+            grant = form.get('grant_type', [''])[0]
+            if grant == 'refresh_token':
+                refresh_token = form.get('refresh_token', [''])[0]
+                with self._lock:
+                    valid = refresh_token in self.refresh_tokens
+                    self.refresh_tokens.discard(refresh_token)
+                if not valid:
+                    return 400, {'error': 'invalid_grant', 'error_description': 'Refresh token inválido'}, {}
+            elif grant != 'authorization_code':
+                return 400, {'error': 'unsupported_grant_type'}, {}
+            return 200, self.issue_token(), {}
+
+        if method != 'GET':
+            return 405, {'error': {'type': 'METHOD_NOT_ALLOWED', 'message': 'Método não suportado'}}, {}
+
+        token = (headers.get('Authorization') or '').replace('Bearer ', '').strip()
+        with self._lock:
+            expires = self.tokens.get(token)
+        if not expires or expires < time.time():
+            return 401, {'error': {'type': 'invalid_token', 'message': 'invalid_token'}}, {}
+
+        if self._over_limit(token) or self.random.random() < self.error_429_rate:
+            return 429, {'error': {'type': 'TOO_MANY_REQUESTS', 'message': 'Limite de requisições atingido',
+                                   'description': f'Limite de {int(self.requests_per_second)} por second'}}, {'Retry-After': '1'}
+        if self.random.random() < self.error_5xx_rate:
+            return 503, {'error': {'type': 'SERVICE_UNAVAILABLE', 'message': 'Serviço indisponível'}}, {}
+
+        if route == '/pedidos/vendas':
+            return 200, {'data': self.list_orders(params)}, {}
+        if route.startswith('/pedidos/vendas/'):
+            try:
+                order = self.get_order(int(route.rsplit('/', 1)[1]))
+            except ValueError:
+                order = None
+            if order is None:
+                return 404, {'error': {'type': 'RESOURCE_NOT_FOUND', 'message': 'Pedido não encontrado'}}, {}
+            return 200, {'data': order}, {}
+
+        return 404, {'error': {'type': 'RESOURCE_NOT_FOUND', 'message': 'Recurso não encontrado'}}, {}
+
+    def _make_handler(self):
+        """Cria a classe de handler ligada a este simulador."""
+        simulator = self
+
+        class SimulatorHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, como a API real
+
+            def log_message(self, format, *args):
+                pass
+
+            def _serve(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                endpoint = urlparse(self.path).path.rstrip('0123456789')
+                try:
+                    status, payload, extra = simulator.handle(method, self.path, self.headers, body)
+                except Exception as e:
+                    logger.error(f"Erro no simulador: {e}")
+                    status, payload, extra = 500, {'error': {'message': str(e)}}, {}
+                simulator._count(f"{method} {endpoint}", status)
+
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in extra.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._serve('GET')
+
+            def do_POST(self):
+                self._serve('POST')
+
+        return SimulatorHandler
+
+
+class _SimulatedClient:
+    """Cliente mínimo (base_url, headers) para rodar o pipeline contra o simulador."""
+
+    def __init__(self, base_url: str, access_token: str):
+        self.base_url = base_url
+        self.access_token = access_token
+        self.headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+
+    def _process_order_data(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        return order
+
+
+def run_benchmark(simulator: BlingSimulator, duration: float, poll_interval: float) -> Dict[str, Any]:
+    """
+    Executa ciclos de polling incremental contra o simulador e mede a latência.
+
+    Args:
+        simulator: Simulador em execução
+        duration: Duração do teste (s)
+        poll_interval: Intervalo entre os ciclos (s)
+
+    Returns:
+        Dict com pedidos obtidos, requisições, percentis de latência (s) e métricas HTTP por endpoint
+    """
+    from bling_api.fetch_pipeline import BlingFetchPipeline
+    from bling_api.http_client import BlingHttpClient
+
+    token = simulator.issue_token()['access_token']
+    http = BlingHttpClient()
+    pipeline = BlingFetchPipeline(_SimulatedClient(simulator.base_url, token), http=http)
+    seen = set()
+    latencies = []
+    last_id = 0
+    failed_cycles = 0
+    since = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    deadline = time.monotonic() + duration
+
+    try:
+        while time.monotonic() < deadline:
+            cycle_started = time.monotonic()
+            try:
+                result = pipeline.fetch_orders(
+                    {'dataAlteracaoInicial': since},
+                    needs_detail=lambda order, floor=last_id: order['id'] > floor,
+                )
+            except Exception as e:
+                logger.warning(f"Ciclo do benchmark falhou: {e}")
+                failed_cycles += 1
+                result = {'details': []}
+            now = time.time()
+            for order in result['details']:
+                if order['id'] in seen:
+                    continue
+                seen.add(order['id'])
+                latencies.append(now - simulator.created_at[order['id']])
+                last_id = max(last_id, order['id'])
+            time.sleep(max(0.0, poll_interval - (time.monotonic() - cycle_started)))
+    finally:
+        pipeline.close()
+        http.close()
+
+    latencies.sort()
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3) if latencies else None
+
+    return {
+        'orders_created': simulator.stats['orders'],
+        'orders_fetched': len(seen),
+        'requests': pipeline.request_count,
+        'failed_cycles': failed_cycles,
+        'latency_p50': percentile(0.50),
+        'latency_p95': percentile(0.95),
+        'latency_max': round(latencies[-1], 3) if latencies else None,
+        'status': dict(simulator.stats['status']),
+        'http': http.stats(),
+    }
+
+
+def main(argv=None) -> int:
+    """Executa o simulador ou o benchmark pela linha de comando."""
+    parser = argparse.ArgumentParser(description="Simulador local da API v3 do Bling")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8780)
+    parser.add_argument('--modelos', help="Padrão glob dos pedidos modelo (padrão: pedido_*.json)")
+    parser.add_argument('--pedidos-por-minuto', type=float, default=30.0)
+    parser.add_argument('--latencia-ms', type=float, default=100.0)
+    parser.add_argument('--variacao-ms', type=float, default=50.0)
+    parser.add_argument('--taxa-429', type=float, default=0.0, help="Probabilidade de 429 por requisição")
+    parser.add_argument('--taxa-5xx', type=float, default=0.0, help="Probabilidade de 503 por requisição")
+    parser.add_argument('--limite-por-segundo', type=float, default=3.0)
+    parser.add_argument('--benchmark', type=float, metavar='SEGUNDOS', help="Mede a latência de ponta a ponta")
+    parser.add_argument('--intervalo', type=float, default=5.0, help="Intervalo de polling do benchmark (s)")
+    parser.add_argument('--semente', type=int)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    simulator = BlingSimulator(
+        templates=load_templates(args.modelos),
+        host=args.host,
+        port=0 if args.benchmark else args.porta,
+        orders_per_minute=args.pedidos_por_minuto,
+        latency_ms=args.latencia_ms,
+        latency_jitter_ms=args.variacao_ms,
+        error_429_rate=args.taxa_429,
+        error_5xx_rate=args.taxa_5xx,
+        requests_per_second=args.limite_por_segundo,
+        seed=args.semente,
+    )
+    simulator.start()
+
+    try:
+        if args.benchmark:
+            print(json.dumps(run_benchmark(simulator, args.benchmark, args.intervalo), indent=2))
+        else:
+            print(f"Defina {ENV_VAR}={simulator.base_url} para apontar a aplicação ao simulador")
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
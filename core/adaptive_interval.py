@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Intervalo de polling adaptativo.
+
+O intervalo deixa de ser um valor fixo: encurta enquanto os pedidos chegam
+com frequência, cresce exponencialmente quando os ciclos voltam vazios ou
+após um 429, e nunca consome a cota diária de requisições do Bling mais
+depressa do que ela pode ser distribuída pelo restante do dia.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Limite diário da API v3 do Bling por conta
+BLING_DAILY_REQUEST_LIMIT = 120000
+
+# Chave do consumo diário na tabela config
+BUDGET_CONFIG_KEY = 'polling_request_budget'
+
+
+class AdaptiveIntervalScheduler:
+    """
+    Calcula o intervalo até o próximo ciclo de polling.
+
+    Attributes:
+        current_interval: Intervalo (s) a aplicar no próximo ciclo
+        arrival_rate: Média móvel de pedidos novos por minuto
+    """
+
+    def __init__(self, base_interval: float = 60, min_interval: float = 15,
+                 max_interval: float = 300, daily_limit: int = BLING_DAILY_REQUEST_LIMIT,
+                 budget_share: float = 0.5, storage=None):
+        """
+        Args:
+            base_interval: Intervalo configurado pelo usuário (s)
+            min_interval: Menor intervalo permitido em períodos de pico (s)
+            max_interval: Maior intervalo após ciclos ociosos (s)
+            daily_limit: Requisições diárias permitidas pela API
+            budget_share: Fração da cota diária reservada ao polling
+            storage: Storage opcional para persistir o consumo do dia
+        """
+        self.base_interval = float(base_interval)
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+        self.daily_limit = daily_limit
+        self.budget_share = budget_share
+        self.storage = storage
+
+        self.current_interval = self.base_interval
+        self.arrival_rate = 0.0
+        self.floor = 0.0
+        self._idle_cycles = 0
+        self._requests_per_cycle = 1.0
+        self._lock = threading.Lock()
+
+        self._budget_day, self._budget_used = self._load_budget()
+
+    # ------------------------------------------------------------------
+    # Cota diária
+    # ------------------------------------------------------------------
+
+    def _load_budget(self):
+        """Carrega o consumo do dia salvo no storage."""
+        today = datetime.now().strftime("%Y-%m-%d")
+        if self.storage is not None:
+            try:
+                data = self.storage.get_config(BUDGET_CONFIG_KEY)
+                if isinstance(data, dict) and data.get('day') == today:
+                    return today, int(data.get('used', 0))
+            except Exception as e:
+                logger.error(f"Erro ao carregar consumo diário de requisições: {e}")
+        return today, 0
+
+    def _save_budget(self) -> None:
+        """Persiste o consumo do dia no storage."""
+        if self.storage is None:
+            return
+        try:
+            self.storage.set_config(BUDGET_CONFIG_KEY, {'day': self._budget_day, 'used': self._budget_used})
+        except Exception as e:
+            logger.error(f"Erro ao salvar consumo diário de requisições: {e}")
+
+    def _roll_day(self, now: datetime) -> None:
+        """Zera o consumo quando o dia muda."""
+        today = now.strftime("%Y-%m-%d")
+        if today != self._budget_day:
+            self._budget_day, self._budget_used = today, 0
+
+    def remaining_budget(self) -> int:
+        """Requisições de polling ainda disponíveis hoje."""
+        with self._lock:
+            self._roll_day(datetime.now())
+            return max(0, int(self.daily_limit * self.budget_share) - self._budget_used)
+
+    def _budget_interval(self, now: datetime) -> float:
+        """Menor intervalo que distribui a cota restante até a meia-noite."""
+        remaining = max(0, int(self.daily_limit * self.budget_share) - self._budget_used)
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        seconds_left = (midnight - now).total_seconds()
+        if remaining <= 0:
+            return seconds_left
+        cycles_left = remaining / max(1.0, self._requests_per_cycle)
+        return seconds_left / cycles_left
+
+    # ------------------------------------------------------------------
+    # Atualização por ciclo
+    # ------------------------------------------------------------------
+
+    def configure(self, base_interval: Optional[float] = None, min_interval: Optional[float] = None,
+                  max_interval: Optional[float] = None) -> None:
+        """Aplica novos limites vindos das configurações do usuário."""
+        with self._lock:
+            if base_interval:
+                self.base_interval = float(base_interval)
+                self.current_interval = self.base_interval
+            if min_interval:
+                self.min_interval = float(min_interval)
+            if max_interval:
+                self.max_interval = float(max_interval)
+
+    def set_floor(self, seconds: float) -> None:
+        """Impõe um intervalo mínimo externo (ex.: fila de impressão longa); 0 remove."""
+        with self._lock:
+            self.floor = float(seconds)
+
+    def longest_interval(self) -> float:
+        """Maior intervalo (s) esperado entre dois ciclos com a configuração atual."""
+        with self._lock:
+            return max(self.max_interval, self.current_interval, self.floor)
+
+    def record_cycle(self, new_orders: int, requests_used: int, elapsed: float) -> float:
+        """
+        Registra o resultado de um ciclo e calcula o próximo intervalo.
+
+        Args:
+            new_orders: Pedidos novos encontrados no ciclo
+            requests_used: Requisições feitas à API no ciclo
+            elapsed: Segundos desde o ciclo anterior
+
+        Returns:
+            float: Próximo intervalo (s)
+        """
+        now = datetime.now()
+        with self._lock:
+            self._roll_day(now)
+            self._budget_used += requests_used
+            if requests_used:
+                self._requests_per_cycle = 0.8 * self._requests_per_cycle + 0.2 * requests_used
+
+            rate = new_orders / max(elapsed, 1.0) * 60
+            self.arrival_rate = 0.7 * self.arrival_rate + 0.3 * rate
+
+            if new_orders:
+                self._idle_cycles = 0
+                # Pico: aproximar o intervalo do tempo médio entre pedidos
+                target = 60 / self.arrival_rate if self.arrival_rate > 0 else self.base_interval
+                interval = min(self.base_interval, max(self.min_interval, target))
+            else:
+                # Ociosidade: o primeiro ciclo vazio volta ao intervalo base, os seguintes recuam
+                self._idle_cycles += 1
+                interval = max(self.current_interval, self.base_interval)
+                if self._idle_cycles > 1:
+                    interval *= 1.5
+
+            interval = self._bounded(interval, now)
+            self.current_interval = interval
+
+        self._save_budget()
+        return interval
+
+    def record_rate_limit(self, retry_after: float) -> float:
+        """
+        Registra um 429 e dobra o intervalo (respeitando o tempo pedido pela API).
+
+        Args:
+            retry_after: Espera indicada pela API (s)
+
+        Returns:
+            float: Próximo intervalo (s)
+        """
+        now = datetime.now()
+        with self._lock:
+            interval = max(retry_after, self.current_interval * 2)
+            self.current_interval = max(self._bounded(interval, now), retry_after)
+            logger.warning(f"Limite de requisições atingido, intervalo de polling ampliado para {self.current_interval:.0f}s")
+            return self.current_interval
+
+    def _bounded(self, interval: float, now: datetime) -> float:
+        """Aplica os limites mínimo/máximo, a cota diária e o piso externo."""
+        interval = min(self.max_interval, max(self.min_interval, interval))
+        return max(interval, self._budget_interval(now), self.floor)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado atual para exibição na interface."""
+        return {
+            'interval': int(self.current_interval),
+            'arrival_rate': round(self.arrival_rate, 2),
+            'remaining_budget': self.remaining_budget(),
+        }
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Motor de polling de pedidos baseado em asyncio.
+
+Substitui a cadeia PollingAuthThread -> PedidosPoller (QThread) -> QTimer por
+um único laço asyncio em uma thread própria, com tarefas canceláveis para
+autenticação, polling, busca e entrega dos pedidos. Parar o polling cancela
+as tarefas (inclusive uma espera de intervalo ou de rate limit em curso) em
+vez de aguardar o fim do ciclo ou recorrer a terminate().
+
+O motor não depende de Qt: tudo o que a interface precisa saber é publicado
+como eventos (tipo, dados) em uma `queue.Queue` thread-safe, consumida na
+thread principal pelo PollingEventBridge (core/polling_bridge.py).
+"""
+
+import time
+import queue
+import asyncio
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Callable
+
+from bling_api.factory import BlingClientFactory
+from core.filters import OrderFilter
+from core.order_sweeper import OrderSweeper
+
+logger = logging.getLogger(__name__)
+
+# Tipos de evento publicados na fila de eventos
+EVENT_STARTED = 'started'
+EVENT_STOPPED = 'stopped'
+EVENT_STATUS = 'status'            # (texto, is_polling)
+EVENT_ACTIVITY = 'activity'        # texto para o log de atividades
+EVENT_NEW_ORDERS = 'new_orders'    # lista de pedidos filtrados
+EVENT_ERROR = 'error'              # mensagem
+EVENT_AUTH_NEEDED = 'auth_needed'
+EVENT_AUTH_FAILED = 'auth_failed'  # mensagem
+EVENT_RATE_LIMIT = 'rate_limit'    # segundos de espera
+
+
+class AsyncPollingEngine:
+    """
+    Executa o polling de pedidos em um laço asyncio dedicado.
+
+    Mantém a interface usada pelo main.py com o PedidosPoller (start_polling,
+    stop_polling, is_polling, update_settings, polling_interval, scheduler,
+    fetch_order_detail e set_reconciliation_mode).
+    """
+
+    def __init__(self, bling_oauth, storage, token_manager=None, events: Optional["queue.Queue"] = None,
+                 auth_retry_interval: int = 30, stop_timeout: float = 5.0):
+        """
+        Args:
+            bling_oauth: Instância do gerenciador de autenticação OAuth do Bling
+            storage: Instância do gerenciador de armazenamento
+            token_manager: TokenManager com o token em cache (opcional; sem ele o
+                token é obtido do BlingOAuth a cada ciclo)
+            events: Fila thread-safe onde os eventos são publicados (criada se omitida)
+            auth_retry_interval: Espera (s) entre tentativas de reautenticação
+            stop_timeout: Tempo máximo (s) aguardando a thread ao parar
+        """
+        self.bling_oauth = bling_oauth
+        self.storage = storage
+        self.token_manager = token_manager
+        self.events: "queue.Queue" = events if events is not None else queue.Queue()
+        self.auth_retry_interval = auth_retry_interval
+        self.stop_timeout = stop_timeout
+        self.bling_client = None
+        self.order_filter = OrderFilter(storage)
+        # Chamado na thread do motor com os pedidos filtrados antes de o cursor avançar
+        # (ex.: registrar as intenções no diário de impressão); uma exceção mantém o cursor
+        self.accept_orders: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+
+        self.polling_interval = 60
+        try:
+            settings = self.storage.get_settings()
+            if settings:
+                self.polling_interval = int(settings.get('polling_interval', 60))
+        except Exception as e:
+            logger.error(f"Erro ao carregar configurações para o motor de polling: {e}")
+
+        self.sweeper = OrderSweeper(storage, client_provider=self._get_or_create_client,
+                                    base_interval=self.polling_interval)
+        self.scheduler = self.sweeper.scheduler
+
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._main_task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._is_running = False
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida (chamado pela thread principal)
+    # ------------------------------------------------------------------
+
+    def start_polling(self) -> None:
+        """Autentica e inicia o polling na thread do motor."""
+        if self._thread is not None and self._thread.is_alive():
+            logger.debug("Motor de polling já está em execução")
+            return
+        self._is_running = True
+        self._thread = threading.Thread(target=self._run_loop, name="AsyncPollingEngine", daemon=True)
+        self._thread.start()
+
+    def stop_polling(self) -> None:
+        """Cancela as tarefas do motor e aguarda o fim da thread."""
+        self._is_running = False
+        loop, task = self._loop, self._main_task
+        if loop is not None and task is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # Laço encerrado entre a verificação e a chamada
+        if self._thread is not None:
+            self._thread.join(self.stop_timeout)
+            if self._thread.is_alive():
+                logger.warning("Motor de polling não encerrou no tempo limite")
+            else:
+                logger.info("Motor de polling finalizado com sucesso")
+        self.sweeper.close()
+
+    def is_polling(self) -> bool:
+        """
+        Verifica se o polling está ativo.
+
+        Returns:
+            bool: True se o polling está em execução
+        """
+        return self._is_running and self._thread is not None and self._thread.is_alive()
+
+    def update_settings(self) -> None:
+        """Atualiza o intervalo e os filtros com os valores mais recentes do storage."""
+        settings = self.storage.get_settings() or {}
+        self.order_filter.update_settings(
+            allowed_stores=settings.get('allowed_stores', []),
+            filter_mode=settings.get('filter_mode', 'all'),
+            sku_list=settings.get('sku_list', [])
+        )
+        self.sweeper.configure(int(settings.get('polling_interval', 60)))
+        self.polling_interval = self.sweeper.next_interval
+        logger.info(f"Configurações do motor de polling atualizadas: intervalo={self.polling_interval}s")
+
+    def fetch_order_detail(self, order_id, full: bool = False) -> Optional[Dict[str, Any]]:
+        """Busca o pedido pelo ID (usado pelo receptor de webhooks); `full` dispensa a projeção."""
+        return self.sweeper.fetch_order_detail(order_id, full=full)
+
+    def set_reconciliation_mode(self, interval: int) -> None:
+        """
+        Reduz o polling a uma varredura de reconciliação (pedidos chegam por webhook).
+
+        Args:
+            interval: Intervalo mínimo (s) entre as varreduras
+        """
+        self.sweeper.set_reconciliation_mode(interval)
+        self.polling_interval = interval
+
+    # ------------------------------------------------------------------
+    # Cliente Bling
+    # ------------------------------------------------------------------
+
+    def _get_or_create_client(self):
+        """
+        Obtém ou cria um cliente Bling com token atualizado.
+
+        Returns:
+            Instância de BlingClient ou None se não foi possível obter um token.
+        """
+        if self.token_manager is not None:
+            access_token = self.token_manager.get_token()
+        else:
+            access_token = self.bling_oauth.get_valid_access_token()
+        if not access_token:
+            logger.error("Não foi possível obter um token válido")
+            return None
+
+        if not self.bling_client:
+            self.bling_client = BlingClientFactory.create_from_oauth_instance(self.bling_oauth)
+            if not self.bling_client:
+                logger.error("Não foi possível criar cliente Bling a partir da instância OAuth")
+                return None
+        elif self.bling_client.access_token != access_token:
+            self.bling_client.access_token = access_token
+            self.bling_client.headers["Authorization"] = f"Bearer {access_token}"
+        return self.bling_client
+
+    # ------------------------------------------------------------------
+    # Laço asyncio (thread do motor)
+    # ------------------------------------------------------------------
+
+    def _emit(self, kind: str, payload: Any = None) -> None:
+        """Publica um evento para a thread principal."""
+        self.events.put((kind, payload))
+
+    def _run_loop(self) -> None:
+        """Ponto de entrada da thread: executa o laço até o cancelamento."""
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="AsyncPollingIO")
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            logger.error(f"Erro no motor de polling: {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            # Uma busca bloqueante em andamento termina sozinha; não esperar por ela
+            self._executor.shutdown(wait=False)
+            self._loop = None
+            self._main_task = None
+            self._is_running = False
+            self._emit(EVENT_STOPPED)
+
+    async def _main(self) -> None:
+        """Coordena as tarefas de autenticação, polling e entrega."""
+        self._loop = asyncio.get_running_loop()
+        self._main_task = asyncio.current_task()
+        if not self._is_running:
+            return  # stop_polling chamado antes de o laço começar
+
+        delivery: "asyncio.Queue" = asyncio.Queue()
+        enqueue_task = asyncio.create_task(self._enqueue_loop(delivery), name="enqueue")
+        try:
+            if not await asyncio.create_task(self._authenticate(), name="auth"):
+                return
+            self._emit(EVENT_STARTED)
+            await asyncio.create_task(self._poll_loop(delivery), name="poll")
+        except asyncio.CancelledError:
+            logger.info("Polling cancelado")
+        finally:
+            # Entregar o que já foi buscado antes de encerrar
+            if not enqueue_task.done():
+                await delivery.join()
+            enqueue_task.cancel()
+            logger.info("Finalizando polling de pedidos")
+
+    async def _in_executor(self, func, *args):
+        """Executa uma chamada bloqueante (rede, storage) sem travar o laço."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _authenticate(self) -> bool:
+        """
+        Autentica no Bling sem intervenção do usuário.
+
+        Returns:
+            bool: True se a autenticação foi bem-sucedida
+        """
+        self._emit(EVENT_STATUS, ("Autenticando...", None))
+        try:
+            if self.token_manager is not None and self.token_manager.has_valid_token():
+                # Token em cache e renovado em segundo plano: nada a fazer antes do primeiro ciclo
+                authenticated = True
+            else:
+                authenticated = await self._in_executor(self.bling_oauth.authenticate_automatically)
+                if authenticated and self.token_manager is not None:
+                    self.token_manager.load()
+        except Exception as e:
+            logger.error(f"Erro na autenticação para polling: {e}")
+            self._emit(EVENT_AUTH_FAILED, f"Erro ao iniciar verificação: {e}")
+            return False
+
+        if not authenticated:
+            logger.warning("Falha na autenticação automática para polling")
+            self._emit(EVENT_AUTH_FAILED, "Não foi possível conectar ao Bling. Verifique sua conexão e credenciais.")
+            return False
+
+        logger.info("Autenticação automática bem-sucedida, iniciando polling")
+        self._emit(EVENT_STATUS, ("Iniciando verificação...", None))
+        self._emit(EVENT_ACTIVITY, "Iniciando verificação automática de pedidos")
+        return True
+
+    async def _sleep(self, seconds: Optional[float] = None) -> None:
+        """
+        Aguarda o intervalo de polling (ou `seconds`), cancelável a qualquer momento.
+
+        Sem `seconds`, o intervalo é relido a cada segundo, então uma mudança
+        de `polling_interval` (configurações, contrapressão) vale para a espera em curso.
+        """
+        started = time.monotonic()
+        while True:
+            target = seconds if seconds is not None else max(1, self.polling_interval)
+            remaining = target - (time.monotonic() - started)
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(1.0, remaining))
+
+    async def _poll_loop(self, delivery: "asyncio.Queue") -> None:
+        """Executa os ciclos de busca e encaminha os pedidos novos à tarefa de entrega."""
+        logger.info("Iniciando polling de pedidos")
+        failures = 0
+
+        while True:
+            try:
+                fetch_task = asyncio.create_task(self._in_executor(self.sweeper.sweep), name="fetch")
+                result = await fetch_task
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                logger.error(f"Erro durante polling: {e}")
+                self._emit(EVENT_ERROR, f"Erro durante polling: {e}")
+                await self._sleep(10 * min(failures, 6))
+                continue
+
+            if result.get('rate_limit_wait'):
+                self._emit(EVENT_RATE_LIMIT, result['rate_limit_wait'])
+            if 'orders' in result or result.get('rate_limit_wait'):
+                self.polling_interval = self.sweeper.next_interval
+            if result.get('status'):
+                self._emit(EVENT_STATUS, (result['status'], True))
+
+            if 'orders' in result:
+                failures = 0
+                # O cursor segue com os pedidos: o próximo ciclo já pode estar em andamento
+                # quando a entrega deste terminar
+                cursor = self.sweeper.take_pending()
+                if result['orders']:
+                    await delivery.put((result['orders'], cursor))
+                else:
+                    self.sweeper.commit(cursor)
+                await self._sleep()
+                continue
+
+            if result.get('waiting_for_rate_limit'):
+                await self._sleep(5)
+                continue
+
+            error = result.get('error', {})
+            status_code = error.get('status_code', 0)
+
+            if result.get('auth_needed') or result.get('client_unavailable'):
+                if self.token_manager is not None and result.get('auth_needed'):
+                    # Token rejeitado pela API: uma única renovação, compartilhada com as demais threads
+                    if await self._in_executor(self.token_manager.refresh, True):
+                        continue
+                self._emit(EVENT_AUTH_NEEDED)
+                while not await self._authenticate():
+                    await self._sleep(self.auth_retry_interval)
+                continue
+
+            if status_code == 429:
+                wait_time = error.get('wait_time', 60)
+                logger.warning(f"Rate limit atingido, aguardando {wait_time} segundos")
+                self._emit(EVENT_STATUS, (f"Aguardando: limite excedido ({wait_time}s)", True))
+                await self._sleep(min(wait_time, 300))
+                continue
+
+            if status_code == 403:
+                message = "Acesso negado. Verifique se suas credenciais têm permissão para acessar os pedidos."
+                logger.error(f"Erro 403 ao consultar pedidos: {message}")
+                self._emit(EVENT_ERROR, message)
+                await self._sleep(60)
+                continue
+
+            message = error.get('message', 'Erro desconhecido')
+            logger.error(f"Erro ao consultar pedidos: {message}")
+            self._emit(EVENT_ERROR, f"Erro ao consultar pedidos: {message}")
+            await self._sleep(10)
+
+    async def _enqueue_loop(self, delivery: "asyncio.Queue") -> None:
+        """Filtra os pedidos novos, publica-os para a interface e avança o cursor."""
+        while True:
+            orders, cursor = await delivery.get()
+            try:
+                logger.info(f"Processando {len(orders)} pedidos.")
+                filtered = self.order_filter.process_orders(orders) if self.order_filter else orders
+                if filtered:
+                    logger.info(f"{len(filtered)} pedidos passaram pelos filtros.")
+                    if self.accept_orders is not None:
+                        await self._in_executor(self.accept_orders, filtered)
+                    self._emit(EVENT_NEW_ORDERS, filtered)
+                else:
+                    logger.info("Nenhum pedido passou pelos filtros.")
+                # Pedidos aceitos (intenções no disco) e entregues à interface: o cursor pode avançar
+                self.sweeper.commit(cursor)
+            except Exception as e:
+                # O cursor deste ciclo não é salvo; os pedidos serão buscados de novo
+                logger.error(f"Erro ao entregar pedidos: {e}")
+                self._emit(EVENT_ERROR, f"Erro ao processar pedidos: {e}")
+            finally:
+                delivery.task_done()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Recuperação (backfill) de pedidos recebidos enquanto a aplicação estava fechada.
+
+Quando o polling volta depois de um período parado, o intervalo entre o
+cursor salvo (ou a última impressão registrada em `print_history`) e o
+momento atual é entregue a este módulo. O polling continua a partir de
+agora; o backfill busca os pedidos do intervalo em páginas concorrentes,
+descarta os que já constam em `print_history` e os entrega ao fluxo de
+impressão em ordem de prazo (dataPrevista), com vazão limitada e só quando
+a fila da impressora está curta, para que os pedidos ao vivo não fiquem
+atrás de uma manhã inteira de pedidos atrasados.
+
+O intervalo pendente fica salvo no storage até terminar, então um backfill
+interrompido é retomado na próxima inicialização. Pedidos cujo detalhe falhou
+não são entregues (o resumo da listagem não tem itens): o intervalo continua
+salvo e eles são buscados de novo na próxima execução.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Callable, Set, Tuple
+
+from bling_api.fetch_pipeline import BlingFetchPipeline
+from core.order_sweeper import OrderCursor, BLING_DATETIME_FORMAT, _order_id
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Chave do intervalo pendente na tabela config
+BACKFILL_CONFIG_KEY = 'polling_backfill'
+
+
+def last_printed_at(storage) -> Optional[datetime]:
+    """Instante da última impressão bem-sucedida registrada em `print_history`."""
+    try:
+        row = storage.conn.execute(
+            "SELECT MAX(printed_at) FROM print_history WHERE status = 'success'"
+        ).fetchone()
+        if row and row[0]:
+            return datetime.fromisoformat(row[0])
+    except Exception as e:
+        logger.error(f"Erro ao consultar última impressão: {e}")
+    return None
+
+
+def printed_order_numbers(storage, since: datetime) -> Set[str]:
+    """Números dos pedidos impressos com sucesso desde `since` (o histórico guarda o número do pedido)."""
+    try:
+        rows = storage.conn.execute(
+            "SELECT DISTINCT order_id FROM print_history WHERE status = 'success' AND printed_at >= ?",
+            (since.isoformat(),)
+        ).fetchall()
+        return {str(row[0]) for row in rows}
+    except Exception as e:
+        logger.error(f"Erro ao consultar pedidos já impressos: {e}")
+        return set()
+
+
+def _date_field(order: Dict[str, Any], field: str) -> Optional[str]:
+    """Data de um campo do pedido, ignorando a data vazia do Bling ("0000-00-00")."""
+    value = order.get(field)
+    if not value or str(value).startswith('0000'):
+        return None
+    return str(value)
+
+
+def order_deadline(order: Dict[str, Any]):
+    """Chave de ordenação por prazo: data prevista, data de saída, data do pedido e ID."""
+    deadline = (_date_field(order, 'dataPrevista') or _date_field(order, 'dataSaida')
+                or _date_field(order, 'data') or '9999-12-31')
+    return (deadline, _date_field(order, 'data') or '', _order_id(order) or 0)
+
+
+class OrderBackfill:
+    """
+    Busca e entrega, com vazão limitada, os pedidos de um período sem polling.
+    """
+
+    def __init__(self, storage, client_provider: Callable[[], Any], on_order: Callable[[Dict[str, Any]], None],
+                 queue_depth: Optional[Callable[[], int]] = None, order_filter=None, projection=None,
+                 gap_threshold: int = 600, gap_margin: int = 300,
+                 expected_interval: Optional[Callable[[], float]] = None,
+                 max_gap_hours: float = 24, orders_per_minute: float = 6,
+                 max_queued: int = 2, max_pages: int = 50):
+        """
+        Args:
+            storage: Instância do gerenciador de armazenamento
+            client_provider: Função que retorna um BlingClient autenticado (ou None)
+            on_order: Função que recebe cada pedido recuperado
+            queue_depth: Função que retorna quantos trabalhos aguardam a impressora
+            order_filter: OrderFilter aplicado aos pedidos recuperados (opcional)
+            projection: OrderProjection aplicada aos pedidos recuperados (opcional)
+            gap_threshold: Tempo mínimo (s) sem polling a partir do qual há backfill
+            gap_margin: Folga (s) somada ao maior intervalo normal entre ciclos
+            expected_interval: Função que retorna o maior intervalo (s) esperado entre
+                ciclos (ex.: AdaptiveIntervalScheduler.longest_interval)
+            max_gap_hours: Período máximo recuperado
+            orders_per_minute: Vazão máxima de pedidos recuperados
+            max_queued: Trabalhos na fila da impressora acima dos quais o backfill espera
+            max_pages: Páginas da listagem consultadas no máximo
+        """
+        self.storage = storage
+        self.client_provider = client_provider
+        self.on_order = on_order
+        self.queue_depth = queue_depth
+        self.order_filter = order_filter
+        self.projection = projection
+        self.gap_threshold = gap_threshold
+        self.gap_margin = gap_margin
+        self.expected_interval = expected_interval
+        self.max_gap_hours = max_gap_hours
+        self.max_queued = max_queued
+        self.max_pages = max_pages
+        self.bucket = TokenBucket(rate=orders_per_minute / 60.0, capacity=1)
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self.delivered = 0
+
+    # ------------------------------------------------------------------
+    # Detecção do intervalo
+    # ------------------------------------------------------------------
+
+    def is_running(self) -> bool:
+        """Indica se há um backfill em andamento."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def current_gap_threshold(self) -> float:
+        """
+        Tempo (s) sem polling a partir do qual há backfill.
+
+        Fica acima do maior intervalo normal entre ciclos (ociosidade, modo de
+        reconciliação, contrapressão da impressora), para que uma varredura
+        espaçada não seja tratada como um período com a aplicação fechada.
+        """
+        threshold = float(self.gap_threshold)
+        if self.expected_interval is not None:
+            try:
+                threshold = max(threshold, self.expected_interval() + self.gap_margin)
+            except Exception as e:
+                logger.error(f"Erro ao consultar o intervalo de polling esperado: {e}")
+        return threshold
+
+    def handle_gap(self, cursor: Optional[OrderCursor], now: datetime) -> bool:
+        """
+        Verifica se houve um período sem polling e, se houve, agenda o backfill.
+
+        Chamado pelo OrderSweeper no início de cada ciclo.
+
+        Args:
+            cursor: Cursor salvo, ou None se ainda não existe
+            now: Início do ciclo
+
+        Returns:
+            bool: True se o período ficou com o backfill (o polling deve seguir a partir de agora)
+        """
+        if self.is_running():
+            return False
+
+        if cursor is not None:
+            since = datetime.strptime(cursor.changed_since, BLING_DATETIME_FORMAT)
+            last_id = cursor.last_id
+        else:
+            # Sem cursor (primeira execução ou cursor descartado): usar a última impressão
+            since = last_printed_at(self.storage)
+            last_id = 0
+            if since is None:
+                return False
+
+        if (now - since).total_seconds() < self.current_gap_threshold():
+            return False
+
+        # Um intervalo anterior ainda pendente (pedidos sem detalhe) é incluído no novo
+        pending = self._pending_gap()
+        if pending is not None:
+            pending_since = datetime.strptime(pending['since'], BLING_DATETIME_FORMAT)
+            if pending_since < since:
+                since = pending_since
+                last_id = min(last_id, int(pending.get('last_id') or 0))
+
+        oldest = now - timedelta(hours=self.max_gap_hours)
+        if since < oldest:
+            logger.warning(f"Período sem polling maior que {self.max_gap_hours}h; recuperando a partir de {oldest}")
+            since = oldest
+
+        self.start({
+            'since': since.strftime(BLING_DATETIME_FORMAT),
+            'until': now.strftime(BLING_DATETIME_FORMAT),
+            'last_id': last_id,
+        })
+        return True
+
+    # ------------------------------------------------------------------
+    # Execução
+    # ------------------------------------------------------------------
+
+    def _pending_gap(self) -> Optional[Dict[str, Any]]:
+        """Intervalo salvo de um backfill interrompido ou com pedidos sem detalhe (ou None)."""
+        if self.storage is None:
+            return None
+        try:
+            gap = self.storage.get_config(BACKFILL_CONFIG_KEY)
+        except Exception as e:
+            logger.error(f"Erro ao carregar backfill pendente: {e}")
+            return None
+        if not isinstance(gap, dict) or not gap.get('since'):
+            return None
+        return gap
+
+    def resume(self) -> bool:
+        """
+        Retoma um backfill interrompido pelo encerramento da aplicação.
+
+        Returns:
+            bool: True se havia um backfill pendente
+        """
+        gap = self._pending_gap()
+        if gap is None:
+            return False
+        logger.info(f"Retomando backfill de pedidos de {gap['since']} a {gap['until']}")
+        self.start(gap)
+        return True
+
+    def start(self, gap: Dict[str, Any]) -> None:
+        """Salva o intervalo pendente e inicia a thread de backfill."""
+        with self._lock:
+            if self.is_running():
+                return
+            try:
+                self.storage.set_config(BACKFILL_CONFIG_KEY, gap)
+            except Exception as e:
+                logger.error(f"Erro ao salvar backfill pendente: {e}")
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, args=(gap,), name="OrderBackfill", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Interrompe o backfill; o intervalo pendente é retomado na próxima inicialização."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def _run(self, gap: Dict[str, Any]) -> None:
+        """Busca os pedidos do intervalo e os entrega com vazão limitada."""
+        logger.info(f"Backfill de pedidos de {gap['since']} a {gap['until']}")
+        try:
+            orders, failed = self._fetch_missing(gap)
+        except Exception as e:
+            logger.error(f"Erro ao buscar pedidos do backfill: {e}")
+            return  # Intervalo continua salvo para nova tentativa
+
+        if orders:
+            logger.info(f"Backfill: {len(orders)} pedidos a imprimir, prazos de {order_deadline(orders[0])[0]} "
+                        f"a {order_deadline(orders[-1])[0]}")
+        for order in orders:
+            if not self._wait_for_printer():
+                logger.info(f"Backfill interrompido com {self.delivered} pedidos entregues")
+                return
+            try:
+                self.on_order(order)
+                self.delivered += 1
+            except Exception as e:
+                logger.error(f"Erro ao entregar pedido {order.get('numero')} do backfill: {e}")
+
+        if failed:
+            # Intervalo continua salvo: na próxima execução os pedidos impressos agora são descartados
+            logger.warning(f"Backfill: {len(failed)} pedidos sem detalhe ficam para a próxima execução "
+                           f"({self.delivered} pedidos entregues)")
+            return
+        try:
+            self.storage.delete_config(BACKFILL_CONFIG_KEY)
+        except Exception as e:
+            logger.error(f"Erro ao encerrar backfill: {e}")
+        logger.info(f"Backfill concluído: {self.delivered} pedidos entregues")
+
+    def _fetch_missing(self, gap: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Lista o intervalo e detalha apenas os pedidos novos ainda não impressos.
+
+        Returns:
+            Tupla (pedidos a imprimir, em ordem de prazo; resumos dos pedidos cujo
+            detalhe falhou, que não são entregues)
+        """
+        client = self.client_provider()
+        if not client:
+            raise RuntimeError("cliente Bling indisponível")
+
+        since = datetime.strptime(gap['since'], BLING_DATETIME_FORMAT)
+        last_id = int(gap.get('last_id') or 0)
+        printed = printed_order_numbers(self.storage, since)
+        since_date = since.strftime("%Y-%m-%d")
+
+        def is_missing(order):
+            if str(order.get('numero')) in printed:
+                return False
+            # Com cursor, "novo" é ID acima do último visto; sem cursor, criado dentro do intervalo
+            if last_id:
+                return (_order_id(order) or 0) > last_id
+            return (order.get('data') or '') >= since_date
+
+        pipeline = BlingFetchPipeline(client)
+        try:
+            result = pipeline.fetch_orders(
+                {'dataAlteracaoInicial': gap['since'], 'dataAlteracaoFinal': gap['until']},
+                max_pages=self.max_pages,
+                needs_detail=is_missing,
+            )
+        finally:
+            pipeline.close()
+
+        orders = [order for order in result['details'] if is_missing(order)]
+        if self.projection is not None:
+            orders = [self.projection.apply(order) for order in orders]
+        if self.order_filter is not None:
+            orders = self.order_filter.process_orders(orders)
+        orders.sort(key=order_deadline)
+        logger.info(f"Backfill: {len(result['summaries'])} pedidos no intervalo, "
+                    f"{len(printed)} já impressos, {len(orders)} faltando")
+        return orders, result['failed']
+
+    def _wait_for_printer(self) -> bool:
+        """
+        Aguarda a vazão permitida e uma fila de impressão curta.
+
+        Returns:
+            bool: False se o backfill foi interrompido
+        """
+        if not self.bucket.consume(1, stop_event=self._stop_event):
+            return False
+        while self.queue_depth is not None and self.queue_depth() > self.max_queued:
+            if self._stop_event.wait(1.0):
+                return False
+        return not self._stop_event.is_set()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Manutenção do cache de pedidos (`orders_cache`) em segundo plano.
+
+A limpeza do cache era feita por `clean_expired_orders_cache()` na thread da
+interface, na inicialização e a cada início de polling, com um único DELETE
+que varria a tabela inteira (só há índice em `order_number`). Esta tarefa
+cria índices em `expires_at` e `created_at`, remove os pedidos expirados em
+lotes pequenos com pausas entre eles (sem segurar o banco para as demais
+gravações) e devolve o espaço liberado ao sistema com `incremental_vacuum`,
+convertendo o banco para `auto_vacuum = INCREMENTAL` com um `VACUUM`
+completo ocasional.
+
+A manutenção usa uma conexão própria com o arquivo do banco, para não
+disputar transações com a conexão compartilhada do storage.
+"""
+
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Índices usados pela expiração (o de `order_number` já é criado pelo storage)
+CACHE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_orders_cache_expires ON orders_cache(expires_at)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_cache_created ON orders_cache(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_cache_accessed ON orders_cache(last_accessed)",
+)
+
+# Valor de PRAGMA auto_vacuum para o modo incremental
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def database_path(conn: sqlite3.Connection) -> Optional[str]:
+    """Caminho do arquivo do banco principal de uma conexão (None se em memória)."""
+    try:
+        for row in conn.execute("PRAGMA database_list").fetchall():
+            if row[1] == 'main':
+                return row[2] or None
+    except Exception as e:
+        logger.error(f"Erro ao obter caminho do banco de dados: {e}")
+    return None
+
+
+class CacheMaintenance:
+    """
+    Expiração em lotes e compactação do `orders_cache` em uma thread de fundo.
+    """
+
+    def __init__(self, storage, days_threshold: Optional[int] = 60, interval: float = 3600,
+                 initial_delay: float = 30, batch_size: int = 200, batch_pause: float = 0.05,
+                 vacuum_pages: int = 500, full_vacuum_interval: float = 7 * 24 * 3600):
+        """
+        Args:
+            storage: Instância do gerenciador de armazenamento (com `conn`)
+            days_threshold: Remove também pedidos criados há mais dias que isso (None desativa)
+            interval: Intervalo (s) entre rodadas de manutenção
+            initial_delay: Espera (s) antes da primeira rodada, para não competir com a inicialização
+            batch_size: Pedidos removidos por transação
+            batch_pause: Pausa (s) entre lotes
+            vacuum_pages: Páginas livres devolvidas por `incremental_vacuum` a cada rodada
+            full_vacuum_interval: Intervalo mínimo (s) entre VACUUMs completos
+        """
+        self.storage = storage
+        self.days_threshold = days_threshold
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.vacuum_pages = vacuum_pages
+        self.full_vacuum_interval = full_vacuum_interval
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_full_vacuum = 0.0
+        self._indexes_ready = False
+        self.removed_total = 0
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Inicia a thread de manutenção."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="OrdersCacheMaintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Encerra a thread de manutenção (o lote em andamento é concluído)."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def _loop(self) -> None:
+        """Executa uma rodada de manutenção a cada `interval` segundos."""
+        if self._stop_event.wait(self.initial_delay):
+            return
+        while not self._stop_event.is_set():
+            self.run_once()
+            self._stop_event.wait(self.interval)
+
+    # ------------------------------------------------------------------
+    # Manutenção
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Abre a conexão de manutenção com o mesmo arquivo do storage."""
+        path = database_path(self.storage.conn)
+        if not path:
+            logger.debug("Banco em memória, manutenção do cache ignorada")
+            return None
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout = 10000")
+        return conn
+
+    def run_once(self) -> int:
+        """
+        Executa uma rodada completa: índices, remoção em lotes e compactação.
+
+        Returns:
+            int: Número de pedidos removidos
+        """
+        try:
+            conn = self._connect()
+        except Exception as e:
+            logger.error(f"Erro ao abrir conexão de manutenção do cache: {e}")
+            return 0
+        if conn is None:
+            return 0
+
+        removed = 0
+        try:
+            if not self._indexes_ready:
+                for sql in CACHE_INDEXES:
+                    conn.execute(sql)
+                self._indexes_ready = True
+
+            now = datetime.now()
+            removed += self._delete_in_batches(conn, "expires_at", now.isoformat())
+            if self.days_threshold is not None:
+                threshold = (now - timedelta(days=self.days_threshold)).isoformat()
+                removed += self._delete_in_batches(conn, "created_at", threshold)
+
+            if removed:
+                logger.info(f"Manutenção do cache: {removed} pedidos expirados removidos")
+            self.removed_total += removed
+
+            if not self._stop_event.is_set():
+                self._vacuum(conn)
+        except Exception as e:
+            logger.error(f"Erro na manutenção do cache de pedidos: {e}")
+        finally:
+            conn.close()
+        return removed
+
+    def _delete_in_batches(self, conn: sqlite3.Connection, column: str, before: str) -> int:
+        """
+        Remove, em transações de até `batch_size` linhas, os pedidos com `column` < `before`.
+
+        Args:
+            conn: Conexão de manutenção
+            column: Coluna indexada de data ('expires_at' ou 'created_at')
+            before: Data ISO limite
+
+        Returns:
+            int: Número de linhas removidas
+        """
+        sql = (f"DELETE FROM orders_cache WHERE id IN "
+               f"(SELECT id FROM orders_cache WHERE {column} < ? LIMIT ?)")
+        removed = 0
+        while not self._stop_event.is_set():
+            cursor = conn.execute(sql, (before, self.batch_size))
+            removed += cursor.rowcount
+            if cursor.rowcount < self.batch_size:
+                break
+            # Libera o banco entre os lotes para as gravações do restante da aplicação
+            time.sleep(self.batch_pause)
+        return removed
+
+    def _vacuum(self, conn: sqlite3.Connection) -> None:
+        """Devolve páginas livres ao sistema, convertendo para auto_vacuum incremental se preciso."""
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode == AUTO_VACUUM_INCREMENTAL:
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if free_pages:
+                # Cada passo do PRAGMA libera uma página; execute() daria um único passo
+                conn.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});")
+                logger.debug(f"incremental_vacuum: até {self.vacuum_pages} de {free_pages} páginas livres devolvidas")
+            return
+
+        # A mudança de modo só vale após um VACUUM completo, feito no máximo uma vez por intervalo
+        if self._last_full_vacuum and time.monotonic() - self._last_full_vacuum < self.full_vacuum_interval:
+            return
+        self._last_full_vacuum = time.monotonic()
+        try:
+            started = time.perf_counter()
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            logger.info(f"Banco convertido para auto_vacuum incremental em {time.perf_counter() - started:.1f}s")
+        except sqlite3.OperationalError as e:
+            # Banco ocupado: nova tentativa após o intervalo
+            logger.warning(f"VACUUM adiado: {e}")
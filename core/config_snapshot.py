@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Configuração carregada uma vez, validada e imutável.
+
+As configurações ficam em três lugares: a tabela `config` do Storage (cada
+valor criptografado), `config.json` e `config/impressora_config.json`.
+Impressão, polling e filtros liam `get_config()` a cada pedido, com uma
+consulta ao SQLite e uma descriptografia por chave.
+
+O ConfigStore lê tudo na inicialização e monta um ConfigSnapshot: os
+valores da tabela congelados (listas viram tuplas, dicts viram mappings
+somente leitura), os dois arquivos JSON e atributos tipados para as chaves
+usadas nos caminhos quentes (`snapshot.auto_print`, `snapshot.printer`...).
+Cada gravação gera um snapshot novo que substitui o anterior de uma vez
+(quem já tem uma referência continua vendo um estado consistente) e
+notifica os assinantes com as chaves alteradas.
+
+`install_config_store` passa `get_config()`/`get_settings()` do Storage a
+responder pelo snapshot e `set_config()`/`delete_config()`/`save_settings()`
+a atualizá-lo depois de gravar no banco. Uma gravação que falha (exceção ou
+retorno False) não altera o snapshot: ele continua igual ao banco.
+"""
+
+import codecs
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, Any, Optional, Callable, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_CONFIG_PATH = os.path.join(_APP_DIR, 'config.json')
+PRINTER_CONFIG_PATH = os.path.join(_APP_DIR, 'config', 'impressora_config.json')
+
+# Chaves da tabela `config` lidas nos caminhos quentes: chave -> (tipo, padrão)
+TYPED_SETTINGS = {
+    # Impressão
+    'auto_print': (bool, False),
+    'printer': (str, ''),
+    'font_size': (int, 10),
+    'line_spacing': (float, 1.2),
+    'paper_width': (int, 80),
+    'use_custom_layout': (bool, False),
+    # Polling
+    'polling_interval': (int, 300),
+    'continuous_polling': (bool, True),
+    'auto_start_polling': (bool, False),
+    # Filtros
+    'filter_mode': (str, 'all'),
+    'allowed_stores': (tuple, ()),
+    'sku_list': (tuple, ()),
+    'include_stores': (tuple, ()),
+    'exclude_stores': (tuple, ()),
+    'include_skus': (tuple, ()),
+    'exclude_skus': (tuple, ()),
+    'marketplace_only': (bool, False),
+    'required_statuses': (tuple, ()),
+    # Cache e diversos
+    'order_cache_size': (int, 500),
+    'keep_full_order_payload': (bool, False),
+    'log_level': (str, 'INFO'),
+}
+
+# Padrões devolvidos por `get_settings()` (os mesmos do Storage)
+SETTINGS_DEFAULTS = ('polling_interval', 'continuous_polling', 'auto_print', 'printer',
+                     'allowed_stores', 'filter_mode', 'sku_list', 'log_level')
+
+# Campos de `config/impressora_config.json` validados antes de entrar no snapshot: campo -> (tipos, mínimo)
+PRINTER_FILE_FIELDS = {
+    'largura_papel': ((int,), 1),
+    'baudrate': ((int,), 1),
+    'timeout': ((int, float), 0),
+    'velocidade_papel_mm_s': ((int, float), 1),
+    'impressora_windows': ((str,), None),
+    'porta_serial': ((str,), None),
+    'encoding': ((str,), None),
+    'metodos_impressao': ((list,), None),
+}
+
+# Chaves de assinatura para mudanças nos arquivos JSON
+APP_FILE_KEY = 'config.json'
+PRINTER_FILE_KEY = 'impressora_config.json'
+
+
+def freeze(value: Any) -> Any:
+    """Cópia somente leitura de um valor JSON (listas viram tuplas, dicts viram mappings)."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Cópia mutável de um valor congelado, no formato que o Storage devolvia."""
+    if isinstance(value, MappingProxyType):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+def as_stored(value: Any) -> Any:
+    """Valor como ele volta do banco: o Storage grava JSON e `_decrypt` faz o parse."""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return json.loads(json.dumps(value))
+
+
+def validate_printer_config(data: Dict[str, Any]) -> List[str]:
+    """
+    Valida o conteúdo de `config/impressora_config.json`.
+
+    Returns:
+        Lista de erros (vazia se a configuração é válida)
+    """
+    errors = []
+    for field, (kinds, minimum) in PRINTER_FILE_FIELDS.items():
+        if field not in data:
+            continue
+        value = data[field]
+        if isinstance(value, bool) or not isinstance(value, kinds):
+            errors.append(f"{field}: tipo inválido ({value!r})")
+        elif minimum is not None and value < minimum:
+            errors.append(f"{field}: deve ser no mínimo {minimum} ({value!r})")
+    encoding = data.get('encoding')
+    if isinstance(encoding, str):
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            errors.append(f"encoding: codificação desconhecida ({encoding!r})")
+    return errors
+
+
+def _convert(key: str, value: Any) -> Any:
+    """Converte um valor salvo para o tipo da chave; valores inválidos usam o padrão."""
+    kind, default = TYPED_SETTINGS[key]
+    if value is None or value == '':
+        return default
+    try:
+        if kind is bool:
+            if isinstance(value, str):
+                return value.strip().lower() in ('1', 'true', 'sim', 'yes', 'on')
+            return bool(value)
+        if kind is tuple:
+            if isinstance(value, str):
+                # Listas digitadas como texto ("SKU1, SKU2")
+                return tuple(part.strip() for part in value.split(',') if part.strip())
+            return tuple(value)
+        if kind is int:
+            return int(float(value))
+        return kind(value)
+    except (TypeError, ValueError):
+        logger.warning(f"Configuração '{key}' com valor inválido ({value!r}), usando o padrão {default!r}")
+        return default
+
+
+class ConfigSnapshot:
+    """
+    Estado imutável das configurações em um instante.
+
+    Os atributos de TYPED_SETTINGS já vêm convertidos; as demais chaves da
+    tabela `config` são lidas com `get()`.
+    """
+
+    __slots__ = ('values', 'app', 'printer_file', 'version', 'loaded_at') + tuple(TYPED_SETTINGS)
+
+    def __init__(self, values: Dict[str, Any], app: Dict[str, Any], printer_file: Dict[str, Any], version: int):
+        """
+        Args:
+            values: Valores da tabela `config` (já descriptografados)
+            app: Conteúdo de `config.json`
+            printer_file: Conteúdo de `config/impressora_config.json`
+            version: Número sequencial do snapshot
+        """
+        setattr_ = object.__setattr__
+        setattr_(self, 'values', freeze(values))
+        setattr_(self, 'app', freeze(app))
+        setattr_(self, 'printer_file', freeze(printer_file))
+        setattr_(self, 'version', version)
+        setattr_(self, 'loaded_at', datetime.now())
+        for key in TYPED_SETTINGS:
+            setattr_(self, key, freeze(_convert(key, values.get(key))))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot é imutável; altere pelo set_config() do Storage")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Valor da tabela `config` como o Storage devolvia (cópia mutável), ou `default`."""
+        if key not in self.values:
+            return default
+        return thaw(self.values[key])
+
+    def settings(self) -> Dict[str, Any]:
+        """Todas as configurações com os padrões do Storage, como `get_settings()`."""
+        settings = {key: thaw(value) for key, value in self.values.items()}
+        for key in SETTINGS_DEFAULTS:
+            settings.setdefault(key, thaw(TYPED_SETTINGS[key][1]))
+        return settings
+
+    def print_config(self) -> Dict[str, Any]:
+        """Configuração de impressão no formato de `PrintController._get_print_config()`."""
+        return {
+            'printer': self.printer,
+            'font_size': self.font_size,
+            'line_spacing': self.line_spacing,
+            'paper_width': self.paper_width,
+            'use_custom_layout': self.use_custom_layout,
+        }
+
+
+Subscriber = Callable[[ConfigSnapshot, frozenset], None]
+
+
+class ConfigStore:
+    """
+    Mantém o snapshot atual e avisa os assinantes a cada troca.
+    """
+
+    def __init__(self, storage, app_config_path: str = APP_CONFIG_PATH,
+                 printer_config_path: str = PRINTER_CONFIG_PATH):
+        """
+        Args:
+            storage: Instância de Storage (com `conn` e `_decrypt`)
+            app_config_path: Caminho de `config.json`
+            printer_config_path: Caminho de `config/impressora_config.json`
+        """
+        self.storage = storage
+        self.app_config_path = app_config_path
+        self.printer_config_path = printer_config_path
+        self._current: Optional[ConfigSnapshot] = None
+        self._subscribers: List[Tuple[Subscriber, Optional[frozenset]]] = []
+        self._lock = threading.RLock()
+
+    @property
+    def current(self) -> ConfigSnapshot:
+        """Snapshot atual (leitura sem lock: a troca é uma única atribuição)."""
+        return self._current
+
+    # ------------------------------------------------------------------
+    # Leitura das fontes
+    # ------------------------------------------------------------------
+
+    def _read_table(self) -> Dict[str, Any]:
+        values = {}
+        rows = self.storage.conn.execute("SELECT key, value FROM config").fetchall()
+        for key, encrypted in rows:
+            try:
+                values[key] = self.storage._decrypt(encrypted)
+            except Exception as e:
+                logger.error(f"Configuração '{key}' ilegível ignorada: {e}")
+        return values
+
+    @staticmethod
+    def _read_json(path: str) -> Optional[Dict[str, Any]]:
+        """Conteúdo do arquivo ({} se ele não existe) ou None se ele não pôde ser lido."""
+        try:
+            if not os.path.exists(path):
+                return {}
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("o conteúdo não é um objeto JSON")
+            return data
+        except Exception as e:
+            logger.error(f"Erro ao ler configuração {path}: {e}")
+            return None
+
+    def _read_printer_file(self) -> Optional[Dict[str, Any]]:
+        """`impressora_config.json` validado; None se ilegível ou inválido."""
+        data = self._read_json(self.printer_config_path)
+        if data is None:
+            return None
+        errors = validate_printer_config(data)
+        if errors:
+            logger.error(f"Configuração da impressora inválida em {self.printer_config_path}: {'; '.join(errors)}")
+            return None
+        return data
+
+    def load(self, read_files: bool = True) -> ConfigSnapshot:
+        """
+        Lê a tabela `config` e os arquivos JSON e troca o snapshot.
+
+        Um arquivo ilegível ou inválido (ex.: ainda sendo gravado) mantém o
+        conteúdo do snapshot anterior.
+
+        Args:
+            read_files: Se False, relê só a tabela e mantém o conteúdo dos arquivos
+
+        Returns:
+            ConfigSnapshot: O novo snapshot
+        """
+        # Leitura com o lock: uma gravação concorrente não é sobrescrita por valores lidos antes dela
+        with self._lock:
+            previous = self._current
+            values = self._read_table()
+            app = self._read_json(self.app_config_path) if read_files or previous is None else None
+            printer_file = self._read_printer_file() if read_files or previous is None else None
+            if app is None:
+                app = thaw(previous.app) if previous is not None else {}
+            if printer_file is None:
+                printer_file = thaw(previous.printer_file) if previous is not None else {}
+            self._swap(values, app, printer_file)
+            changed = self._diff(previous, self._current) if previous is not None else frozenset()
+        if previous is None:
+            logger.info(f"Configurações carregadas: {len(values)} chaves")
+        self._notify(changed)
+        return self._current
+
+    reload = load
+
+    # ------------------------------------------------------------------
+    # Alterações
+    # ------------------------------------------------------------------
+
+    def _swap(self, values: Dict[str, Any], app: Dict[str, Any], printer_file: Dict[str, Any]) -> None:
+        """Monta e publica um novo snapshot; chamado com o lock."""
+        version = self._current.version + 1 if self._current is not None else 1
+        self._current = ConfigSnapshot(values, app, printer_file, version)
+
+    @staticmethod
+    def _diff(old: ConfigSnapshot, new: ConfigSnapshot) -> frozenset:
+        keys = set(old.values) | set(new.values)
+        changed = {key for key in keys if old.values.get(key, KeyError) != new.values.get(key, KeyError)}
+        if old.app != new.app:
+            changed.add(APP_FILE_KEY)
+        if old.printer_file != new.printer_file:
+            changed.add(PRINTER_FILE_KEY)
+        return frozenset(changed)
+
+    def apply(self, changes: Dict[str, Any], removed: Iterable[str] = ()) -> None:
+        """
+        Publica um snapshot com valores já gravados no banco.
+
+        Args:
+            changes: Chaves alteradas e seus novos valores
+            removed: Chaves excluídas
+        """
+        with self._lock:
+            current = self._current
+            values = {key: thaw(value) for key, value in current.values.items()}
+            values.update({key: as_stored(value) for key, value in changes.items()})
+            for key in removed:
+                values.pop(key, None)
+            self._swap(values, thaw(current.app), thaw(current.printer_file))
+            changed = self._diff(current, self._current)
+        self._notify(changed)
+
+    # ------------------------------------------------------------------
+    # Assinaturas
+    # ------------------------------------------------------------------
+
+    def subscribe(self, callback: Subscriber, keys: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """
+        Registra uma função chamada com (snapshot, chaves alteradas) a cada troca.
+
+        Args:
+            callback: Função chamada na thread que fez a alteração
+            keys: Só avisar quando uma destas chaves mudar (None: qualquer uma).
+                  Mudanças nos arquivos usam as chaves 'config.json' e 'impressora_config.json'.
+
+        Returns:
+            Função que cancela a assinatura
+        """
+        entry = (callback, frozenset(keys) if keys is not None else None)
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+    def _notify(self, changed: frozenset) -> None:
+        if not changed:
+            return
+        snapshot = self._current
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback, keys in subscribers:
+            if keys is not None and not (keys & changed):
+                continue
+            try:
+                callback(snapshot, changed)
+            except Exception as e:
+                logger.error(f"Erro ao notificar mudança de configuração ({', '.join(sorted(changed))}): {e}")
+
+
+def install_config_store(storage, **options) -> ConfigStore:
+    """
+    Carrega o snapshot e passa o Storage a ler dele e a atualizá-lo ao gravar.
+
+    Args:
+        storage: Instância de Storage
+        **options: Opções repassadas ao ConfigStore
+
+    Returns:
+        ConfigStore instalado (em `storage.config_store`)
+    """
+    store = ConfigStore(storage, **options)
+    store.load()
+
+    set_config = storage.set_config
+    delete_config = storage.delete_config
+    save_settings = storage.save_settings
+
+    def get_config_snapshot(key, default=None):
+        return store.current.get(key, default)
+
+    def get_settings_snapshot():
+        return store.current.settings()
+
+    # Publicar só o que foi gravado; exceções do Storage chegam ao chamador
+    def set_config_snapshot(key, value):
+        result = set_config(key, value)
+        if result is not False:
+            store.apply({key: value})
+        return result
+
+    def delete_config_snapshot(key):
+        deleted = delete_config(key)
+        store.apply({}, removed=(key,))
+        return deleted
+
+    def save_settings_snapshot(settings):
+        result = save_settings(settings)
+        if result is not False:
+            store.apply(dict(settings))
+        return result
+
+    storage.get_config = get_config_snapshot
+    storage.get_settings = get_settings_snapshot
+    storage.set_config = set_config_snapshot
+    storage.delete_config = delete_config_snapshot
+    storage.save_settings = save_settings_snapshot
+    storage.config_store = store
+    return store
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Recarga automática das configurações alteradas fora da aplicação.
+
+`configurar_impressora.py` grava `config/impressora_config.json` e outras
+ferramentas (ou outra instância) podem gravar na tabela `config`; até aqui a
+aplicação só via essas mudanças ao reiniciar. O ConfigWatcher verifica a
+cada `interval` segundos o mtime/tamanho dos arquivos JSON e a assinatura
+da tabela `config` (número de chaves e última `updated_at`) e, havendo
+mudança, recarrega o ConfigStore. A validação e a troca atômica do
+snapshot ficam com o ConfigStore; os assinantes (controle de vazão,
+polling) aplicam a nova configuração sem descartar a fila de impressão.
+
+É usado polling de mtime em vez de inotify: funciona igual no Windows e a
+verificação custa um `stat` por arquivo e uma consulta por intervalo.
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """mtime (ns) e tamanho do arquivo, ou None se ele não existe."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ConfigWatcher:
+    """
+    Recarrega o ConfigStore quando os arquivos ou a tabela `config` mudam.
+    """
+
+    def __init__(self, config_store, interval: float = 0.5):
+        """
+        Args:
+            config_store: ConfigStore instalado (core/config_snapshot.py)
+            interval: Intervalo (s) entre as verificações
+        """
+        self.config_store = config_store
+        self.interval = interval
+        self.reloads = 0
+
+        self._signatures: Dict[str, Any] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _table_signature(self) -> Optional[tuple]:
+        try:
+            row = self.config_store.storage.conn.execute(
+                "SELECT COUNT(*), MAX(updated_at) FROM config"
+            ).fetchone()
+            return tuple(row)
+        except Exception as e:
+            logger.debug(f"Erro ao verificar alterações na tabela config: {e}")
+            return None
+
+    def _current_signatures(self) -> Dict[str, Any]:
+        return {
+            'app': _file_signature(self.config_store.app_config_path),
+            'printer': _file_signature(self.config_store.printer_config_path),
+            'table': self._table_signature(),
+        }
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Inicia a verificação em segundo plano."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._signatures = self._current_signatures()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch_loop, name="ConfigWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Encerra a verificação."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def _watch_loop(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.check()
+
+    # ------------------------------------------------------------------
+    # Verificação
+    # ------------------------------------------------------------------
+
+    def check(self) -> bool:
+        """
+        Recarrega as configurações se alguma fonte mudou desde a última verificação.
+
+        Returns:
+            bool: True se houve recarga
+        """
+        # Assinaturas lidas antes da recarga: uma gravação durante a leitura é vista na próxima volta
+        signatures = self._current_signatures()
+        changed = [name for name, signature in signatures.items() if signature != self._signatures.get(name)]
+        if not changed:
+            return False
+        self._signatures = signatures
+        try:
+            previous = self.config_store.current
+            snapshot = self.config_store.reload(read_files=changed != ['table'])
+        except Exception as e:
+            logger.error(f"Erro ao recarregar configurações alteradas ({', '.join(changed)}): {e}")
+            return False
+        self.reloads += 1
+        # As gravações da própria aplicação também mudam a tabela, mas já estão no snapshot
+        if (snapshot.values, snapshot.app, snapshot.printer_file) != (previous.values, previous.app, previous.printer_file):
+            logger.info(f"Configurações recarregadas após alteração em: {', '.join(changed)}")
+        return True
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Criptografia com compressão para os dados gravados pelo Storage.
+
+O Storage criptografa `config.value`, `auth_tokens` e
+`orders_cache.order_data` linha a linha com Fernet: base64 sobre AES-CBC +
+HMAC, sem compressão, com um novo objeto de cifra a cada chamada. O
+StorageCipher comprime antes de criptografar (zstd quando o pacote
+`zstandard` está instalado, senão zlib) e usa AES-256-GCM com o objeto de
+cifra inicializado uma única vez, gravando bytes brutos em vez de base64.
+A chave AES é derivada por HKDF da chave de `encryption.key`, então não é
+preciso gerar nem guardar uma chave nova.
+
+Os valores antigos em Fernet continuam legíveis (o formato é identificado
+pelo prefixo) e são regravados no formato novo na próxima gravação. O
+formato novo não é legível pelo `_decrypt` original do Storage: todo ponto
+de entrada que abre o banco (aplicação, linhas de comando e scripts) chama
+`install_cipher()` logo após criar o Storage.
+
+Benchmark com 10 mil pedidos em cache:
+
+    python -m core.crypto --pedidos 10000
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import base64
+import sqlite3
+import logging
+import argparse
+import tempfile
+from typing import Any, Optional
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+try:
+    import zstandard
+except ImportError:  # Dependência opcional: sem ela, zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Prefixo do formato novo: tokens Fernet sempre começam com "gAAAAA" (versão 0x80 em base64)
+MAGIC = b'AP\x01'
+NONCE_SIZE = 12
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+# Abaixo disso a compressão não compensa o custo
+MIN_COMPRESS_SIZE = 128
+
+HKDF_INFO = b'acriprint-storage-aesgcm-v1'
+
+# Níveis padrão: a compressão domina o custo de gravação, e níveis mais altos
+# quase não reduzem pedidos de ~1 KB
+DEFAULT_LEVELS = {CODEC_ZLIB: 1, CODEC_ZSTD: 3}
+
+
+class StorageCipher:
+    """
+    AES-256-GCM com compressão, compatível com os valores Fernet já gravados.
+    """
+
+    def __init__(self, fernet_key: bytes, compression_level: Optional[int] = None, use_zstd: Optional[bool] = None):
+        """
+        Args:
+            fernet_key: Conteúdo de `encryption.key` (chave Fernet em base64)
+            compression_level: Nível de compressão (zlib 1-9; zstd 1-22); None usa o padrão do codec
+            use_zstd: Forçar (True) ou dispensar (False) o zstd; None usa se estiver instalado
+        """
+        fernet_key = fernet_key.strip()
+        self.fernet = Fernet(fernet_key)
+        aes_key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=HKDF_INFO).derive(
+            base64.urlsafe_b64decode(fernet_key))
+        self.aead = AESGCM(aes_key)
+
+        if use_zstd is None:
+            use_zstd = zstandard is not None
+        if use_zstd and zstandard is None:
+            logger.warning("zstandard não instalado, usando zlib")
+            use_zstd = False
+        self.codec = CODEC_ZSTD if use_zstd else CODEC_ZLIB
+        self.compression_level = compression_level if compression_level is not None else DEFAULT_LEVELS[self.codec]
+        self._zstd_compressor = zstandard.ZstdCompressor(level=self.compression_level) if use_zstd else None
+        self._zstd_decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+
+    @classmethod
+    def from_key_file(cls, key_path: str, **options) -> "StorageCipher":
+        """Cria o cifrador a partir do arquivo de chave do Storage."""
+        with open(key_path, 'rb') as key_file:
+            return cls(key_file.read(), **options)
+
+    # ------------------------------------------------------------------
+    # Bytes
+    # ------------------------------------------------------------------
+
+    def _compress(self, data: bytes):
+        if len(data) < MIN_COMPRESS_SIZE:
+            return CODEC_NONE, data
+        if self.codec == CODEC_ZSTD:
+            return CODEC_ZSTD, self._zstd_compressor.compress(data)
+        return CODEC_ZLIB, zlib.compress(data, self.compression_level)
+
+    def _decompress(self, codec: int, data: bytes) -> bytes:
+        if codec == CODEC_NONE:
+            return data
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(data)
+        if codec == CODEC_ZSTD:
+            if self._zstd_decompressor is None:
+                raise ValueError("Valor comprimido com zstd, mas o pacote zstandard não está instalado")
+            return self._zstd_decompressor.decompress(data)
+        raise ValueError(f"Codec de compressão desconhecido: {codec}")
+
+    def encrypt(self, data: bytes) -> bytes:
+        """Comprime e criptografa bytes no formato novo."""
+        codec, payload = self._compress(data)
+        header = MAGIC + bytes([codec])
+        nonce = os.urandom(NONCE_SIZE)
+        # O cabeçalho entra como dado associado: trocar o codec invalida a autenticação
+        return header + nonce + self.aead.encrypt(nonce, payload, header)
+
+    def decrypt(self, blob: bytes) -> bytes:
+        """Descriptografa bytes no formato novo ou em Fernet."""
+        if isinstance(blob, memoryview):
+            blob = blob.tobytes()
+        if isinstance(blob, str):
+            blob = blob.encode('utf-8')
+        if blob[:len(MAGIC)] != MAGIC:
+            return self.fernet.decrypt(blob)
+        header = blob[:len(MAGIC) + 1]
+        nonce = blob[len(header):len(header) + NONCE_SIZE]
+        payload = self.aead.decrypt(nonce, blob[len(header) + NONCE_SIZE:], header)
+        return self._decompress(header[-1], payload)
+
+    # ------------------------------------------------------------------
+    # Valores do Storage (mesma semântica de Storage._encrypt/_decrypt)
+    # ------------------------------------------------------------------
+
+    def encrypt_value(self, data: Any) -> Optional[bytes]:
+        """
+        Criptografa um valor como `Storage._encrypt`: não-strings viram JSON.
+
+        Returns:
+            bytes: Dados criptografados ou None se `data` for None
+        """
+        if data is None:
+            return None
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        return self.encrypt(data.encode('utf-8'))
+
+    def decrypt_value(self, encrypted_data: Optional[bytes]) -> Optional[Any]:
+        """
+        Descriptografa um valor como `Storage._decrypt`: JSON volta a ser objeto.
+
+        Returns:
+            Dados descriptografados ou None se `encrypted_data` for None
+        """
+        if encrypted_data is None:
+            return None
+        decrypted = self.decrypt(encrypted_data).decode('utf-8')
+        try:
+            return json.loads(decrypted)
+        except json.JSONDecodeError:
+            return decrypted
+
+
+def install_cipher(storage, **options) -> Optional[StorageCipher]:
+    """
+    Passa o Storage a gravar no formato comprimido (a leitura de Fernet continua).
+
+    Idempotente: chamar de novo no mesmo Storage devolve o cifrador já instalado.
+
+    Args:
+        storage: Instância de Storage (com `key_path`); no DataStorage, passar `.storage`
+        **options: Opções repassadas ao StorageCipher
+
+    Returns:
+        StorageCipher instalado ou None se a chave não está disponível
+    """
+    installed = getattr(storage, 'cipher', None)
+    if isinstance(installed, StorageCipher):
+        return installed
+    key_path = getattr(storage, 'key_path', None)
+    if not key_path or not os.path.exists(key_path):
+        logger.warning("Arquivo de chave do Storage não encontrado, criptografia padrão mantida")
+        return None
+    cipher = StorageCipher.from_key_file(key_path, **options)
+    storage.cipher = cipher
+    storage._encrypt = cipher.encrypt_value
+    storage._decrypt = cipher.decrypt_value
+    codec = 'zstd' if cipher.codec == CODEC_ZSTD else 'zlib'
+    logger.info(f"Criptografia do Storage: AES-GCM com compressão {codec}")
+    return cipher
+
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+def _sample_order(index: int, template: dict) -> str:
+    order = dict(template, id=22634343843 + index, numero=114152 + index)
+    return json.dumps(order)
+
+
+def run_benchmark(orders: int = 10000, template_path: Optional[str] = None) -> dict:
+    """
+    Compara Fernet com o StorageCipher gravando e lendo `orders` pedidos em um orders_cache temporário.
+
+    Returns:
+        Dict com CPU (s) de gravação/leitura e tamanho em disco de cada formato
+    """
+    template_path = template_path or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                  'pedido_114152.json')
+    with open(template_path, 'r', encoding='utf-8') as f:
+        template = json.load(f)
+    payloads = [_sample_order(i, template) for i in range(orders)]
+
+    key = Fernet.generate_key()
+    fernet = Fernet(key)
+    cipher = StorageCipher(key)
+    schemes = {
+        'fernet': (lambda text: fernet.encrypt(text.encode('utf-8')), lambda blob: json.loads(fernet.decrypt(blob))),
+        'cipher': (cipher.encrypt_value, cipher.decrypt_value),
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (encrypt, decrypt) in schemes.items():
+            path = os.path.join(tmp, f'{name}.db')
+            conn = sqlite3.connect(path)
+            conn.execute("CREATE TABLE orders_cache (id INTEGER PRIMARY KEY, order_data BLOB NOT NULL)")
+
+            started = time.process_time()
+            blobs = [encrypt(text) for text in payloads]
+            encrypt_cpu = time.process_time() - started
+
+            conn.executemany("INSERT INTO orders_cache (order_data) VALUES (?)", [(blob,) for blob in blobs])
+            conn.commit()
+            conn.execute("VACUUM")
+            rows = [row[0] for row in conn.execute("SELECT order_data FROM orders_cache")]
+            conn.close()
+
+            started = time.process_time()
+            for blob in rows:
+                decrypt(blob)
+            decrypt_cpu = time.process_time() - started
+
+            results[name] = {
+                'encrypt_cpu_s': round(encrypt_cpu, 3),
+                'decrypt_cpu_s': round(decrypt_cpu, 3),
+                'payload_bytes': sum(len(blob) for blob in blobs),
+                'db_bytes': os.path.getsize(path),
+            }
+    results['codec'] = 'zstd' if cipher.codec == CODEC_ZSTD else 'zlib'
+    return results
+
+
+def main(argv=None) -> int:
+    """Ponto de entrada da linha de comando do benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark de criptografia do cache de pedidos (Fernet x AES-GCM comprimido)")
+    parser.add_argument('--pedidos', type=int, default=10000, help="Número de pedidos gravados e lidos")
+    parser.add_argument('--modelo', default=None, help="JSON de pedido usado como modelo")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    results = run_benchmark(args.pedidos, args.modelo)
+    print(f"Compressão: {results['codec']}")
+    for name, label in (('fernet', 'Fernet'), ('cipher', 'AES-GCM+comp.')):
+        r = results[name]
+        print(f"{label:14s} cifrar={r['encrypt_cpu_s']:.3f}s decifrar={r['decrypt_cpu_s']:.3f}s "
+              f"dados={r['payload_bytes'] / 1024:.0f}KiB banco={r['db_bytes'] / 1024:.0f}KiB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Conexões SQLite por thread, em modo WAL, para o `app_data.db`.
+
+O Storage abre uma única conexão (`check_same_thread=False`) usada ao mesmo
+tempo pela thread do Qt, pelo polling, pela autenticação e pelas threads de
+fundo; no modo de journal padrão, qualquer escrita bloqueia as leituras até
+o commit. O ConnectionPool mantém uma conexão por thread com
+`journal_mode=WAL`, `synchronous=NORMAL`, `busy_timeout` e cache de
+statements preparados, e `install_pool()` troca `storage.conn` por um
+proxy que entrega a cada thread a sua conexão, sem alterar os métodos do
+Storage. Escritas de várias linhas usam `transaction()`/`executemany_batched()`.
+
+Benchmark de concorrência (inserções do polling x consultas de histórico):
+
+    python -m core.db_pool --segundos 5
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Statements preparados mantidos por conexão (o padrão do sqlite3 é 128)
+DEFAULT_CACHED_STATEMENTS = 256
+
+
+class ConnectionPool:
+    """
+    Uma conexão SQLite por thread, configurada para leituras concorrentes.
+    """
+
+    def __init__(self, db_path: str, row_factory=sqlite3.Row, busy_timeout_ms: int = 5000,
+                 cached_statements: int = DEFAULT_CACHED_STATEMENTS, synchronous: str = "NORMAL"):
+        """
+        Args:
+            db_path: Caminho do arquivo do banco
+            row_factory: row_factory aplicada às conexões (o Storage usa sqlite3.Row)
+            busy_timeout_ms: Espera máxima (ms) por um lock de escrita
+            cached_statements: Statements preparados mantidos por conexão
+            synchronous: Nível de PRAGMA synchronous (NORMAL é seguro em WAL)
+        """
+        self.db_path = db_path
+        self.row_factory = row_factory
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.synchronous = synchronous
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: Dict[int, tuple] = {}  # id da thread -> (thread, conexão)
+        self._closed = False
+
+        # O modo WAL é persistente no arquivo: basta ativá-lo uma vez
+        conn = self._open()
+        mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if str(mode).lower() != 'wal':
+            logger.warning(f"Não foi possível ativar o modo WAL (modo atual: {mode})")
+        self._local.conn = conn
+        self._register(conn)
+
+    def _open(self) -> sqlite3.Connection:
+        """Abre e configura uma conexão nova."""
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000.0,
+                               check_same_thread=False, cached_statements=self.cached_statements)
+        conn.row_factory = self.row_factory
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        return conn
+
+    def _register(self, conn: sqlite3.Connection) -> None:
+        """Registra a conexão da thread atual e fecha as de threads encerradas."""
+        current = threading.current_thread()
+        with self._lock:
+            self._connections[current.ident] = (current, conn)
+            dead = [ident for ident, (thread, _) in self._connections.items() if not thread.is_alive()]
+            for ident in dead:
+                _, stale = self._connections.pop(ident)
+                try:
+                    stale.close()
+                except Exception:
+                    pass
+
+    def connection(self) -> sqlite3.Connection:
+        """Conexão da thread atual (aberta na primeira chamada)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Pool de conexões encerrado")
+            conn = self._open()
+            self._local.conn = conn
+            self._register(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self, immediate: bool = True):
+        """
+        Transação explícita na conexão da thread atual.
+
+        Args:
+            immediate: Reservar o lock de escrita no início (evita deadlock de upgrade)
+
+        Yields:
+            sqlite3.Connection da thread
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            # Já dentro de uma transação (implícita ou aninhada): apenas participar dela
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+    def executemany_batched(self, sql: str, rows: Iterable[Sequence[Any]], batch_size: int = 500) -> int:
+        """
+        Executa `sql` para várias linhas, em transações de até `batch_size` linhas.
+
+        Returns:
+            int: Número de linhas enviadas
+        """
+        total = 0
+        batch: List[Sequence[Any]] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                with self.transaction() as conn:
+                    conn.executemany(sql, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            with self.transaction() as conn:
+                conn.executemany(sql, batch)
+            total += len(batch)
+        return total
+
+    def checkpoint(self, mode: str = "PASSIVE") -> None:
+        """Copia o WAL para o banco (o SQLite já faz isso a cada ~1000 páginas)."""
+        try:
+            self.connection().execute(f"PRAGMA wal_checkpoint({mode})")
+        except Exception as e:
+            logger.error(f"Erro no checkpoint do WAL: {e}")
+
+    def close_all(self) -> None:
+        """Fecha todas as conexões do pool, com checkpoint final do WAL."""
+        self.checkpoint("TRUNCATE")
+        with self._lock:
+            self._closed = True
+            for _, conn in self._connections.values():
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.error(f"Erro ao fechar conexão do pool: {e}")
+            self._connections.clear()
+        self._local = threading.local()
+
+    def stats(self) -> Dict[str, Any]:
+        """Conexões abertas e modo de journal."""
+        with self._lock:
+            open_connections = len(self._connections)
+        try:
+            mode = self.connection().execute("PRAGMA journal_mode").fetchone()[0]
+        except Exception:
+            mode = None
+        return {'connections': open_connections, 'journal_mode': mode}
+
+
+class PooledConnection:
+    """
+    Substituto de `sqlite3.Connection` que repassa cada chamada à conexão da thread atual.
+    """
+
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+
+    def __getattr__(self, name):
+        if name == '_pool':
+            raise AttributeError(name)
+        return getattr(self._pool.connection(), name)
+
+    def __setattr__(self, name, value):
+        if name == '_pool':
+            object.__setattr__(self, name, value)
+        elif name == 'row_factory':
+            # Vale para as conexões já abertas e para as próximas
+            self._pool.row_factory = value
+            self._pool.connection().row_factory = value
+        else:
+            setattr(self._pool.connection(), name, value)
+
+    def __enter__(self):
+        return self._pool.connection().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._pool.connection().__exit__(exc_type, exc_value, traceback)
+
+    def close(self) -> None:
+        self._pool.close_all()
+
+
+def install_pool(storage, **pool_options) -> Optional[ConnectionPool]:
+    """
+    Passa o Storage a usar uma conexão WAL por thread.
+
+    Args:
+        storage: Instância de Storage (com `conn`)
+        **pool_options: Opções repassadas ao ConnectionPool
+
+    Returns:
+        ConnectionPool instalado, ou None se o banco é em memória ou já usa o pool
+    """
+    conn = storage.conn
+    if isinstance(conn, PooledConnection):
+        return conn._pool
+    path = None
+    for row in conn.execute("PRAGMA database_list").fetchall():
+        if row[1] == 'main':
+            path = row[2]
+    if not path:
+        logger.info("Banco em memória: pool de conexões não instalado")
+        return None
+
+    pool_options.setdefault('row_factory', conn.row_factory)
+    conn.commit()
+    pool = ConnectionPool(path, **pool_options)
+    storage.conn = PooledConnection(pool)
+    conn.close()
+    logger.info(f"Pool de conexões SQLite instalado (WAL, synchronous={pool.synchronous})")
+    return pool
+
+
+# ----------------------------------------------------------------------
+# Benchmark de concorrência
+# ----------------------------------------------------------------------
+
+BENCHMARK_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS orders_cache (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, order_id TEXT NOT NULL UNIQUE,
+        order_number TEXT NOT NULL UNIQUE, order_data BLOB NOT NULL, created_at TEXT NOT NULL,
+        expires_at TEXT NOT NULL, last_accessed TEXT NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS print_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, order_id TEXT NOT NULL, items TEXT NOT NULL,
+        printer TEXT NOT NULL, status TEXT NOT NULL, printed_at TEXT NOT NULL, user TEXT, tipo TEXT)""",
+)
+
+
+def _prepare_benchmark_db(path: str, history_rows: int) -> None:
+    """Cria o banco do benchmark com um histórico de impressão pré-populado."""
+    conn = sqlite3.connect(path)
+    for sql in BENCHMARK_SCHEMA:
+        conn.execute(sql)
+    now = datetime.now().isoformat()
+    conn.executemany(
+        "INSERT INTO print_history (order_id, items, printer, status, printed_at, user, tipo) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(str(100000 + i), '[]', 'POS58', 'success', now, 'admin', 'impressao') for i in range(history_rows)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def _run_scenario(conn_for_thread, seconds: float, payload: bytes, write_interval: float) -> Dict[str, Any]:
+    """Um escritor (cache do polling, commit por pedido) e um leitor (histórico da interface) ao mesmo tempo."""
+    stop = threading.Event()
+    read_latencies: List[float] = []
+    writes = [0]
+
+    def writer():
+        conn = conn_for_thread()
+        n = 0
+        while not stop.is_set():
+            n += 1
+            now = datetime.now().isoformat()
+            conn.execute(
+                "INSERT OR REPLACE INTO orders_cache (order_id, order_number, order_data, created_at, expires_at, last_accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (f"w{threading.get_ident()}-{n}", f"n{threading.get_ident()}-{n}", payload, now, now, now)
+            )
+            conn.commit()
+            writes[0] += 1
+            # Ritmo de um ciclo de polling gravando pedidos no cache, não um laço saturando a CPU
+            stop.wait(write_interval)
+
+    def reader():
+        conn = conn_for_thread()
+        while not stop.is_set():
+            started = time.perf_counter()
+            conn.execute(
+                "SELECT order_id, status, printed_at FROM print_history ORDER BY id DESC LIMIT 100"
+            ).fetchall()
+            conn.execute("SELECT COUNT(*) FROM orders_cache").fetchone()
+            read_latencies.append((time.perf_counter() - started) * 1000)
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    read_latencies.sort()
+    return {
+        'writes_per_s': round(writes[0] / seconds, 1),
+        'reads_per_s': round(len(read_latencies) / seconds, 1),
+        'read_p50_ms': round(statistics.median(read_latencies), 2) if read_latencies else None,
+        'read_p99_ms': round(read_latencies[int(len(read_latencies) * 0.99) - 1], 2) if read_latencies else None,
+        'read_max_ms': round(read_latencies[-1], 2) if read_latencies else None,
+    }
+
+
+def run_benchmark(seconds: float = 5, history_rows: int = 20000, write_interval: float = 0.01) -> Dict[str, Dict[str, Any]]:
+    """
+    Compara a conexão única compartilhada (journal padrão) com o pool WAL.
+
+    Args:
+        seconds: Duração de cada cenário
+        history_rows: Linhas pré-populadas em print_history
+        write_interval: Pausa (s) entre as gravações do escritor
+
+    Returns:
+        Dict com os resultados de 'shared' e 'pool'
+    """
+    payload = os.urandom(2048)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        shared_path = os.path.join(tmp, 'shared.db')
+        _prepare_benchmark_db(shared_path, history_rows)
+        shared = sqlite3.connect(shared_path, check_same_thread=False)
+        results['shared'] = _run_scenario(lambda: shared, seconds, payload, write_interval)
+        shared.close()
+
+        pool_path = os.path.join(tmp, 'pool.db')
+        _prepare_benchmark_db(pool_path, history_rows)
+        pool = ConnectionPool(pool_path)
+        results['pool'] = _run_scenario(pool.connection, seconds, payload, write_interval)
+        pool.close_all()
+    return results
+
+
+def main(argv=None) -> int:
+    """Ponto de entrada da linha de comando do benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark de concorrência do SQLite (conexão única x pool WAL)")
+    parser.add_argument('--segundos', type=float, default=5, help="Duração de cada cenário")
+    parser.add_argument('--historico', type=int, default=20000, help="Linhas pré-populadas em print_history")
+    parser.add_argument('--intervalo', type=float, default=0.01, help="Pausa (s) entre as gravações do escritor")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    results = run_benchmark(args.segundos, args.historico, args.intervalo)
+    for name, label in (('shared', 'Conexão única'), ('pool', 'Pool WAL')):
+        r = results[name]
+        print(f"{label:14s} escritas/s={r['writes_per_s']:8.1f} leituras/s={r['reads_per_s']:8.1f} "
+              f"leitura p50={r['read_p50_ms']}ms p99={r['read_p99_ms']}ms máx={r['read_max_ms']}ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Proteção contra impressão duplicada de pedidos.
+
+Um mesmo pedido pode chegar à impressora pela sobreposição do polling, pelo
+webhook, pelo backfill ou por uma reinicialização. A decisão "já impresso?"
+é tomada em memória (conjuntos com o número do pedido no Bling e o número
+do pedido na loja/marketplace), carregados na inicialização a partir da
+tabela `printed_orders`. A tabela tem chave primária no número do pedido e
+índice único parcial no número da loja, então duas gravações do mesmo
+pedido não coexistem nem se a memória falhar.
+
+Fluxo: `reserve()` antes de enviar à impressora, `confirm()` quando a
+impressão deu certo (gravado em lote por `flush()`), `release()` quando
+falhou. Reimpressões intencionais passam `force=True`.
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple, List
+
+logger = logging.getLogger(__name__)
+
+DEDUP_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS printed_orders (
+        order_number TEXT PRIMARY KEY,       -- numero do pedido no Bling
+        store_order_number TEXT NOT NULL,    -- numeroLoja ('' quando não há)
+        printed_at TEXT NOT NULL
+    )
+    """,
+    # Um pedido de marketplace reimportado no Bling recebe outro número, mas mantém o numeroLoja
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_printed_orders_store
+    ON printed_orders(store_order_number) WHERE store_order_number != ''
+    """,
+)
+
+
+def order_keys(order: Dict[str, Any]) -> Tuple[str, str]:
+    """Número do pedido no Bling (ou ID) e número do pedido na loja ('' se não houver)."""
+    number = order.get('numero')
+    if number in (None, ''):
+        number = order.get('id', '')
+    return str(number or ''), str(order.get('numeroLoja') or '')
+
+
+class PrintDedupGuard:
+    """
+    Decisão O(1) de "já impresso?" com persistência em `printed_orders`.
+    """
+
+    def __init__(self, storage):
+        """
+        Args:
+            storage: Instância de Storage/DataStorage (usa a conexão `conn`)
+        """
+        self.storage = storage
+        self._numbers = set()
+        self._store_numbers = set()
+        self._pending: List[Tuple[str, str, str]] = []
+        self._lock = threading.Lock()
+        self.blocked = 0
+
+    def load(self) -> int:
+        """
+        Cria a tabela se preciso e carrega os pedidos já impressos para a memória.
+
+        Na primeira execução a tabela é preenchida com os pedidos impressos com
+        sucesso registrados em `print_history`.
+
+        Returns:
+            int: Número de pedidos carregados
+        """
+        conn = self.storage.conn
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'printed_orders'"
+            ).fetchone()
+            with conn:
+                for sql in DEDUP_SCHEMA:
+                    conn.execute(sql)
+                if not exists:
+                    conn.execute("""
+                        INSERT OR IGNORE INTO printed_orders (order_number, store_order_number, printed_at)
+                        SELECT order_id, '', MIN(printed_at) FROM print_history
+                        WHERE status = 'success' GROUP BY order_id
+                    """)
+            rows = conn.execute("SELECT order_number, store_order_number FROM printed_orders").fetchall()
+        except Exception as e:
+            logger.error(f"Erro ao carregar pedidos já impressos: {e}")
+            return 0
+
+        with self._lock:
+            self._numbers = {row[0] for row in rows}
+            self._store_numbers = {row[1] for row in rows if row[1]}
+        logger.info(f"Proteção contra impressão duplicada carregada com {len(rows)} pedidos")
+        return len(rows)
+
+    def is_printed(self, order: Dict[str, Any]) -> bool:
+        """Indica se o pedido já foi impresso (ou está reservado para impressão)."""
+        number, store_number = order_keys(order)
+        with self._lock:
+            return number in self._numbers or (store_number != '' and store_number in self._store_numbers)
+
+    def reserve(self, order: Dict[str, Any], force: bool = False) -> bool:
+        """
+        Reserva o pedido para impressão se ele ainda não foi impresso.
+
+        Args:
+            order: Pedido a imprimir
+            force: Reimpressão intencional: reservar mesmo que já tenha sido impresso
+
+        Returns:
+            bool: True se o pedido pode ser impresso
+        """
+        number, store_number = order_keys(order)
+        if not number:
+            return True
+        with self._lock:
+            duplicate = number in self._numbers or (store_number != '' and store_number in self._store_numbers)
+            if duplicate and not force:
+                self.blocked += 1
+                return False
+            self._numbers.add(number)
+            if store_number:
+                self._store_numbers.add(store_number)
+        if duplicate:
+            logger.info(f"Reimpressão intencional do pedido {number} autorizada")
+        return True
+
+    def release(self, order: Dict[str, Any]) -> None:
+        """Desfaz a reserva de um pedido cuja impressão falhou (ele poderá ser impresso de novo)."""
+        number, store_number = order_keys(order)
+        with self._lock:
+            if any(pending[0] == number for pending in self._pending):
+                return
+            self._numbers.discard(number)
+            if store_number:
+                self._store_numbers.discard(store_number)
+        try:
+            row = self.storage.conn.execute(
+                "SELECT 1 FROM printed_orders WHERE order_number = ?", (number,)
+            ).fetchone()
+        except Exception as e:
+            logger.error(f"Erro ao verificar pedido {number} já impresso: {e}")
+            row = None
+        if row:
+            # Impresso antes (ex.: reimpressão forçada que falhou): continua protegido
+            with self._lock:
+                self._numbers.add(number)
+                if store_number:
+                    self._store_numbers.add(store_number)
+
+    def confirm(self, order: Dict[str, Any], printed_at: Optional[str] = None) -> None:
+        """Registra a impressão bem-sucedida; a gravação acontece no próximo `flush()`."""
+        number, store_number = order_keys(order)
+        if not number:
+            return
+        with self._lock:
+            self._numbers.add(number)
+            if store_number:
+                self._store_numbers.add(store_number)
+            self._pending.append((number, store_number, printed_at or datetime.now().isoformat()))
+
+    def flush(self) -> int:
+        """
+        Grava as impressões confirmadas em uma única transação.
+
+        Returns:
+            int: Número de pedidos gravados
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        conn = self.storage.conn
+        try:
+            with conn:
+                # O índice único do numeroLoja pode rejeitar a linha: o pedido já está protegido
+                conn.executemany(
+                    "INSERT OR IGNORE INTO printed_orders (order_number, store_order_number, printed_at) VALUES (?, ?, ?)",
+                    pending
+                )
+            return len(pending)
+        except Exception as e:
+            logger.error(f"Erro ao gravar pedidos impressos: {e}")
+            with self._lock:
+                self._pending[:0] = pending
+            return 0
+
+    def stats(self) -> Dict[str, int]:
+        """Pedidos protegidos, duplicatas bloqueadas e gravações pendentes."""
+        with self._lock:
+            return {'orders': len(self._numbers), 'blocked': self.blocked, 'pending': len(self._pending)}
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Exportação do histórico de impressão com os dados dos pedidos em cache.
+
+Gera CSV, JSON Lines ou Parquet de `print_history` filtrado por período e
+loja, acrescentando campos do pedido (numeroLoja, cliente, situação,
+total) lidos de `orders_cache`. A memória usada não depende do tamanho do
+histórico:
+
+- o histórico é lido em lotes por paginação de chave (printed_at, id), sem
+  manter uma transação de leitura aberta durante toda a exportação;
+- os pedidos de cada lote são descriptografados em threads enquanto o lote
+  anterior é gravado;
+- cada lote é gravado e descartado (no Parquet, um row group por lote).
+
+O arquivo é gravado como `<destino>.part` e renomeado no fim, então uma
+exportação cancelada ou com erro não deixa arquivo pela metade. `ExportJob`
+roda a exportação em uma thread para não travar a interface.
+
+Linha de comando:
+    python -m core.export fechamento.csv --de 2026-09-01 --ate 2026-09-30 --loja 203536978
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable, Iterator
+
+from core.print_stats import ensure_history_schema
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+# Coluna exportada -> tipo no Parquet
+EXPORT_COLUMNS = {
+    'impresso_em': 'string',
+    'pedido': 'string',
+    'numero_loja': 'string',
+    'loja': 'string',
+    'cliente': 'string',
+    'situacao': 'string',
+    'total': 'float64',
+    'itens': 'string',
+    'quantidade': 'int64',
+    'impressora': 'string',
+    'status': 'string',
+    'tipo': 'string',
+    'usuario': 'string',
+}
+
+
+def detect_format(path: str) -> str:
+    """Formato de exportação pela extensão do arquivo (csv, jsonl/ndjson ou parquet)."""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension in FORMATS:
+        return extension
+    raise ValueError(f"Formato de exportação não reconhecido pela extensão: {path}")
+
+
+def _summarize_items(items_json: Optional[str]) -> tuple:
+    """Resumo 'SKU x quantidade' dos itens gravados no histórico e a quantidade total."""
+    try:
+        items = json.loads(items_json) if items_json else []
+    except (TypeError, ValueError):
+        return '', 0
+    parts, quantity = [], 0
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            amount = int(float(item.get('quantidade') or 0))
+        except (TypeError, ValueError):
+            amount = 0
+        quantity += amount
+        parts.append(f"{item.get('codigo') or item.get('descricao') or '?'} x{amount}")
+    return '; '.join(parts), quantity
+
+
+def _export_row(history: tuple, order: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Monta a linha exportada a partir da linha do histórico e do pedido em cache (ou None)."""
+    _, order_number, items_json, printer, status, printed_at, user, tipo, store_id = history
+    order = order if isinstance(order, dict) else {}
+    customer = order.get('contato') or order.get('cliente') or {}
+    situation = order.get('situacao') or {}
+    items, quantity = _summarize_items(items_json)
+    try:
+        total = float(order['total']) if order.get('total') is not None else None
+    except (TypeError, ValueError):
+        total = None
+    return {
+        'impresso_em': printed_at,
+        'pedido': order_number,
+        'numero_loja': order.get('numeroLoja') or '',
+        'loja': str(store_id or (order.get('loja') or {}).get('id') or ''),
+        'cliente': customer.get('nome', '') if isinstance(customer, dict) else '',
+        'situacao': str(situation.get('id', situation.get('valor', '')) if isinstance(situation, dict) else situation),
+        'total': total,
+        'itens': items,
+        'quantidade': quantity,
+        'impressora': printer or '',
+        'status': status or '',
+        'tipo': tipo or 'impressao',
+        'usuario': user or '',
+    }
+
+
+# ----------------------------------------------------------------------
+# Gravadores
+# ----------------------------------------------------------------------
+
+class _CsvWriter:
+    """CSV com ';' e BOM UTF-8, como o Excel em português espera."""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=list(EXPORT_COLUMNS), delimiter=';')
+        self._writer.writeheader()
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _JsonLinesWriter:
+    """Um objeto JSON por linha."""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._file.writelines(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ParquetWriter:
+    """Parquet com um row group por lote (requer pyarrow)."""
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Exportação em Parquet requer o pacote pyarrow (pip install pyarrow)")
+        self._pa = pyarrow
+        self._schema = pyarrow.schema([(name, getattr(pyarrow, kind)()) for name, kind in EXPORT_COLUMNS.items()])
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema, compression='zstd')
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+_WRITERS = {'csv': _CsvWriter, 'jsonl': _JsonLinesWriter, 'parquet': _ParquetWriter}
+
+
+# ----------------------------------------------------------------------
+# Leitura
+# ----------------------------------------------------------------------
+
+class HistoryExporter:
+    """
+    Lê o histórico em lotes e junta os pedidos em cache descriptografados em paralelo.
+    """
+
+    def __init__(self, storage, chunk_size: int = 1000, workers: int = None):
+        """
+        Args:
+            storage: Instância de Storage (com `conn` e `_decrypt`)
+            chunk_size: Linhas do histórico por lote
+            workers: Threads de descriptografia (padrão: núcleos disponíveis, até 4)
+        """
+        self.storage = storage
+        self.chunk_size = chunk_size
+        self.workers = workers or min(4, os.cpu_count() or 1)
+
+    def _history_chunks(self, since: Optional[str], until: Optional[str],
+                        store_id: Optional[str], with_orders: bool) -> Iterator[List[tuple]]:
+        """Lotes de (linha do histórico, blob do pedido em cache ou None), em ordem de printed_at."""
+        # Bancos antigos não têm user, tipo e store_id em print_history
+        ensure_history_schema(self.storage.conn)
+        conditions, params = [], []
+        if since:
+            conditions.append("h.printed_at >= ?")
+            params.append(since)
+        if until:
+            # Data final inclusiva: até o início do dia seguinte
+            end = (datetime.strptime(until[:10], "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+            conditions.append("h.printed_at < ?")
+            params.append(end)
+        if store_id is not None:
+            conditions.append("h.store_id = ?")
+            params.append(str(store_id))
+        order_column = "c.order_data" if with_orders else "NULL"
+        join = "LEFT JOIN orders_cache c ON c.order_number = h.order_id" if with_orders else ""
+        base_where = ' AND '.join(conditions) or '1'
+
+        last_key = None
+        while True:
+            where = base_where
+            page_params = list(params)
+            if last_key is not None:
+                where += " AND (h.printed_at, h.id) > (?, ?)"
+                page_params.extend(last_key)
+            rows = self.storage.conn.execute(
+                f"SELECT h.id, h.order_id, h.items, h.printer, h.status, h.printed_at, h.user, h.tipo, "
+                f"h.store_id, {order_column} FROM print_history h {join} "
+                f"WHERE {where} ORDER BY h.printed_at, h.id LIMIT ?",
+                (*page_params, self.chunk_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield [(tuple(row[:9]), row[9]) for row in rows]
+            if len(rows) < self.chunk_size:
+                return
+            last_key = (rows[-1][5], rows[-1][0])
+
+    def _decrypt_blobs(self, blobs: List[Optional[bytes]]) -> List[Optional[Any]]:
+        results = []
+        for blob in blobs:
+            if blob is None:
+                results.append(None)
+                continue
+            try:
+                value = self.storage._decrypt(blob)
+                results.append(json.loads(value) if isinstance(value, str) else value)
+            except Exception as e:
+                logger.debug(f"Pedido em cache ilegível ignorado na exportação: {e}")
+                results.append(None)
+        return results
+
+    def iter_rows(self, since: Optional[str] = None, until: Optional[str] = None,
+                  store_id: Optional[str] = None, with_orders: bool = True,
+                  cancel_event: Optional[threading.Event] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Lotes de linhas exportadas; o lote seguinte é descriptografado enquanto o atual é consumido.
+
+        Args:
+            since: Data inicial (AAAA-MM-DD, inclusiva)
+            until: Data final (AAAA-MM-DD, inclusiva)
+            store_id: Filtrar por loja
+            with_orders: Juntar os campos dos pedidos em cache
+            cancel_event: Interrompe a leitura quando sinalizado
+        """
+        step = max(1, self.chunk_size // self.workers)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ExportDecrypt") as executor:
+            def submit(chunk):
+                blobs = [blob for _, blob in chunk]
+                return chunk, [executor.submit(self._decrypt_blobs, blobs[i:i + step])
+                               for i in range(0, len(blobs), step)]
+
+            pending = None
+            for chunk in self._history_chunks(since, until, store_id, with_orders):
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                current, pending = pending, submit(chunk)
+                if current is not None:
+                    yield self._assemble(*current)
+            if pending is not None and not (cancel_event is not None and cancel_event.is_set()):
+                yield self._assemble(*pending)
+
+    @staticmethod
+    def _assemble(chunk: List[tuple], futures: list) -> List[Dict[str, Any]]:
+        orders = [order for future in futures for order in future.result()]
+        return [_export_row(history, order) for (history, _), order in zip(chunk, orders)]
+
+    def export(self, path: str, fmt: Optional[str] = None, since: Optional[str] = None,
+               until: Optional[str] = None, store_id: Optional[str] = None, with_orders: bool = True,
+               progress: Optional[Callable[[int], None]] = None,
+               cancel_event: Optional[threading.Event] = None) -> int:
+        """
+        Exporta o histórico para um arquivo.
+
+        Args:
+            path: Arquivo de destino
+            fmt: 'csv', 'jsonl' ou 'parquet' (padrão: pela extensão de `path`)
+            since: Data inicial (AAAA-MM-DD, inclusiva)
+            until: Data final (AAAA-MM-DD, inclusiva)
+            store_id: Filtrar por loja
+            with_orders: Juntar os campos dos pedidos em cache
+            progress: Chamado com o total de linhas gravadas após cada lote
+            cancel_event: Cancela a exportação quando sinalizado
+
+        Returns:
+            int: Linhas exportadas (0 se cancelada)
+        """
+        fmt = fmt or detect_format(path)
+        if fmt not in _WRITERS:
+            raise ValueError(f"Formato de exportação inválido: {fmt}")
+        part_path = f"{path}.part"
+        writer = _WRITERS[fmt](part_path)
+        written = 0
+        completed = False
+        try:
+            for rows in self.iter_rows(since, until, store_id, with_orders, cancel_event):
+                writer.write(rows)
+                written += len(rows)
+                if progress:
+                    progress(written)
+            completed = not (cancel_event is not None and cancel_event.is_set())
+        finally:
+            writer.close()
+            if completed:
+                os.replace(part_path, path)
+            else:
+                try:
+                    os.remove(part_path)
+                except OSError:
+                    pass
+        if not completed:
+            logger.info(f"Exportação para {path} cancelada")
+            return 0
+        logger.info(f"{written} registros do histórico exportados para {path}")
+        return written
+
+
+class ExportJob:
+    """
+    Exportação em uma thread de fundo, com progresso e cancelamento.
+    """
+
+    def __init__(self, storage, path: str, on_progress: Optional[Callable[[int], None]] = None,
+                 on_done: Optional[Callable[[bool, int, str], None]] = None, **options):
+        """
+        Args:
+            storage: Instância de Storage
+            path: Arquivo de destino
+            on_progress: Chamado (na thread da exportação) com as linhas gravadas
+            on_done: Chamado (na thread da exportação) com (sucesso, linhas, mensagem)
+            **options: fmt, since, until, store_id, with_orders, chunk_size, workers
+        """
+        exporter_options = {key: options.pop(key) for key in ('chunk_size', 'workers') if key in options}
+        self.exporter = HistoryExporter(storage, **exporter_options)
+        self.path = path
+        self.options = options
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.rows = 0
+        self._cancel_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Inicia a exportação."""
+        self._thread = threading.Thread(target=self._run, name="HistoryExport", daemon=True)
+        self._thread.start()
+
+    def cancel(self) -> None:
+        """Cancela a exportação (o arquivo parcial é removido)."""
+        self._cancel_event.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda o fim da exportação; retorna True se ela terminou."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return True
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        try:
+            self.rows = self.exporter.export(self.path, progress=self.on_progress,
+                                             cancel_event=self._cancel_event, **self.options)
+            if self._cancel_event.is_set():
+                success, message = False, "Exportação cancelada"
+            else:
+                success, message = True, f"{self.rows} registros exportados para {self.path}"
+        except Exception as e:
+            logger.error(f"Erro ao exportar histórico para {self.path}: {e}")
+            success, message = False, str(e)
+        if self.on_done:
+            self.on_done(success, self.rows, message)
+
+
+def main(argv=None) -> int:
+    """Ponto de entrada da linha de comando."""
+    parser = argparse.ArgumentParser(description="Exporta o histórico de impressão com os dados dos pedidos")
+    parser.add_argument('destino', help="Arquivo de saída (.csv, .jsonl ou .parquet)")
+    parser.add_argument('--formato', choices=FORMATS, default=None, help="Formato (padrão: pela extensão)")
+    parser.add_argument('--de', dest='since', default=None, help="Data inicial AAAA-MM-DD")
+    parser.add_argument('--ate', dest='until', default=None, help="Data final AAAA-MM-DD (inclusiva)")
+    parser.add_argument('--loja', dest='store_id', default=None, help="ID da loja no Bling")
+    parser.add_argument('--sem-pedidos', action='store_true', help="Não juntar os dados dos pedidos em cache")
+    parser.add_argument('--lote', type=int, default=1000, help="Linhas do histórico por lote")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    from data.storage import Storage
+    from core.crypto import install_cipher
+
+    storage = Storage()
+    # Pedidos gravados no formato comprimido precisam do cifrador novo
+    install_cipher(storage)
+    exporter = HistoryExporter(storage, chunk_size=args.lote)
+    exporter.export(args.destino, args.formato, args.since, args.until, args.store_id,
+                    with_orders=not args.sem_pedidos,
+                    progress=lambda rows: print(f"\r{rows} registros", end='', file=sys.stderr))
+    print(file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Cache LRU em memória na frente do `orders_cache` do Storage.
+
+`Storage.get_cached_order()` lê o BLOB do SQLite, descriptografa, faz o
+parse do JSON e ainda grava `last_accessed` a cada consulta, transformando
+leituras em escritas. O OrderCache guarda os pedidos já decodificados em um
+LRU limitado; as atualizações de `last_accessed` ficam pendentes em memória
+e são gravadas em lote por uma thread de fundo (write-behind). As gravações
+(`cache_order`) continuam indo direto ao Storage e atualizam o LRU.
+
+Os demais atributos são delegados ao Storage, então o OrderCache pode ser
+passado no lugar dele (como o DataStorage faz com o Storage).
+`install_order_cache` substitui `get_cached_order`, `cache_order` e
+`clear_cached_order` na própria instância do Storage, de modo que a
+interface, os filtros, o BlingClient e a reimpressão também leiam pelo LRU.
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _copy_order(value: Any) -> Any:
+    """Cópia de um pedido decodificado (só dicts, listas e escalares do JSON; ~3x mais rápida que deepcopy)."""
+    if isinstance(value, dict):
+        return {key: _copy_order(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_order(item) for item in value]
+    return value
+
+
+class OrderCache:
+    """
+    LRU de pedidos decodificados com gravação adiada de `last_accessed`.
+    """
+
+    def __init__(self, storage, max_entries: int = 500, flush_interval: float = 30):
+        """
+        Args:
+            storage: Instância de Storage (com `conn`, `_decrypt` e `cache_order`)
+            max_entries: Número máximo de pedidos mantidos em memória
+            flush_interval: Intervalo (s) entre as gravações de `last_accessed`
+        """
+        self.storage = storage
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+
+        # Gravação e remoção originais do Storage (antes de install_order_cache substituí-las)
+        self._storage_cache_order = storage.cache_order
+        self._storage_clear_cached_order = storage.clear_cached_order
+
+        # chave (ID do pedido) -> (pedido, expires_at ou None)
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], Optional[datetime]]]" = OrderedDict()
+        self._numbers: Dict[str, str] = {}  # número do pedido -> ID
+        self._pending_access: Dict[str, str] = {}  # ID -> último acesso (ISO) ainda não gravado
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.flushed = 0
+
+        self._stop_event = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def __getattr__(self, name):
+        """Delega ao Storage os atributos que o cache não implementa."""
+        if name == 'storage':
+            raise AttributeError(name)
+        return getattr(self.storage, name)
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Inicia a thread de gravação adiada."""
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        self._stop_event.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name="OrderCacheFlusher", daemon=True)
+        self._flusher.start()
+
+    def stop(self) -> None:
+        """Encerra a thread e grava os acessos pendentes."""
+        self._stop_event.set()
+        if self._flusher is not None:
+            self._flusher.join(5)
+            self._flusher = None
+        self.flush()
+
+    def _flush_loop(self) -> None:
+        """Grava os acessos pendentes a cada `flush_interval` segundos."""
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    # ------------------------------------------------------------------
+    # LRU
+    # ------------------------------------------------------------------
+
+    def _key(self, identifier, use_number: bool) -> Optional[str]:
+        """ID do pedido a partir de um ID ou número."""
+        identifier = str(identifier)
+        return self._numbers.get(identifier) if use_number else identifier
+
+    def _store(self, order: Dict[str, Any], expires_at: Optional[datetime]) -> None:
+        """Insere (ou move para o fim) um pedido no LRU; chamado com o lock."""
+        key = str(order.get('id', ''))
+        if not key:
+            return
+        self._entries[key] = (order, expires_at)
+        self._entries.move_to_end(key)
+        if order.get('numero') is not None:
+            self._numbers[str(order['numero'])] = key
+        while len(self._entries) > self.max_entries:
+            old_key, (old_order, _) = self._entries.popitem(last=False)
+            self._numbers.pop(str(old_order.get('numero')), None)
+
+    def _drop(self, key: str) -> None:
+        """Remove um pedido do LRU; chamado com o lock."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._numbers.pop(str(entry[0].get('numero')), None)
+
+    def peek(self, identifier, use_number: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Retorna uma cópia do pedido se ele estiver no LRU (sem consultar o banco).
+
+        Args:
+            identifier: ID ou número do pedido
+            use_number: Se True, `identifier` é o número do pedido
+        """
+        if not identifier:
+            return None
+        now = datetime.now()
+        with self._lock:
+            key = self._key(identifier, use_number)
+            entry = self._entries.get(key) if key else None
+            if entry is None:
+                return None
+            order, expires_at = entry
+            if expires_at is not None and expires_at < now:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self._pending_access[key] = now.isoformat()
+            self.hits += 1
+        # Cópia: quem imprime normaliza os itens no próprio dicionário
+        return _copy_order(order)
+
+    def remember(self, order: Dict[str, Any], expires_at: Optional[datetime] = None) -> None:
+        """Guarda no LRU um pedido já decodificado por outro caminho (ex.: reimpressão)."""
+        if not isinstance(order, dict):
+            return
+        with self._lock:
+            self._store(_copy_order(order), expires_at)
+
+    # ------------------------------------------------------------------
+    # Interface compatível com o Storage
+    # ------------------------------------------------------------------
+
+    def get_cached_order(self, order_identifier, use_number: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Recupera um pedido pelo ID ou número, do LRU ou do banco.
+
+        Args:
+            order_identifier: ID ou número do pedido
+            use_number: Se True, busca por número, senão busca por ID
+
+        Returns:
+            Dict: Dados do pedido ou None se não encontrado/expirado
+        """
+        order = self.peek(order_identifier, use_number)
+        if order is not None:
+            return order
+        if not order_identifier:
+            return None
+
+        with self._lock:
+            self.misses += 1
+        field = "order_number" if use_number else "order_id"
+        try:
+            row = self.storage.conn.execute(
+                f"SELECT order_data, expires_at FROM orders_cache WHERE {field} = ?",
+                (str(order_identifier),)
+            ).fetchone()
+            if not row:
+                return None
+            expires_at = datetime.fromisoformat(row[1])
+            if expires_at < datetime.now():
+                # A remoção fica com a manutenção do cache
+                return None
+            decrypted = self.storage._decrypt(row[0])
+            order = json.loads(decrypted) if isinstance(decrypted, str) else decrypted
+        except Exception as e:
+            logger.error(f"Erro ao recuperar pedido do cache: {e}")
+            return None
+
+        if isinstance(order, dict):
+            with self._lock:
+                self._store(order, expires_at)
+                self._pending_access[str(order.get('id', ''))] = datetime.now().isoformat()
+            return _copy_order(order)
+        return order
+
+    def cache_order(self, order_data: Dict[str, Any], expiration_days: int = 60) -> bool:
+        """
+        Grava o pedido no Storage e atualiza o LRU.
+
+        Args:
+            order_data: Dados do pedido
+            expiration_days: Número de dias para expiração do cache
+
+        Returns:
+            bool: True se o pedido foi armazenado com sucesso
+        """
+        stored = self._storage_cache_order(order_data, expiration_days)
+        if stored and isinstance(order_data, dict):
+            expires_at = datetime.now() + timedelta(days=expiration_days)
+            with self._lock:
+                self._store(_copy_order(order_data), expires_at)
+                # O Storage acabou de gravar last_accessed
+                self._pending_access.pop(str(order_data.get('id', '')), None)
+        return stored
+
+    def clear_cached_order(self, order_id: str = None, number: str = None) -> bool:
+        """Remove um pedido do LRU e do Storage."""
+        with self._lock:
+            for key in (self._key(order_id, False) if order_id else None,
+                        self._key(number, True) if number else None):
+                if key:
+                    self._drop(key)
+                    self._pending_access.pop(key, None)
+        return self._storage_clear_cached_order(order_id=order_id, number=number)
+
+    # ------------------------------------------------------------------
+    # Write-behind e estatísticas
+    # ------------------------------------------------------------------
+
+    def flush(self) -> int:
+        """
+        Grava em uma única transação os `last_accessed` pendentes.
+
+        Returns:
+            int: Número de pedidos atualizados
+        """
+        with self._lock:
+            pending, self._pending_access = self._pending_access, {}
+        if not pending:
+            return 0
+        try:
+            self.storage.conn.executemany(
+                "UPDATE orders_cache SET last_accessed = ? WHERE order_id = ?",
+                [(accessed, order_id) for order_id, accessed in pending.items()]
+            )
+            self.storage.conn.commit()
+            self.flushed += len(pending)
+            logger.debug(f"last_accessed gravado para {len(pending)} pedidos em cache")
+            return len(pending)
+        except Exception as e:
+            logger.error(f"Erro ao gravar acessos ao cache de pedidos: {e}")
+            with self._lock:
+                # Devolver os pendentes sem sobrescrever acessos mais recentes
+                for order_id, accessed in pending.items():
+                    self._pending_access.setdefault(order_id, accessed)
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamanho do LRU, acertos, falhas e taxa de acerto."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'pending_access': len(self._pending_access),
+                'flushed': self.flushed,
+            }
+
+    def log_stats(self) -> None:
+        """Registra as estatísticas do cache no log."""
+        stats = self.stats()
+        logger.info(f"Cache de pedidos em memória: {stats['entries']}/{stats['max_entries']} pedidos, "
+                    f"{stats['hits']} acertos, {stats['misses']} falhas (taxa {stats['hit_rate']:.0%})")
+
+
+def install_order_cache(storage, **options) -> OrderCache:
+    """
+    Cria o LRU e passa as leituras e gravações de pedidos do Storage por ele.
+
+    Deve ser chamado depois de `install_search_index`, para que as gravações
+    continuem indexadas.
+
+    Args:
+        storage: Instância de Storage
+        **options: Opções repassadas ao OrderCache
+
+    Returns:
+        OrderCache instalado (em `storage.order_cache`)
+    """
+    cache = OrderCache(storage, **options)
+    storage.get_cached_order = cache.get_cached_order
+    storage.cache_order = cache.cache_order
+    storage.clear_cached_order = cache.clear_cached_order
+    storage.order_cache = cache
+    logger.info(f"Cache de pedidos em memória instalado ({cache.max_entries} pedidos)")
+    return cache
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Projeção dos pedidos do Bling nos campos usados pela impressão e pelos filtros.
+
+O detalhe de um pedido na API v3 traz o contato duas vezes (`contato` e
+`cliente`), uma cópia `_original` de cada item com `produto` e `comissao`
+aninhados e vários campos que nenhum layout lê. Tudo isso era serializado,
+criptografado e gravado em `orders_cache.order_data` e mantido na fila de
+impressão. A projeção reduz o pedido ao conjunto de campos derivado do
+layout ativo (padrão ou personalizado) e dos filtros antes do cache e da
+fila; o pedido completo continua disponível sob demanda
+(`OrderSweeper.fetch_order_detail(..., full=True)`) ou desativando a
+projeção pela configuração `keep_full_order_payload`.
+"""
+
+import logging
+from typing import Dict, Any, Optional, Iterable, Set
+
+logger = logging.getLogger(__name__)
+
+# Campos sempre mantidos: identificação, datas (ordenação do backfill e
+# reimpressão) e os lidos pelos filtros e pela validação do layout
+BASE_ORDER_FIELDS = frozenset({
+    'id', 'numero', 'numeroLoja', 'data', 'dataSaida', 'dataPrevista',
+    'situacao', 'loja', 'lojaId', 'origem', 'itens',
+})
+
+# Campos lidos pelo layout padrão
+DEFAULT_LAYOUT_FIELDS = frozenset({
+    'cliente', 'total', 'totalProdutos', 'observacoes', 'observacao',
+})
+
+# Campos lidos por cada tipo de elemento do layout personalizado
+LAYOUT_ELEMENT_FIELDS = {
+    'order_number': {'numero'},
+    'qrcode': {'numero'},
+    'store_info': {'loja'},
+    'customer': {'cliente'},
+    'customer_info': {'cliente'},
+    'items_list': {'itens'},
+    'date': {'data'},
+}
+
+# Campos lidos pelos placeholders dos elementos de texto
+PLACEHOLDER_FIELDS = {
+    '{pedido}': 'numero',
+    '{data}': 'data',
+    '{cliente}': 'cliente',
+    '{loja}': 'loja',
+    '{loja_id}': 'loja',
+}
+
+# Campos mantidos em cada item e no produto de cada item
+ITEM_FIELDS = frozenset({
+    'id', 'codigo', 'sku', 'descricao', 'quantidade', 'unidade',
+    'valorUnidade', 'valor', 'preco', 'preco_unitario', 'observacao',
+})
+PRODUCT_FIELDS = frozenset({'id', 'codigo', 'sku', 'nome'})
+
+# Campos mantidos do cliente (layouts leem o nome; a impressão legada, o telefone)
+CUSTOMER_FIELDS = frozenset({'id', 'nome', 'telefone', 'celular'})
+
+
+def layout_fields(custom_layout: Optional[Dict[str, Any]] = None) -> Set[str]:
+    """
+    Campos de pedido lidos pelo layout ativo.
+
+    Args:
+        custom_layout: Layout personalizado carregado (com 'elements'), ou None
+            quando o layout padrão está em uso
+
+    Returns:
+        Conjunto de campos de primeiro nível do pedido
+    """
+    if not custom_layout or not custom_layout.get('elements'):
+        return set(DEFAULT_LAYOUT_FIELDS)
+
+    fields: Set[str] = set()
+    for element in custom_layout.get('elements', []):
+        element_type = element.get('type')
+        fields.update(LAYOUT_ELEMENT_FIELDS.get(element_type, ()))
+        if element_type == 'text':
+            content = element.get('content') or ''
+            fields.update(field for placeholder, field in PLACEHOLDER_FIELDS.items() if placeholder in content)
+    # O layout personalizado recorre ao padrão quando falha
+    return fields | DEFAULT_LAYOUT_FIELDS
+
+
+def _pick(data: Any, fields: Iterable[str]) -> Any:
+    """Cópia rasa de `data` com apenas `fields` (valores não-dicionário são mantidos)."""
+    if not isinstance(data, dict):
+        return data
+    return {key: value for key, value in data.items() if key in fields}
+
+
+class OrderProjection:
+    """
+    Reduz pedidos aos campos usados pelo layout ativo e pelos filtros.
+    """
+
+    def __init__(self, fields: Optional[Iterable[str]] = None, enabled: bool = True):
+        """
+        Args:
+            fields: Campos extras de primeiro nível a manter (padrão: os do layout padrão)
+            enabled: Se False, os pedidos passam sem alteração
+        """
+        self.enabled = enabled
+        self.fields: Set[str] = set(BASE_ORDER_FIELDS)
+        self.configure(fields)
+
+    @classmethod
+    def from_print_config(cls, print_config: Optional[Dict[str, Any]], custom_layout: Optional[Dict[str, Any]] = None,
+                          enabled: bool = True) -> "OrderProjection":
+        """
+        Cria a projeção a partir da configuração de impressão.
+
+        Args:
+            print_config: Configuração de impressão (chave 'use_custom_layout')
+            custom_layout: Layout personalizado carregado, se houver
+            enabled: Se False, os pedidos passam sem alteração
+        """
+        projection = cls(enabled=enabled)
+        projection.update_layout(print_config, custom_layout)
+        return projection
+
+    def configure(self, fields: Optional[Iterable[str]] = None) -> None:
+        """Redefine os campos extras mantidos."""
+        extra = set(fields) if fields is not None else set(DEFAULT_LAYOUT_FIELDS)
+        self.fields = set(BASE_ORDER_FIELDS) | extra
+
+    def update_layout(self, print_config: Optional[Dict[str, Any]], custom_layout: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Recalcula os campos mantidos após uma mudança de layout.
+
+        Args:
+            print_config: Configuração de impressão (chave 'use_custom_layout')
+            custom_layout: Layout personalizado carregado, se houver
+        """
+        use_custom = bool((print_config or {}).get('use_custom_layout')) and custom_layout
+        self.configure(layout_fields(custom_layout if use_custom else None))
+        logger.debug(f"Projeção de pedidos com os campos: {sorted(self.fields)}")
+
+    def apply(self, order: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Retorna uma cópia reduzida do pedido (o original não é alterado).
+
+        Args:
+            order: Pedido da API (resumo ou detalhe)
+
+        Returns:
+            Pedido projetado, ou o próprio pedido se a projeção está desativada
+        """
+        if not self.enabled or not isinstance(order, dict):
+            return order
+
+        projected = {key: value for key, value in order.items() if key in self.fields}
+
+        if 'cliente' in self.fields:
+            # `contato` e `cliente` trazem os mesmos dados: manter um só, no nome lido pelos layouts
+            customer = order.get('cliente') or order.get('contato')
+            if customer:
+                projected['cliente'] = _pick(customer, CUSTOMER_FIELDS)
+
+        if isinstance(projected.get('loja'), dict):
+            projected['loja'] = _pick(projected['loja'], ('id', 'nome', 'descricao'))
+
+        if isinstance(projected.get('itens'), list):
+            projected['itens'] = [self._project_item(item) for item in projected['itens']]
+
+        return projected
+
+    @staticmethod
+    def _project_item(item: Any) -> Any:
+        """Remove `_original`, `comissao` e os campos não usados de um item."""
+        if not isinstance(item, dict):
+            return item
+        projected = _pick(item, ITEM_FIELDS)
+        if 'produto' in item:
+            projected['produto'] = _pick(item['produto'], PRODUCT_FIELDS)
+        return projected
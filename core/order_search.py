@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Índice de busca (SQLite FTS5) sobre os pedidos em cache.
+
+Os pedidos ficam criptografados em `orders_cache`; achar um pedido pelo nome
+do cliente ou pelo SKU exigia descriptografar a tabela inteira. A tabela
+`orders_search` guarda apenas os campos pesquisáveis de cada pedido (número,
+numeroLoja, cliente, SKUs e descrições dos itens), com o ID do pedido no
+Bling como rowid:
+
+- a inclusão acontece em `Storage.cache_order()` (substituído por
+  `install_search_index`), na gravação de cada pedido;
+- a remoção é feita por um trigger em `orders_cache`, então a limpeza do
+  cache e `clear_cached_order()` também limpam o índice;
+- pedidos gravados antes do índice existir são indexados por uma thread de
+  fundo, em lotes, retomando do último ID indexado.
+
+O índice fica em texto claro no banco. A projeção de privacidade
+(`fields`) escolhe quais campos entram; documentos, endereços e valores
+nunca são indexados. Quando a projeção muda, o índice é recriado.
+
+Benchmark: python -m core.order_search --pedidos 200000
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Any, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'orders_search'
+
+# Campo do índice -> descrição (a ordem é a das colunas da tabela)
+SEARCH_FIELDS = {
+    'numero': 'Número do pedido no Bling',
+    'numero_loja': 'Número do pedido na loja/marketplace',
+    'cliente': 'Nome do cliente',
+    'sku': 'Códigos (SKU) dos itens',
+    'descricao': 'Descrições dos itens',
+}
+
+FIELDS_CONFIG_KEY = 'order_search_fields'
+INDEXED_FIELDS_CONFIG_KEY = 'order_search_indexed_fields'
+BACKFILL_CURSOR_CONFIG_KEY = 'order_search_cursor'
+
+_QUERY_TOKEN = re.compile(r'[^\s"]+')
+
+
+def extract_search_document(order: Dict[str, Any], fields: Sequence[str]) -> Dict[str, str]:
+    """
+    Monta o documento pesquisável de um pedido, com os campos fora da projeção vazios.
+
+    Args:
+        order: Pedido (completo ou projetado)
+        fields: Campos do índice habilitados
+
+    Returns:
+        Dict campo -> texto
+    """
+    customer = order.get('contato') or order.get('cliente') or {}
+    items = [item for item in order.get('itens') or [] if isinstance(item, dict)]
+    values = {
+        'numero': order.get('numero'),
+        'numero_loja': order.get('numeroLoja'),
+        'cliente': customer.get('nome') if isinstance(customer, dict) else None,
+        'sku': ' '.join(str(item.get('codigo')) for item in items if item.get('codigo')),
+        'descricao': ' '.join(str(item.get('descricao')) for item in items if item.get('descricao')),
+    }
+    return {field: str(values[field] or '') if field in fields else '' for field in SEARCH_FIELDS}
+
+
+def build_match_query(text: str, field: Optional[str] = None) -> str:
+    """
+    Converte o texto digitado pelo operador em uma consulta FTS5.
+
+    Cada palavra vira um prefixo entre aspas ("silva"*), todas obrigatórias,
+    então pontuação e operadores do FTS5 no texto não quebram a consulta.
+
+    Args:
+        text: Texto digitado
+        field: Restringir a busca a um campo do índice
+
+    Returns:
+        str: Expressão MATCH (vazia se não houver palavras)
+    """
+    terms = [f'"{token}"*' for token in _QUERY_TOKEN.findall(text or '')]
+    if not terms:
+        return ''
+    query = ' AND '.join(terms)
+    if field:
+        if field not in SEARCH_FIELDS:
+            raise ValueError(f"Campo de busca inválido: {field}")
+        query = f"{field} : ({query})"
+    return query
+
+
+def _search_schema() -> List[str]:
+    columns = ', '.join(SEARCH_FIELDS)
+    return [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+            {columns}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+        """,
+        # IDs do Bling são numéricos e viram o rowid do documento
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_cache_search_delete AFTER DELETE ON orders_cache
+        BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid = CAST(OLD.order_id AS INTEGER);
+        END
+        """,
+    ]
+
+
+def _search_rowid(order: Dict[str, Any]) -> Optional[int]:
+    try:
+        return int(order.get('id'))
+    except (TypeError, ValueError):
+        return None
+
+
+class OrderSearchIndex:
+    """
+    Busca de pedidos em cache por cliente, SKU, descrição ou número.
+    """
+
+    def __init__(self, storage, fields: Optional[Sequence[str]] = None,
+                 batch_size: int = 500, batch_pause: float = 0.05):
+        """
+        Args:
+            storage: Instância de Storage (com `conn`, `_decrypt` e config)
+            fields: Campos indexados (padrão: configuração `order_search_fields` ou todos)
+            batch_size: Pedidos descriptografados por lote na indexação inicial
+            batch_pause: Pausa (s) entre lotes para não disputar o banco com a impressão
+        """
+        self.storage = storage
+        if fields is None:
+            fields = storage.get_config(FIELDS_CONFIG_KEY) or list(SEARCH_FIELDS)
+        unknown = [field for field in fields if field not in SEARCH_FIELDS]
+        if unknown:
+            logger.warning(f"Campos de busca desconhecidos ignorados: {', '.join(unknown)}")
+        self.fields = [field for field in SEARCH_FIELDS if field in fields]
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.indexed = 0
+
+        self._ensure_schema()
+
+    # ------------------------------------------------------------------
+    # Esquema
+    # ------------------------------------------------------------------
+
+    def _ensure_schema(self) -> None:
+        """Cria a tabela e o trigger; recria o índice se a projeção de campos mudou."""
+        conn = self.storage.conn
+        indexed_fields = self.storage.get_config(INDEXED_FIELDS_CONFIG_KEY)
+        with conn:
+            if indexed_fields is not None and list(indexed_fields) != self.fields:
+                logger.info("Campos da busca de pedidos alterados, recriando o índice")
+                conn.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+                indexed_fields = None
+            for sql in _search_schema():
+                conn.execute(sql)
+        if indexed_fields is None:
+            self.storage.delete_config(BACKFILL_CURSOR_CONFIG_KEY)
+            self.storage.set_config(INDEXED_FIELDS_CONFIG_KEY, self.fields)
+
+    # ------------------------------------------------------------------
+    # Indexação
+    # ------------------------------------------------------------------
+
+    def _rows(self, orders: Sequence[Dict[str, Any]]) -> List[tuple]:
+        rows = []
+        for order in orders:
+            rowid = _search_rowid(order) if isinstance(order, dict) else None
+            if rowid is None:
+                continue
+            document = extract_search_document(order, self.fields)
+            rows.append((rowid, *document.values()))
+        return rows
+
+    def index_orders(self, orders: Sequence[Dict[str, Any]]) -> int:
+        """
+        Inclui ou atualiza pedidos no índice em uma única transação.
+
+        Args:
+            orders: Pedidos decodificados
+
+        Returns:
+            int: Número de pedidos indexados
+        """
+        rows = self._rows(orders)
+        if not rows:
+            return 0
+        placeholders = ', '.join('?' * (len(SEARCH_FIELDS) + 1))
+        conn = self.storage.conn
+        with conn:
+            conn.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = ?", [(row[0],) for row in rows])
+            conn.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) VALUES ({placeholders})",
+                rows
+            )
+        return len(rows)
+
+    def index_order(self, order: Dict[str, Any]) -> None:
+        """Inclui ou atualiza um pedido no índice (chamado a cada gravação no cache)."""
+        try:
+            self.index_orders([order])
+        except Exception as e:
+            logger.error(f"Erro ao indexar pedido {order.get('numero')} para busca: {e}")
+
+    def remove_order(self, order_id) -> None:
+        """Remove um pedido do índice."""
+        try:
+            with self.storage.conn:
+                self.storage.conn.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = ?", (int(order_id),))
+        except Exception as e:
+            logger.error(f"Erro ao remover pedido {order_id} do índice de busca: {e}")
+
+    # ------------------------------------------------------------------
+    # Indexação inicial em segundo plano
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Indexa em segundo plano os pedidos em cache ainda fora do índice."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._backfill, name="OrderSearchIndexer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Interrompe a indexação inicial (o progresso fica salvo)."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def _backfill(self) -> None:
+        """Percorre `orders_cache` pelo id, em lotes, a partir do último lote indexado."""
+        cursor = int(self.storage.get_config(BACKFILL_CURSOR_CONFIG_KEY) or 0)
+        started = time.monotonic()
+        total = 0
+        try:
+            while not self._stop_event.is_set():
+                rows = self.storage.conn.execute(
+                    "SELECT id, order_data FROM orders_cache WHERE id > ? ORDER BY id LIMIT ?",
+                    (cursor, self.batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                orders = []
+                for row in rows:
+                    try:
+                        decrypted = self.storage._decrypt(row[1])
+                        orders.append(json.loads(decrypted) if isinstance(decrypted, str) else decrypted)
+                    except Exception as e:
+                        logger.debug(f"Pedido {row[0]} do cache não pôde ser lido para indexação: {e}")
+                total += self.index_orders(orders)
+                cursor = rows[-1][0]
+                self.storage.set_config(BACKFILL_CURSOR_CONFIG_KEY, cursor)
+                self._stop_event.wait(self.batch_pause)
+        except Exception as e:
+            logger.error(f"Erro na indexação de pedidos para busca: {e}")
+            return
+        self.indexed += total
+        if total:
+            logger.info(f"{total} pedidos em cache indexados para busca em {time.monotonic() - started:.1f}s")
+
+    # ------------------------------------------------------------------
+    # Busca
+    # ------------------------------------------------------------------
+
+    def search(self, text: str, field: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Busca pedidos em cache pelo texto digitado.
+
+        Args:
+            text: Nome do cliente, SKU, descrição, número ou numeroLoja (ou parte do início das palavras)
+            field: Restringir a um campo ('numero', 'numero_loja', 'cliente', 'sku' ou 'descricao')
+            limit: Número máximo de resultados
+
+        Returns:
+            Lista de dicts com 'order_id' e os campos indexados, dos pedidos mais recentes aos mais antigos
+        """
+        query = build_match_query(text, field)
+        if not query:
+            return []
+        columns = ', '.join(SEARCH_FIELDS)
+        try:
+            rows = self.storage.conn.execute(
+                f"SELECT rowid, {columns} FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH ? "
+                f"ORDER BY rowid DESC LIMIT ?",
+                (query, limit)
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            logger.error(f"Erro na busca de pedidos '{text}': {e}")
+            return []
+        results = []
+        for row in rows:
+            result = {'order_id': str(row[0])}
+            result.update(zip(SEARCH_FIELDS, row[1:]))
+            results.append(result)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Pedidos no índice e campos indexados."""
+        row = self.storage.conn.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}").fetchone()
+        return {'orders': row[0], 'fields': list(self.fields)}
+
+
+def install_search_index(storage, **options) -> OrderSearchIndex:
+    """
+    Cria o índice e passa `Storage.cache_order()` a indexar cada pedido gravado.
+
+    Args:
+        storage: Instância de Storage
+        **options: Opções repassadas ao OrderSearchIndex
+
+    Returns:
+        OrderSearchIndex instalado (em `storage.search_index`)
+    """
+    index = OrderSearchIndex(storage, **options)
+    cache_order = storage.cache_order
+
+    def cache_order_indexed(order_data: Dict[str, Any], expiration_days: int = 60) -> bool:
+        stored = cache_order(order_data, expiration_days)
+        if stored:
+            index.index_order(order_data)
+        return stored
+
+    storage.cache_order = cache_order_indexed
+    storage.search_index = index
+    logger.info(f"Busca de pedidos em cache indexando: {', '.join(index.fields) or 'nenhum campo'}")
+    return index
+
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+class _BenchmarkStorage:
+    """Storage mínimo (conexão e config em memória) para o benchmark."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.config = {}
+
+    def get_config(self, key, default=None):
+        return self.config.get(key, default)
+
+    def set_config(self, key, value):
+        self.config[key] = value
+
+    def delete_config(self, key):
+        self.config.pop(key, None)
+
+
+def run_benchmark(orders: int = 200000, queries: int = 200, template_path: Optional[str] = None) -> dict:
+    """
+    Indexa `orders` pedidos sintéticos e mede a latência das buscas.
+
+    Returns:
+        Dict com tempo de indexação e latências (ms) por tipo de busca
+    """
+    import random
+
+    template_path = template_path or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                  'pedido_114152.json')
+    with open(template_path, 'r', encoding='utf-8') as f:
+        template = json.load(f)
+    first_names = ['Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Heitor', 'Isabela', 'João',
+                   'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Tiago', 'Vitória', 'Yuri']
+    last_names = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima',
+                  'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Zuntini', 'Biazzi']
+    rng = random.Random(42)
+
+    def sample(i):
+        name = f"{rng.choice(first_names)} {rng.choice(last_names)} {rng.choice(last_names)}"
+        items = [dict(item, codigo=f"ACR-{rng.randrange(5000):04d}") for item in template.get('itens', [])]
+        return dict(template, id=22634343843 + i, numero=114152 + i, numeroLoja=f"2504{i:08d}MG",
+                    contato={'nome': name}, itens=items)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'search.db'), check_same_thread=False)
+        conn.execute("CREATE TABLE orders_cache (id INTEGER PRIMARY KEY, order_id TEXT, order_data BLOB)")
+        index = OrderSearchIndex(_BenchmarkStorage(conn))
+
+        started = time.perf_counter()
+        for start in range(0, orders, 5000):
+            index.index_orders([sample(i) for i in range(start, min(start + 5000, orders))])
+        index_s = time.perf_counter() - started
+
+        cases = {
+            'cliente': lambda: f"{rng.choice(first_names)} {rng.choice(last_names)}",
+            'sku': lambda: f"ACR-{rng.randrange(5000):04d}",
+            'numero_loja': lambda: f"2504{rng.randrange(orders):08d}",
+            'prefixo': lambda: rng.choice(last_names)[:3],
+        }
+        latencies = {}
+        for name, make_query in cases.items():
+            timings = []
+            for _ in range(queries):
+                text = make_query()
+                started = time.perf_counter()
+                index.search(text, limit=50)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            latencies[name] = {'p50_ms': round(timings[len(timings) // 2], 2),
+                               'p99_ms': round(timings[int(len(timings) * 0.99) - 1], 2)}
+        conn.close()
+    return {'orders': orders, 'index_s': round(index_s, 1), 'latencies': latencies}
+
+
+def main(argv=None) -> int:
+    """Ponto de entrada da linha de comando do benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark da busca FTS5 de pedidos em cache")
+    parser.add_argument('--pedidos', type=int, default=200000, help="Número de pedidos indexados")
+    parser.add_argument('--buscas', type=int, default=200, help="Buscas por tipo")
+    parser.add_argument('--modelo', default=None, help="JSON de pedido usado como modelo")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    results = run_benchmark(args.pedidos, args.buscas, args.modelo)
+    print(f"{results['orders']} pedidos indexados em {results['index_s']}s")
+    for name, r in results['latencies'].items():
+        print(f"{name:12s} p50={r['p50_ms']:.2f}ms p99={r['p99_ms']:.2f}ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
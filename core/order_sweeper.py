@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Varredura incremental de pedidos, independente de Qt.
+
+Concentra a lógica de um ciclo de polling: cursor persistido (maior ID de
+pedido visto e instante da última varredura), busca concorrente pelo
+BlingFetchPipeline e ajuste do intervalo pelo AdaptiveIntervalScheduler.
+O resultado de cada ciclo é devolvido como dicionário, para que o chamador
+(QThread ou motor asyncio) decida como notificar a interface.
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+from bling_api.client import TokenExpiredError, RateLimitError, BlingAPIError
+from bling_api.fetch_pipeline import BlingFetchPipeline
+from bling_api.endpoints import resolve_api_base_url, apply_to_client
+from core.adaptive_interval import AdaptiveIntervalScheduler
+from core.order_projection import OrderProjection
+
+logger = logging.getLogger(__name__)
+
+# Chave do cursor na tabela config
+CURSOR_CONFIG_KEY = 'polling_cursor'
+
+# Formato de data aceito pelos filtros de data/hora da API v3
+BLING_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _order_id(order: Dict[str, Any]) -> Optional[int]:
+    """Retorna o ID numérico de um pedido ou None."""
+    try:
+        return int(order.get('id'))
+    except (TypeError, ValueError):
+        return None
+
+
+class OrderCursor:
+    """
+    Marca d'água (high-watermark) do polling incremental.
+
+    Attributes:
+        last_id: Maior ID de pedido já visto
+        changed_since: Instante (horário local) da última varredura concluída
+    """
+
+    def __init__(self, last_id: int = 0, changed_since: Optional[str] = None):
+        self.last_id = last_id
+        self.changed_since = changed_since
+
+    @classmethod
+    def load(cls, storage) -> Optional["OrderCursor"]:
+        """
+        Carrega o cursor salvo no storage.
+
+        Returns:
+            OrderCursor ou None se ainda não existir
+        """
+        try:
+            data = storage.get_config(CURSOR_CONFIG_KEY)
+            if isinstance(data, dict) and data.get('changed_since'):
+                return cls(int(data.get('last_id') or 0), data['changed_since'])
+        except Exception as e:
+            logger.error(f"Erro ao carregar cursor de polling: {e}")
+        return None
+
+    def save(self, storage) -> bool:
+        """Persiste o cursor no storage."""
+        try:
+            storage.set_config(CURSOR_CONFIG_KEY, {
+                'last_id': self.last_id,
+                'changed_since': self.changed_since,
+            })
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao salvar cursor de polling: {e}")
+            return False
+
+    def advance(self, orders: List[Dict[str, Any]], sweep_started: datetime) -> "OrderCursor":
+        """
+        Retorna um novo cursor avançado pelos pedidos de uma varredura.
+
+        Args:
+            orders: Pedidos retornados pela varredura
+            sweep_started: Instante em que a varredura começou
+        """
+        ids = [_order_id(order) for order in orders]
+        last_id = max([self.last_id] + [i for i in ids if i is not None])
+        return OrderCursor(last_id, sweep_started.strftime(BLING_DATETIME_FORMAT))
+
+
+class OrderSweeper:
+    """
+    Executa ciclos de busca incremental de pedidos.
+    """
+
+    def __init__(self, storage, client_provider: Callable[[], Any], base_interval: float = 60,
+                 overlap_seconds: int = 120, page_size: int = 100, max_pages: int = 10):
+        """
+        Args:
+            storage: Instância do gerenciador de armazenamento
+            client_provider: Função que retorna um BlingClient autenticado (ou None)
+            base_interval: Intervalo de polling configurado pelo usuário (s)
+            overlap_seconds: Margem aplicada ao cursor para tolerar diferença de relógio
+            page_size: Pedidos por página (máximo da API: 100)
+            max_pages: Páginas consultadas por ciclo
+        """
+        self.storage = storage
+        self.client_provider = client_provider
+        self.overlap_seconds = overlap_seconds
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.api_base_url = resolve_api_base_url(storage)
+        self.reconciliation_interval: Optional[int] = None
+        self.rate_limit_retry_after = 0.0
+        self.scheduler = AdaptiveIntervalScheduler(base_interval=base_interval, storage=storage)
+        # Recebe (cursor ou None, início do ciclo) e devolve True se assumiu um período sem polling
+        self.gap_handler: Optional[Callable[[Optional[OrderCursor], datetime], bool]] = None
+        # Reduz os pedidos aos campos usados pelo layout antes do cache e da fila
+        self.projection: Optional[OrderProjection] = None
+
+        # O ciclo seguinte (executor) e a entrega do anterior (loop) acessam o cursor pendente
+        self._cursor_lock = threading.Lock()
+        self._pending_cursor: Optional[OrderCursor] = None
+        self._pipeline: Optional[BlingFetchPipeline] = None
+        self._last_cycle_requests = 0
+        self._last_cycle_at = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Cliente e pipeline
+    # ------------------------------------------------------------------
+
+    def get_client(self):
+        """Obtém o cliente Bling, apontando-o para o endereço alternativo se configurado."""
+        client = self.client_provider()
+        apply_to_client(client, self.api_base_url)
+        return client
+
+    def _get_pipeline(self, client) -> BlingFetchPipeline:
+        """Retorna o pipeline de busca do cliente atual, recriando se o cliente mudou."""
+        if self._pipeline is None or self._pipeline.client is not client:
+            if self._pipeline is not None:
+                self._pipeline.close()
+            self._pipeline = BlingFetchPipeline(client)
+        return self._pipeline
+
+    def close(self) -> None:
+        """Libera o pool de conexões."""
+        if self._pipeline is not None:
+            self._pipeline.close()
+            self._pipeline = None
+
+    def project(self, order: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Aplica a projeção de campos configurada (se houver) a um pedido."""
+        if self.projection is None:
+            return order
+        return self.projection.apply(order)
+
+    def fetch_order_detail(self, order_id, full: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Busca o pedido pelo ID (usado pelo receptor de webhooks).
+
+        Args:
+            order_id: ID do pedido no Bling
+            full: Retornar o pedido completo da API, sem projeção
+
+        Returns:
+            Dict com o pedido processado ou None
+        """
+        client = self.get_client()
+        if not client:
+            return None
+        order = self._get_pipeline(client).fetch_order_detail(order_id)
+        if order and not full:
+            order = self.project(order)
+        if order:
+            try:
+                self.storage.cache_order(order)
+            except Exception as cache_error:
+                logger.warning(f"Não foi possível armazenar pedido no cache: {cache_error}")
+        return order
+
+    def _fetch_changed_orders(self, client, changed_since: str,
+                              min_id: float) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Busca os pedidos alterados desde `changed_since`.
+
+        As páginas e os detalhes dos pedidos novos (ID acima de `min_id`) são
+        buscados em paralelo pelo BlingFetchPipeline.
+
+        Args:
+            client: BlingClient autenticado
+            changed_since: Data/hora inicial no formato da API
+            min_id: Maior ID já visto; só pedidos acima dele recebem detalhe
+
+        Returns:
+            Tupla (pedidos, falhas): pedidos detalhados quando novos, em ordem
+            crescente de ID, e os resumos dos pedidos novos cujo detalhe falhou
+            (fora da lista de pedidos)
+        """
+        pipeline = self._get_pipeline(client)
+        requests_before = pipeline.request_count
+        try:
+            result = pipeline.fetch_orders(
+                {"dataAlteracaoInicial": changed_since},
+                page_size=self.page_size,
+                max_pages=self.max_pages,
+                needs_detail=lambda order: (_order_id(order) or 0) > min_id,
+            )
+        finally:
+            self._last_cycle_requests = pipeline.request_count - requests_before
+        details = {_order_id(order): order for order in result['details']}
+        failed_ids = {_order_id(order) for order in result['failed']}
+        orders = [self.project(details.get(_order_id(order), order)) for order in result['summaries']
+                  if _order_id(order) not in failed_ids]
+        orders.sort(key=lambda order: _order_id(order) or 0)
+        return orders, result['failed']
+
+    # ------------------------------------------------------------------
+    # Configuração
+    # ------------------------------------------------------------------
+
+    def configure(self, base_interval: float) -> None:
+        """Aplica o intervalo configurado pelo usuário (ignorado em modo de reconciliação)."""
+        if self.reconciliation_interval:
+            self.set_reconciliation_mode(self.reconciliation_interval)
+        else:
+            self.scheduler.configure(base_interval=base_interval)
+
+    def set_reconciliation_mode(self, interval: int) -> None:
+        """
+        Reduz o polling a uma varredura de reconciliação (pedidos chegam por webhook).
+
+        Args:
+            interval: Intervalo mínimo (s) entre as varreduras
+        """
+        self.reconciliation_interval = interval
+        self.scheduler.configure(base_interval=interval, min_interval=interval, max_interval=interval * 2)
+        logger.info(f"Polling em modo de reconciliação a cada {interval}s")
+
+    def reset_cursor(self) -> None:
+        """Descarta o cursor; o próximo ciclo apenas estabelece um novo ponto de partida."""
+        try:
+            self.storage.delete_config(CURSOR_CONFIG_KEY)
+            logger.info("Cursor de polling descartado")
+        except Exception as e:
+            logger.error(f"Erro ao descartar cursor de polling: {e}")
+
+    @property
+    def next_interval(self) -> int:
+        """Intervalo (s) até o próximo ciclo."""
+        return max(1, int(round(self.scheduler.current_interval)))
+
+    # ------------------------------------------------------------------
+    # Ciclo
+    # ------------------------------------------------------------------
+
+    def sweep(self) -> Dict[str, Any]:
+        """
+        Executa um ciclo e ajusta o intervalo até o próximo.
+
+        Returns:
+            Dict com uma das chaves:
+            - 'orders': pedidos novos (o cursor só avança após `commit()`;
+              use `take_pending` para guardá-lo com os pedidos)
+            - 'waiting_for_rate_limit': True enquanto durar a espera de um 429
+            - 'error': {'message', 'status_code', ...}
+            e, quando aplicável, 'status' (texto para a interface), 'auth_needed',
+            'client_unavailable' e 'rate_limit_wait' (segundos).
+        """
+        self._last_cycle_requests = 0
+        result = self._sweep()
+
+        now = time.monotonic()
+        elapsed, self._last_cycle_at = now - self._last_cycle_at, now
+        if 'orders' in result:
+            self.scheduler.record_cycle(len(result['orders']), self._last_cycle_requests, elapsed)
+        elif result.get('error', {}).get('status_code') == 429:
+            self.scheduler.record_rate_limit(result['error'].get('wait_time', 60))
+        else:
+            return result
+
+        snapshot = self.scheduler.snapshot()
+        result['status'] = f"Próxima verificação em {snapshot['interval']}s (cota restante hoje: {snapshot['remaining_budget']})"
+        return result
+
+    def take_pending(self) -> Optional[OrderCursor]:
+        """
+        Retira o avanço do cursor calculado pelo último ciclo.
+
+        Quem entrega os pedidos guarda o cursor junto com eles e o passa a
+        `commit`, de modo que um ciclo seguinte não troque o cursor a persistir.
+        """
+        with self._cursor_lock:
+            cursor, self._pending_cursor = self._pending_cursor, None
+        return cursor
+
+    def commit(self, cursor: Optional[OrderCursor] = None) -> None:
+        """
+        Avança o cursor persistido depois que os pedidos do ciclo foram entregues.
+
+        Args:
+            cursor: Cursor retirado com `take_pending`. Se None, usa o pendente.
+        """
+        with self._cursor_lock:
+            if cursor is None:
+                cursor, self._pending_cursor = self._pending_cursor, None
+            if cursor is not None:
+                cursor.save(self.storage)
+
+    def _sweep(self) -> Dict[str, Any]:
+        """Busca os pedidos novos a partir do cursor persistido."""
+        try:
+            client = self.get_client()
+            if not client:
+                logger.error("Não foi possível obter cliente para verificar pedidos.")
+                return {'error': {'message': 'Não foi possível obter cliente para verificar pedidos.', 'status_code': 401},
+                        'client_unavailable': True}
+
+            if self.rate_limit_retry_after > 0:
+                if time.time() < self.rate_limit_retry_after:
+                    wait_time = int(self.rate_limit_retry_after - time.time())
+                    return {'waiting_for_rate_limit': True, 'status': f"Aguardando: {wait_time}s (limite de requisições)"}
+                self.rate_limit_retry_after = 0
+
+            sweep_started = datetime.now()
+            cursor = OrderCursor.load(self.storage)
+            first_run = cursor is None
+            if self.gap_handler is not None and self.gap_handler(cursor, sweep_started) and not first_run:
+                # O período parado fica com o backfill; o polling segue a partir de agora
+                cursor = OrderCursor(cursor.last_id, sweep_started.strftime(BLING_DATETIME_FORMAT))
+            if first_run:
+                # Sem cursor: mesma regra de antes, só imprimir o que chegar a partir de agora
+                cursor = OrderCursor(0, (sweep_started - timedelta(days=1)).strftime(BLING_DATETIME_FORMAT))
+
+            since = datetime.strptime(cursor.changed_since, BLING_DATETIME_FORMAT) - timedelta(seconds=self.overlap_seconds)
+            since_text = since.strftime(BLING_DATETIME_FORMAT)
+            logger.info(f"Verificando pedidos alterados desde {since_text} (último ID {cursor.last_id})")
+
+            try:
+                # Na primeira execução não há o que imprimir, então os detalhes são dispensados
+                min_id = float('inf') if first_run else cursor.last_id
+                changed, failed = self._fetch_changed_orders(client, since_text, min_id)
+            except RateLimitError as e:
+                wait_time = 4 * 60 * 60 if "por day" in str(e) else 60
+                self.rate_limit_retry_after = time.time() + wait_time
+                return {'error': {'message': 'Limite de requisições atingido.', 'description': str(e),
+                                  'status_code': 429, 'wait_time': wait_time},
+                        'rate_limit_wait': wait_time}
+            except TokenExpiredError:
+                logger.warning("Token expirado ao verificar pedidos")
+                return {'error': {'message': 'Token de autenticação expirado', 'status_code': 401},
+                        'auth_needed': True}
+            except BlingAPIError as e:
+                status_code = 403 if "403" in str(e) else 500
+                return {'error': {'message': f'Erro na API do Bling: {e}', 'status_code': status_code}}
+
+            for order in changed:
+                try:
+                    self.storage.cache_order(order)
+                except Exception as cache_error:
+                    logger.warning(f"Não foi possível armazenar pedido no cache: {cache_error}")
+
+            new_orders = [order for order in changed if (_order_id(order) or 0) > cursor.last_id]
+            if failed:
+                # O cursor fica onde está para que os pedidos sem detalhe voltem no próximo ciclo;
+                # os que forem entregues agora são descartados lá pela proteção contra duplicidade
+                logger.warning(f"Cursor mantido: {len(failed)} pedidos novos sem detalhe serão buscados de novo")
+                advanced = None
+            else:
+                advanced = cursor.advance(changed, sweep_started)
+
+            if first_run:
+                logger.info(f"Cursor de polling inicial estabelecido no pedido {advanced.last_id}")
+                self.commit(advanced)
+                return {'orders': []}
+
+            with self._cursor_lock:
+                self._pending_cursor = advanced
+
+            logger.info(f"{len(changed)} pedidos alterados, {len(new_orders)} novos desde o último ciclo")
+            return {'orders': new_orders}
+
+        except Exception as e:
+            logger.error(f"Erro ao verificar novos pedidos: {e}")
+            return {'error': {'message': f'Erro geral: {str(e)}', 'status_code': 500}}
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Ponte entre o motor de polling asyncio e a interface Qt.
+
+O AsyncPollingEngine roda em uma thread própria e só publica eventos em uma
+fila thread-safe; este objeto, criado na thread principal, esvazia a fila
+periodicamente e reemite cada evento como sinal Qt.
+"""
+
+import queue
+import logging
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from core import async_polling
+
+logger = logging.getLogger(__name__)
+
+
+class PollingEventBridge(QObject):
+    """
+    Converte os eventos do AsyncPollingEngine em sinais na thread principal.
+    """
+
+    polling_started = Signal()
+    polling_stopped = Signal()
+    status_changed = Signal(str, object)   # Texto e estado (True/False/None) do polling
+    activity_logged = Signal(str)
+    new_orders_found = Signal(list)
+    error_occurred = Signal(str)
+    auth_needed = Signal()
+    auth_failed = Signal(str)
+    rate_limit_hit = Signal(int)
+
+    def __init__(self, engine, interval_ms: int = 100, parent=None):
+        """
+        Args:
+            engine: AsyncPollingEngine cujos eventos serão repassados
+            interval_ms: Intervalo (ms) entre as leituras da fila
+            parent: Objeto pai na hierarquia Qt (opcional)
+        """
+        super().__init__(parent)
+        self.engine = engine
+        self._signals = {
+            async_polling.EVENT_STARTED: self.polling_started,
+            async_polling.EVENT_STOPPED: self.polling_stopped,
+            async_polling.EVENT_STATUS: self.status_changed,
+            async_polling.EVENT_ACTIVITY: self.activity_logged,
+            async_polling.EVENT_NEW_ORDERS: self.new_orders_found,
+            async_polling.EVENT_ERROR: self.error_occurred,
+            async_polling.EVENT_AUTH_NEEDED: self.auth_needed,
+            async_polling.EVENT_AUTH_FAILED: self.auth_failed,
+            async_polling.EVENT_RATE_LIMIT: self.rate_limit_hit,
+        }
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.drain)
+        self._timer.start()
+
+    def stop(self) -> None:
+        """Para a leitura da fila, repassando os eventos pendentes."""
+        self._timer.stop()
+        self.drain()
+
+    def drain(self) -> None:
+        """Reemite todos os eventos pendentes na fila do motor."""
+        while True:
+            try:
+                kind, payload = self.engine.events.get_nowait()
+            except queue.Empty:
+                return
+            signal = self._signals.get(kind)
+            if signal is None:
+                logger.warning(f"Evento de polling desconhecido: {kind}")
+                continue
+            try:
+                if payload is None:
+                    signal.emit()
+                elif isinstance(payload, tuple):
+                    signal.emit(*payload)
+                else:
+                    signal.emit(payload)
+            except Exception as e:
+                logger.error(f"Erro ao repassar evento de polling '{kind}': {e}")
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Diário (journal) de impressão à prova de falhas.
+
+Cada trabalho de impressão passa por três estados registrados em um arquivo
+append-only (uma linha JSON por registro):
+
+- intent: o pedido foi aceito para impressão
+- sent:   os bytes foram entregues ao spooler da impressora
+- acked:  o registro correspondente foi gravado em `print_history`
+
+Trabalhos que falham na impressora recebem o estado terminal `failed` e não
+são reimpressos automaticamente.
+
+As gravações são agrupadas e sincronizadas com `fsync` em lotes por uma
+thread de fundo, sem adicionar uma escrita síncrona no banco por trabalho.
+A intenção é a exceção: `record_intent` só retorna depois que o seu lote
+foi sincronizado, para que o pedido nunca seja enviado à impressora (nem o
+cursor do polling avance) sem a intenção no disco. Intenções registradas
+ao mesmo tempo por várias threads compartilham o mesmo fsync.
+Na inicialização, `recover()` reexecuta o diário: trabalhos que não chegaram
+a ser enviados voltam para a fila, e trabalhos enviados sem confirmação têm
+o histórico gravado sem nova impressão.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from core.print_stats import ensure_history_schema
+
+logger = logging.getLogger(__name__)
+
+# Arquivo padrão do diário, ao lado do app_data.db
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'print_journal.jsonl')
+
+STATE_INTENT = "intent"
+STATE_SENT = "sent"
+STATE_ACKED = "acked"
+STATE_FAILED = "failed"
+
+# Estados que encerram um trabalho e permitem removê-lo na compactação
+FINAL_STATES = (STATE_ACKED, STATE_FAILED)
+
+
+class _SyncBatch:
+    """Registros gravados no mesmo fsync; `done` é sinalizado ao final da gravação."""
+
+    __slots__ = ('lines', 'done', 'error')
+
+    def __init__(self):
+        self.lines = []
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class PrintJournal:
+    """
+    Diário append-only dos estados de cada trabalho de impressão.
+    """
+
+    def __init__(self, path: str = None, flush_interval: float = 0.05):
+        """
+        Abre (ou cria) o diário de impressão.
+
+        Args:
+            path: Caminho do arquivo do diário. Se None, usa o padrão.
+            flush_interval: Intervalo máximo (s) entre sincronizações com o disco
+        """
+        self.path = path or DEFAULT_JOURNAL_PATH
+        self.flush_interval = flush_interval
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._truncate_torn_tail()
+        self._file = open(self.path, 'ab')
+        self._lock = threading.Lock()
+        self._batch = _SyncBatch()
+        self._dirty = threading.Event()
+        self._closed = False
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="PrintJournalFlusher", daemon=True)
+        self._flusher.start()
+
+    def _truncate_torn_tail(self) -> None:
+        """Remove uma última linha incompleta deixada por uma queda durante a gravação."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b'\n':
+                return
+
+            # Procurar a última quebra de linha em blocos a partir do fim
+            position = size
+            while position > 0:
+                block = min(4096, position)
+                position -= block
+                f.seek(position)
+                index = f.read(block).rfind(b'\n')
+                if index != -1:
+                    position += index + 1
+                    break
+            logger.warning(f"Removendo registro incompleto do fim do diário de impressão ({size - position} bytes)")
+            f.truncate(position)
+
+    # ------------------------------------------------------------------
+    # Registro de estados
+    # ------------------------------------------------------------------
+
+    def record_intent(self, order: Dict[str, Any], printer: Optional[str] = None,
+                      user: Optional[str] = None, tipo: str = 'impressao') -> str:
+        """
+        Registra a intenção de imprimir um pedido.
+
+        Args:
+            order: Dados do pedido
+            printer: Impressora de destino
+            user: Usuário responsável (para o histórico)
+            tipo: 'impressao' ou 'reimpressao'
+
+        Returns:
+            str: Chave do trabalho, usada nos registros seguintes
+
+        Raises:
+            OSError: A intenção não pôde ser sincronizada com o disco; o pedido não deve ser impresso
+        """
+        return self.record_intents([order], printer, user=user, tipo=tipo)[0]
+
+    def record_intents(self, orders: List[Dict[str, Any]], printer: Optional[str] = None,
+                       user: Optional[str] = None, tipo: str = 'impressao') -> List[str]:
+        """
+        Registra a intenção de imprimir vários pedidos com um único fsync.
+
+        Retorna somente depois que as intenções estão no disco.
+
+        Args:
+            orders: Pedidos a imprimir
+            printer: Impressora de destino
+            user: Usuário responsável (para o histórico)
+            tipo: 'impressao' ou 'reimpressao'
+
+        Returns:
+            List[str]: Chaves dos trabalhos, na ordem dos pedidos
+
+        Raises:
+            OSError: As intenções não puderam ser sincronizadas com o disco
+        """
+        job_keys = []
+        batch = None
+        for order in orders:
+            job_key = uuid.uuid4().hex
+            batch = self._append({
+                'job': job_key,
+                'state': STATE_INTENT,
+                'order': order,
+                'printer': printer,
+                'user': user,
+                'tipo': tipo,
+            })
+            job_keys.append(job_key)
+        if batch is not None:
+            self._sync(batch)
+        return job_keys
+
+    def record_sent(self, job_key: str) -> None:
+        """Registra que os bytes do trabalho foram entregues à impressora."""
+        self._append({'job': job_key, 'state': STATE_SENT})
+
+    def record_failed(self, job_key: str) -> None:
+        """Registra que o trabalho falhou na impressora e não deve ser repetido."""
+        self._append({'job': job_key, 'state': STATE_FAILED})
+
+    def record_acked(self, job_keys: List[str]) -> None:
+        """Registra que o histórico dos trabalhos foi persistido."""
+        for job_key in job_keys:
+            self._append({'job': job_key, 'state': STATE_ACKED})
+
+    def _append(self, record: Dict[str, Any]) -> _SyncBatch:
+        """Acrescenta um registro ao buffer de gravação e retorna o lote em que ele será gravado."""
+        record['ts'] = datetime.now().isoformat()
+        line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+        with self._lock:
+            if self._closed:
+                raise ValueError("Diário de impressão já foi fechado")
+            batch = self._batch
+            batch.lines.append(line)
+        self._dirty.set()
+        return batch
+
+    def _sync(self, batch: _SyncBatch) -> None:
+        """Grava o lote agora (ou aguarda quem já o está gravando) e propaga a falha do fsync."""
+        try:
+            self.flush()
+        except Exception:
+            pass  # Falha registrada no próprio lote, verificada abaixo
+        if not batch.done.is_set() or batch.error is not None:
+            raise OSError(f"Diário de impressão não sincronizado com o disco: {batch.error}")
+
+    # ------------------------------------------------------------------
+    # Persistência
+    # ------------------------------------------------------------------
+
+    def flush(self) -> None:
+        """Grava e sincroniza com o disco todos os registros pendentes."""
+        with self._lock:
+            self._write_batch_locked()
+
+    def _write_batch_locked(self) -> None:
+        """Grava o lote atual com fsync e avisa quem espera por ele; chamado com o lock."""
+        batch = self._batch
+        if not batch.lines or self._file is None:
+            return
+        self._batch = _SyncBatch()
+        try:
+            self._file.write(b"".join(batch.lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception as e:
+            batch.error = e
+            raise
+        finally:
+            batch.done.set()
+
+    def _flush_loop(self) -> None:
+        """Sincroniza os registros em lote a cada `flush_interval`."""
+        while not self._closed:
+            self._dirty.wait()
+            self._dirty.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erro ao sincronizar diário de impressão: {e}")
+            # Agrupar os registros que chegarem durante o intervalo
+            time.sleep(self.flush_interval)
+
+    def close(self) -> None:
+        """Grava os registros pendentes e fecha o diário."""
+        self.flush()
+        with self._lock:
+            self._closed = True
+            if self._file:
+                self._file.close()
+                self._file = None
+        self._dirty.set()
+
+    # ------------------------------------------------------------------
+    # Recuperação
+    # ------------------------------------------------------------------
+
+    def _replay(self) -> Dict[str, Dict[str, Any]]:
+        """Lê o diário e retorna o último estado conhecido de cada trabalho."""
+        jobs = {}
+        if not os.path.exists(self.path):
+            return jobs
+
+        with open(self.path, 'rb') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except (ValueError, UnicodeDecodeError):
+                    # Última linha truncada por uma queda durante a gravação
+                    logger.warning(f"Registro inválido ignorado no diário de impressão (linha {line_number})")
+                    continue
+
+                job_key = record.get('job')
+                state = record.get('state')
+                if state == STATE_INTENT:
+                    jobs[job_key] = record
+                elif job_key in jobs:
+                    jobs[job_key]['state'] = state
+        return jobs
+
+    def recover(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Reexecuta o diário após uma reinicialização.
+
+        Returns:
+            tuple: (trabalhos a reimprimir, trabalhos enviados sem histórico gravado)
+        """
+        self.flush()
+        jobs = self._replay()
+        unsent = [job for job in jobs.values() if job['state'] == STATE_INTENT]
+        unacked = [job for job in jobs.values() if job['state'] == STATE_SENT]
+
+        if unsent or unacked:
+            logger.info(
+                f"Recuperação do diário de impressão: {len(unsent)} trabalhos não enviados, "
+                f"{len(unacked)} enviados sem histórico"
+            )
+        return unsent, unacked
+
+    def compact(self) -> None:
+        """
+        Reescreve o diário mantendo apenas trabalhos ainda não confirmados.
+
+        A troca é atômica (arquivo temporário + os.replace).
+        """
+        with self._lock:
+            self._write_batch_locked()
+
+            jobs = self._replay()
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as tmp:
+                for job in jobs.values():
+                    if job['state'] in FINAL_STATES:
+                        continue
+                    state = job['state']
+                    intent = dict(job, state=STATE_INTENT)
+                    tmp.write(json.dumps(intent, ensure_ascii=False).encode('utf-8') + b'\n')
+                    if state == STATE_SENT:
+                        sent = {'job': job['job'], 'state': STATE_SENT, 'ts': job['ts']}
+                        tmp.write(json.dumps(sent, ensure_ascii=False).encode('utf-8') + b'\n')
+                tmp.flush()
+                os.fsync(tmp.fileno())
+
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, 'ab')
+
+
+def history_record_from_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Monta o registro de `print_history` correspondente a um trabalho do diário.
+
+    Args:
+        job: Registro de intenção do diário
+
+    Returns:
+        Dict no formato aceito por `Storage.add_print_history`
+    """
+    order = job.get('order') or {}
+    return {
+        'order_id': str(order.get('numero', order.get('id', ''))),
+        'items': order.get('itens', []),
+        'printer': job.get('printer') or '',
+        'status': 'success',
+        'user': job.get('user'),
+        'tipo': job.get('tipo', 'impressao'),
+        'printed_at': job.get('ts'),
+        'store_id': (order.get('loja') or {}).get('id'),
+    }
+
+
+def write_print_history_batch(storage, records: List[Dict[str, Any]]) -> int:
+    """
+    Grava vários registros em `print_history` em uma única transação.
+
+    Os totais diários (`print_history_daily`) são atualizados pelos triggers
+    na mesma transação.
+
+    Args:
+        storage: Instância de Storage/DataStorage (usa a conexão `conn`)
+        records: Registros no formato de `Storage.add_print_history`, com a
+            chave opcional 'store_id'
+
+    Returns:
+        int: Número de registros gravados
+    """
+    if not records:
+        return 0
+
+    now = datetime.now().isoformat()
+    rows = [
+        (
+            record.get('order_id'),
+            json.dumps(record.get('items', [])),
+            record.get('printer') or '',
+            record.get('status', 'unknown'),
+            record.get('printed_at') or now,
+            record.get('user'),
+            record.get('tipo', 'impressao'),
+            str(record['store_id']) if record.get('store_id') is not None else None,
+        )
+        for record in records
+    ]
+
+    conn = storage.conn
+    ensure_history_schema(conn)
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO print_history
+            (order_id, items, printer, status, printed_at, user, tipo, store_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows
+        )
+    return len(rows)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Índices e totais diários materializados de `print_history`.
+
+`print_history` não tinha índices secundários: o painel, a verificação de
+"já impresso?" e as consultas de histórico varriam a tabela inteira. Este
+módulo cria os índices usados por essas consultas e a tabela
+`print_history_daily` (impressões por dia, impressora, status, loja e tipo),
+mantida por triggers a cada inserção ou remoção em `print_history`. O
+painel lê os totais prontos em vez de agregar as linhas do histórico.
+
+A loja não fazia parte do histórico; a coluna `store_id` é adicionada e
+preenchida por `write_print_history_batch` a partir do pedido (`loja.id`).
+Registros gravados sem loja entram nos totais com a loja vazia. Bancos
+criados por versões antigas do Storage também não têm `user` e `tipo`
+(o CREATE TABLE IF NOT EXISTS não altera tabelas existentes); as três
+colunas são adicionadas antes dos índices, dos totais e dos triggers.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = 'print_history_daily'
+
+# Colunas de print_history ausentes em bancos criados por versões antigas
+HISTORY_COLUMNS = ('user', 'tipo', 'store_id')
+
+HISTORY_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_print_history_order ON print_history(order_id, status)",
+    "CREATE INDEX IF NOT EXISTS idx_print_history_printed_at ON print_history(printed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_print_history_status ON print_history(status, printed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_print_history_printer ON print_history(printer, printed_at)",
+)
+
+ROLLUP_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+        day TEXT NOT NULL,          -- AAAA-MM-DD de printed_at
+        printer TEXT NOT NULL,
+        status TEXT NOT NULL,
+        store_id TEXT NOT NULL,     -- '' quando a loja não foi registrada
+        tipo TEXT NOT NULL,
+        prints INTEGER NOT NULL,
+        PRIMARY KEY (day, printer, status, store_id, tipo)
+    )
+"""
+
+# Chave de agrupamento de uma linha do histórico (NEW/OLD nos triggers)
+_ROLLUP_KEY = ("substr({row}.printed_at, 1, 10), COALESCE({row}.printer, ''), {row}.status, "
+               "COALESCE({row}.store_id, ''), COALESCE({row}.tipo, 'impressao')")
+
+ROLLUP_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_print_history_rollup_insert AFTER INSERT ON print_history
+    BEGIN
+        INSERT INTO {ROLLUP_TABLE} (day, printer, status, store_id, tipo, prints)
+        VALUES ({_ROLLUP_KEY.format(row='NEW')}, 1)
+        ON CONFLICT (day, printer, status, store_id, tipo) DO UPDATE SET prints = prints + 1;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_print_history_rollup_delete AFTER DELETE ON print_history
+    BEGIN
+        UPDATE {ROLLUP_TABLE} SET prints = prints - 1
+        WHERE (day, printer, status, store_id, tipo) = ({_ROLLUP_KEY.format(row='OLD')});
+    END
+    """,
+)
+
+# Bancos (caminho do arquivo) com o esquema já verificado neste processo
+_ready_databases = set()
+_ready_lock = threading.Lock()
+
+
+def _database_key(conn) -> str:
+    """Identifica o banco de uma conexão (caminho do arquivo ou id da conexão em memória)."""
+    for row in conn.execute("PRAGMA database_list").fetchall():
+        if row[1] == 'main':
+            return row[2] or f"memory:{id(conn)}"
+    return f"memory:{id(conn)}"
+
+
+def ensure_history_schema(conn) -> None:
+    """
+    Cria as colunas que faltam, os índices, a tabela de totais e os triggers (idempotente).
+
+    Na primeira execução os totais são calculados a partir do histórico existente,
+    na mesma transação que cria os triggers.
+
+    Args:
+        conn: Conexão com o banco do Storage
+    """
+    key = _database_key(conn)
+    with _ready_lock:
+        if key in _ready_databases:
+            return
+
+        started = datetime.now()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(print_history)").fetchall()}
+        if not columns:
+            # Tabela ainda não criada pelo Storage
+            return
+        with conn:
+            for column in HISTORY_COLUMNS:
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE print_history ADD COLUMN {column} TEXT")
+            for sql in HISTORY_INDEXES:
+                conn.execute(sql)
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (ROLLUP_TABLE,)
+            ).fetchone()
+            conn.execute(ROLLUP_SCHEMA)
+            if not exists:
+                _rebuild(conn)
+            for sql in ROLLUP_TRIGGERS:
+                conn.execute(sql)
+        _ready_databases.add(key)
+
+        elapsed = (datetime.now() - started).total_seconds()
+        if elapsed > 1:
+            logger.info(f"Índices e totais diários de print_history criados em {elapsed:.1f}s")
+
+
+def _rebuild(conn) -> None:
+    """Recalcula todos os totais a partir de `print_history` (dentro da transação do chamador)."""
+    conn.execute(f"DELETE FROM {ROLLUP_TABLE}")
+    conn.execute(f"""
+        INSERT INTO {ROLLUP_TABLE} (day, printer, status, store_id, tipo, prints)
+        SELECT {_ROLLUP_KEY.format(row='print_history')}, COUNT(*)
+        FROM print_history
+        GROUP BY 1, 2, 3, 4, 5
+    """)
+
+
+class PrintStats:
+    """
+    Consultas do painel e do histórico sobre os totais diários e os índices.
+    """
+
+    def __init__(self, storage):
+        """
+        Args:
+            storage: Instância de Storage/DataStorage (usa a conexão `conn`)
+        """
+        self.storage = storage
+        ensure_history_schema(storage.conn)
+
+    def rebuild(self) -> None:
+        """Recalcula os totais a partir do histórico (após importações ou correções manuais)."""
+        with self.storage.conn:
+            _rebuild(self.storage.conn)
+        logger.info("Totais diários de impressão recalculados")
+
+    def daily(self, since: Optional[str] = None, until: Optional[str] = None,
+              printer: Optional[str] = None, status: Optional[str] = None,
+              store_id: Optional[str] = None, group_by: str = 'day') -> List[Dict[str, Any]]:
+        """
+        Totais de impressão agrupados por dia, impressora, status, loja ou tipo.
+
+        Args:
+            since: Primeiro dia (AAAA-MM-DD, inclusivo)
+            until: Último dia (AAAA-MM-DD, inclusivo)
+            printer: Filtrar por impressora
+            status: Filtrar por status ('success', 'error'...)
+            store_id: Filtrar por loja
+            group_by: Coluna de agrupamento ('day', 'printer', 'status', 'store_id' ou 'tipo')
+
+        Returns:
+            Lista de dicts com a coluna de agrupamento e 'prints'
+        """
+        if group_by not in ('day', 'printer', 'status', 'store_id', 'tipo'):
+            raise ValueError(f"Agrupamento inválido: {group_by}")
+        conditions, params = [], []
+        for column, value in (('printer', printer), ('status', status), ('store_id', store_id)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(str(value))
+        if since:
+            conditions.append("day >= ?")
+            params.append(since)
+        if until:
+            conditions.append("day <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.storage.conn.execute(
+            f"SELECT {group_by}, SUM(prints) FROM {ROLLUP_TABLE} {where} GROUP BY {group_by} ORDER BY {group_by}",
+            tuple(params)
+        ).fetchall()
+        return [{group_by: row[0], 'prints': row[1]} for row in rows if row[1]]
+
+    def today(self) -> Dict[str, int]:
+        """Impressões de hoje por status."""
+        day = datetime.now().strftime("%Y-%m-%d")
+        return {row['status']: row['prints'] for row in self.daily(since=day, until=day, group_by='status')}
+
+    def last_days(self, days: int = 7, status: Optional[str] = 'success') -> List[Dict[str, Any]]:
+        """Impressões por dia nos últimos `days` dias (inclui hoje)."""
+        since = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        return self.daily(since=since, status=status)
+
+    def was_printed(self, order_number) -> bool:
+        """Indica se o pedido já foi impresso com sucesso (consulta pelo índice de order_id)."""
+        row = self.storage.conn.execute(
+            "SELECT 1 FROM print_history WHERE order_id = ? AND status = 'success' LIMIT 1",
+            (str(order_number),)
+        ).fetchone()
+        return row is not None
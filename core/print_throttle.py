@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Controle de vazão por impressora e contrapressão para o polling.
+
+Cada trabalho é convertido em "segundos de impressora": o maior entre o
+tempo de transmissão (bytes / bytes por segundo) e o tempo de avanço do
+papel (comprimento estimado / velocidade do papel). Um balde de fichas por
+impressora libera os trabalhos nesse ritmo, e a soma dos trabalhos na fila
+fornece o tempo estimado para esvaziá-la, usado para desacelerar o polling
+e informar o operador.
+"""
+
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Tempo de escrita acumulado (s) necessário para atualizar a taxa medida
+MEASURE_WINDOW_SECONDS = 0.5
+
+# Geometria da POS58 (203 dpi = 8 pontos por mm)
+DOTS_PER_MM = 8
+QR_HEIGHT_DOTS = 150            # Altura do QR Code gerado por montar_documento_pos58
+QR_RASTER_BYTES = 48 * 150 + 8  # Bitmap 384x150 em GS v 0
+LINE_HEIGHT_MM = 3.75           # Fonte A (24 pontos) + espaçamento padrão
+BYTES_PER_LINE = 33             # Linha de 32 colunas + quebra
+BASE_LINES_PER_ORDER = 12       # Cabeçalho, cliente, separadores e rodapé
+LINES_PER_ITEM = 3              # Descrição, valores e linha em branco
+
+
+def estimate_order_cost(order: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Estima bytes e comprimento de papel de um pedido antes da formatação.
+
+    Args:
+        order: Dados do pedido
+
+    Returns:
+        Dict com 'bytes' e 'paper_mm'
+    """
+    items = order.get('itens') or []
+    lines = BASE_LINES_PER_ORDER + LINES_PER_ITEM * max(1, len(items))
+    return {
+        'bytes': QR_RASTER_BYTES + lines * BYTES_PER_LINE,
+        'paper_mm': QR_HEIGHT_DOTS / DOTS_PER_MM + lines * LINE_HEIGHT_MM,
+    }
+
+
+class PrinterThrottle:
+    """
+    Limitador de vazão de uma impressora.
+
+    As fichas do balde representam segundos de trabalho da impressora.
+    """
+
+    def __init__(self, name: str, bytes_per_second: float = 960.0,
+                 paper_mm_per_second: float = 50.0, burst_seconds: float = 10.0):
+        """
+        Args:
+            name: Nome da impressora
+            bytes_per_second: Taxa inicial de transmissão (9600 baud ≈ 960 B/s)
+            paper_mm_per_second: Velocidade de avanço do papel
+            burst_seconds: Segundos de trabalho aceitos de imediato (buffer da impressora)
+        """
+        self.name = name
+        self.bytes_per_second = float(bytes_per_second)
+        self.paper_mm_per_second = float(paper_mm_per_second)
+        self.bucket = TokenBucket(rate=1.0, capacity=burst_seconds)
+        self.queued_seconds = 0.0
+        self.queued_jobs = 0
+        self._sample_bytes = 0
+        self._sample_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def job_seconds(self, cost: Dict[str, float]) -> float:
+        """Converte bytes e papel de um trabalho em segundos de impressora."""
+        transmit = cost.get('bytes', 0) / self.bytes_per_second
+        feed = cost.get('paper_mm', 0) / self.paper_mm_per_second
+        return max(transmit, feed)
+
+    def enqueue(self, cost: Dict[str, float]) -> float:
+        """Registra um trabalho na fila e retorna seu custo em segundos."""
+        seconds = self.job_seconds(cost)
+        with self._lock:
+            self.queued_seconds += seconds
+            self.queued_jobs += 1
+        return seconds
+
+    def acquire(self, seconds: float, stop_event: Optional[threading.Event] = None) -> bool:
+        """Aguarda a impressora ter capacidade para o trabalho."""
+        waited = self.bucket.time_until(min(seconds, self.bucket.capacity))
+        if waited > 0:
+            logger.debug(f"Impressora {self.name}: aguardando {waited:.1f}s para liberar o próximo trabalho")
+        return self.bucket.consume(seconds, stop_event=stop_event)
+
+    def complete(self, seconds: float, bytes_sent: Optional[int] = None,
+                 elapsed: Optional[float] = None) -> None:
+        """
+        Remove o trabalho da fila e atualiza a taxa medida da impressora.
+
+        Args:
+            seconds: Custo registrado em `enqueue`
+            bytes_sent: Bytes efetivamente enviados (informado pelo worker)
+            elapsed: Tempo (s) que a escrita levou
+        """
+        with self._lock:
+            self.queued_seconds = max(0.0, self.queued_seconds - seconds)
+            self.queued_jobs = max(0, self.queued_jobs - 1)
+
+            # Escritas curtas são acumuladas até somarem uma janela de medição;
+            # um trabalho isolado raramente leva tempo suficiente sozinho
+            if bytes_sent and elapsed and elapsed > 0:
+                self._sample_bytes += bytes_sent
+                self._sample_seconds += elapsed
+                if self._sample_seconds >= MEASURE_WINDOW_SECONDS:
+                    measured = self._sample_bytes / self._sample_seconds
+                    self._sample_bytes = 0
+                    self._sample_seconds = 0.0
+                    self.bytes_per_second = 0.8 * self.bytes_per_second + 0.2 * measured
+                    logger.debug(f"Impressora {self.name}: taxa medida {measured:.0f} B/s "
+                                 f"(média {self.bytes_per_second:.0f} B/s)")
+
+    def drain_seconds(self) -> float:
+        """Tempo estimado (s) para imprimir tudo o que está na fila."""
+        with self._lock:
+            queued = self.queued_seconds
+        return queued + self.bucket.time_until(0)
+
+
+class PrinterThrottleRegistry:
+    """
+    Conjunto de limitadores, um por impressora, com o estado agregado da fila.
+    """
+
+    def __init__(self, bytes_per_second: float = 960.0, paper_mm_per_second: float = 50.0,
+                 slowdown_after_seconds: float = 60.0):
+        """
+        Args:
+            bytes_per_second: Taxa inicial de transmissão das impressoras
+            paper_mm_per_second: Velocidade de avanço do papel
+            slowdown_after_seconds: Fila (em segundos de impressão) a partir da qual o polling desacelera
+        """
+        self.bytes_per_second = bytes_per_second
+        self.paper_mm_per_second = paper_mm_per_second
+        self.slowdown_after_seconds = slowdown_after_seconds
+        self._throttles: Dict[str, PrinterThrottle] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_printer_config(cls, config: Dict[str, Any]) -> "PrinterThrottleRegistry":
+        """
+        Cria o registro a partir da configuração de `config/impressora_config.json`.
+
+        Args:
+            config: Dicionário com 'baudrate' e, opcionalmente, 'velocidade_papel_mm_s'
+        """
+        baudrate = config.get('baudrate', 9600) or 9600
+        return cls(
+            bytes_per_second=baudrate / 10.0,  # 8N1: 10 bits por byte
+            paper_mm_per_second=config.get('velocidade_papel_mm_s', 50.0) or 50.0,
+        )
+
+    def reconfigure(self, config: Dict[str, Any]) -> None:
+        """
+        Aplica uma nova configuração da impressora sem descartar a fila.
+
+        Os trabalhos já enfileirados mantêm o custo calculado com a configuração
+        anterior; os próximos usam as novas taxas.
+
+        Args:
+            config: Dicionário com 'baudrate' e, opcionalmente, 'velocidade_papel_mm_s'
+        """
+        updated = self.from_printer_config(config)
+        with self._lock:
+            self.bytes_per_second = updated.bytes_per_second
+            self.paper_mm_per_second = updated.paper_mm_per_second
+            throttles = list(self._throttles.values())
+        for throttle in throttles:
+            with throttle._lock:
+                throttle.bytes_per_second = float(updated.bytes_per_second)
+                throttle.paper_mm_per_second = float(updated.paper_mm_per_second)
+        logger.info(f"Controle de vazão reconfigurado: {updated.bytes_per_second:.0f} B/s, "
+                    f"{updated.paper_mm_per_second:.0f} mm/s")
+
+    def for_printer(self, name: Optional[str]) -> PrinterThrottle:
+        """Retorna (criando se necessário) o limitador de uma impressora."""
+        key = name or ''
+        with self._lock:
+            if key not in self._throttles:
+                self._throttles[key] = PrinterThrottle(
+                    key or 'padrão', self.bytes_per_second, self.paper_mm_per_second
+                )
+            return self._throttles[key]
+
+    def enqueue_order(self, printer_name: Optional[str], order: Dict[str, Any]) -> float:
+        """
+        Registra um pedido na fila da impressora.
+
+        Returns:
+            float: Custo estimado em segundos de impressora
+        """
+        return self.for_printer(printer_name).enqueue(estimate_order_cost(order))
+
+    def acquire(self, printer_name: Optional[str], seconds: float,
+                stop_event: Optional[threading.Event] = None) -> bool:
+        """Aguarda a impressora ter capacidade para um trabalho de `seconds`."""
+        return self.for_printer(printer_name).acquire(seconds, stop_event)
+
+    def complete(self, printer_name: Optional[str], seconds: float,
+                 bytes_sent: Optional[int] = None, elapsed: Optional[float] = None) -> None:
+        """Remove o trabalho da fila da impressora e atualiza a taxa medida."""
+        self.for_printer(printer_name).complete(seconds, bytes_sent, elapsed)
+
+    def queued_jobs(self) -> int:
+        """Número total de trabalhos aguardando impressão."""
+        with self._lock:
+            throttles = list(self._throttles.values())
+        return sum(t.queued_jobs for t in throttles)
+
+    def drain_seconds(self) -> float:
+        """
+        Tempo estimado (s) para esvaziar a fila.
+
+        Os trabalhos são despachados em sequência, então os tempos se somam.
+        """
+        with self._lock:
+            throttles = list(self._throttles.values())
+        return sum(t.drain_seconds() for t in throttles)
+
+    def suggested_poll_interval(self, base_interval: float) -> float:
+        """
+        Intervalo de polling sugerido para a fila atual.
+
+        Enquanto a fila exceder `slowdown_after_seconds`, o próximo polling só
+        deve ocorrer depois que ela tiver sido impressa.
+
+        Args:
+            base_interval: Intervalo configurado pelo usuário (s)
+        """
+        drain = self.drain_seconds()
+        if drain <= self.slowdown_after_seconds:
+            return base_interval
+        return max(base_interval, drain)
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Worker de impressão persistente.
+
+Substitui o disparo de um `print_process.py` por pedido (com arquivos JSON
+temporários de entrada e saída) por um único processo de longa duração.
+A aplicação conversa com o worker pelo stdin/stdout do processo usando
+mensagens JSON com prefixo de tamanho, e um supervisor reinicia o worker
+caso ele termine inesperadamente.
+
+O worker importa `nova_impressora` (PIL, qrcode e win32print) uma única vez
+e mantém os handles das impressoras abertos entre os trabalhos.
+
+Opcionalmente, um `PrinterThrottleRegistry` (core/print_throttle.py) limita
+a vazão de cada impressora e estima o tempo para esvaziar a fila.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import struct
+import logging
+import itertools
+import threading
+import subprocess
+import traceback
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+# Cabeçalho de cada mensagem: tamanho do corpo JSON (uint32 big-endian)
+_HEADER = struct.Struct(">I")
+
+# Limite de segurança para uma mensagem (pedidos têm poucos KB)
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+# Diretório raiz da aplicação (onde estão main.py e nova_impressora.py)
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def send_message(stream, message: Dict[str, Any]) -> None:
+    """
+    Escreve uma mensagem JSON com prefixo de tamanho no stream.
+
+    Args:
+        stream: Stream binário de escrita
+        message: Dicionário serializável em JSON
+    """
+    body = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    stream.write(_HEADER.pack(len(body)) + body)
+    stream.flush()
+
+
+def _read_exact(stream, size: int) -> Optional[bytes]:
+    """Lê exatamente `size` bytes ou retorna None se o stream terminar antes."""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def receive_message(stream) -> Optional[Dict[str, Any]]:
+    """
+    Lê uma mensagem JSON com prefixo de tamanho do stream.
+
+    Args:
+        stream: Stream binário de leitura
+
+    Returns:
+        Dict com a mensagem ou None se o stream foi fechado
+    """
+    header = _read_exact(stream, _HEADER.size)
+    if header is None:
+        return None
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Mensagem muito grande recebida do canal de impressão: {size} bytes")
+    body = _read_exact(stream, size)
+    if body is None:
+        return None
+    return json.loads(body.decode('utf-8'))
+
+
+class PrintWorkerError(Exception):
+    """Erro de comunicação com o worker de impressão."""
+    pass
+
+
+class PrintWorkerTimeout(PrintWorkerError):
+    """O worker não respondeu a tempo; o trabalho pode ter chegado à impressora."""
+    pass
+
+
+class PrintWorkerClient:
+    """
+    Cliente e supervisor do worker de impressão persistente.
+
+    Os pedidos são enfileirados com `submit` e enviados em ordem por uma
+    thread despachante, sem bloquear a thread da interface. O resultado de
+    cada trabalho é entregue ao callback informado.
+
+    Um trabalho sem resposta dentro do tempo limite é entregue ao callback
+    como enviado (sucesso): o worker é reiniciado, mas os bytes podem já
+    estar no spooler, e tratá-lo como falha permitiria imprimir o pedido de
+    novo por outro caminho (polling, webhook, backfill).
+    """
+
+    def __init__(self, request_timeout: float = 30.0, max_restarts: int = 5,
+                 restart_window: float = 60.0, throttles=None, timeout_per_job_second: float = 2.0):
+        """
+        Inicializa o cliente do worker.
+
+        Args:
+            request_timeout: Tempo máximo (s) aguardando a resposta de um trabalho, além do tempo
+                estimado de impressão
+            max_restarts: Reinícios permitidos dentro de `restart_window`
+            restart_window: Janela (s) usada para limitar reinícios em sequência
+            throttles: PrinterThrottleRegistry opcional para limitar a vazão por impressora
+            timeout_per_job_second: Segundos de espera acrescentados por segundo estimado de
+                impressão (com `throttles`), para documentos longos em impressoras lentas
+        """
+        self.request_timeout = request_timeout
+        self.timeout_per_job_second = timeout_per_job_second
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.throttles = throttles
+
+        self._process: Optional[subprocess.Popen] = None
+        self._process_lock = threading.Lock()
+        self._request_lock = threading.Lock()
+        self._restart_times = []
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._job_ids = itertools.count(1)
+        self._running = False
+        self._dispatcher: Optional[threading.Thread] = None
+        self._supervisor: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Inicia o processo worker, o despachante e o supervisor."""
+        if self._running:
+            return
+        self._running = True
+        self._stop_event.clear()
+        self._ensure_process()
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="PrintWorkerDispatcher", daemon=True)
+        self._dispatcher.start()
+        self._supervisor = threading.Thread(target=self._supervise_loop, name="PrintWorkerSupervisor", daemon=True)
+        self._supervisor.start()
+        logger.info("Worker de impressão persistente iniciado")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Encerra o worker de forma ordenada.
+
+        Args:
+            timeout: Tempo máximo (s) aguardando o processo terminar
+        """
+        if not self._running:
+            return
+        self._running = False
+        self._stop_event.set()
+        self._jobs.put(None)  # Acordar o despachante
+
+        if self._dispatcher:
+            self._dispatcher.join(timeout)
+
+        with self._process_lock:
+            process = self._process
+            self._process = None
+        if process and process.poll() is None:
+            try:
+                send_message(process.stdin, {'type': 'shutdown'})
+                process.wait(timeout)
+            except Exception:
+                logger.warning("Worker de impressão não encerrou normalmente, finalizando processo")
+                process.kill()
+        logger.info("Worker de impressão encerrado")
+
+    def is_alive(self) -> bool:
+        """Retorna True se o processo worker está em execução."""
+        process = self._process
+        return process is not None and process.poll() is None
+
+    def pending(self) -> int:
+        """Retorna o número de trabalhos aguardando envio ao worker."""
+        return self._jobs.qsize()
+
+    # ------------------------------------------------------------------
+    # API de impressão
+    # ------------------------------------------------------------------
+
+    def submit(self, order: Dict[str, Any], printer_name: Optional[str] = None,
+               callback: Optional[Callable[[Dict[str, Any], bool, str], None]] = None) -> int:
+        """
+        Enfileira um pedido para impressão.
+
+        Args:
+            order: Dados do pedido
+            printer_name: Nome da impressora (None usa a padrão do Windows)
+            callback: Função chamada com (pedido, sucesso, mensagem) ao final
+
+        Returns:
+            int: Identificador do trabalho
+        """
+        job_id = next(self._job_ids)
+        cost = 0.0
+        if self.throttles is not None:
+            cost = self.throttles.enqueue_order(printer_name, order)
+        self._jobs.put({
+            'id': job_id,
+            'order': order,
+            'printer': printer_name,
+            'callback': callback,
+            'cost': cost,
+        })
+        return job_id
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+
+    def _spawn(self) -> subprocess.Popen:
+        """Cria o processo worker."""
+        creationflags = 0
+        if os.name == 'nt':
+            creationflags = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+        logger.info("Iniciando processo worker de impressão")
+        return subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            cwd=APP_ROOT,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None,  # Logs do worker vão para o console/arquivo herdado
+            creationflags=creationflags,
+        )
+
+    def _ensure_process(self) -> subprocess.Popen:
+        """Garante que existe um processo worker vivo, reiniciando se necessário."""
+        with self._process_lock:
+            if self._process is not None and self._process.poll() is None:
+                return self._process
+
+            if self._process is not None:
+                logger.warning(f"Worker de impressão terminou (código {self._process.returncode}), reiniciando")
+
+            now = time.monotonic()
+            self._restart_times = [t for t in self._restart_times if now - t < self.restart_window]
+            if len(self._restart_times) >= self.max_restarts:
+                raise PrintWorkerError(
+                    f"Worker de impressão reiniciado {len(self._restart_times)} vezes em "
+                    f"{int(self.restart_window)}s, aguardando antes de tentar novamente"
+                )
+            self._restart_times.append(now)
+            self._process = self._spawn()
+            return self._process
+
+    def job_timeout(self, cost: float) -> float:
+        """Tempo limite (s) de um trabalho com custo estimado de `cost` segundos de impressora."""
+        return self.request_timeout + self.timeout_per_job_second * max(0.0, cost)
+
+    def _request(self, request: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Envia uma requisição e aguarda a resposta correspondente."""
+        with self._request_lock:
+            return self._request_locked(request, timeout or self.request_timeout)
+
+    def _request_locked(self, request: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """Implementação de `_request`; o canal atende uma requisição por vez."""
+        process = self._ensure_process()
+        response_box = {}
+
+        def read_response():
+            try:
+                response_box['response'] = receive_message(process.stdout)
+            except Exception as e:
+                response_box['error'] = e
+
+        try:
+            send_message(process.stdin, request)
+        except (BrokenPipeError, OSError) as e:
+            self._discard_process(process)
+            raise PrintWorkerError(f"Falha ao enviar trabalho ao worker de impressão: {e}")
+
+        reader = threading.Thread(target=read_response, daemon=True)
+        reader.start()
+        reader.join(timeout)
+
+        if reader.is_alive():
+            logger.error(f"Worker de impressão não respondeu em {timeout:.0f}s, reiniciando")
+            self._discard_process(process)
+            raise PrintWorkerTimeout(f"Tempo limite de {timeout:.0f}s excedido aguardando o worker de impressão")
+
+        if 'error' in response_box or response_box.get('response') is None:
+            self._discard_process(process)
+            raise PrintWorkerError(f"Worker de impressão encerrou durante o trabalho: {response_box.get('error')}")
+
+        return response_box['response']
+
+    def _discard_process(self, process: subprocess.Popen) -> None:
+        """Finaliza um processo worker com problema para que seja recriado."""
+        with self._process_lock:
+            if self._process is process:
+                self._process = None
+        try:
+            if process.poll() is None:
+                process.kill()
+                process.wait(1)
+        except Exception as e:
+            logger.warning(f"Erro ao finalizar worker de impressão: {e}")
+
+    def _dispatch_loop(self) -> None:
+        """Envia os trabalhos enfileirados ao worker, um por vez."""
+        while self._running:
+            job = self._jobs.get()
+            if job is None:
+                break
+
+            order = job['order']
+            order_number = order.get('numero', order.get('id', 'desconhecido'))
+            if self.throttles is not None:
+                if not self.throttles.acquire(job['printer'], job['cost'], self._stop_event):
+                    break  # Encerramento solicitado durante a espera
+
+            response = {}
+            try:
+                response = self._request({
+                    'type': 'print',
+                    'id': job['id'],
+                    'order': order,
+                    'printer': job['printer'],
+                }, timeout=self.job_timeout(job['cost']))
+                success = bool(response.get('success'))
+                message = response.get('message', '')
+            except PrintWorkerTimeout as e:
+                # Sem resposta não se sabe se a impressora recebeu o trabalho: não reimprimir
+                logger.warning(f"Pedido {order_number} considerado enviado sem confirmação do worker: {e}")
+                success = True
+                message = f"Enviado sem confirmação da impressora ({e})"
+            except PrintWorkerError as e:
+                success = False
+                message = str(e)
+            except Exception as e:
+                logger.error(f"Erro inesperado ao despachar pedido {order_number}: {e}")
+                logger.error(traceback.format_exc())
+                success = False
+                message = str(e)
+
+            if success:
+                logger.info(f"Pedido {order_number} impresso pelo worker")
+            else:
+                logger.error(f"Falha ao imprimir pedido {order_number} no worker: {message}")
+
+            if self.throttles is not None:
+                self.throttles.complete(job['printer'], job['cost'],
+                                        response.get('bytes'), response.get('elapsed'))
+
+            callback = job.get('callback')
+            if callback:
+                try:
+                    callback(order, success, message)
+                except Exception as e:
+                    logger.error(f"Erro no callback de impressão do pedido {order_number}: {e}")
+
+    def _supervise_loop(self, interval: float = 2.0) -> None:
+        """Reinicia o worker em segundo plano caso ele termine inesperadamente."""
+        while not self._stop_event.wait(interval):
+            if not self._running:
+                break
+            if not self.is_alive():
+                try:
+                    self._ensure_process()
+                except PrintWorkerError as e:
+                    logger.error(str(e))
+
+
+# ----------------------------------------------------------------------
+# Lado do processo worker
+# ----------------------------------------------------------------------
+
+def _run_worker() -> int:
+    """Loop principal do processo worker."""
+    # O canal de mensagens usa o stdout original; qualquer print() ou
+    # handler de logging que escreva em sys.stdout vai para o stderr.
+    channel_in = sys.stdin.buffer
+    channel_out = sys.stdout.buffer
+    sys.stdout = sys.stderr
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - PrintWorker - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+
+    # Importações pesadas feitas uma única vez por processo
+    import win32print
+    import nova_impressora
+
+    handles = {}
+
+    def get_handle(printer_name):
+        if printer_name not in handles:
+            handles[printer_name] = win32print.OpenPrinter(printer_name)
+        return handles[printer_name]
+
+    def drop_handle(printer_name):
+        hprinter = handles.pop(printer_name, None)
+        if hprinter:
+            try:
+                win32print.ClosePrinter(hprinter)
+            except Exception:
+                pass
+
+    logger.info(f"Worker de impressão pronto (PID {os.getpid()})")
+
+    while True:
+        message = receive_message(channel_in)
+        if message is None or message.get('type') == 'shutdown':
+            break
+
+        response = {'type': 'result', 'id': message.get('id'), 'success': False, 'message': ''}
+        try:
+            order = message.get('order')
+            if not isinstance(order, dict):
+                raise ValueError("Pedido inválido: não é um dicionário")
+
+            printer_name = message.get('printer') or win32print.GetDefaultPrinter()
+            numero_pedido, documento = nova_impressora.montar_documento_pos58(order)
+            started = time.monotonic()
+            try:
+                response['bytes'] = nova_impressora.enviar_documento_raw(get_handle(printer_name), documento)
+                response['elapsed'] = time.monotonic() - started
+            except Exception:
+                # Handle pode ter ficado inválido (impressora reiniciada, fila removida)
+                drop_handle(printer_name)
+                raise
+
+            response['success'] = True
+            response['message'] = f"Pedido {numero_pedido} enviado para {printer_name}"
+        except Exception as e:
+            logger.error(f"Erro ao imprimir pedido: {e}")
+            logger.error(traceback.format_exc())
+            response['message'] = str(e)
+
+        send_message(channel_out, response)
+
+    for printer_name in list(handles):
+        drop_handle(printer_name)
+    logger.info("Worker de impressão finalizado")
+    return 0
+
+
+if __name__ == "__main__":
+    # Executado como script pelo supervisor: garantir acesso a nova_impressora
+    sys.path.insert(0, APP_ROOT)
+    sys.exit(_run_worker())
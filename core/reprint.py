@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Reimpressão em lote a partir do histórico de impressão.
+
+Seleciona pedidos em `print_history` (com os dados completos de
+`orders_cache`) por período, loja, status ou faixa de números, formata cada
+pedido com o layout POS58 e envia vários pedidos por trabalho RAW,
+respeitando um limite de vazão. Os bytes já formatados ficam guardados em
+`print_documents` e são reaproveitados nas próximas reimpressões.
+
+Uso pela linha de comando:
+
+    python -m core.reprint --desde 2025-04-16T06:00 --ate 2025-04-16T14:00 --loja 204848504
+"""
+
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Separador entre pedidos coalescidos no mesmo trabalho (avanço de papel + corte parcial)
+ORDER_SEPARATOR = b'\n\n\n\x1D\x56\x01'
+
+
+def _order_digest(order: Dict[str, Any]) -> str:
+    """Resumo estável do conteúdo de um pedido, usado como chave do documento formatado."""
+    return hashlib.sha1(json.dumps(order, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class FormattedDocumentCache:
+    """
+    Cache persistente dos bytes ESC/POS já formatados de cada pedido.
+
+    Os documentos são gravados criptografados na tabela `print_documents` do
+    mesmo banco do `Storage`, indexados pelo número do pedido e por um resumo
+    do conteúdo (qualquer alteração no pedido invalida o documento).
+    """
+
+    def __init__(self, storage):
+        """
+        Args:
+            storage: Instância de Storage/DataStorage
+        """
+        self.storage = storage
+        self.storage.conn.execute("""
+            CREATE TABLE IF NOT EXISTS print_documents (
+                order_number TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                document BLOB NOT NULL,  -- Bytes ESC/POS criptografados
+                created_at TEXT NOT NULL
+            )
+        """)
+        self.storage.conn.commit()
+
+    def get(self, order_number: str, digest: str) -> Optional[bytes]:
+        """Retorna o documento formatado, se existir para o mesmo conteúdo do pedido."""
+        row = self.storage.conn.execute(
+            "SELECT digest, document FROM print_documents WHERE order_number = ?",
+            (str(order_number),)
+        ).fetchone()
+        if not row or row[0] != digest:
+            return None
+        try:
+            return self.storage.fernet.decrypt(row[1])
+        except Exception as e:
+            logger.warning(f"Documento em cache inválido para o pedido {order_number}: {e}")
+            return None
+
+    def put(self, order_number: str, digest: str, document: bytes) -> None:
+        """Grava (ou substitui) o documento formatado de um pedido."""
+        self.storage.conn.execute(
+            """
+            INSERT OR REPLACE INTO print_documents (order_number, digest, document, created_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            (str(order_number), digest, self.storage.fernet.encrypt(document), datetime.now().isoformat())
+        )
+        self.storage.conn.commit()
+
+
+class ReprintEngine:
+    """
+    Motor de reimpressão em lote sobre `print_history` e `orders_cache`.
+    """
+
+    def __init__(self, storage, send_raw: Callable[[bytes, Optional[str], str], bool],
+                 batch_size: int = 10, max_orders_per_minute: int = 60, order_cache=None):
+        """
+        Args:
+            storage: Instância de Storage/DataStorage
+            send_raw: Função que envia (documento, impressora, título) e retorna True em caso de sucesso
+            batch_size: Número de pedidos agrupados em cada trabalho de impressão
+            max_orders_per_minute: Limite de vazão da reimpressão
+            order_cache: OrderCache com os pedidos já decodificados (opcional)
+        """
+        from core.print_stats import ensure_history_schema
+
+        self.storage = storage
+        self.order_cache = order_cache
+        ensure_history_schema(storage.conn)
+        self.send_raw = send_raw
+        self.batch_size = max(1, batch_size)
+        self.max_orders_per_minute = max(1, max_orders_per_minute)
+        self.documents = FormattedDocumentCache(storage)
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        """Interrompe a reimpressão em andamento após o trabalho atual."""
+        self._cancelled = True
+
+    # ------------------------------------------------------------------
+    # Seleção
+    # ------------------------------------------------------------------
+
+    def select_orders(self, since: Optional[str] = None, until: Optional[str] = None,
+                      store_id: Optional[str] = None, status: Optional[str] = 'success',
+                      number_from: Optional[int] = None, number_to: Optional[int] = None,
+                      chunk_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        Seleciona os pedidos a reimprimir, em ordem da primeira impressão.
+
+        Args:
+            since: Data/hora ISO inicial (inclusiva) de `printed_at`
+            until: Data/hora ISO final (exclusiva) de `printed_at`
+            store_id: ID da loja no Bling (`loja.id`)
+            status: Status no histórico ('success', 'error'...) ou None para todos
+            number_from: Menor número de pedido
+            number_to: Maior número de pedido
+            chunk_size: Linhas lidas do banco por vez
+
+        Yields:
+            Dict com 'order_number', 'printed_at' e 'order' (None se o pedido não está em cache)
+        """
+        sql = """
+            SELECT ph.order_id AS order_number, MIN(ph.printed_at) AS printed_at, oc.order_data,
+                   MAX(ph.store_id) AS store_id
+            FROM print_history ph
+            LEFT JOIN orders_cache oc ON oc.order_number = ph.order_id
+        """
+        conditions = []
+        params = []
+        if since:
+            conditions.append("ph.printed_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("ph.printed_at < ?")
+            params.append(until)
+        if store_id:
+            # Registros anteriores à coluna store_id não têm a loja: conferida no pedido abaixo
+            conditions.append("(ph.store_id = ? OR ph.store_id IS NULL)")
+            params.append(str(store_id))
+        if status:
+            conditions.append("ph.status = ?")
+            params.append(status)
+        if number_from is not None:
+            conditions.append("CAST(ph.order_id AS INTEGER) >= ?")
+            params.append(int(number_from))
+        if number_to is not None:
+            conditions.append("CAST(ph.order_id AS INTEGER) <= ?")
+            params.append(int(number_to))
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " GROUP BY ph.order_id ORDER BY MIN(ph.printed_at)"
+
+        cursor = self.storage.conn.cursor()
+        cursor.execute(sql, tuple(params))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                order = self.order_cache.peek(row[0], use_number=True) if self.order_cache else None
+                if order is None and row[2] is not None:
+                    try:
+                        decrypted = self.storage._decrypt(row[2])
+                        order = json.loads(decrypted) if isinstance(decrypted, str) else decrypted
+                        if self.order_cache:
+                            self.order_cache.remember(order)
+                    except Exception as e:
+                        logger.warning(f"Não foi possível ler o pedido {row[0]} do cache: {e}")
+
+                if store_id and row[3] is None:
+                    # Sem a loja no histórico nem os dados do pedido não é possível confirmar a loja
+                    if order is None or str((order.get('loja') or {}).get('id', '')) != str(store_id):
+                        continue
+
+                yield {'order_number': row[0], 'printed_at': row[1], 'order': order}
+
+    # ------------------------------------------------------------------
+    # Formatação e impressão
+    # ------------------------------------------------------------------
+
+    def _document_for(self, order_number: str, order: Dict[str, Any]) -> Tuple[bytes, bool]:
+        """
+        Retorna os bytes formatados do pedido, usando o cache quando possível.
+
+        Returns:
+            tuple: (documento, True se veio do cache)
+        """
+        digest = _order_digest(order)
+        document = self.documents.get(order_number, digest)
+        if document is not None:
+            return document, True
+
+        from nova_impressora import montar_documento_pos58
+        _, document = montar_documento_pos58(dict(order))
+        self.documents.put(order_number, digest, document)
+        return document, False
+
+    def reprint(self, selection: Iterator[Dict[str, Any]], printer_name: Optional[str] = None,
+                user: Optional[str] = None,
+                progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Reimprime os pedidos selecionados em trabalhos coalescidos.
+
+        Args:
+            selection: Resultado de `select_orders`
+            printer_name: Impressora de destino (None usa a padrão)
+            user: Usuário registrado no histórico como autor da reimpressão
+            progress: Callback chamado após cada trabalho com o resumo parcial
+
+        Returns:
+            Dict: Resumo com 'selected', 'printed', 'failed', 'missing' e 'cached'
+        """
+        from core.print_journal import write_print_history_batch
+
+        self._cancelled = False
+        summary = {'selected': 0, 'printed': 0, 'failed': 0, 'missing': 0, 'cached': 0, 'elapsed': 0.0}
+        started = time.monotonic()
+        seconds_per_order = 60.0 / self.max_orders_per_minute
+        next_slot = started
+
+        batch = []  # (order_number, order, document)
+
+        def flush_batch():
+            nonlocal next_slot
+            if not batch:
+                return
+
+            # Limite de vazão: cada pedido ocupa um intervalo fixo
+            wait = next_slot - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            next_slot = max(next_slot, time.monotonic()) + seconds_per_order * len(batch)
+
+            numbers = [number for number, _, _ in batch]
+            document = ORDER_SEPARATOR.join(doc for _, _, doc in batch) + ORDER_SEPARATOR
+            title = f"Reimpressão AcriPrint ({numbers[0]}-{numbers[-1]})"
+            try:
+                ok = bool(self.send_raw(document, printer_name, title))
+            except Exception as e:
+                logger.error(f"Erro ao enviar lote de reimpressão {numbers}: {e}")
+                ok = False
+
+            if ok:
+                summary['printed'] += len(batch)
+                write_print_history_batch(self.storage, [
+                    {
+                        'order_id': number,
+                        'items': order.get('itens', []),
+                        'printer': printer_name or '',
+                        'status': 'success',
+                        'user': user,
+                        'tipo': 'reimpressao',
+                        'store_id': (order.get('loja') or {}).get('id'),
+                    }
+                    for number, order, _ in batch
+                ])
+            else:
+                summary['failed'] += len(batch)
+            batch.clear()
+
+            summary['elapsed'] = time.monotonic() - started
+            if progress:
+                progress(dict(summary))
+
+        for entry in selection:
+            if self._cancelled:
+                logger.info("Reimpressão em lote cancelada")
+                break
+
+            summary['selected'] += 1
+            order_number = entry['order_number']
+            order = entry['order']
+            if order is None:
+                logger.warning(f"Pedido {order_number} não está no cache local e não será reimpresso")
+                summary['missing'] += 1
+                continue
+
+            try:
+                document, from_cache = self._document_for(order_number, order)
+                batch.append((order_number, order, document))
+                if from_cache:
+                    summary['cached'] += 1
+            except Exception as e:
+                logger.error(f"Erro ao formatar pedido {order_number} para reimpressão: {e}")
+                summary['failed'] += 1
+                continue
+
+            if len(batch) >= self.batch_size:
+                flush_batch()
+
+        flush_batch()
+        summary['elapsed'] = time.monotonic() - started
+        logger.info(
+            f"Reimpressão em lote concluída: {summary['printed']} impressos, {summary['failed']} falhas, "
+            f"{summary['missing']} sem dados, {summary['cached']} do cache em {summary['elapsed']:.1f}s"
+        )
+        return summary
+
+
+def direct_sender() -> Callable[[bytes, Optional[str], str], bool]:
+    """
+    Cria uma função de envio que imprime diretamente pelo win32print,
+    mantendo o handle da impressora aberto durante toda a reimpressão.
+    """
+    import win32print
+    from nova_impressora import enviar_documento_raw
+
+    handles = {}
+
+    def send(document: bytes, printer_name: Optional[str], title: str) -> bool:
+        printer_name = printer_name or win32print.GetDefaultPrinter()
+        if printer_name not in handles:
+            handles[printer_name] = win32print.OpenPrinter(printer_name)
+        try:
+            enviar_documento_raw(handles[printer_name], document, title)
+            return True
+        except Exception:
+            win32print.ClosePrinter(handles.pop(printer_name))
+            raise
+
+    return send
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Ponto de entrada da linha de comando."""
+    parser = argparse.ArgumentParser(description="AcriPrint - Reimpressão em lote a partir do histórico")
+    parser.add_argument("--desde", help="Data/hora inicial (ISO, ex: 2025-04-16T06:00)")
+    parser.add_argument("--ate", help="Data/hora final, exclusiva (ISO)")
+    parser.add_argument("--loja", help="ID da loja no Bling")
+    parser.add_argument("--status", default="success", help="Status no histórico ('todos' para não filtrar)")
+    parser.add_argument("--numero-de", type=int, help="Menor número de pedido")
+    parser.add_argument("--numero-ate", type=int, help="Maior número de pedido")
+    parser.add_argument("--impressora", help="Nome da impressora (padrão: a configurada)")
+    parser.add_argument("--lote", type=int, default=10, help="Pedidos por trabalho de impressão")
+    parser.add_argument("--max-por-minuto", type=int, default=60, help="Limite de pedidos por minuto")
+    parser.add_argument("--simular", action="store_true", help="Apenas listar os pedidos selecionados")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from data.storage import DataStorage
+    from core.crypto import install_cipher
+    from core.config_snapshot import install_config_store
+    from core.order_cache import install_order_cache
+
+    # Mesmos componentes que o main.py instala no Storage: sem o cifrador, os pedidos
+    # gravados pela aplicação no formato comprimido não seriam legíveis
+    storage = DataStorage().storage
+    install_cipher(storage)
+    config_store = install_config_store(storage)
+    order_cache = install_order_cache(storage, max_entries=config_store.current.order_cache_size)
+
+    status = None if args.status == 'todos' else args.status
+    printer_name = args.impressora or config_store.current.printer or None
+
+    if args.simular:
+        engine = ReprintEngine(storage, send_raw=lambda *_: True, order_cache=order_cache)
+    else:
+        engine = ReprintEngine(storage, direct_sender(), batch_size=args.lote,
+                               max_orders_per_minute=args.max_por_minuto, order_cache=order_cache)
+
+    selection = engine.select_orders(
+        since=args.desde, until=args.ate, store_id=args.loja, status=status,
+        number_from=args.numero_de, number_to=args.numero_ate
+    )
+
+    if args.simular:
+        total = 0
+        for entry in selection:
+            total += 1
+            situacao = "ok" if entry['order'] is not None else "sem dados no cache"
+            print(f"{entry['order_number']}  {entry['printed_at']}  {situacao}")
+        print(f"\n{total} pedidos selecionados")
+        return 0
+
+    def show_progress(summary):
+        print(f"\rImpressos: {summary['printed']}  Falhas: {summary['failed']}  "
+              f"Sem dados: {summary['missing']}  Tempo: {summary['elapsed']:.0f}s", end="", flush=True)
+
+    summary = engine.reprint(selection, printer_name=printer_name, user='cli', progress=show_progress)
+    print()
+    order_cache.flush()
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
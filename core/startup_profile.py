@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Perfil e orçamento de tempo da inicialização até a janela de login.
+
+O `main.py` marca as fases da inicialização (importações, armazenamento,
+janela de login) com um StartupProfile e registra os tempos no log; os
+serviços de impressão e pedidos só são importados depois do login. Este
+módulo só usa a biblioteca padrão: é importado antes de qualquer módulo
+pesado para que a primeira marca inclua o custo das importações.
+
+Uso (a partir da raiz do projeto):
+    python -m core.startup_profile                     # módulos mais caros ao importar main
+    python -m core.startup_profile --orcamento-ms 2500 # falha se o login demorar mais
+
+A medição do login executa `main.py --startup-benchmark`, que imprime
+STARTUP_LOGIN_READY assim que a janela de login é exibida e encerra; o tempo
+é medido de fora (inclui a inicialização do interpretador).
+"""
+
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOGIN_READY_MARKER = "STARTUP_LOGIN_READY"
+
+DEFAULT_BUDGET_MS = 3000
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+class StartupProfile:
+    """
+    Marcas de tempo das fases da inicialização.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self._last = self.started
+
+    def mark(self, phase: str) -> float:
+        """
+        Encerra uma fase da inicialização.
+
+        Args:
+            phase: Nome da fase
+
+        Returns:
+            float: Duração da fase em milissegundos
+        """
+        now = time.perf_counter()
+        elapsed = (now - self._last) * 1000
+        self.phases.append((phase, elapsed))
+        self._last = now
+        return elapsed
+
+    def elapsed_ms(self) -> float:
+        """Tempo desde a criação do perfil, em milissegundos."""
+        return (time.perf_counter() - self.started) * 1000
+
+    def report(self) -> str:
+        """Registra no log e retorna o resumo das fases."""
+        summary = ", ".join(f"{phase} {elapsed:.0f} ms" for phase, elapsed in self.phases)
+        text = f"Inicialização em {self.elapsed_ms():.0f} ms ({summary})"
+        logger.info(text)
+        return text
+
+
+def import_timings(module: str = "main", python: Optional[str] = None) -> List[Tuple[str, int, int]]:
+    """
+    Mede o custo de importação de cada módulo com `python -X importtime`.
+
+    Args:
+        module: Módulo a importar (o `main` não executa main() ao ser importado)
+        python: Interpretador a usar (padrão: o atual)
+
+    Returns:
+        List[Tuple[str, int, int]]: (módulo, próprio µs, acumulado µs), do mais caro ao mais barato
+    """
+    result = subprocess.run(
+        [python or sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        last_line = (result.stderr.strip().splitlines() or [""])[-1]
+        raise RuntimeError(f"Falha ao importar {module}: {last_line}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            timings.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    timings.sort(key=lambda item: item[2], reverse=True)
+    return timings
+
+
+def measure_login_time(python: Optional[str] = None, timeout: float = 60.0) -> float:
+    """
+    Executa `main.py --startup-benchmark` e mede o tempo até a janela de login.
+
+    Args:
+        python: Interpretador a usar (padrão: o atual)
+        timeout: Tempo máximo de espera (s)
+
+    Returns:
+        float: Milissegundos entre o início do processo e a janela de login
+    """
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [python or sys.executable, "main.py", "--startup-benchmark"],
+        cwd=APP_ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    try:
+        deadline = started + timeout
+        for line in process.stdout:
+            if line.startswith(LOGIN_READY_MARKER):
+                return (time.perf_counter() - started) * 1000
+            if time.perf_counter() > deadline:
+                break
+        raise RuntimeError("A janela de login não foi exibida")
+    finally:
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Relatório de importações e verificação do orçamento de tempo até o login."""
+    import argparse
+    import statistics
+
+    parser = argparse.ArgumentParser(description="Perfil de inicialização do AcriPrint")
+    parser.add_argument("--importacoes", type=int, default=25,
+                        help="Quantos módulos listar no relatório de importações (0 desativa)")
+    parser.add_argument("--orcamento-ms", type=float, default=None,
+                        help=f"Falhar se o tempo até o login passar deste valor (ex.: {DEFAULT_BUDGET_MS})")
+    parser.add_argument("--execucoes", type=int, default=3,
+                        help="Execuções para a mediana do tempo até o login")
+    args = parser.parse_args(argv)
+
+    if args.importacoes > 0:
+        try:
+            timings = import_timings()
+        except RuntimeError as e:
+            print(e)
+            return 2
+        total = next((cumulative for name, _, cumulative in timings if name == "main"), 0)
+        print(f"Importação de main: {total / 1000:.0f} ms")
+        print(f"{'módulo':<50} {'próprio':>10} {'acumulado':>10}")
+        for name, own, cumulative in timings[:args.importacoes]:
+            print(f"{name:<50} {own / 1000:>8.1f}ms {cumulative / 1000:>8.1f}ms")
+
+    if args.orcamento_ms is None:
+        return 0
+
+    samples = []
+    for _ in range(max(1, args.execucoes)):
+        try:
+            samples.append(measure_login_time())
+        except RuntimeError as e:
+            print(e)
+            return 2
+    median = statistics.median(samples)
+    print(f"Tempo até a janela de login: mediana {median:.0f} ms "
+          f"({', '.join(f'{s:.0f}' for s in samples)}), orçamento {args.orcamento_ms:.0f} ms")
+    if median > args.orcamento_ms:
+        print("Orçamento de inicialização excedido")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
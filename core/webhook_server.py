@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Receptor local de webhooks de pedidos do Bling.
+
+Um pequeno servidor HTTP recebe as notificações de pedidos, verifica a
+assinatura HMAC-SHA256 enviada pelo Bling, descarta entregas repetidas e
+entrega cada pedido diretamente ao fluxo de impressão, eliminando a espera
+do intervalo de polling. O polling continua ativo em baixa frequência como
+varredura de reconciliação.
+
+Também aceita o corpo de um pedido "puro" (como os arquivos pedido_*.json),
+o que permite testar o fluxo localmente:
+
+    python -m core.webhook_server --porta 8765
+    python -m core.webhook_server --enviar pedido_114152.json --url http://127.0.0.1:8765/webhooks/bling
+"""
+
+import sys
+import hmac
+import json
+import queue
+import hashlib
+import logging
+import argparse
+import threading
+import traceback
+import urllib.request
+import urllib.error
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Optional, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+DEFAULT_PATH = '/webhooks/bling'
+
+# Cabeçalho com a assinatura do corpo (formato "sha256=<hex>")
+SIGNATURE_HEADER = 'X-Bling-Signature-256'
+
+# Eventos que resultam em impressão. Atualizações (situação, nota fiscal) chegam também
+# para pedidos antigos, que depois de reiniciar não estão no conjunto em memória e seriam
+# reimpressos; pedidos alterados ficam com a varredura de reconciliação do polling
+ORDER_EVENTS = ('order.created',)
+
+# Corpo máximo aceito (pedidos têm poucos KB)
+MAX_BODY_SIZE = 1024 * 1024
+
+
+def sign_payload(body: bytes, secret: str) -> str:
+    """Calcula o valor do cabeçalho de assinatura para um corpo."""
+    digest = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def verify_signature(body: bytes, header_value: Optional[str], secret: str) -> bool:
+    """
+    Verifica a assinatura HMAC-SHA256 de um webhook.
+
+    Args:
+        body: Corpo bruto da requisição
+        header_value: Valor do cabeçalho de assinatura
+        secret: Segredo compartilhado (client secret do aplicativo Bling)
+
+    Returns:
+        bool: True se a assinatura confere
+    """
+    if not header_value:
+        return False
+    return hmac.compare_digest(sign_payload(body, secret), header_value.strip())
+
+
+def extract_order(payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Extrai o evento e o pedido de um webhook.
+
+    Aceita o envelope do Bling ({"eventId", "event", "data": {...}}) ou um
+    pedido puro, tratado como "order.created".
+
+    Returns:
+        tuple: (id do evento, nome do evento, pedido) — pedido None se não houver
+    """
+    if isinstance(payload.get('data'), dict) and 'event' in payload:
+        return payload.get('eventId'), payload.get('event'), payload['data']
+    if 'id' in payload or 'numero' in payload:
+        return None, 'order.created', payload
+    return payload.get('eventId'), payload.get('event'), None
+
+
+class RecentIdSet:
+    """
+    Conjunto limitado (LRU) de identificadores já vistos, thread-safe.
+    """
+
+    def __init__(self, maxlen: int = 5000):
+        self.maxlen = maxlen
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key) -> bool:
+        """
+        Registra um identificador.
+
+        Returns:
+            bool: True se é novo, False se já tinha sido visto
+        """
+        if key is None:
+            return True
+        key = str(key)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return False
+            self._items[key] = True
+            if len(self._items) > self.maxlen:
+                self._items.popitem(last=False)
+            return True
+
+    def discard(self, key) -> None:
+        """Remove um identificador (ex.: entrega que falhou e deve ser aceita de novo)."""
+        with self._lock:
+            self._items.pop(str(key), None)
+
+
+class BlingWebhookServer:
+    """
+    Servidor HTTP local que recebe webhooks de pedidos do Bling.
+
+    As requisições são respondidas assim que validadas (202); a busca de
+    detalhes e a entrega ao fluxo de impressão acontecem em uma thread própria.
+    """
+
+    def __init__(self, on_order: Callable[[Dict[str, Any]], None], secret: Optional[str] = None,
+                 host: str = '127.0.0.1', port: int = DEFAULT_PORT, path: str = DEFAULT_PATH,
+                 resolve_order: Optional[Callable[[Any], Optional[Dict[str, Any]]]] = None,
+                 seen_orders: Optional[RecentIdSet] = None):
+        """
+        Args:
+            on_order: Função chamada com cada pedido novo
+            secret: Segredo para verificar as assinaturas (None desativa a verificação)
+            host: Endereço de escuta
+            port: Porta de escuta
+            path: Caminho aceito para os webhooks
+            resolve_order: Função que busca o pedido completo pelo ID quando o webhook traz só o resumo
+            seen_orders: Conjunto de pedidos já recebidos, compartilhável com o polling
+        """
+        self.on_order = on_order
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.path = path
+        self.resolve_order = resolve_order
+        self.seen_events = RecentIdSet()
+        self.seen_orders = seen_orders or RecentIdSet()
+
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._threads = []
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Abre a porta e inicia as threads do servidor e do processamento."""
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.port = self._httpd.server_port  # Porta real quando port=0
+        self._threads = [
+            threading.Thread(target=self._httpd.serve_forever, name="BlingWebhookServer", daemon=True),
+            threading.Thread(target=self._process_loop, name="BlingWebhookProcessor", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        if not self.secret:
+            logger.warning("Receptor de webhooks iniciado SEM verificação de assinatura")
+        logger.info(f"Receptor de webhooks do Bling ouvindo em http://{self.host}:{self.port}{self.path}")
+
+    def stop(self) -> None:
+        """Encerra o servidor e a thread de processamento."""
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        self._queue.put(None)
+        logger.info("Receptor de webhooks do Bling encerrado")
+
+    # ------------------------------------------------------------------
+    # Recebimento
+    # ------------------------------------------------------------------
+
+    def handle_delivery(self, body: bytes, signature: Optional[str]) -> Tuple[int, str]:
+        """
+        Valida uma entrega e a enfileira para processamento.
+
+        Args:
+            body: Corpo bruto da requisição
+            signature: Valor do cabeçalho de assinatura
+
+        Returns:
+            tuple: (status HTTP, mensagem)
+        """
+        if self.secret and not verify_signature(body, signature, self.secret):
+            logger.warning("Webhook rejeitado: assinatura inválida")
+            return 401, "assinatura invalida"
+
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            return 400, "json invalido"
+        if not isinstance(payload, dict):
+            return 400, "json invalido"
+
+        event_id, event, order = extract_order(payload)
+        if event not in ORDER_EVENTS or not order:
+            logger.debug(f"Webhook ignorado (evento {event})")
+            return 200, "ignorado"
+
+        if not self.seen_events.add(event_id):
+            return 200, "duplicado"
+        if not self.seen_orders.add(order.get('id')):
+            logger.info(f"Webhook do pedido {order.get('numero', order.get('id'))} já recebido, ignorando")
+            return 200, "duplicado"
+
+        self._queue.put(order)
+        return 202, "aceito"
+
+    def _process_loop(self) -> None:
+        """Completa os pedidos recebidos e os entrega ao fluxo de impressão."""
+        while True:
+            order = self._queue.get()
+            if order is None:
+                break
+            order_id = order.get('id')
+            try:
+                if not order.get('itens') and self.resolve_order and order_id:
+                    resolved = self.resolve_order(order_id)
+                    if not resolved:
+                        raise ValueError("pedido não encontrado na API")
+                    order = resolved
+                logger.info(f"Pedido {order.get('numero', order_id)} recebido por webhook")
+                self.on_order(order)
+            except Exception as e:
+                # Permitir que uma nova entrega (ou a varredura do polling) traga o pedido
+                self.seen_orders.discard(order_id)
+                logger.error(f"Erro ao processar webhook do pedido {order_id}: {e}")
+                logger.error(traceback.format_exc())
+
+    def _make_handler(self):
+        """Cria a classe de handler ligada a este servidor."""
+        server = self
+
+        class WebhookHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(f"Webhook {self.address_string()}: {format % args}")
+
+            def _reply(self, status, message):
+                body = json.dumps({'status': message}).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path.split('?', 1)[0] != server.path:
+                    return self._reply(404, "caminho desconhecido")
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                except ValueError:
+                    return self._reply(400, "tamanho invalido")
+                if length <= 0 or length > MAX_BODY_SIZE:
+                    return self._reply(413 if length > 0 else 400, "tamanho invalido")
+                body = self.rfile.read(length)
+                status, message = server.handle_delivery(body, self.headers.get(SIGNATURE_HEADER))
+                self._reply(status, message)
+
+        return WebhookHandler
+
+
+def post_order_file(path: str, url: str, secret: Optional[str] = None) -> Tuple[int, str]:
+    """
+    Envia um arquivo JSON (ex.: pedido_114152.json) ao receptor, assinando se houver segredo.
+
+    Returns:
+        tuple: (status HTTP, corpo da resposta)
+    """
+    with open(path, 'rb') as f:
+        body = f.read()
+    request = urllib.request.Request(url, data=body, method='POST', headers={'Content-Type': 'application/json'})
+    if secret:
+        request.add_header(SIGNATURE_HEADER, sign_payload(body, secret))
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.read().decode('utf-8')
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode('utf-8')
+
+
+def main(argv=None) -> int:
+    """Executa o receptor isolado (registrando os pedidos) ou envia arquivos de teste."""
+    parser = argparse.ArgumentParser(description="Receptor local de webhooks de pedidos do Bling")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--segredo', help="Segredo para assinar/verificar as requisições")
+    parser.add_argument('--enviar', nargs='+', metavar='ARQUIVO', help="Envia arquivos pedido_*.json ao receptor")
+    parser.add_argument('--url', help="URL do receptor (padrão: derivada de --host/--porta)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.enviar:
+        url = args.url or f"http://{args.host}:{args.porta}{DEFAULT_PATH}"
+        for path in args.enviar:
+            status, body = post_order_file(path, url, args.segredo)
+            print(f"{path}: {status} {body}")
+        return 0
+
+    def on_order(order):
+        print(f"Pedido recebido: {order.get('numero', order.get('id'))} ({len(order.get('itens', []))} itens)")
+
+    server = BlingWebhookServer(on_order, secret=args.segredo, host=args.host, port=args.porta)
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
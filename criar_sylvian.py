@@ -1,7 +1,10 @@
 from data.storage import DataStorage
+from core.crypto import install_cipher
 import bcrypt
 
 storage = DataStorage()
+# Mesmo formato de criptografia da aplicação (valores comprimidos em AES-GCM)
+install_cipher(storage.storage)
 nome = "sylvian"
 email = "sylvian@local"
 senha = "admin"
@@ -11,22 +11,26 @@ import logging
 import argparse
 import threading
 import bcrypt
-import traceback
 import json
 from datetime import datetime, timedelta
 
+# Marcado antes das importações pesadas: a primeira fase mede o custo de importar
+from core.startup_profile import StartupProfile, LOGIN_READY_MARKER
+startup_profile = StartupProfile()
+
 # Desativar mensagens de erro de fontes do Qt ANTES de importar qualquer módulo Qt
 os.environ["QT_LOGGING_RULES"] = "qt.qpa.fonts=false;qt.qpa.backingstore=false"
 
 from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QMessageBox, QDialog, 
-    QWidget, QVBoxLayout, QLabel, QPushButton
+    QMainWindow, QMessageBox, QDialog, 
+    QWidget, QVBoxLayout, QLabel, QPushButton, QFileDialog
 )
 from PySide6.QtCore import Qt, QObject, Signal, QTimer, QThread, QSize, QEvent
-from PySide6.QtGui import QFont
+from PySide6.QtGui import QFont, QAction
 
 # Importações de autenticação
-from auth.bling_oauth import BlingOAuth
+# Serviços usados só depois do login (OAuth, cliente HTTP, impressão, polling,
+# webhook, busca e diário) são importados em start_services, dentro de main()
 from core.auth.auth_client import AuthClient  # Caminho corrigido para core.auth.auth_client
 
 # Importações de dados
@@ -34,20 +38,15 @@ from data.storage import DataStorage, Storage  # Adicionado Storage à importaç
 from utils.config import Config  # Adicionando importação da classe Config
 
 # Importações de interface
-from ui.main_window import MainWindow, SignalManager
+# MainWindow, LockScreen e SettingsDialog são importados só depois do login
 from ui.login_window import LoginWindow
-from ui.lock_screen import LockScreen
 from ui.themes import setup_dark_theme
 from ui.dialog_manager import show_info, show_error, show_question
-from ui.settings_dialog import SettingsDialog  # Adicionando importação do SettingsDialog
-
-# Importações de impressão e layouts
-from core.layout_printer import DefaultLayoutPrinter
-from core.print_controller import PrintController
 
-# Importações de processamento de pedidos
-from core.polling import PedidosPoller
-from core.filters import OrderFilter  # Caminho corrigido
+# Importações de armazenamento (necessárias antes de ler os usuários)
+from core.db_pool import install_pool
+from core.crypto import install_cipher
+from core.config_snapshot import install_config_store
 
 # Importações de utilities
 from utils.qt_utils import ensure_qapplication, safely_emit_in_main_thread
@@ -55,41 +54,8 @@ from utils.qt_utils import ensure_qapplication, safely_emit_in_main_thread
 # Configuração do logger global
 logger = logging.getLogger(__name__)
 
-# Variável global para manter a thread de polling viva
-_polling_auth_thread = None
-
-# Classe para autenticação e polling definida fora da função para evitar destruição prematura
-class PollingAuthThread(QThread):
-    def __init__(self, oauth_handler, main_window, poller):
-        super().__init__()
-        self.oauth_handler = oauth_handler
-        self.main_window = main_window
-        self.poller = poller
-        self.setObjectName("PollingAuthThread")
-        
-    def run(self):
-        try:
-            # Primeiro tentar autenticação automática
-            if self.oauth_handler.authenticate_automatically():
-                logger.info("Autenticação automática bem-sucedida, iniciando polling")
-                safely_emit_in_main_thread(self.main_window.update_polling_status, "Iniciando verificação...", None)
-                safely_emit_in_main_thread(self.main_window.add_activity_log, "Iniciando verificação automática de pedidos")
-                
-                # Iniciar o polling na thread principal
-                safely_emit_in_main_thread(self.poller.start_polling)
-            else:
-                # Se falhar na autenticação automática, notificar o usuário
-                logger.warning("Falha na autenticação automática para polling")
-                safely_emit_in_main_thread(self.main_window.update_polling_status, "Erro de autenticação", False)
-                safely_emit_in_main_thread(self.main_window.add_activity_log, "Falha na autenticação para verificação de pedidos")
-                safely_emit_in_main_thread(self.main_window.show_error, 
-                                         "Não foi possível conectar ao Bling. Verifique sua conexão e credenciais.")
-        except Exception as e:
-            logger.error(f"Erro na thread de autenticação para polling: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-            safely_emit_in_main_thread(self.main_window.update_polling_status, "Erro", False)
-            safely_emit_in_main_thread(self.main_window.show_error, f"Erro ao iniciar verificação: {str(e)}")
+# Intervalo mínimo de polling (s); o polling incremental gasta uma requisição por ciclo
+MIN_POLLING_INTERVAL = 15
 
 def setup_logging():
     """Configura o sistema de logging."""
@@ -120,11 +86,14 @@ def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="AcriPrint - Sistema de impressão de etiquetas Bling")
     parser.add_argument("--homologation", action="store_true", help="Executar processo de homologação do Bling")
+    parser.add_argument("--startup-benchmark", action="store_true",
+                        help="Encerrar assim que a janela de login for exibida (python -m core.startup_profile)")
     args = parser.parse_args()
     
     # Configurar logging
     global logger
     logger = setup_logging()
+    startup_profile.mark("importações")
     
     # Se o argumento de homologação foi passado, executar apenas esse processo
     if args.homologation:
@@ -132,8 +101,9 @@ def main():
         
         logger.info("Executando processo de homologação do Bling...")
         
-        # Inicializar storage
+        # Inicializar storage (valores gravados pela aplicação podem estar no formato comprimido)
         storage = DataStorage()
+        install_cipher(storage.storage)
         
         # Executar processo de homologação
         success = test_homologation(storage)
@@ -192,12 +162,22 @@ def main():
     # Inicializar o sistema de armazenamento
     storage = DataStorage()
     
-    # Limpar cache expirado na inicialização para evitar excesso de dados
+    # Novos valores gravados comprimidos e em AES-GCM (os antigos em Fernet continuam legíveis)
+    try:
+        install_cipher(storage.storage)
+    except Exception as e:
+        logger.error(f"Erro ao configurar criptografia comprimida, usando Fernet: {e}")
+    
+    # Uma conexão WAL por thread: gravações do polling não bloqueiam as consultas da interface
+    db_pool = None
     try:
-        storage.clean_expired_orders_cache(days_threshold=60)
-        logger.info("Cache de pedidos expirados limpo na inicialização")
+        db_pool = install_pool(storage.storage)
     except Exception as e:
-        logger.warning(f"Não foi possível limpar cache expirado: {e}")
+        logger.error(f"Erro ao instalar pool de conexões SQLite, usando conexão única: {e}")
+    
+    # Configurações lidas uma vez; get_config() passa a responder da memória
+    config_store = install_config_store(storage.storage)
+    startup_profile.mark("armazenamento")
     
     # Verificar usuário admin
     logger.info("Verificando usuário admin...")
@@ -212,61 +192,72 @@ def main():
         storage.set_user_password('admin', 'admin')
         logger.info("Senha do usuário admin verificada/definida")
     
-    # Gerenciador de sinais para comunicação entre componentes
-    signal_manager = SignalManager()
-    
-    # Inicializar componentes de autenticação e API
-    try:
-        oauth_handler = BlingOAuth(parent=None, storage=storage.storage)
-        logger.info("BlingOAuth inicializado com sucesso")
-    except Exception as e:
-        logger.error(f"Erro ao inicializar BlingOAuth: {e}")
-        traceback.print_exc()
-        oauth_handler = BlingOAuth(parent=None, storage=None)
-        logger.warning("BlingOAuth inicializado sem storage devido a erro")
-        
     auth_client = AuthClient(storage)
     
-    # Configurar o filtro de pedidos
-    order_filter = OrderFilter(storage)
-    
-    # Criar o layout printer
-    layout_printer = DefaultLayoutPrinter()
-    
-    # Criar o print controller
-    print_controller = PrintController(storage, layout_printer)
-    
-    # Verificar configuração da impressora
-    printer_config = print_controller._get_print_config()
-    logger.debug(f"Configuração de impressora carregada: {printer_config}")
-    if printer_config.get('printer'):
-        logger.info(f"Impressora configurada: {printer_config.get('printer')}")
-    else:
-        logger.warning("ATENÇÃO: Nenhuma impressora configurada! Configure uma impressora nas Configurações.")
+    # Serviços iniciados por start_services() depois do login; até lá ficam None
+    print_stats = None
+    print_dedup = None
+    order_search = None
+    cache_maintenance = None
+    order_cache = None
+    oauth_handler = None
+    token_manager = None
+    print_controller = None
+    order_projection = None
+    print_throttles = None
+    print_worker = None
+    print_journal = None
+    history_flush_timer = None
+    poller = None
+    polling_events = None
+    config_watcher = None
+    print_backpressure_timer = None
+    seen_orders = None
+    webhook_server = None
+    order_backfill = None
+    pending_history = []  # (chave do trabalho, registro de histórico) aguardando gravação em lote
+    services_state = {'started': False}
     
     # Inicializar cliente Bling como None, será inicializado pela MainWindow quando necessário
     bling_client = None
     
-    # Inicializar poller (verificação periódica de pedidos)
-    try:
-        poller = PedidosPoller(oauth_handler, storage.storage)
-        logger.info("Serviço de polling inicializado com sucesso")
-        
-        # Ajustar intervalo de polling para ser mais conservador
-        # Por padrão, usar um intervalo maior para economizar requisições
-        default_settings = storage.get_settings() or {}
-        if 'polling_interval' not in default_settings:
-            # Definir um intervalo padrão mais conservador (5 minutos = 300 segundos)
-            try:
-                storage.set_config('polling_interval', 300)
-                logger.info("Configurado intervalo de polling padrão de 5 minutos para economizar requisições")
-            except Exception as e:
-                logger.warning(f"Não foi possível configurar intervalo padrão: {e}")
-    except Exception as e:
-        logger.error(f"Erro ao inicializar serviço de polling: {e}")
-        traceback.print_exc()
-        poller = None
-        logger.warning("Serviço de polling não pôde ser inicializado")
+    def load_active_custom_layout(print_config):
+        """Carrega o layout personalizado se ele estiver ativo na configuração de impressão."""
+        if not (print_config or {}).get('use_custom_layout'):
+            return None
+        try:
+            from core.custom_layout import load_custom_layout
+            return load_custom_layout()
+        except Exception as e:
+            logger.error(f"Erro ao carregar layout personalizado para a projeção de pedidos: {e}")
+            return None
+    
+    def flush_print_history():
+        """Grava em lote o histórico dos trabalhos impressos e confirma no diário."""
+        if not pending_history:
+            return
+        from core.print_journal import write_print_history_batch
+        batch = pending_history[:]
+        del pending_history[:]
+        try:
+            write_print_history_batch(storage.storage, [record for _, record in batch])
+            print_journal.record_acked([job_key for job_key, _ in batch])
+        except Exception as e:
+            logger.error(f"Erro ao gravar histórico de impressão em lote: {e}")
+            pending_history[:0] = batch
+        print_dedup.flush()
+        show_print_totals()
+    
+    def submit_print_job(job_key, order, printer_name):
+        """Envia ao worker um trabalho já registrado no diário."""
+        def on_done(done_order, success, message):
+            # Executado na thread do despachante, logo após a resposta do worker
+            if success:
+                print_journal.record_sent(job_key)
+            else:
+                print_journal.record_failed(job_key)
+            safely_emit_in_main_thread(handle_print_job_done, job_key, done_order, success, message, printer_name)
+        print_worker.submit(order, printer_name, callback=on_done)
     
     # Variáveis para controlar as threads
     auth_thread = None
@@ -275,6 +266,277 @@ def main():
     polling_status_timer = QTimer()
     polling_status_timer.setInterval(5000)  # Atualizar a cada 5 segundos
     
+    # Estado da contrapressão da fila de impressão sobre o polling
+    backpressure_state = {'active': False}
+    
+    def apply_print_backpressure():
+        """Desacelera o polling enquanto a fila de impressão estiver longa e mostra a previsão."""
+        if poller is None or main_window is None:
+            return
+        try:
+            base_interval = int(poller.scheduler.current_interval)
+            suggested = int(print_throttles.suggested_poll_interval(base_interval))
+            queued = print_throttles.queued_jobs()
+            
+            if suggested > base_interval:
+                # O piso vale também para os próximos intervalos calculados pelo agendador
+                poller.scheduler.set_floor(suggested)
+                poller.polling_interval = suggested
+                drain = int(print_throttles.drain_seconds())
+                main_window.update_print_status(
+                    f"Fila de impressão: {queued} pedidos, ~{drain // 60}min {drain % 60}s para esvaziar", True
+                )
+                if not backpressure_state['active']:
+                    logger.info(f"Fila de impressão longa ({queued} pedidos), polling desacelerado para {suggested}s")
+                    backpressure_state['active'] = True
+            elif backpressure_state['active']:
+                poller.scheduler.set_floor(0)
+                poller.polling_interval = base_interval
+                backpressure_state['active'] = False
+                logger.info(f"Fila de impressão normalizada, polling restaurado para {base_interval}s")
+                main_window.update_print_status("Fila de impressão normalizada", True)
+        except Exception as e:
+            logger.error(f"Erro ao aplicar contrapressão da impressão: {e}")
+    
+    def start_services():
+        """
+        Importa e inicia os serviços usados depois do login.
+        
+        Chamada uma única vez, pelo primeiro login bem-sucedido: até lá a janela
+        de login não espera pelo cliente HTTP, pelo worker de impressão, pelo
+        polling, pelo receptor de webhooks nem pela busca em cache.
+        """
+        nonlocal print_stats, print_dedup, order_search, cache_maintenance, order_cache
+        nonlocal oauth_handler, token_manager, print_controller, order_projection
+        nonlocal print_throttles, print_worker, print_journal, history_flush_timer
+        nonlocal poller, polling_events, config_watcher, print_backpressure_timer
+        nonlocal seen_orders, webhook_server, order_backfill
+        if services_state['started']:
+            return
+        services_state['started'] = True
+        
+        from auth.bling_oauth import BlingOAuth
+        from auth.token_manager import TokenManager
+        from bling_api.endpoints import resolve_api_base_url, apply_api_base_url
+        from bling_api.http_client import install_shared_http
+        from core.layout_printer import DefaultLayoutPrinter
+        from core.print_controller import PrintController
+        from core.print_worker import PrintWorkerClient
+        from core.print_throttle import PrinterThrottleRegistry
+        from core.webhook_server import RecentIdSet
+        from core.print_journal import PrintJournal, history_record_from_job, write_print_history_batch
+        from core.order_projection import OrderProjection
+        from core.cache_maintenance import CacheMaintenance
+        from core.order_cache import install_order_cache
+        from core.print_stats import PrintStats
+        from core.config_snapshot import PRINTER_FILE_KEY
+        from core.config_watcher import ConfigWatcher
+        from core.dedup import PrintDedupGuard
+        from core.order_search import install_search_index
+        from core.async_polling import AsyncPollingEngine
+        from core.polling_bridge import PollingEventBridge
+        
+        logger.info("Iniciando serviços de impressão e pedidos...")
+        
+        # Token OAuth e BlingClient respeitam o mesmo limite de taxa do polling
+        install_shared_http()
+        
+        # Índices e totais diários do histórico de impressão (lidos pelo painel)
+        try:
+            print_stats = PrintStats(storage.storage)
+        except Exception as e:
+            logger.error(f"Erro ao preparar totais do histórico de impressão: {e}")
+        
+        # Decisão O(1) de "já impresso?" para polling, webhook, backfill e reinicializações
+        print_dedup = PrintDedupGuard(storage.storage)
+        print_dedup.load()
+        
+        # Busca de pedidos em cache por cliente, SKU ou número sem descriptografar o cache
+        try:
+            order_search = install_search_index(storage.storage)
+            order_search.start()
+        except Exception as e:
+            order_search = None
+            logger.error(f"Erro ao preparar busca de pedidos em cache: {e}")
+        
+        # Limpeza do cache de pedidos em segundo plano (sem bloquear a inicialização)
+        cache_maintenance = CacheMaintenance(storage.storage, days_threshold=60)
+        cache_maintenance.start()
+        
+        # Pedidos decodificados em memória na frente do orders_cache (last_accessed gravado em lote);
+        # instalado no Storage, vale para a interface, os filtros e o BlingClient
+        order_cache = install_order_cache(storage.storage, max_entries=config_store.current.order_cache_size)
+        order_cache.start()
+        
+        # Endereço alternativo da API (simulador local para testes de carga)
+        apply_api_base_url(resolve_api_base_url(storage.storage))
+        
+        # Inicializar componentes de autenticação e API
+        try:
+            oauth_handler = BlingOAuth(parent=None, storage=storage.storage)
+            logger.info("BlingOAuth inicializado com sucesso")
+        except Exception as e:
+            logger.error(f"Erro ao inicializar BlingOAuth: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            oauth_handler = BlingOAuth(parent=None, storage=None)
+            logger.warning("BlingOAuth inicializado sem storage devido a erro")
+        
+        # Token em memória, renovado em segundo plano antes de expirar
+        token_manager = TokenManager(oauth_handler)
+        token_manager.start()
+        
+        # Tentar configurar credenciais do Bling
+        configure_bling_credentials()
+        
+        # Criar o layout printer
+        layout_printer = DefaultLayoutPrinter()
+        
+        # Criar o print controller
+        print_controller = PrintController(storage, layout_printer)
+        
+        # Verificar configuração da impressora
+        printer_config = print_controller._get_print_config()
+        logger.debug(f"Configuração de impressora carregada: {printer_config}")
+        if printer_config.get('printer'):
+            logger.info(f"Impressora configurada: {printer_config.get('printer')}")
+        else:
+            logger.warning("ATENÇÃO: Nenhuma impressora configurada! Configure uma impressora nas Configurações.")
+        
+        # Pedidos reduzidos aos campos usados pelo layout e pelos filtros antes do cache e da fila
+        order_projection = OrderProjection.from_print_config(
+            printer_config,
+            load_active_custom_layout(printer_config),
+            enabled=not config_store.current.keep_full_order_payload,
+        )
+        
+        # Worker de impressão persistente (evita iniciar um processo por pedido)
+        print_throttles = PrinterThrottleRegistry.from_printer_config(config_store.current.printer_file)
+        config_store.subscribe(lambda snapshot, changed: print_throttles.reconfigure(snapshot.printer_file),
+                               keys={PRINTER_FILE_KEY})
+        print_worker = PrintWorkerClient(throttles=print_throttles)
+        try:
+            print_worker.start()
+        except Exception as e:
+            logger.error(f"Erro ao iniciar worker de impressão: {e}")
+        
+        # Diário de impressão: garante que cada pedido seja impresso exatamente uma vez
+        print_journal = PrintJournal()
+        
+        history_flush_timer = QTimer()
+        history_flush_timer.setInterval(1000)
+        history_flush_timer.timeout.connect(flush_print_history)
+        history_flush_timer.start()
+        
+        # Recuperar trabalhos interrompidos por uma queda anterior
+        try:
+            unsent_jobs, unacked_jobs = print_journal.recover()
+        except Exception as e:
+            logger.error(f"Erro ao recuperar diário de impressão: {e}")
+            unsent_jobs, unacked_jobs = [], []
+        if unacked_jobs:
+            for job in unacked_jobs:
+                print_dedup.confirm(job['order'])
+            print_dedup.flush()
+            records = [(job['job'], history_record_from_job(job)) for job in unacked_jobs]
+            try:
+                write_print_history_batch(storage.storage, [record for _, record in records])
+                print_journal.record_acked([job_key for job_key, _ in records])
+                logger.info(f"{len(unacked_jobs)} impressões recuperadas do diário sem reimpressão")
+            except Exception as e:
+                # Continuam 'sent' no diário; flush_print_history tenta gravar de novo
+                logger.error(f"Erro ao gravar histórico das impressões recuperadas do diário: {e}")
+                pending_history.extend(records)
+        try:
+            print_journal.compact()
+        except Exception as e:
+            logger.error(f"Erro ao compactar diário de impressão: {e}")
+        for job in unsent_jobs:
+            logger.info(f"Reenviando pedido não impresso antes da queda: {job['order'].get('numero')}")
+            print_dedup.reserve(job['order'], force=True)
+            submit_print_job(job['job'], job['order'], job.get('printer'))
+        
+        # Inicializar poller (verificação periódica de pedidos)
+        try:
+            # Polling incremental em laço asyncio próprio; a interface recebe os eventos pela ponte Qt
+            poller = AsyncPollingEngine(oauth_handler, order_cache, token_manager=token_manager)
+            polling_events = PollingEventBridge(poller)
+            poller.sweeper.projection = order_projection
+            poller.accept_orders = accept_polled_orders
+            logger.info("Serviço de polling inicializado com sucesso")
+            
+            # Com o cursor, ciclos curtos custam uma requisição e não repetem pedidos
+            default_settings = storage.get_settings() or {}
+            if 'polling_interval' not in default_settings:
+                try:
+                    storage.set_config('polling_interval', MIN_POLLING_INTERVAL * 4)
+                    logger.info(f"Configurado intervalo de polling padrão de {MIN_POLLING_INTERVAL * 4} segundos")
+                except Exception as e:
+                    logger.warning(f"Não foi possível configurar intervalo padrão: {e}")
+        except Exception as e:
+            logger.error(f"Erro ao inicializar serviço de polling: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            poller = None
+            polling_events = None
+            logger.warning("Serviço de polling não pôde ser inicializado")
+        
+        # Intervalo e filtros alterados (pela janela ou fora da aplicação) valem no próximo ciclo
+        if poller:
+            config_store.subscribe(lambda snapshot, changed: safely_emit_in_main_thread(poller.update_settings),
+                                   keys={'polling_interval', 'allowed_stores', 'filter_mode', 'sku_list'})
+        
+        # Alterações em config.json, impressora_config.json ou na tabela config sem reiniciar
+        config_watcher = ConfigWatcher(config_store)
+        config_watcher.start()
+        
+        print_backpressure_timer = QTimer()
+        print_backpressure_timer.setInterval(5000)
+        print_backpressure_timer.timeout.connect(apply_print_backpressure)
+        print_backpressure_timer.start()
+        
+        # Pedidos já entregues ao fluxo de impressão (webhook ou polling)
+        seen_orders = RecentIdSet()
+        
+        # Receptor de webhooks do Bling (opcional): pedidos chegam sem esperar o polling,
+        # que passa a rodar em baixa frequência apenas para reconciliação
+        if storage.get_config('webhook_enabled', False):
+            try:
+                from core.webhook_server import BlingWebhookServer, DEFAULT_PORT as WEBHOOK_DEFAULT_PORT
+                webhook_server = BlingWebhookServer(
+                    # Thread do receptor: uma falha no diário devolve o pedido para a próxima entrega
+                    on_order=lambda order: dispatch_webhook_order(order),
+                    secret=storage.get_config('webhook_secret') or None,
+                    host=storage.get_config('webhook_host') or '127.0.0.1',
+                    port=int(storage.get_config('webhook_port') or WEBHOOK_DEFAULT_PORT),
+                    resolve_order=poller.fetch_order_detail if poller else None,
+                    seen_orders=seen_orders,
+                )
+                webhook_server.start()
+                if poller:
+                    poller.set_reconciliation_mode(int(storage.get_config('webhook_reconciliation_interval') or 900))
+            except Exception as e:
+                logger.error(f"Erro ao iniciar receptor de webhooks do Bling: {e}")
+                webhook_server = None
+        
+        # Recuperação dos pedidos feitos enquanto a aplicação estava fechada
+        if poller and storage.get_config('backfill_enabled', True):
+            from core.backfill import OrderBackfill
+            order_backfill = OrderBackfill(
+                storage.storage,
+                client_provider=poller.sweeper.get_client,
+                on_order=lambda order: safely_emit_in_main_thread(dispatch_polled_order, order),
+                queue_depth=print_throttles.queued_jobs,
+                order_filter=poller.order_filter,
+                projection=order_projection,
+                expected_interval=poller.scheduler.longest_interval,
+                max_gap_hours=float(storage.get_config('backfill_max_hours') or 24),
+                orders_per_minute=float(storage.get_config('backfill_orders_per_minute') or 6),
+            )
+            poller.sweeper.gap_handler = order_backfill.handle_gap
+        
+        logger.info("Serviços de impressão e pedidos iniciados")
+    
     # 4. Fluxo da UI - Começar com a tela de login
     logger.info("Iniciando interface do usuário...")
     login_window = LoginWindow()
@@ -334,10 +596,13 @@ def main():
             
             # Fechar a janela de login e abrir a principal
             login_window.close()
+            start_services()
+            from ui.main_window import MainWindow
             main_window = MainWindow(user_found)
             main_window.show()
             auth_client.authenticate_user(username, password)
             connect_signals()
+            show_print_totals()
             # Somente agora, após o login, iniciar o fluxo de autorização OAuth
             if not oauth_handler.has_valid_token():
                 logger.info("Iniciando autorização OAuth após login...")
@@ -377,10 +642,13 @@ def main():
         
         # Fechar a janela de login e abrir a principal
         login_window.close()
+        start_services()
+        from ui.main_window import MainWindow
         main_window = MainWindow(user_found)
         main_window.show()
         auth_client.authenticate_user(username, password)
         connect_signals()
+        show_print_totals()
         # Somente agora, após o login, iniciar o fluxo de autorização OAuth
         if not oauth_handler.has_valid_token():
             logger.info("Iniciando autorização OAuth após login...")
@@ -424,8 +692,117 @@ def main():
         
         logger.info(f"Solicitação de redefinição de senha processada para: {username}")
     
+    def handle_print_job_done(job_key, order, success, message, printer_name):
+        """
+        Trata o resultado de um pedido impresso pelo worker (thread da UI).
+        
+        Args:
+            job_key: Chave do trabalho no diário
+            order: Pedido impresso
+            success: Se o worker confirmou a impressão
+            message: Mensagem do worker
+            printer_name: Impressora usada no trabalho (None = padrão do Windows), que pode
+                diferir da configuração atual se ela mudou ou se o trabalho veio do diário
+        """
+        order_id = str(order.get('numero', order.get('id', '')))
+        if success:
+            # O histórico é gravado em lote por flush_print_history
+            pending_history.append((job_key, {
+                'order_id': order_id,
+                'items': order.get('itens', []),
+                'printer': printer_name,
+                'status': 'success',
+                'user': current_user.get('name') if current_user else None,
+                'store_id': (order.get('loja') or {}).get('id'),
+            }))
+            print_dedup.confirm(order)
+            handle_print_success(order_id)
+        else:
+            print_dedup.release(order)
+            handle_print_error(order_id, message)
+    
+    def dispatch_orders_to_printer(orders, force=False):
+        """
+        Envia pedidos ao worker de impressão se a impressão automática estiver ativa.
+        
+        As intenções são gravadas no diário (um fsync para todos os pedidos) antes
+        do envio. Pode ser chamada de qualquer thread.
+        
+        Args:
+            orders: Pedidos a imprimir
+            force: Reimpressão intencional de pedidos já impressos
+        
+        Raises:
+            OSError: O diário não pôde ser gravado; nenhum pedido foi enviado
+        """
+        settings = config_store.current
+        if not settings.auto_print:
+            return
+        reserved = []
+        for order in orders:
+            if print_dedup.reserve(order, force=force):
+                reserved.append(order)
+            else:
+                logger.info(f"Pedido {order.get('numero', order.get('id'))} já impresso, ignorando")
+        if not reserved:
+            return
+        printer_name = settings.printer or None
+        user = current_user.get('name') if current_user else None
+        try:
+            job_keys = print_journal.record_intents(reserved, printer_name, user=user)
+        except Exception:
+            for order in reserved:
+                print_dedup.release(order)
+            raise
+        for job_key, order in zip(job_keys, reserved):
+            submit_print_job(job_key, order, printer_name)
+    
+    def dispatch_order_to_printer(order, force=False):
+        """
+        Envia um pedido ao worker de impressão se a impressão automática estiver ativa.
+        
+        Args:
+            order: Pedido a imprimir
+            force: Reimpressão intencional de um pedido já impresso
+        """
+        dispatch_orders_to_printer([order], force=force)
+    
+    def dispatch_polled_order(order):
+        """Envia um pedido vindo do backfill, ignorando os que já chegaram por webhook."""
+        if not seen_orders.add(order.get('id')):
+            logger.debug(f"Pedido {order.get('numero', order.get('id'))} já recebido por webhook, ignorando")
+            return
+        try:
+            dispatch_order_to_printer(order)
+        except Exception as e:
+            seen_orders.discard(order.get('id'))
+            logger.error(f"Erro ao enviar pedido {order.get('numero', order.get('id'))} para impressão: {e}")
+    
+    def dispatch_webhook_order(order):
+        """Envia um pedido recebido por webhook, aplicando os mesmos filtros do polling."""
+        order = order_projection.apply(order)
+        if poller and poller.order_filter and not poller.order_filter.process_orders([order]):
+            logger.info(f"Pedido {order.get('numero', order.get('id'))} recebido por webhook não passou pelos filtros")
+            return
+        dispatch_order_to_printer(order)
+    
+    def accept_polled_orders(orders):
+        """
+        Registra e envia os pedidos do polling antes de o cursor avançar (thread do motor).
+        
+        Se o diário não puder ser gravado, a exceção faz o motor manter o cursor,
+        e os pedidos voltam no próximo ciclo.
+        """
+        new_orders = [order for order in orders if seen_orders.add(order.get('id'))]
+        try:
+            dispatch_orders_to_printer(new_orders)
+        except Exception:
+            for order in new_orders:
+                seen_orders.discard(order.get('id'))
+            raise
+    
     def handle_new_order(order):
-        """Manipula novo pedido recebido"""
+        """Manipula novo pedido recebido (já enviado à impressão por accept_polled_orders)"""
         if not order:
             logger.error("Pedido recebido é inválido (None)")
             return
@@ -437,14 +814,12 @@ def main():
                 for single_order in order:
                     if isinstance(single_order, dict):
                         order_id = single_order.get('id', 'ID não encontrado')
-                        logger.info(f"Processando pedido da lista: {order_id}")
-                        # TODO: Implementar lógica para cada pedido individual
+                        logger.info(f"Pedido da lista recebido: {order_id}")
                     else:
                         logger.warning(f"Item inválido na lista de pedidos: {type(single_order)}")
             elif isinstance(order, dict):
                 order_id = order.get('id', 'ID não encontrado')
                 logger.info(f"Novo pedido recebido: {order_id}")
-                # TODO: Implementar lógica de novo pedido
             else:
                 logger.warning(f"Tipo de pedido recebido não suportado: {type(order)}")
         except Exception as e:
@@ -452,12 +827,53 @@ def main():
             import traceback
             logger.error(traceback.format_exc())
     
+    # Último erro de polling mostrado, para não repetir o mesmo aviso a cada ciclo
+    polling_error_state = {'message': None, 'at': 0.0}
+    
     def handle_polling_error(error_message):
         """Manipula erro no polling"""
         if not error_message:
             error_message = "Erro desconhecido no polling"
         logger.error(f"Erro no polling: {error_message}")
-        # TODO: Implementar lógica de erro no polling
+        if main_window is None:
+            return
+        
+        # O motor já repete a consulta sozinho; aqui só informar, sem janelas modais
+        import time
+        now = time.monotonic()
+        if error_message == polling_error_state['message'] and now - polling_error_state['at'] < 300:
+            main_window.statusBar().showMessage(error_message, 10000)
+            return
+        polling_error_state.update(message=error_message, at=now)
+        main_window.update_polling_status("Erro ao consultar pedidos", False)
+        main_window.add_activity_log(error_message, "error")
+    
+    def handle_rate_limit_hit(wait_seconds):
+        """Informa que o Bling limitou as requisições e quando o polling será retomado."""
+        logger.warning(f"Limite de requisições do Bling atingido, polling retomado em {wait_seconds}s")
+        if main_window is None:
+            return
+        minutes, seconds = divmod(int(wait_seconds), 60)
+        wait_text = f"{minutes}min {seconds}s" if minutes else f"{seconds}s"
+        main_window.update_polling_status(f"Limite de requisições, aguardando {wait_text}", None)
+    
+    def handle_polling_status(status_text, is_polling):
+        """Mostra o estado do polling; avisos de cada ciclo vão só para a barra de status."""
+        if main_window is None:
+            return
+        if is_polling:
+            main_window.statusBar().showMessage(status_text, 10000)
+        else:
+            main_window.update_polling_status(status_text, is_polling)
+    
+    def handle_polling_auth_failure(error_message):
+        """Manipula falha na autenticação ao iniciar o polling."""
+        logger.warning(f"Falha na autenticação para polling: {error_message}")
+        if main_window is None:
+            return
+        main_window.update_polling_status("Erro de autenticação", False)
+        main_window.add_activity_log("Falha na autenticação para verificação de pedidos")
+        main_window.show_error("Erro de autenticação", error_message)
     
     def handle_auth_success():
         """Manipula o evento de sucesso na autenticação."""
@@ -481,8 +897,9 @@ def main():
             # Importar o utilitário Qt para execução thread-safe
             from utils.qt_utils import ensure_qapplication, safely_emit_in_main_thread, qt_helper
             
-            # Verificar se temos um token válido e salvar na configuração
-            valid_token = oauth_handler.get_valid_access_token()
+            # Atualizar o token em cache e salvar na configuração
+            token_manager.load()
+            valid_token = token_manager.get_token()
             if valid_token:
                 logger.info("Token OAuth válido obtido, salvando na configuração")
                 try:
@@ -587,6 +1004,26 @@ def main():
         main_window.update_print_status(f"Pedido {order_id} impresso", True)
         main_window.add_activity_log(f"Pedido {order_id} impresso com sucesso")
     
+    # Último resumo exibido, para não repetir a mesma entrada no log de atividades
+    print_totals_state = {'text': None}
+    
+    def show_print_totals():
+        """Mostra no painel as impressões de hoje e dos últimos 7 dias (totais diários do histórico)."""
+        if print_stats is None or main_window is None:
+            return
+        try:
+            today = print_stats.today()
+            week = sum(row['prints'] for row in print_stats.last_days(7))
+        except Exception as e:
+            logger.error(f"Erro ao consultar totais de impressão: {e}")
+            return
+        printed = today.get('success', 0)
+        failed = sum(prints for status, prints in today.items() if status != 'success')
+        text = f"Hoje: {printed} impressos, {failed} com erro | 7 dias: {week} impressos"
+        if text != print_totals_state['text']:
+            print_totals_state['text'] = text
+            main_window.update_print_status(text, failed == 0)
+    
     def handle_print_error(order_id, error_message):
         """Manipula erro na impressão"""
         if not error_message:
@@ -628,9 +1065,15 @@ def main():
     
     def connect_signals():
         """Conecta sinais entre as classes."""
-        # Sinais do polling
-        poller.new_orders_found.connect(handle_new_order)
-        poller.error_occurred.connect(handle_polling_error)
+        # Sinais do polling (repassados da thread do motor pela ponte Qt)
+        if polling_events:
+            polling_events.new_orders_found.connect(handle_new_order)
+            polling_events.error_occurred.connect(handle_polling_error)
+            polling_events.status_changed.connect(handle_polling_status)
+            polling_events.activity_logged.connect(main_window.add_activity_log)
+            polling_events.auth_failed.connect(handle_polling_auth_failure)
+            polling_events.rate_limit_hit.connect(handle_rate_limit_hit)
+            polling_events.polling_stopped.connect(lambda: main_window.update_polling_status("Parado", False))
         
         # Sinais de autenticação OAuth
         oauth_handler.signals.auth_succeeded.connect(handle_auth_success)
@@ -651,11 +1094,15 @@ def main():
         if hasattr(main_window, 'toggle_polling_requested'):
             main_window.toggle_polling_requested.connect(lambda start: start_polling() if start else stop_polling())
         
+        # Exportação do histórico de impressão no menu Arquivo
+        add_export_history_action()
+        
         # Conectar janela principal para atualizar status de ferramentas
         if polling_status_timer is not None:
             polling_status_timer.timeout.connect(main_window.update_polling_status)
         
         # Sinais do SettingsDialog
+        from ui.settings_dialog import SettingsDialog
         if hasattr(SettingsDialog, 'settings_saved'):
             # Pegar a instância do diálogo quando for criada em open_settings
             # e conectar o sinal
@@ -744,47 +1191,22 @@ def main():
         main_window.statusBar().showMessage("Conectando ao Bling, aguarde...", 5000)
     
     def start_polling():
-        """Inicia o polling de pedidos."""
-        nonlocal auth_thread
+        """Inicia o polling de pedidos (a autenticação acontece na thread do motor)."""
+        if not poller:
+            logger.error("Serviço de polling indisponível")
+            return
         
         logger.info("Iniciando processo de autenticação para polling...")
         
-        # Verificar se já existe uma thread rodando e pará-la
-        if auth_thread and auth_thread.isRunning():
-            logger.info("Thread de polling já está em execução, parando antes de iniciar nova")
-            try:
-                auth_thread.quit()
-                if not auth_thread.wait(3000):  # Aguardar até 3 segundos
-                    logger.warning("Thread de polling não encerrou, forçando término")
-                    auth_thread.terminate()
-                    auth_thread.wait(1000)
-            except Exception as e:
-                logger.error(f"Erro ao parar thread de polling existente: {e}")
-        
         # Atualizar status inicial
         main_window.update_polling_status("Autenticando...", None)
         main_window.add_activity_log("Iniciando autenticação para verificação de pedidos")
         
-        # Limpar cache de pedidos expirados antes de iniciar
-        try:
-            storage.clean_expired_orders_cache(days_threshold=60)
-            logger.info("Cache de pedidos expirados limpo antes de iniciar polling")
-        except Exception as e:
-            logger.warning(f"Não foi possível limpar cache expirado: {e}")
-            
-        # Iniciar thread de autenticação para polling usando a classe global
-        auth_thread = PollingAuthThread(oauth_handler, main_window, poller)
-        
-        # Garantir que a thread termine corretamente quando o aplicativo é encerrado
-        app = QApplication.instance()
-        if app:
-            app.aboutToQuit.connect(auth_thread.quit)
+        # Um backfill interrompido no último encerramento continua junto com o polling
+        if order_backfill and not order_backfill.is_running():
+            order_backfill.resume()
         
-        # Manter referência global ao thread para evitar que seja coletado pelo garbage collector
-        global _polling_auth_thread
-        _polling_auth_thread = auth_thread
-        
-        auth_thread.start()
+        poller.start_polling()
     
     def stop_polling():
         """Interrompe o polling de pedidos."""
@@ -819,9 +1241,72 @@ def main():
             # Exibir mensagem de erro para o usuário
             QMessageBox.critical(main_window, "Erro", f"Erro ao abrir configurações: {e}")
     
+    # Exportação do histórico em andamento (uma por vez)
+    export_state = {'job': None}
+    
+    def export_print_history():
+        """Exporta o histórico de impressão em segundo plano, com o progresso na barra de status."""
+        job = export_state['job']
+        if job is not None and job.is_running():
+            if show_question(main_window, "Exportação em andamento",
+                             "Uma exportação do histórico já está em andamento. Deseja cancelá-la?",
+                             default_yes=False):
+                job.cancel()
+            return
+        
+        path, _ = QFileDialog.getSaveFileName(
+            main_window, "Exportar histórico de impressão",
+            f"historico_impressao_{datetime.now().strftime('%Y-%m-%d')}.csv",
+            "CSV (*.csv);;JSON Lines (*.jsonl);;Parquet (*.parquet)"
+        )
+        if not path:
+            return
+        
+        from core.export import ExportJob, detect_format
+        try:
+            detect_format(path)
+        except ValueError as e:
+            show_error(main_window, "Exportar histórico", str(e))
+            return
+        
+        def update_progress(rows):
+            if main_window is not None:
+                main_window.statusBar().showMessage(f"Exportando histórico: {rows} registros...", 5000)
+        
+        def finish_export(success, rows, message):
+            if main_window is None:
+                return
+            main_window.statusBar().showMessage(message, 10000)
+            main_window.add_activity_log(f"Exportação do histórico: {message}", "success" if success else "error")
+        
+        # Os callbacks rodam na thread da exportação; a interface é atualizada na thread principal
+        job = ExportJob(
+            storage.storage, path,
+            on_progress=lambda rows: safely_emit_in_main_thread(update_progress, rows),
+            on_done=lambda success, rows, message: safely_emit_in_main_thread(finish_export, success, rows, message),
+        )
+        export_state['job'] = job
+        job.start()
+        main_window.statusBar().showMessage(f"Exportando histórico para {path}...", 5000)
+    
+    def add_export_history_action():
+        """Acrescenta 'Exportar histórico de impressão...' ao menu Arquivo da janela principal."""
+        try:
+            menubar = main_window.menuBar()
+            file_menu = next((action.menu() for action in menubar.actions()
+                              if action.menu() is not None and action.text().replace('&', '') == "Arquivo"), None)
+            if file_menu is None:
+                file_menu = menubar.addMenu("Arquivo")
+            export_action = QAction("Exportar histórico de impressão...", main_window)
+            export_action.triggered.connect(export_print_history)
+            file_menu.insertAction(file_menu.actions()[0] if file_menu.actions() else None, export_action)
+        except Exception as e:
+            logger.error(f"Erro ao adicionar exportação do histórico ao menu: {e}")
+    
     def show_lock_screen():
         """Exibe a tela de bloqueio."""
         logger.info("Bloqueando aplicação")
+        from ui.lock_screen import LockScreen
         lock_screen = LockScreen()
         main_window.hide()
         
@@ -859,20 +1344,6 @@ def main():
         logger.info("Iniciando desligamento seguro da aplicação...")
         logger.info("=============================================")
         
-        # Encerrar thread global de polling se existir
-        global _polling_auth_thread
-        if _polling_auth_thread is not None and _polling_auth_thread.isRunning():
-            logger.info("Encerrando thread global de polling...")
-            try:
-                _polling_auth_thread.quit()
-                # Espera até 3 segundos para a thread terminar
-                if not _polling_auth_thread.wait(3000):
-                    logger.warning("Thread global não encerrou, forçando término...")
-                    _polling_auth_thread.terminate()
-                    _polling_auth_thread.wait(1000)
-            except Exception as e:
-                logger.error(f"Erro ao encerrar thread global de polling: {e}")
-        
         # Tentar obter informações sobre threads ativas
         active_threads = threading.enumerate()
         logger.info(f"Threads ativas no momento do desligamento: {len(active_threads)}")
@@ -880,20 +1351,63 @@ def main():
             logger.info(f" - Thread: {thread.name} (ID: {thread.ident}), Daemon: {thread.daemon}")
         
         # Parar o polling se estiver ativo
-        if 'poller' in globals() and poller and poller.is_polling():
+        if poller and poller.is_polling():
             logger.info("Parando verificação de pedidos...")
             try:
+                # Cancela as tarefas do motor, inclusive esperas em andamento
                 poller.stop_polling()
-                logger.info("Aguardando finalização do polling (até 5 segundos)...")
-                if not poller.wait(5000):  # Espera até 5 segundos
-                    logger.warning("Thread de polling não finalizou em tempo, forçando término...")
-                    poller.terminate()
-                    poller.wait(1000)
                 logger.info("Polling finalizado")
             except Exception as e:
-                logger.error(f"Erro ao parar thread de polling: {e}")
+                logger.error(f"Erro ao parar motor de polling: {e}")
         else:
             logger.info("Polling não está ativo, não é necessário parar")
+        if order_backfill:
+            order_backfill.stop()
+        if polling_events:
+            polling_events.stop()
+        if token_manager:
+            token_manager.stop()
+            from bling_api.http_client import get_shared_client
+            get_shared_client().log_stats()
+        
+        if webhook_server:
+            try:
+                webhook_server.stop()
+            except Exception as e:
+                logger.error(f"Erro ao encerrar receptor de webhooks: {e}")
+        
+        # Encerrar worker de impressão persistente
+        if print_worker:
+            try:
+                print_backpressure_timer.stop()
+                print_worker.stop()
+            except Exception as e:
+                logger.error(f"Erro ao encerrar worker de impressão: {e}")
+        
+        if cache_maintenance:
+            cache_maintenance.stop()
+        if config_watcher:
+            config_watcher.stop()
+        if order_search:
+            order_search.stop()
+        if export_state['job'] is not None and export_state['job'].is_running():
+            # O arquivo parcial é removido pela própria exportação
+            export_state['job'].cancel()
+            export_state['job'].wait(5)
+        if order_cache:
+            order_cache.stop()
+            order_cache.log_stats()
+        
+        # Gravar histórico pendente e fechar o diário de impressão
+        try:
+            if print_journal:
+                history_flush_timer.stop()
+                flush_print_history()
+                print_journal.close()
+            if db_pool:
+                db_pool.checkpoint()
+        except Exception as e:
+            logger.error(f"Erro ao fechar diário de impressão: {e}")
         
         # Encerrar thread de autenticação se estiver ativa
         if auth_thread and auth_thread.isRunning():
@@ -1020,6 +1534,7 @@ def main():
         else:
             # Para usuários não-admin, solicitar senha de administrador
             logger.info("Tentativa de fechamento por usuário não-admin. Solicitando confirmação...")
+            from ui.lock_screen import LockScreen
             lock_screen = LockScreen(exit_confirmation=True)
             
             def handle_exit_confirmation(password):
@@ -1078,29 +1593,33 @@ def main():
     def on_settings_saved():
         """Função chamada quando as configurações são salvas."""
         logger.info("Configurações salvas, recarregando configurações de impressão...")
+        # Relê o banco e os arquivos JSON (a janela de configurações pode gravar direto neles)
+        config_store.reload()
         if print_controller:
             print_controller.reload_config()
             
+        # O layout pode ter mudado: recalcular os campos mantidos nos pedidos
+        try:
+            print_config = print_controller._get_print_config()
+            order_projection.update_layout(print_config, load_active_custom_layout(print_config))
+        except Exception as e:
+            logger.error(f"Erro ao atualizar projeção de pedidos: {e}")
+            
         # Verificar e ajustar configurações de polling
         try:
             settings = storage.get_settings() or {}
             polling_interval = settings.get('polling_interval', 0)
             
             # Se o intervalo de polling for muito pequeno, aumentar para evitar muitas requisições
-            if polling_interval > 0 and polling_interval < 60:
-                logger.warning(f"Intervalo de polling muito pequeno ({polling_interval}s), ajustando para mínimo de 60s")
-                storage.set_config('polling_interval', 60)
+            if polling_interval > 0 and polling_interval < MIN_POLLING_INTERVAL:
+                logger.warning(f"Intervalo de polling muito pequeno ({polling_interval}s), ajustando para mínimo de {MIN_POLLING_INTERVAL}s")
+                storage.set_config('polling_interval', MIN_POLLING_INTERVAL)
                 
                 # Notificar usuário se a janela principal existir
                 if main_window:
-                    main_window.add_activity_log("Intervalo de polling ajustado para mínimo de 60 segundos para evitar excesso de requisições")
+                    main_window.add_activity_log(f"Intervalo de polling ajustado para mínimo de {MIN_POLLING_INTERVAL} segundos para evitar excesso de requisições")
                     QMessageBox.information(main_window, "Ajuste de Intervalo", 
-                                          "O intervalo de polling foi ajustado para o mínimo de 60 segundos para evitar excesso de requisições à API.")
-            
-            # Atualizar poller se estiver ativo
-            if poller:
-                poller.update_settings()
-                logger.info("Configurações de polling atualizadas")
+                                          f"O intervalo de polling foi ajustado para o mínimo de {MIN_POLLING_INTERVAL} segundos para evitar excesso de requisições à API.")
         except Exception as e:
             logger.error(f"Erro ao ajustar configurações de polling: {e}")
     
@@ -1131,9 +1650,6 @@ def main():
             logger.error(f"Erro ao configurar credenciais do usuário Bling: {e}")
             return False
     
-    # Tentar configurar credenciais do Bling
-    configure_bling_credentials()
-
     # Loop principal da aplicação
     logger.info("Iniciando loop de eventos Qt...")
     
@@ -1149,6 +1665,15 @@ def main():
         remembered_username = storage.get_config('remembered_username', '')
         if remembered_username:
             login_window.set_remembered_username(remembered_username)
+        
+        startup_profile.mark("janela de login")
+        startup_profile.report()
+        if args.startup_benchmark:
+            # Medido de fora por core/startup_profile.py: avisar assim que a janela for desenhada
+            def finish_startup_benchmark():
+                print(f"{LOGIN_READY_MARKER} {startup_profile.elapsed_ms():.0f}", flush=True)
+                qt_app.quit()
+            QTimer.singleShot(0, finish_startup_benchmark)
             
         # Iniciar o loop de eventos
         result = qt_app.exec()
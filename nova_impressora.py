@@ -27,8 +27,51 @@ class ConfiguracaoImpressora:
     
     def __init__(self, arquivo_config='config/impressora_config.json'):
         self.arquivo_config = arquivo_config
+        self._assinatura = self._assinatura_arquivo()
+        self._verificado_em = time.monotonic()
         self.config = self._carregar_config()
     
+    def _assinatura_arquivo(self):
+        """mtime e tamanho do arquivo de configuração (None se não existe)"""
+        try:
+            estado = os.stat(self.arquivo_config)
+            return estado.st_mtime_ns, estado.st_size
+        except OSError:
+            return None
+    
+    def recarregar_se_alterado(self, intervalo_minimo=0.5):
+        """
+        Relê o arquivo se ele foi alterado por outro programa (ex.: configurar_impressora.py).
+        
+        A configuração nova substitui a atual de uma vez; se o arquivo estiver
+        ilegível (ainda sendo gravado), a atual é mantida.
+        
+        Args:
+            intervalo_minimo: Segundos mínimos entre duas verificações do arquivo
+            
+        Returns:
+            bool: True se a configuração foi trocada
+        """
+        agora = time.monotonic()
+        if agora - self._verificado_em < intervalo_minimo:
+            return False
+        self._verificado_em = agora
+        assinatura = self._assinatura_arquivo()
+        if assinatura == self._assinatura or assinatura is None:
+            return False
+        try:
+            with open(self.arquivo_config, 'r', encoding='utf-8') as f:
+                nova_config = json.load(f)
+            if not isinstance(nova_config, dict):
+                raise ValueError("conteúdo não é um objeto JSON")
+        except Exception as e:
+            logging.error(f"Configuração alterada ignorada, arquivo inválido: {str(e)}")
+            return False
+        self._assinatura = assinatura
+        self.config = nova_config
+        logging.info(f"Configuração da impressora recarregada de {self.arquivo_config}")
+        return True
+    
     def _carregar_config(self):
         """Carrega as configurações do arquivo JSON ou cria um padrão"""
         try:
@@ -61,6 +104,7 @@ class ConfiguracaoImpressora:
             with open(self.arquivo_config, 'w', encoding='utf-8') as f:
                 json.dump(config_para_salvar, f, indent=4)
             self.config = config_para_salvar
+            self._assinatura = self._assinatura_arquivo()
             return True
         except Exception as e:
             logging.error(f"Erro ao salvar configuração: {str(e)}")
@@ -79,11 +123,19 @@ class GerenciadorImpressao:
         
         # Carregar configurações
         self.config_manager = ConfiguracaoImpressora(arquivo_config)
-        self.config = self.config_manager.obter()
+        self._config_do_trabalho = None
         
         # Conexão serial (se utilizada)
         self.conexao_serial = None
     
+    @property
+    def config(self):
+        """Configuração atual; durante uma impressão, a que estava valendo quando ela começou"""
+        if self._config_do_trabalho is not None:
+            return self._config_do_trabalho
+        self.config_manager.recarregar_se_alterado()
+        return self.config_manager.obter()
+    
     def _configurar_logger(self):
         """Configura o logger para registro de eventos"""
         logger = logging.getLogger('nova_impressora')
@@ -429,6 +481,15 @@ class GerenciadorImpressao:
     
     def imprimir(self, pedido):
         """Método principal que tenta imprimir usando os métodos configurados"""
+        # Alterações no arquivo durante a impressão valem a partir do próximo pedido
+        self._config_do_trabalho = self.config
+        try:
+            return self._imprimir_com_config(pedido)
+        finally:
+            self._config_do_trabalho = None
+    
+    def _imprimir_com_config(self, pedido):
+        """Formata o pedido e tenta cada método de impressão configurado"""
         self.logger.info(f"Iniciando impressão do pedido: {pedido.get('numero', 'N/D')}")
         
         # Formatar o texto
@@ -741,6 +802,134 @@ def gerar_comandos_escpos_imagem(img):
         data_bytes.extend(byte_row)
     return header + data_bytes
 
+def montar_documento_pos58(pedido):
+    """
+    Gera os bytes ESC/POS (QR Code centralizado + texto) de um pedido para a POS58.
+
+    Args:
+        pedido: Dicionário com os dados do pedido
+
+    Returns:
+        tuple: (numero_pedido, bytes do documento pronto para envio RAW)
+    """
+    # --- DADOS MÍNIMOS REQUERIDOS ---
+    # Garantir que temos um número de pedido válido
+    numero_pedido = pedido.get('numero', '')
+    if not numero_pedido:
+        # Tentar outros campos comuns
+        for campo in ['id', 'numeroPedido', 'order_id', 'idVenda']:
+            if campo in pedido and pedido[campo]:
+                numero_pedido = str(pedido[campo])
+                logger.info(f"Usando campo '{campo}' como número do pedido: {numero_pedido}")
+                break
+        
+        # Se ainda não tiver, gerar um temporário baseado em timestamp
+        if not numero_pedido:
+            numero_pedido = f"TEMP-{int(time.time())}"
+            logger.warning(f"Número de pedido não encontrado. Usando temporário: {numero_pedido}")
+    
+    # Garantir que pedido tenha um campo 'itens' e seja uma lista
+    if 'itens' not in pedido or not isinstance(pedido['itens'], list):
+        logger.warning("Pedido sem campo 'itens' válido. Criando lista vazia.")
+        pedido['itens'] = []
+
+    # --- AJUSTES QR CODE ---
+    # 1. Gerar QR Code (imagem PIL) - Tamanho aumentado para 150
+    try:
+        qr_img_original = gerar_qrcode(numero_pedido, tamanho=150)
+        logger.debug(f"QR Code original gerado ({qr_img_original.width}x{qr_img_original.height}).")
+        
+        # 2. Criar imagem maior para centralizar o QR Code
+        largura_papel_pixels = 384 # Largura comum para 58mm
+        altura_qr = qr_img_original.height
+        img_centralizada = Image.new('1', (largura_papel_pixels, altura_qr), 1) # Fundo branco (1)
+        
+        # Calcular posição para colar
+        pos_x = (largura_papel_pixels - qr_img_original.width) // 2
+        pos_y = 0
+        img_centralizada.paste(qr_img_original, (pos_x, pos_y))
+        logger.debug(f"QR Code colado na imagem centralizada em ({pos_x},{pos_y}).")
+        
+        # 3. Converter imagem CENTRALIZADA para comandos ESC/POS
+        comandos_qr = gerar_comandos_escpos_imagem(img_centralizada)
+        logger.debug(f"{len(comandos_qr)} bytes de comandos ESC/POS gerados para o QR Code centralizado.")
+    except Exception as qr_err:
+        logger.error(f"Erro ao gerar QR Code: {qr_err}")
+        logger.error(traceback.format_exc())
+        comandos_qr = b''  # QR Code vazio se falhar
+    # --- FIM AJUSTES QR CODE ---
+
+    # 4. Formatar Texto
+    try:
+        texto_pedido = formatar_pedido_para_texto_pos(pedido, largura=32)
+        # <<< LOG DO TEXTO FORMATADO >>>
+        logger.debug(f"Texto formatado para impressão:")
+        logger.debug(f"\n-- INICIO TEXTO --\n{texto_pedido}\n-- FIM TEXTO --")
+    except Exception as fmt_err:
+        logger.error(f"Erro na formatação do texto do pedido: {fmt_err}")
+        logger.error(traceback.format_exc())
+        # Criar texto de emergência para garantir que alguma coisa seja impressa
+        texto_pedido = f"""
+---------------------------------
+        PEDIDO EMERGENCIAL
+---------------------------------
+Número: {numero_pedido}
+Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}
+
+ATENÇÃO: Erro na formatação do pedido.
+Por favor, verifique no sistema.
+---------------------------------
+        """
+        logger.warning("Usando texto de emergência para impressão")
+
+    # Converter texto para bytes
+    try:
+        texto_bytes = texto_pedido.encode('cp850', errors='replace')
+    except LookupError:
+        try:
+            logger.warning("cp850 não disponível, usando cp437")
+            texto_bytes = texto_pedido.encode('cp437', errors='replace')
+        except Exception as enc_err:
+            logger.error(f"Erro na codificação: {enc_err}. Usando ASCII.")
+            texto_bytes = texto_pedido.encode('ascii', errors='replace')
+    
+    logger.debug(f"{len(texto_bytes)} bytes de texto formatado para impressão.")
+
+    return numero_pedido, comandos_qr + b'\n' + texto_bytes
+
+def enviar_documento_raw(hprinter, dados, titulo="Pedido AcriPrint"):
+    """
+    Envia um documento RAW usando um handle de impressora já aberto.
+
+    O handle não é fechado aqui, permitindo reaproveitá-lo entre vários trabalhos.
+
+    Args:
+        hprinter: Handle obtido com win32print.OpenPrinter
+        dados: Bytes ESC/POS do documento
+        titulo: Nome do documento na fila de impressão do Windows
+
+    Returns:
+        int: Número de bytes escritos
+
+    Raises:
+        pywintypes.error: Falha ao escrever na impressora. O QR Code e o texto
+            vão no mesmo WritePrinter, então não há mais o "sucesso parcial"
+            (QR impresso, texto com erro) de imprimir_pedido_pos58: o trabalho
+            falha inteiro e o erro chega a quem chamou.
+    """
+    job_id = win32print.StartDocPrinter(hprinter, 1, (titulo, None, "RAW"))
+    logger.debug(f"Job de impressão RAW iniciado: {job_id}")
+    try:
+        win32print.StartPagePrinter(hprinter)
+        bytes_escritos = win32print.WritePrinter(hprinter, dados)
+        logger.debug(f"{bytes_escritos} bytes escritos.")
+        if bytes_escritos != len(dados):
+            logger.warning("Nem todos os bytes do documento foram escritos!")
+        win32print.EndPagePrinter(hprinter)
+    finally:
+        win32print.EndDocPrinter(hprinter)
+    return bytes_escritos
+
 def imprimir_pedido_pos58(pedido, impressora_nome=None):
     # <<< LOG INICIAL >>>
     logger.debug(f"Iniciando imprimir_pedido_pos58. Dados recebidos:")
@@ -769,124 +958,12 @@ def imprimir_pedido_pos58(pedido, impressora_nome=None):
     success = False
 
     try:
-        # --- DADOS MÍNIMOS REQUERIDOS ---
-        # Garantir que temos um número de pedido válido
-        numero_pedido = pedido.get('numero', '')
-        if not numero_pedido:
-            # Tentar outros campos comuns
-            for campo in ['id', 'numeroPedido', 'order_id', 'idVenda']:
-                if campo in pedido and pedido[campo]:
-                    numero_pedido = str(pedido[campo])
-                    logger.info(f"Usando campo '{campo}' como número do pedido: {numero_pedido}")
-                    break
-            
-            # Se ainda não tiver, gerar um temporário baseado em timestamp
-            if not numero_pedido:
-                numero_pedido = f"TEMP-{int(time.time())}"
-                logger.warning(f"Número de pedido não encontrado. Usando temporário: {numero_pedido}")
-        
-        # Garantir que pedido tenha um campo 'itens' e seja uma lista
-        if 'itens' not in pedido or not isinstance(pedido['itens'], list):
-            logger.warning("Pedido sem campo 'itens' válido. Criando lista vazia.")
-            pedido['itens'] = []
-
-        # --- AJUSTES QR CODE ---
-        # 1. Gerar QR Code (imagem PIL) - Tamanho aumentado para 150
-        try:
-            qr_img_original = gerar_qrcode(numero_pedido, tamanho=150)
-            logger.debug(f"QR Code original gerado ({qr_img_original.width}x{qr_img_original.height}).")
-            
-            # 2. Criar imagem maior para centralizar o QR Code
-            largura_papel_pixels = 384 # Largura comum para 58mm
-            altura_qr = qr_img_original.height
-            img_centralizada = Image.new('1', (largura_papel_pixels, altura_qr), 1) # Fundo branco (1)
-            
-            # Calcular posição para colar
-            pos_x = (largura_papel_pixels - qr_img_original.width) // 2
-            pos_y = 0
-            img_centralizada.paste(qr_img_original, (pos_x, pos_y))
-            logger.debug(f"QR Code colado na imagem centralizada em ({pos_x},{pos_y}).")
-            
-            # 3. Converter imagem CENTRALIZADA para comandos ESC/POS
-            comandos_qr = gerar_comandos_escpos_imagem(img_centralizada)
-            logger.debug(f"{len(comandos_qr)} bytes de comandos ESC/POS gerados para o QR Code centralizado.")
-            qr_gerado_sucesso = True
-        except Exception as qr_err:
-            logger.error(f"Erro ao gerar QR Code: {qr_err}")
-            logger.error(traceback.format_exc())
-            comandos_qr = b''  # QR Code vazio se falhar
-            qr_gerado_sucesso = False
-        # --- FIM AJUSTES QR CODE ---
+        numero_pedido, documento = montar_documento_pos58(pedido)
 
-        # 4. Formatar Texto
-        try:
-            texto_pedido = formatar_pedido_para_texto_pos(pedido, largura=32)
-            # <<< LOG DO TEXTO FORMATADO >>>
-            logger.debug(f"Texto formatado para impressão:")
-            logger.debug(f"\n-- INICIO TEXTO --\n{texto_pedido}\n-- FIM TEXTO --")
-        except Exception as fmt_err:
-            logger.error(f"Erro na formatação do texto do pedido: {fmt_err}")
-            logger.error(traceback.format_exc())
-            # Criar texto de emergência para garantir que alguma coisa seja impressa
-            texto_pedido = f"""
----------------------------------
-        PEDIDO EMERGENCIAL
----------------------------------
-Número: {numero_pedido}
-Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}
-
-ATENÇÃO: Erro na formatação do pedido.
-Por favor, verifique no sistema.
----------------------------------
-            """
-            logger.warning("Usando texto de emergência para impressão")
-
-        # Converter texto para bytes
-        try:
-            texto_bytes = texto_pedido.encode('cp850', errors='replace')
-        except LookupError:
-            try:
-                logger.warning("cp850 não disponível, usando cp437")
-                texto_bytes = texto_pedido.encode('cp437', errors='replace')
-            except Exception as enc_err:
-                logger.error(f"Erro na codificação: {enc_err}. Usando ASCII.")
-                texto_bytes = texto_pedido.encode('ascii', errors='replace')
-        
-        logger.debug(f"{len(texto_bytes)} bytes de texto formatado para impressão.")
-
-        # 5. Abrir impressora e iniciar documento RAW
+        # 5. Abrir impressora e enviar documento RAW
         try:
             hprinter = win32print.OpenPrinter(impressora_nome)
-            doc_info = ("Pedido AcriPrint", None, "RAW")
-            job_id = win32print.StartDocPrinter(hprinter, 1, doc_info)
-            logger.debug(f"Job de impressão RAW iniciado: {job_id}")
-            win32print.StartPagePrinter(hprinter)
-            
-            # 6. Enviar comandos ESC/POS do QR Code CENTRALIZADO
-            if qr_gerado_sucesso and comandos_qr:
-                try:
-                    bytes_written_qr = win32print.WritePrinter(hprinter, comandos_qr)
-                    logger.debug(f"{bytes_written_qr} bytes de comando QR escritos.")
-                    if bytes_written_qr != len(comandos_qr):
-                        logger.warning("Nem todos os bytes do comando QR foram escritos!")
-                except Exception as qr_write_err:
-                    logger.error(f"Erro ao enviar QR Code para impressora: {qr_write_err}")
-            
-            # 7. Enviar Texto
-            try:
-                newline_bytes = b'\n'
-                win32print.WritePrinter(hprinter, newline_bytes)
-                bytes_written_txt = win32print.WritePrinter(hprinter, texto_bytes)
-                logger.debug(f"{bytes_written_txt} bytes de texto escritos.")
-                if bytes_written_txt != len(texto_bytes):
-                    logger.warning("Nem todos os bytes do texto foram escritos!")
-            except Exception as txt_write_err:
-                logger.error(f"Erro ao enviar texto para impressora: {txt_write_err}")
-                # Mesmo com erro, consideramos sucesso parcial, pois o QR code pode ter sido impresso
-            
-            # 8. Finalizar impressão
-            win32print.EndPagePrinter(hprinter)
-            win32print.EndDocPrinter(hprinter)
+            enviar_documento_raw(hprinter, documento)
             success = True
             logger.info(f"Impressão (ESC/POS+RAW) do pedido {numero_pedido} enviada com sucesso.")
         
@@ -3,12 +3,15 @@ from PySide6.QtWidgets import QApplication
 import sys
 from data.storage import Storage
 from auth.bling_oauth import BlingOAuth
+from core.crypto import install_cipher
 
 def main():
     app = QApplication(sys.argv)
     
     # Criar instância do storage
     storage = Storage()
+    # Mesmo formato de criptografia da aplicação (valores comprimidos em AES-GCM)
+    install_cipher(storage)
     
     # Criar instância do BlingOAuth
     oauth = BlingOAuth(storage=storage)
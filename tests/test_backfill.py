@@ -0,0 +1,138 @@
+"""
+Testes unitários para o módulo core/backfill.py.
+
+Testa a detecção de um período sem polling: varreduras espaçadas pelo
+agendador (ociosidade, modo de reconciliação) não disparam backfill. Testa
+também que pedidos cujo detalhe falhou não são entregues e ficam para a
+próxima execução.
+"""
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from core.adaptive_interval import AdaptiveIntervalScheduler
+from core.backfill import OrderBackfill, BACKFILL_CONFIG_KEY
+from core.order_sweeper import OrderCursor, BLING_DATETIME_FORMAT
+
+
+class TestBackfillGap(unittest.TestCase):
+    """Testes para OrderBackfill.handle_gap."""
+
+    def setUp(self):
+        self.scheduler = AdaptiveIntervalScheduler(base_interval=60, min_interval=15, max_interval=300)
+        self.backfill = OrderBackfill(
+            storage=None, client_provider=lambda: None, on_order=lambda order: None,
+            expected_interval=self.scheduler.longest_interval,
+        )
+        self.started = []
+        self.backfill.start = self.started.append
+        self.now = datetime(2025, 4, 16, 12, 0, 0)
+
+    def _gap(self, seconds):
+        since = (self.now - timedelta(seconds=seconds)).strftime(BLING_DATETIME_FORMAT)
+        return self.backfill.handle_gap(OrderCursor(last_id=10, changed_since=since), self.now)
+
+    def test_normal_polling(self):
+        """Com o polling normal, o limite é o maior intervalo ocioso mais a folga."""
+        self.assertEqual(self.backfill.current_gap_threshold(), 600)
+        self.assertFalse(self._gap(590))
+        self.assertTrue(self._gap(700))
+        self.assertEqual(self.started[0]['last_id'], 10)
+        self.assertEqual(self.started[0]['until'], self.now.strftime(BLING_DATETIME_FORMAT))
+
+    def test_reconciliation_sweeps_are_not_gaps(self):
+        """No modo de reconciliação (webhooks), varreduras a cada 15-30 min não são downtime."""
+        self.scheduler.configure(base_interval=900, min_interval=900, max_interval=1800)
+        self.assertFalse(self._gap(900))
+        self.assertFalse(self._gap(1800))
+        self.assertTrue(self._gap(2400))
+        self.assertEqual(len(self.started), 1)
+
+    def test_backpressure_floor(self):
+        """O piso imposto pela fila da impressora também amplia o limite."""
+        self.scheduler.set_floor(1200)
+        self.assertEqual(self.backfill.current_gap_threshold(), 1500)
+        self.assertFalse(self._gap(1300))
+
+
+class _Storage:
+    """Storage mínimo: config em memória e histórico de impressão vazio."""
+
+    def __init__(self):
+        self.config = {}
+
+    @property
+    def conn(self):
+        raise AttributeError("sem banco: nenhum pedido impresso")
+
+    def get_config(self, key, default=None):
+        return self.config.get(key, default)
+
+    def set_config(self, key, value):
+        self.config[key] = value
+
+    def delete_config(self, key):
+        self.config.pop(key, None)
+
+
+class _Pipeline:
+    """BlingFetchPipeline falso: o pedido 12 não tem detalhe na primeira execução."""
+
+    failing = {12}
+
+    def __init__(self, client):
+        pass
+
+    def fetch_orders(self, params, max_pages=10, needs_detail=None):
+        summaries = [{'id': order_id, 'numero': str(order_id)} for order_id in (11, 12, 13)]
+        selected = [order for order in summaries if needs_detail(order)]
+        return {
+            'summaries': summaries,
+            'details': [dict(order, itens=[{'codigo': 'SKU'}]) for order in selected
+                        if order['id'] not in self.failing],
+            'failed': [order for order in selected if order['id'] in self.failing],
+        }
+
+    def close(self):
+        pass
+
+
+class TestBackfillFailedDetails(unittest.TestCase):
+    """Testes para pedidos sem detalhe no backfill."""
+
+    def setUp(self):
+        self.storage = _Storage()
+        self.delivered = []
+        self.backfill = OrderBackfill(
+            self.storage, client_provider=object, on_order=self.delivered.append, orders_per_minute=60000,
+        )
+        self.gap = {'since': '2025-04-16 08:00:00', 'until': '2025-04-16 12:00:00', 'last_id': 10}
+        self.storage.set_config(BACKFILL_CONFIG_KEY, self.gap)
+
+    def test_failed_details_are_kept_for_next_run(self):
+        """Só pedidos detalhados são entregues; o intervalo fica salvo até todos terem detalhe."""
+        with mock.patch('core.backfill.BlingFetchPipeline', _Pipeline):
+            self.backfill._run(self.gap)
+            self.assertEqual([order['id'] for order in self.delivered], [11, 13])
+            self.assertTrue(all(order['itens'] for order in self.delivered))
+            self.assertEqual(self.storage.get_config(BACKFILL_CONFIG_KEY), self.gap)
+
+            with mock.patch.object(_Pipeline, 'failing', set()):
+                self.backfill._run(self.gap)
+        self.assertEqual([order['id'] for order in self.delivered[2:]], [11, 12, 13])
+        self.assertIsNone(self.storage.get_config(BACKFILL_CONFIG_KEY))
+
+    def test_new_gap_includes_pending_interval(self):
+        """Um novo período sem polling começa no intervalo pendente mais antigo."""
+        started = []
+        self.backfill.start = started.append
+        now = datetime(2025, 4, 16, 18, 0, 0)
+        cursor = OrderCursor(last_id=20, changed_since='2025-04-16 16:00:00')
+
+        self.assertTrue(self.backfill.handle_gap(cursor, now))
+        self.assertEqual(started[0]['since'], self.gap['since'])
+        self.assertEqual(started[0]['last_id'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
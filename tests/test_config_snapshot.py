@@ -0,0 +1,161 @@
+"""
+Testes unitários para o módulo core/config_snapshot.py.
+
+Testa a conversão tipada do snapshot, a imutabilidade, as notificações por
+chave, a leitura dos arquivos JSON e a publicação do snapshot apenas quando
+a gravação no Storage dá certo.
+"""
+import os
+import json
+import sqlite3
+import tempfile
+import unittest
+
+from core.config_snapshot import install_config_store, PRINTER_FILE_KEY
+
+
+class _Storage:
+    """Storage mínimo: tabela config com valores em JSON (sem criptografia)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.conn.execute("CREATE TABLE config (key TEXT PRIMARY KEY, value TEXT, updated_at TEXT)")
+        self.fail_writes = False
+
+    def _decrypt(self, value):
+        return json.loads(value)
+
+    def _write(self, key, value):
+        if self.fail_writes:
+            raise sqlite3.OperationalError("database is locked")
+        self.conn.execute("INSERT OR REPLACE INTO config (key, value, updated_at) VALUES (?, ?, '')",
+                          (key, json.dumps(value)))
+
+    def set_config(self, key, value):
+        self._write(key, value)
+        self.conn.commit()
+
+    def get_config(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM config WHERE key = ?", (key,)).fetchone()
+        return self._decrypt(row[0]) if row else default
+
+    def delete_config(self, key):
+        cursor = self.conn.execute("DELETE FROM config WHERE key = ?", (key,))
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def save_settings(self, settings):
+        for key, value in settings.items():
+            self._write(key, value)
+        self.conn.commit()
+
+    def get_settings(self):
+        return {}
+
+
+class TestConfigStore(unittest.TestCase):
+    """Testes para ConfigStore e install_config_store."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.conn = sqlite3.connect(os.path.join(self.tmpdir.name, 'app_data.db'))
+        self.storage = _Storage(self.conn)
+        self.storage.set_config('auto_print', 'true')
+        self.storage.set_config('sku_list', 'SKU1, SKU2')
+        self.storage.set_config('polling_interval', 'rápido')
+        self.printer_path = os.path.join(self.tmpdir.name, 'impressora_config.json')
+        self.store = install_config_store(
+            self.storage,
+            app_config_path=os.path.join(self.tmpdir.name, 'config.json'),
+            printer_config_path=self.printer_path,
+        )
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def test_typed_values(self):
+        """Chaves dos caminhos quentes vêm convertidas; valores inválidos usam o padrão."""
+        snapshot = self.store.current
+        self.assertIs(snapshot.auto_print, True)
+        self.assertEqual(snapshot.sku_list, ('SKU1', 'SKU2'))
+        self.assertEqual(snapshot.polling_interval, 300)
+        self.assertEqual(snapshot.printer, '')
+
+    def test_snapshot_is_immutable(self):
+        """O snapshot não aceita atribuições e get() devolve cópias mutáveis."""
+        self.storage.set_config('lojas', [{'id': 1}])
+        snapshot = self.store.current
+        with self.assertRaises(AttributeError):
+            snapshot.auto_print = False
+        value = self.storage.get_config('lojas')
+        value.append({'id': 2})
+        self.assertEqual(self.storage.get_config('lojas'), [{'id': 1}])
+
+    def test_set_config_publishes_and_notifies(self):
+        """Gravar publica um snapshot novo e avisa só os assinantes das chaves alteradas."""
+        calls = []
+        self.store.subscribe(lambda snapshot, changed: calls.append(('printer', changed)), keys={'printer'})
+        self.store.subscribe(lambda snapshot, changed: calls.append(('filtros', changed)), keys={'sku_list'})
+        previous = self.store.current
+
+        self.storage.set_config('printer', 'POS58')
+
+        self.assertEqual(self.store.current.printer, 'POS58')
+        self.assertEqual(self.store.current.version, previous.version + 1)
+        self.assertEqual(previous.printer, '')
+        self.assertEqual(calls, [('printer', frozenset({'printer'}))])
+
+    def test_failed_write_keeps_snapshot(self):
+        """Uma gravação que falha não altera o snapshot nem avisa os assinantes."""
+        calls = []
+        self.store.subscribe(lambda snapshot, changed: calls.append(changed))
+        previous = self.store.current
+        self.storage.fail_writes = True
+
+        with self.assertRaises(sqlite3.OperationalError):
+            self.storage.set_config('printer', 'POS58')
+        with self.assertRaises(sqlite3.OperationalError):
+            self.storage.save_settings({'auto_print': False})
+
+        self.assertIs(self.store.current, previous)
+        self.assertEqual(self.storage.get_config('printer', ''), '')
+        self.assertEqual(calls, [])
+
+    def test_write_returning_false_keeps_snapshot(self):
+        """set_config que informa a falha pelo retorno também não publica o valor."""
+        self.storage.set_config = lambda key, value: False
+        store = install_config_store(self.storage, app_config_path=os.path.join(self.tmpdir.name, 'x.json'),
+                                     printer_config_path=self.printer_path)
+        self.assertIs(self.storage.set_config('printer', 'POS58'), False)
+        self.assertEqual(store.current.printer, '')
+
+    def test_delete_and_settings(self):
+        """Excluir remove a chave; save_settings publica todas as chaves de uma vez."""
+        self.assertTrue(self.storage.delete_config('sku_list'))
+        self.assertEqual(self.store.current.sku_list, ())
+
+        self.storage.save_settings({'printer': 'POS80', 'filter_mode': 'sku'})
+        settings = self.storage.get_settings()
+        self.assertEqual(settings['printer'], 'POS80')
+        self.assertEqual(settings['filter_mode'], 'sku')
+        self.assertIn('log_level', settings)
+
+    def test_invalid_printer_file_keeps_previous(self):
+        """Um impressora_config.json inválido mantém o conteúdo anterior do arquivo."""
+        with open(self.printer_path, 'w', encoding='utf-8') as f:
+            json.dump({'baudrate': 9600}, f)
+        changed = []
+        self.store.subscribe(lambda snapshot, keys: changed.append(keys), keys={PRINTER_FILE_KEY})
+        self.store.reload()
+        self.assertEqual(self.store.current.printer_file['baudrate'], 9600)
+
+        with open(self.printer_path, 'w', encoding='utf-8') as f:
+            json.dump({'baudrate': 0}, f)
+        self.store.reload()
+        self.assertEqual(self.store.current.printer_file['baudrate'], 9600)
+        self.assertEqual(changed, [frozenset({PRINTER_FILE_KEY})])
+
+
+if __name__ == '__main__':
+    unittest.main()
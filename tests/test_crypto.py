@@ -0,0 +1,94 @@
+"""
+Testes unitários para o módulo core/crypto.py.
+
+Testa a leitura dos valores antigos em Fernet, a gravação no formato
+comprimido e a instalação idempotente do cifrador no Storage.
+"""
+import os
+import json
+import tempfile
+import unittest
+
+from cryptography.fernet import Fernet
+
+from core.crypto import install_cipher, StorageCipher, MAGIC
+
+
+class _Storage:
+    """Storage mínimo: Fernet com a chave de encryption.key, como o Storage original."""
+
+    def __init__(self, key_path):
+        self.key_path = key_path
+        with open(key_path, 'rb') as key_file:
+            self.fernet = Fernet(key_file.read())
+
+    def _encrypt(self, data):
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        return self.fernet.encrypt(data.encode('utf-8'))
+
+    def _decrypt(self, encrypted_data):
+        decrypted = self.fernet.decrypt(encrypted_data).decode('utf-8')
+        try:
+            return json.loads(decrypted)
+        except json.JSONDecodeError:
+            return decrypted
+
+
+class TestInstallCipher(unittest.TestCase):
+    """Testes para StorageCipher e install_cipher."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.key_path = os.path.join(self.tmpdir.name, 'encryption.key')
+        with open(self.key_path, 'wb') as key_file:
+            key_file.write(Fernet.generate_key())
+        self.storage = _Storage(self.key_path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_reads_fernet_and_writes_new_format(self):
+        """Valores em Fernet continuam legíveis; gravações novas usam o formato comprimido."""
+        legacy = self.storage._encrypt({'numero': '5001'})
+        cipher = install_cipher(self.storage)
+
+        self.assertEqual(self.storage._decrypt(legacy), {'numero': '5001'})
+        order = {'numero': '5002', 'itens': [{'codigo': 'CHAVEIRO-AZ'}] * 20}
+        blob = self.storage._encrypt(order)
+        self.assertTrue(blob.startswith(MAGIC))
+        self.assertEqual(self.storage._decrypt(blob), order)
+        self.assertEqual(cipher.decrypt_value(cipher.encrypt_value('texto')), 'texto')
+
+    def test_install_is_idempotent(self):
+        """Uma segunda instalação (outro ponto de entrada no mesmo Storage) reaproveita o cifrador."""
+        cipher = install_cipher(self.storage)
+        self.assertIs(install_cipher(self.storage), cipher)
+        self.assertIs(self.storage.cipher, cipher)
+
+    def test_other_process_reads_new_format(self):
+        """Outro Storage com a mesma chave lê o formato novo depois de instalar o cifrador."""
+        install_cipher(self.storage)
+        blob = self.storage._encrypt({'token': 'abc'})
+
+        other = _Storage(self.key_path)
+        install_cipher(other)
+        self.assertEqual(other._decrypt(blob), {'token': 'abc'})
+
+    def test_zlib_without_zstandard(self):
+        """Sem zstd, a compressão usa zlib e o valor continua legível."""
+        with open(self.key_path, 'rb') as key_file:
+            cipher = StorageCipher(key_file.read(), use_zstd=False)
+        data = b'x' * 1000
+        self.assertEqual(cipher.decrypt(cipher.encrypt(data)), data)
+
+    def test_missing_key_keeps_storage(self):
+        """Sem arquivo de chave, o Storage continua com a criptografia original."""
+        self.storage.key_path = os.path.join(self.tmpdir.name, 'inexistente.key')
+        original = self.storage._decrypt
+        self.assertIsNone(install_cipher(self.storage))
+        self.assertEqual(self.storage._decrypt, original)
+
+
+if __name__ == '__main__':
+    unittest.main()
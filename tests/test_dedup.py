@@ -0,0 +1,120 @@
+"""
+Testes unitários para o módulo core/dedup.py.
+
+Testa a reserva, a confirmação e a liberação de pedidos, a chave pelo número
+da loja, a carga inicial a partir de print_history e a persistência entre
+reinicializações.
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from core.dedup import PrintDedupGuard, order_keys
+
+HISTORY_SCHEMA = """
+    CREATE TABLE print_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id TEXT NOT NULL,
+        items TEXT NOT NULL,
+        printer TEXT NOT NULL,
+        status TEXT NOT NULL,
+        printed_at TEXT NOT NULL
+    )
+"""
+
+
+class _Storage:
+    """Storage mínimo: apenas a conexão usada pela proteção."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class TestPrintDedupGuard(unittest.TestCase):
+    """Testes para PrintDedupGuard."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'app_data.db')
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(HISTORY_SCHEMA)
+        self.conn.commit()
+        self.guard = PrintDedupGuard(_Storage(self.conn))
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def test_order_keys(self):
+        """O número do Bling tem precedência sobre o ID; sem numeroLoja a chave da loja é vazia."""
+        self.assertEqual(order_keys({'id': 9, 'numero': 100, 'numeroLoja': 'ML-1'}), ('100', 'ML-1'))
+        self.assertEqual(order_keys({'id': 9, 'numero': ''}), ('9', ''))
+
+    def test_reserve_blocks_duplicates(self):
+        """Um pedido reservado não é reservado de novo, a menos que seja uma reimpressão forçada."""
+        self.guard.load()
+        order = {'numero': '100'}
+        self.assertTrue(self.guard.reserve(order))
+        self.assertFalse(self.guard.reserve(order))
+        self.assertTrue(self.guard.reserve(order, force=True))
+        self.assertEqual(self.guard.stats()['blocked'], 1)
+
+    def test_store_number_blocks_reimported_order(self):
+        """Um pedido reimportado no Bling (outro número, mesmo numeroLoja) é bloqueado."""
+        self.guard.load()
+        self.assertTrue(self.guard.reserve({'numero': '100', 'numeroLoja': 'ML-1'}))
+        self.assertFalse(self.guard.reserve({'numero': '101', 'numeroLoja': 'ML-1'}))
+        self.assertTrue(self.guard.reserve({'numero': '102'}))
+
+    def test_release_after_failure(self):
+        """Falha na impressão libera o pedido, exceto se ele já foi impresso antes."""
+        self.guard.load()
+        order = {'numero': '100', 'numeroLoja': 'ML-1'}
+        self.guard.reserve(order)
+        self.guard.release(order)
+        self.assertFalse(self.guard.is_printed(order))
+
+        self.guard.confirm(order)
+        self.guard.flush()
+        self.guard.reserve(order, force=True)
+        self.guard.release(order)
+        self.assertTrue(self.guard.is_printed(order))
+
+    def test_release_keeps_pending_confirmation(self):
+        """Uma confirmação ainda não gravada não é desfeita por release."""
+        self.guard.load()
+        order = {'numero': '100'}
+        self.guard.confirm(order)
+        self.guard.release(order)
+        self.assertTrue(self.guard.is_printed(order))
+
+    def test_persisted_across_restarts(self):
+        """Confirmações gravadas por flush valem após reinicializar."""
+        self.guard.load()
+        self.guard.confirm({'numero': '100', 'numeroLoja': 'ML-1'})
+        self.guard.confirm({'numero': '101', 'numeroLoja': 'ML-1'})  # Rejeitado pelo índice único
+        self.assertEqual(self.guard.flush(), 2)
+        self.assertEqual(self.guard.flush(), 0)
+
+        reloaded = PrintDedupGuard(_Storage(self.conn))
+        self.assertEqual(reloaded.load(), 1)
+        self.assertTrue(reloaded.is_printed({'numero': '999', 'numeroLoja': 'ML-1'}))
+        self.assertTrue(reloaded.is_printed({'numero': '100'}))
+
+    def test_first_load_imports_print_history(self):
+        """Na primeira execução, os pedidos impressos com sucesso no histórico ficam protegidos."""
+        self.conn.executemany(
+            "INSERT INTO print_history (order_id, items, printer, status, printed_at) VALUES (?, '[]', 'POS58', ?, ?)",
+            [('100', 'success', '2025-04-16T08:00:00'), ('100', 'success', '2025-04-16T09:00:00'),
+             ('101', 'error', '2025-04-16T08:00:00')]
+        )
+        self.conn.commit()
+
+        self.assertEqual(self.guard.load(), 1)
+        self.assertTrue(self.guard.is_printed({'numero': '100'}))
+        self.assertFalse(self.guard.is_printed({'numero': '101'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Testes unitários para o módulo core/export.py.
+
+Testa a exportação do histórico de impressão em CSV e JSON Lines com os dados
+dos pedidos em cache, o filtro por período e a migração do esquema de
+print_history dos bancos antigos antes da primeira leitura.
+"""
+import os
+import csv
+import json
+import sqlite3
+import tempfile
+import unittest
+
+from core.export import HistoryExporter, ExportJob
+
+# Esquema de print_history do app_data.db distribuído (sem user, tipo e store_id)
+LEGACY_HISTORY_SCHEMA = """
+    CREATE TABLE print_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id TEXT NOT NULL,
+        items TEXT NOT NULL,
+        printer TEXT NOT NULL,
+        status TEXT NOT NULL,
+        printed_at TEXT NOT NULL
+    )
+"""
+
+CACHE_SCHEMA = """
+    CREATE TABLE orders_cache (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id TEXT UNIQUE NOT NULL,
+        order_number TEXT,
+        order_data TEXT NOT NULL
+    )
+"""
+
+
+class _Storage:
+    """Storage mínimo: pedidos em cache em JSON puro."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _decrypt(self, value):
+        return value
+
+
+class TestHistoryExporter(unittest.TestCase):
+    """Testes para HistoryExporter e ExportJob."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        # ExportJob lê na própria thread (no app, o pool de conexões dá uma conexão por thread)
+        self.conn = sqlite3.connect(os.path.join(self.tmpdir.name, 'app_data.db'), check_same_thread=False)
+        self.conn.execute(LEGACY_HISTORY_SCHEMA)
+        self.conn.execute(CACHE_SCHEMA)
+        self.conn.executemany(
+            "INSERT INTO print_history (order_id, items, printer, status, printed_at) VALUES (?, ?, 'POS58', ?, ?)",
+            [('5001', json.dumps([{'codigo': 'CHAVEIRO-AZ', 'quantidade': 2}]), 'success', '2026-09-01T08:00:00'),
+             ('5002', '[]', 'error', '2026-09-02T09:00:00'),
+             ('5003', '[]', 'success', '2026-10-01T10:00:00')]
+        )
+        self.conn.execute(
+            "INSERT INTO orders_cache (order_id, order_number, order_data) VALUES ('1001', '5001', ?)",
+            (json.dumps({'id': 1001, 'numero': '5001', 'numeroLoja': 'ML-777', 'total': '39.90',
+                         'contato': {'nome': 'João da Silva'}, 'loja': {'id': 203536978}}),)
+        )
+        self.conn.commit()
+        self.storage = _Storage(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_legacy_schema_is_migrated(self):
+        """Bancos sem user, tipo e store_id ganham as colunas antes da primeira leitura."""
+        rows = [row for chunk in HistoryExporter(self.storage).iter_rows() for row in chunk]
+
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(print_history)")}
+        self.assertTrue({'user', 'tipo', 'store_id'} <= columns)
+        self.assertEqual([row['pedido'] for row in rows], ['5001', '5002', '5003'])
+        self.assertEqual(rows[0]['tipo'], 'impressao')
+
+    def test_csv_export(self):
+        """CSV com ';', cabeçalho e os campos do pedido em cache; a data final é inclusiva."""
+        path = self._path('fechamento.csv')
+        exported = HistoryExporter(self.storage, chunk_size=1).export(path, since='2026-09-01', until='2026-09-02')
+
+        self.assertEqual(exported, 2)
+        self.assertFalse(os.path.exists(f"{path}.part"))
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f, delimiter=';'))
+        self.assertEqual([row['pedido'] for row in rows], ['5001', '5002'])
+        self.assertEqual(rows[0]['cliente'], 'João da Silva')
+        self.assertEqual(rows[0]['numero_loja'], 'ML-777')
+        self.assertEqual(rows[0]['loja'], '203536978')
+        self.assertEqual(rows[0]['itens'], 'CHAVEIRO-AZ x2')
+        self.assertEqual(rows[1]['cliente'], '')
+        self.assertEqual(rows[1]['status'], 'error')
+
+    def test_jsonl_export_in_background(self):
+        """ExportJob grava um objeto JSON por linha e informa o progresso e o resultado."""
+        path = self._path('historico.jsonl')
+        progress, done = [], []
+        job = ExportJob(self.storage, path, on_progress=progress.append,
+                        on_done=lambda *result: done.append(result), chunk_size=2, workers=1)
+        job.start()
+        self.assertTrue(job.wait(10))
+
+        with open(path, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row['pedido'] for row in rows], ['5001', '5002', '5003'])
+        self.assertEqual(rows[0]['total'], 39.9)
+        self.assertEqual(rows[0]['quantidade'], 2)
+        self.assertEqual(progress, [2, 3])
+        self.assertEqual(done[0][:2], (True, 3))
+
+    def test_cancelled_export_leaves_no_file(self):
+        """Uma exportação cancelada não deixa o arquivo nem o parcial."""
+        path = self._path('cancelado.csv')
+        job = ExportJob(self.storage, path, chunk_size=1, workers=1)
+        job.cancel()
+        job.start()
+        job.wait(10)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(f"{path}.part"))
+
+
+if __name__ == '__main__':
+    unittest.main()
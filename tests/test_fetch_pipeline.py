@@ -0,0 +1,126 @@
+"""
+Testes unitários para o módulo bling_api/fetch_pipeline.py.
+
+Testa que um detalhe que falha não é substituído pelo resumo da listagem
+(que não tem itens) e que o OrderSweeper mantém o cursor para buscar de novo
+os pedidos sem detalhe.
+"""
+import unittest
+from datetime import datetime, timedelta
+
+from bling_api.client import BlingAPIError
+from bling_api.fetch_pipeline import BlingFetchPipeline
+from core.order_sweeper import OrderSweeper, OrderCursor, CURSOR_CONFIG_KEY, BLING_DATETIME_FORMAT
+
+
+class _Http:
+    """Cliente HTTP falso: listagem com resumos e detalhes com itens; alguns detalhes falham."""
+
+    def __init__(self, ids, failing=()):
+        self.ids = ids
+        self.failing = set(failing)
+
+    def get_json(self, url, headers=None, params=None, endpoint=None, on_attempt=None):
+        if on_attempt:
+            on_attempt()
+        if endpoint == "pedidos/vendas":
+            page = self.ids if params['pagina'] == 1 else []
+            return {'data': [{'id': order_id, 'numero': str(order_id)} for order_id in page]}
+        order_id = int(endpoint.rsplit('/', 1)[1])
+        if order_id in self.failing:
+            raise BlingAPIError("Erro na API do Bling: 500")
+        return {'data': {'id': order_id, 'numero': str(order_id), 'itens': [{'codigo': f"SKU-{order_id}"}]}}
+
+
+class _Client:
+    """BlingClient mínimo."""
+
+    base_url = "https://bling.test/Api/v3"
+    headers = {}
+
+    def _process_order_data(self, data):
+        return dict(data)
+
+
+class _Storage:
+    """Storage mínimo: config em memória e cache de pedidos ignorado."""
+
+    def __init__(self):
+        self.config = {}
+
+    def get_config(self, key, default=None):
+        return self.config.get(key, default)
+
+    def set_config(self, key, value):
+        self.config[key] = value
+
+    def delete_config(self, key):
+        self.config.pop(key, None)
+
+    def cache_order(self, order):
+        return True
+
+
+class TestFetchPipeline(unittest.TestCase):
+    """Testes para BlingFetchPipeline.fetch_orders."""
+
+    def test_failed_detail_is_not_replaced_by_summary(self):
+        """Detalhes que falham ficam em 'failed' e fora de 'details'."""
+        pipeline = BlingFetchPipeline(_Client(), max_workers=2, http=_Http([1, 2, 3], failing={2}))
+        try:
+            result = pipeline.fetch_orders({})
+        finally:
+            pipeline.close()
+
+        self.assertEqual([order['id'] for order in result['summaries']], [1, 2, 3])
+        self.assertEqual([order['id'] for order in result['details']], [1, 3])
+        self.assertTrue(all(order['itens'] for order in result['details']))
+        self.assertEqual([order['id'] for order in result['failed']], [2])
+
+
+class TestSweeperFailedDetails(unittest.TestCase):
+    """Testes para o cursor do OrderSweeper quando detalhes falham."""
+
+    def setUp(self):
+        self.storage = _Storage()
+        since = (datetime.now() - timedelta(minutes=5)).strftime(BLING_DATETIME_FORMAT)
+        OrderCursor(last_id=100, changed_since=since).save(self.storage)
+        self.saved_cursor = dict(self.storage.config[CURSOR_CONFIG_KEY])
+        self.client = _Client()
+        self.sweeper = OrderSweeper(self.storage, client_provider=lambda: self.client)
+
+    def tearDown(self):
+        self.sweeper.close()
+
+    def _sweep(self, http):
+        self.sweeper._pipeline = BlingFetchPipeline(self.client, http=http)
+        return self.sweeper.sweep()
+
+    def test_cursor_kept_when_detail_fails(self):
+        """Pedidos sem detalhe não são entregues e o cursor não avança além deles."""
+        result = self._sweep(_Http([101, 102], failing={101}))
+
+        self.assertEqual([order['id'] for order in result['orders']], [102])
+        self.sweeper.commit()
+        self.assertEqual(self.storage.config[CURSOR_CONFIG_KEY], self.saved_cursor)
+
+        # No ciclo seguinte o detalhe responde e o cursor avança
+        result = self._sweep(_Http([101, 102]))
+        self.assertEqual([order['id'] for order in result['orders']], [101, 102])
+        self.sweeper.commit()
+        self.assertEqual(self.storage.config[CURSOR_CONFIG_KEY]['last_id'], 102)
+
+    def test_cursor_taken_with_orders(self):
+        """O cursor retirado de um ciclo é o salvo, mesmo com outro ciclo já concluído."""
+        self._sweep(_Http([101]))
+        first = self.sweeper.take_pending()
+        self._sweep(_Http([101, 102]))
+
+        self.sweeper.commit(first)
+        self.assertEqual(self.storage.config[CURSOR_CONFIG_KEY]['last_id'], 101)
+        self.sweeper.commit()
+        self.assertEqual(self.storage.config[CURSOR_CONFIG_KEY]['last_id'], 102)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+"""
+Testes unitários para o módulo bling_api/http_client.py.
+
+Testa a taxa adaptativa (redução a cada 429 e recuperação gradual), as novas
+tentativas apenas para métodos idempotentes e o orçamento global de tentativas.
+"""
+import sys
+import time
+import types
+import unittest
+
+import requests
+
+from bling_api.http_client import (
+    BlingHttpClient, RetryBudget, endpoint_label, install_shared_http, SharedRequests
+)
+
+
+def _response(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = b'{}'
+    return response
+
+
+class _Session:
+    """Sessão que devolve as respostas (ou exceções) programadas, na ordem."""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def close(self):
+        pass
+
+
+class TestRetryBudget(unittest.TestCase):
+    """Testes para RetryBudget."""
+
+    def test_spend_and_deposit(self):
+        """Cada tentativa gasta uma ficha; requisições originais depositam `ratio`."""
+        budget = RetryBudget(ratio=0.5, min_per_second=0, capacity=1)
+        self.assertTrue(budget.try_spend())
+        self.assertFalse(budget.try_spend())
+        self.assertEqual(budget.exhausted, 1)
+
+        budget.record_request()
+        budget.record_request()
+        self.assertTrue(budget.try_spend())
+
+    def test_capacity(self):
+        """O saldo não passa da capacidade."""
+        budget = RetryBudget(ratio=5, min_per_second=0, capacity=2)
+        budget.record_request()
+        self.assertAlmostEqual(budget.balance(), 2.0)
+
+
+class TestBlingHttpClient(unittest.TestCase):
+    """Testes para BlingHttpClient."""
+
+    def _client(self, results, **options):
+        options.setdefault('requests_per_second', 1000)
+        client = BlingHttpClient(burst=100, backoff_base=0, **options)
+        client.session.close()
+        client.session = _Session(results)
+        return client
+
+    def test_endpoint_label(self):
+        """IDs numéricos viram {id} e a query string é descartada."""
+        self.assertEqual(endpoint_label('GET', '/Api/v3/pedidos/vendas/123?x=1'), 'GET Api/v3/pedidos/vendas/{id}')
+
+    def test_rate_decreases_on_429_and_recovers(self):
+        """Cada 429 reduz a taxa em 30% até o mínimo; respostas OK a recuperam aos poucos."""
+        client = self._client([_response(429)] * 3 + [_response(200)] * 2, requests_per_second=2, max_retries=0)
+        client.bucket.capacity = 100
+        client.bucket._tokens = 100
+
+        client.request('GET', 'https://api.bling.com.br/Api/v3/pedidos/vendas')
+        self.assertAlmostEqual(client.current_rate, 1.4)
+        client.request('GET', 'https://api.bling.com.br/Api/v3/pedidos/vendas')
+        client.request('GET', 'https://api.bling.com.br/Api/v3/pedidos/vendas')
+        self.assertAlmostEqual(client.current_rate, 0.686)
+
+        client.request('GET', 'https://api.bling.com.br/Api/v3/pedidos/vendas')
+        client.request('GET', 'https://api.bling.com.br/Api/v3/pedidos/vendas')
+        self.assertAlmostEqual(client.current_rate, 0.886)
+
+    def test_rate_floor(self):
+        """A taxa não cai abaixo do mínimo."""
+        client = self._client([_response(429)] * 10, requests_per_second=1, max_retries=0)
+        client.bucket._tokens = 100
+        client.bucket.capacity = 100
+        for _ in range(10):
+            client.request('GET', 'https://api.bling.com.br/Api/v3/pedidos/vendas')
+        self.assertAlmostEqual(client.current_rate, client.min_rate)
+
+    def test_idempotent_request_is_retried(self):
+        """GET é repetido após 503 e devolve a resposta bem-sucedida."""
+        client = self._client([_response(503), _response(502), _response(200)])
+        response = client.request('GET', 'https://api.bling.com.br/Api/v3/pedidos/vendas/1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(client.session.calls), 3)
+        stats = client.stats()['endpoints']['GET Api/v3/pedidos/vendas/{id}']
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['errors'], {'503': 1, '502': 1})
+
+    def test_post_is_not_retried(self):
+        """POST não é repetido: a primeira resposta volta ao chamador."""
+        client = self._client([_response(503), _response(200)])
+        response = client.request('POST', 'https://api.bling.com.br/Api/v3/pedidos/vendas')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(client.session.calls), 1)
+
+    def test_retry_budget_exhausted(self):
+        """Sem saldo no orçamento, a falha é devolvida sem novas tentativas."""
+        budget = RetryBudget(ratio=0, min_per_second=0, capacity=1)
+        client = self._client([_response(503)] * 4, retry_budget=budget)
+        response = client.request('GET', 'https://api.bling.com.br/Api/v3/pedidos/vendas')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(client.session.calls), 2)
+        self.assertEqual(budget.exhausted, 1)
+
+    def test_connection_error_retried_then_raised(self):
+        """Falhas de comunicação são repetidas e, esgotadas as tentativas, propagadas."""
+        error = requests.ConnectionError("recusada")
+        client = self._client([error] * 3, max_retries=2)
+        with self.assertRaises(requests.ConnectionError):
+            client.request('GET', 'https://api.bling.com.br/Api/v3/pedidos/vendas')
+        self.assertEqual(len(client.session.calls), 3)
+
+    def test_rate_limit_headers_pause(self):
+        """X-RateLimit-Remaining 0 pausa as requisições até o reset informado."""
+        client = self._client([])
+        wait = client._read_rate_limit_headers(
+            _response(200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '5'})
+        )
+        self.assertEqual(wait, 5.0)
+        self.assertGreater(client._paused_until, time.monotonic() + 4)
+        self.assertIsNone(client._read_rate_limit_headers(_response(200, {'X-RateLimit-Remaining': '3'})))
+
+
+class TestInstallSharedHttp(unittest.TestCase):
+    """Testa o redirecionamento de módulos que usam `requests` diretamente."""
+
+    def setUp(self):
+        self.module = types.ModuleType('_fake_bling_oauth')
+        self.module.requests = requests
+        sys.modules[self.module.__name__] = self.module
+        self.addCleanup(sys.modules.pop, self.module.__name__, None)
+
+    def test_module_requests_go_through_client(self):
+        """requests.post do módulo passa pelo cliente; exceções continuam acessíveis."""
+        client = BlingHttpClient(requests_per_second=1000, max_retries=0)
+        client.session.close()
+        client.session = _Session([_response(200)])
+        routed = install_shared_http([self.module.__name__, '_modulo_inexistente'], client=client)
+        self.assertEqual(routed, [self.module.__name__])
+        self.assertIsInstance(self.module.requests, SharedRequests)
+
+        response = self.module.requests.post('https://www.bling.com.br/Api/v3/oauth/token',
+                                             data={'grant_type': 'refresh_token'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.session.calls, [('POST', 'https://www.bling.com.br/Api/v3/oauth/token')])
+        self.assertIs(self.module.requests.RequestException, requests.RequestException)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Testes unitários para o módulo core/order_cache.py.
+
+Testa o LRU instalado no Storage: leituras pelo próprio Storage passam pelo
+cache, gravações e remoções mantêm o LRU coerente com o banco e os acessos
+são gravados em lote.
+"""
+import os
+import json
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from core.order_cache import install_order_cache
+
+
+class _Storage:
+    """Storage mínimo com orders_cache em JSON puro e contagem de leituras no banco."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE orders_cache (
+                order_id TEXT PRIMARY KEY,
+                order_number TEXT,
+                order_data TEXT NOT NULL,
+                cached_at TEXT NOT NULL,
+                expires_at TEXT NOT NULL,
+                last_accessed TEXT NOT NULL
+            )
+        """)
+        self.decrypts = 0
+
+    def _decrypt(self, value):
+        self.decrypts += 1
+        return value
+
+    def cache_order(self, order_data, expiration_days=60):
+        now = datetime.now()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO orders_cache VALUES (?, ?, ?, ?, ?, ?)",
+            (str(order_data['id']), str(order_data.get('numero')), json.dumps(order_data),
+             now.isoformat(), (now + timedelta(days=expiration_days)).isoformat(), now.isoformat())
+        )
+        self.conn.commit()
+        return True
+
+    def get_cached_order(self, order_identifier, use_number=False):
+        raise AssertionError("leitura deveria passar pelo LRU")
+
+    def clear_cached_order(self, order_id=None, number=None):
+        if order_id:
+            self.conn.execute("DELETE FROM orders_cache WHERE order_id = ?", (str(order_id),))
+        if number:
+            self.conn.execute("DELETE FROM orders_cache WHERE order_number = ?", (str(number),))
+        self.conn.commit()
+        return True
+
+
+class TestInstallOrderCache(unittest.TestCase):
+    """Testes para install_order_cache."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.storage = _Storage(os.path.join(self.tmpdir.name, 'app_data.db'))
+        self.cache = install_order_cache(self.storage, max_entries=2)
+
+    def tearDown(self):
+        self.storage.conn.close()
+        self.tmpdir.cleanup()
+
+    def test_reads_through_storage_use_lru(self):
+        """Pedidos gravados pelo Storage são lidos da memória, por ID ou número."""
+        self.storage.cache_order({'id': 1, 'numero': '100', 'itens': []})
+
+        order = self.storage.get_cached_order('1')
+        self.assertEqual(order['numero'], '100')
+        self.assertEqual(self.storage.get_cached_order('100', use_number=True)['id'], 1)
+        self.assertEqual(self.storage.decrypts, 0)
+        self.assertIs(self.storage.order_cache, self.cache)
+
+        # Cópias: alterar o pedido devolvido não altera o cache
+        order['itens'].append({'codigo': 'X'})
+        self.assertEqual(self.storage.get_cached_order('1')['itens'], [])
+
+    def test_miss_loads_from_database_once(self):
+        """Uma falha no LRU lê o banco e guarda o pedido para as próximas leituras."""
+        self.cache._storage_cache_order({'id': 2, 'numero': '200'})
+        self.assertEqual(self.storage.get_cached_order('2')['numero'], '200')
+        self.assertEqual(self.storage.get_cached_order('2')['numero'], '200')
+        self.assertEqual(self.storage.decrypts, 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_eviction_and_clear(self):
+        """O LRU respeita o limite; remover o pedido limpa a memória e o banco."""
+        for number in range(3):
+            self.storage.cache_order({'id': number, 'numero': str(100 + number)})
+        self.assertEqual(self.cache.stats()['entries'], 2)
+        self.assertIsNone(self.cache.peek('0'))
+
+        self.storage.clear_cached_order(order_id='2')
+        self.assertIsNone(self.storage.get_cached_order('2'))
+
+    def test_access_written_in_batch(self):
+        """last_accessed das leituras é gravado em uma única atualização."""
+        self.storage.cache_order({'id': 1, 'numero': '100'})
+        self.storage.conn.execute("UPDATE orders_cache SET last_accessed = '2000-01-01T00:00:00'")
+        self.storage.get_cached_order('1')
+
+        self.assertEqual(self.cache.flush(), 1)
+        accessed = self.storage.conn.execute("SELECT last_accessed FROM orders_cache").fetchone()[0]
+        self.assertGreater(accessed, '2000-01-01T00:00:00')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+Testes unitários para o módulo core/order_search.py.
+
+Testa a consulta FTS5 montada a partir do texto digitado, a busca por
+cliente, SKU e número, a projeção de campos, a remoção pelo trigger de
+orders_cache e a indexação inicial do cache existente.
+"""
+import os
+import json
+import sqlite3
+import tempfile
+import unittest
+
+from core.order_search import (
+    OrderSearchIndex, install_search_index, build_match_query, extract_search_document,
+)
+
+CACHE_SCHEMA = """
+    CREATE TABLE orders_cache (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id TEXT UNIQUE NOT NULL,
+        order_number TEXT,
+        order_data TEXT NOT NULL
+    )
+"""
+
+ORDERS = [
+    {'id': 1001, 'numero': '5001', 'numeroLoja': 'ML-777', 'contato': {'nome': 'João da Silva'},
+     'itens': [{'codigo': 'CHAVEIRO-AZ', 'descricao': 'Chaveiro acrílico azul'}]},
+    {'id': 1002, 'numero': '5002', 'numeroLoja': 'SHP-12', 'contato': {'nome': 'Maria Souza'},
+     'itens': [{'codigo': 'PLACA-01', 'descricao': 'Placa de porta'}]},
+]
+
+
+class _Storage:
+    """Storage mínimo: orders_cache em JSON puro e config em memória."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.config = {}
+
+    def get_config(self, key, default=None):
+        return self.config.get(key, default)
+
+    def set_config(self, key, value):
+        self.config[key] = value
+
+    def delete_config(self, key):
+        self.config.pop(key, None)
+
+    def _decrypt(self, value):
+        return value
+
+    def cache_order(self, order_data, expiration_days=60):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO orders_cache (order_id, order_number, order_data) VALUES (?, ?, ?)",
+                (str(order_data['id']), str(order_data['numero']), json.dumps(order_data))
+            )
+        return True
+
+
+class TestOrderSearch(unittest.TestCase):
+    """Testes para OrderSearchIndex."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.conn = sqlite3.connect(os.path.join(self.tmpdir.name, 'app_data.db'))
+        self.conn.execute(CACHE_SCHEMA)
+        self.storage = _Storage(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def _numbers(self, results):
+        return [result['numero'] for result in results]
+
+    def test_build_match_query(self):
+        """Cada palavra vira um prefixo obrigatório; aspas e operadores do texto não quebram a consulta."""
+        self.assertEqual(build_match_query('silva joão'), '"silva"* AND "joão"*')
+        self.assertEqual(build_match_query('a "OR" b'), '"a"* AND "OR"* AND "b"*')
+        self.assertEqual(build_match_query('  '), '')
+        self.assertEqual(build_match_query('123', field='numero'), 'numero : ("123"*)')
+        with self.assertRaises(ValueError):
+            build_match_query('x', field='cpf')
+
+    def test_search_written_orders(self):
+        """Pedidos gravados pelo Storage são encontrados por cliente (sem acento), SKU e número."""
+        index = install_search_index(self.storage)
+        for order in ORDERS:
+            self.storage.cache_order(order)
+
+        self.assertEqual(self._numbers(index.search('joao sil')), ['5001'])
+        self.assertEqual(self._numbers(index.search('placa-01')), ['5002'])
+        self.assertEqual(self._numbers(index.search('ML-777')), ['5001'])
+        self.assertEqual(self._numbers(index.search('500')), ['5002', '5001'])
+        self.assertEqual(self._numbers(index.search('500', field='cliente')), [])
+        self.assertEqual(index.stats()['orders'], 2)
+
+    def test_update_and_delete(self):
+        """Regravar o pedido atualiza o documento; remover do cache remove do índice."""
+        index = install_search_index(self.storage)
+        self.storage.cache_order(ORDERS[0])
+        self.storage.cache_order(dict(ORDERS[0], contato={'nome': 'Ana Lima'}))
+        self.assertEqual(self._numbers(index.search('silva')), [])
+        self.assertEqual(self._numbers(index.search('ana')), ['5001'])
+
+        with self.conn:
+            self.conn.execute("DELETE FROM orders_cache WHERE order_id = '1001'")
+        self.assertEqual(index.search('ana'), [])
+
+    def test_field_projection(self):
+        """Campos fora da projeção ficam vazios; mudar a projeção recria o índice."""
+        document = extract_search_document(ORDERS[0], ['numero', 'sku'])
+        self.assertEqual(document['cliente'], '')
+        self.assertEqual(document['sku'], 'CHAVEIRO-AZ')
+
+        index = OrderSearchIndex(self.storage)
+        index.index_orders(ORDERS)
+        self.assertEqual(self._numbers(index.search('maria')), ['5002'])
+
+        restricted = OrderSearchIndex(self.storage, fields=['numero', 'sku'])
+        self.assertEqual(restricted.stats()['orders'], 0)
+        restricted.index_orders(ORDERS)
+        self.assertEqual(restricted.search('maria'), [])
+        self.assertEqual(self._numbers(restricted.search('chaveiro')), ['5001'])
+
+    def test_initial_backfill(self):
+        """Pedidos gravados antes do índice são indexados em lotes, retomando do último lote."""
+        for order in ORDERS:
+            self.storage.cache_order(order)
+        index = OrderSearchIndex(self.storage, batch_size=1, batch_pause=0)
+
+        index._backfill()
+
+        self.assertEqual(index.indexed, 2)
+        self.assertEqual(self._numbers(index.search('maria')), ['5002'])
+        index._backfill()
+        self.assertEqual(index.indexed, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
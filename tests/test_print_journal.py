@@ -0,0 +1,186 @@
+"""
+Testes unitários para o módulo core/print_journal.py.
+
+Testa a reexecução e a compactação do diário de impressão e a gravação do
+histórico em lote sobre o esquema de print_history dos bancos existentes.
+"""
+import os
+import json
+import sqlite3
+import tempfile
+import unittest
+
+from core.print_journal import (
+    PrintJournal, history_record_from_job, write_print_history_batch,
+    STATE_INTENT, STATE_SENT,
+)
+
+# Esquema de print_history do app_data.db distribuído (sem user, tipo e store_id)
+LEGACY_HISTORY_SCHEMA = """
+    CREATE TABLE print_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id TEXT NOT NULL,
+        items TEXT NOT NULL,
+        printer TEXT NOT NULL,
+        status TEXT NOT NULL,
+        printed_at TEXT NOT NULL
+    )
+"""
+
+
+class _Storage:
+    """Storage mínimo: apenas a conexão usada pelas funções do diário."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class TestPrintJournal(unittest.TestCase):
+    """Testes para o diário de impressão."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'print_journal.jsonl')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _lines(self):
+        with open(self.path, 'rb') as f:
+            return [json.loads(line) for line in f]
+
+    def test_recover_after_restart(self):
+        """Cada trabalho volta no último estado registrado antes da queda."""
+        journal = PrintJournal(self.path)
+        unsent = journal.record_intent({'numero': '1'}, 'POS58', user='admin')
+        unacked = journal.record_intent({'numero': '2'}, 'POS58')
+        done = journal.record_intent({'numero': '3'}, 'POS58')
+        failed = journal.record_intent({'numero': '4'}, 'POS58')
+        journal.record_sent(unacked)
+        journal.record_sent(done)
+        journal.record_acked([done])
+        journal.record_failed(failed)
+        journal.close()
+
+        reopened = PrintJournal(self.path)
+        unsent_jobs, unacked_jobs = reopened.recover()
+        reopened.close()
+
+        self.assertEqual([job['job'] for job in unsent_jobs], [unsent])
+        self.assertEqual(unsent_jobs[0]['order'], {'numero': '1'})
+        self.assertEqual(unsent_jobs[0]['user'], 'admin')
+        self.assertEqual([job['job'] for job in unacked_jobs], [unacked])
+
+    def test_intent_is_durable_when_record_intent_returns(self):
+        """A intenção já está no arquivo quando record_intent retorna, sem esperar o flusher."""
+        journal = PrintJournal(self.path, flush_interval=5)
+        try:
+            first = journal.record_intent({'numero': '1'}, 'POS58')
+            journal.record_sent(first)  # Fica no buffer até o próximo lote
+            second, third = journal.record_intents([{'numero': '2'}, {'numero': '3'}], 'POS58')
+            states = [(line['job'], line['state']) for line in self._lines()]
+            self.assertEqual(states, [
+                (first, STATE_INTENT), (first, STATE_SENT), (second, STATE_INTENT), (third, STATE_INTENT),
+            ])
+        finally:
+            journal.close()
+
+    def test_intent_fails_when_journal_is_closed(self):
+        """Sem diário gravável a intenção não é aceita."""
+        journal = PrintJournal(self.path)
+        journal.close()
+        with self.assertRaises(ValueError):
+            journal.record_intent({'numero': '1'}, 'POS58')
+
+    def test_intent_raises_when_write_fails(self):
+        """Uma falha de gravação chega a quem registrou a intenção."""
+        class BrokenFile:
+            def write(self, data):
+                raise OSError("disco cheio")
+
+        journal = PrintJournal(self.path)
+        real_file, journal._file = journal._file, BrokenFile()
+        try:
+            with self.assertRaises(OSError):
+                journal.record_intent({'numero': '1'}, 'POS58')
+        finally:
+            journal._file = real_file
+            journal.close()
+
+    def test_torn_tail_is_removed(self):
+        """Uma última linha incompleta é descartada ao abrir o diário."""
+        journal = PrintJournal(self.path)
+        job_key = journal.record_intent({'numero': '1'}, 'POS58')
+        journal.close()
+        with open(self.path, 'ab') as f:
+            f.write(b'{"job": "incompleto", "state": "int')
+
+        reopened = PrintJournal(self.path)
+        unsent_jobs, _ = reopened.recover()
+        reopened.close()
+
+        self.assertEqual([job['job'] for job in unsent_jobs], [job_key])
+        self.assertTrue(open(self.path, 'rb').read().endswith(b'\n'))
+
+    def test_compact_keeps_only_open_jobs(self):
+        """A compactação remove trabalhos encerrados e mantém o estado dos demais."""
+        journal = PrintJournal(self.path)
+        unsent = journal.record_intent({'numero': '1'}, 'POS58')
+        unacked = journal.record_intent({'numero': '2'}, 'POS58')
+        done = journal.record_intent({'numero': '3'}, 'POS58')
+        journal.record_sent(unacked)
+        journal.record_sent(done)
+        journal.record_acked([done])
+        journal.compact()
+
+        # O diário continua aceitando registros depois da troca do arquivo
+        journal.record_acked([unacked])
+        journal.close()
+
+        states = [(line['job'], line['state']) for line in self._lines()]
+        self.assertNotIn(done, [job for job, _ in states])
+        self.assertIn((unsent, STATE_INTENT), states)
+        self.assertIn((unacked, STATE_SENT), states)
+
+        reopened = PrintJournal(self.path)
+        unsent_jobs, unacked_jobs = reopened.recover()
+        reopened.close()
+        self.assertEqual([job['job'] for job in unsent_jobs], [unsent])
+        self.assertEqual(unacked_jobs, [])
+
+
+class TestHistoryBatch(unittest.TestCase):
+    """Testes para a gravação do histórico em lote."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.conn = sqlite3.connect(os.path.join(self.tmpdir.name, 'app_data.db'))
+        self.conn.execute(LEGACY_HISTORY_SCHEMA)
+        self.conn.execute(
+            "INSERT INTO print_history (order_id, items, printer, status, printed_at) "
+            "VALUES ('100', '[]', 'POS58', 'success', '2025-04-16T09:00:00')"
+        )
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def test_write_on_legacy_schema(self):
+        """O lote é gravado em um print_history sem as colunas user, tipo e store_id."""
+        job = {
+            'job': 'abc', 'state': STATE_SENT, 'ts': '2025-04-16T10:00:00', 'printer': 'POS58',
+            'user': 'admin', 'tipo': 'impressao',
+            'order': {'numero': '101', 'itens': [{'codigo': 'SKU'}], 'loja': {'id': 204848504}},
+        }
+        written = write_print_history_batch(_Storage(self.conn), [history_record_from_job(job)])
+
+        self.assertEqual(written, 1)
+        row = self.conn.execute(
+            "SELECT order_id, printer, user, tipo, store_id, printed_at FROM print_history WHERE order_id = '101'"
+        ).fetchone()
+        self.assertEqual(row, ('101', 'POS58', 'admin', 'impressao', '204848504', '2025-04-16T10:00:00'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Testes unitários para o módulo core/print_stats.py.
+
+Testa a migração do esquema de print_history dos bancos antigos, o cálculo
+inicial dos totais diários e a manutenção dos totais pelos triggers.
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from core.print_journal import write_print_history_batch
+from core.print_stats import PrintStats, ROLLUP_TABLE
+
+# Esquema de print_history do app_data.db distribuído (sem user, tipo e store_id)
+LEGACY_HISTORY_SCHEMA = """
+    CREATE TABLE print_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id TEXT NOT NULL,
+        items TEXT NOT NULL,
+        printer TEXT NOT NULL,
+        status TEXT NOT NULL,
+        printed_at TEXT NOT NULL
+    )
+"""
+
+
+class _Storage:
+    """Storage mínimo: apenas a conexão usada pelos totais."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class TestPrintStats(unittest.TestCase):
+    """Testes para os totais diários de print_history."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.conn = sqlite3.connect(os.path.join(self.tmpdir.name, 'app_data.db'))
+        self.conn.execute(LEGACY_HISTORY_SCHEMA)
+        self.storage = _Storage(self.conn)
+        self.today = datetime.now().strftime("%Y-%m-%d")
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def _legacy_insert(self, order_id, status, printed_at):
+        self.conn.execute(
+            "INSERT INTO print_history (order_id, items, printer, status, printed_at) VALUES (?, '[]', 'POS58', ?, ?)",
+            (order_id, status, printed_at)
+        )
+        self.conn.commit()
+
+    def test_legacy_history_is_migrated_and_totalled(self):
+        """Bancos antigos ganham as colunas novas e os totais incluem o histórico existente."""
+        self._legacy_insert('1', 'success', f"{self.today}T08:00:00")
+        self._legacy_insert('2', 'error', f"{self.today}T08:05:00")
+
+        stats = PrintStats(self.storage)
+
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(print_history)")}
+        self.assertTrue({'user', 'tipo', 'store_id'} <= columns)
+        self.assertEqual(stats.today(), {'success': 1, 'error': 1})
+        self.assertEqual(stats.daily(group_by='tipo'), [{'tipo': 'impressao', 'prints': 2}])
+
+    def test_triggers_keep_totals(self):
+        """Inserções e remoções em print_history atualizam os totais na mesma transação."""
+        stats = PrintStats(self.storage)
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        write_print_history_batch(self.storage, [
+            {'order_id': '1', 'status': 'success', 'printer': 'POS58', 'store_id': 10},
+            {'order_id': '2', 'status': 'success', 'printer': 'POS58', 'store_id': 20, 'tipo': 'reimpressao'},
+            {'order_id': '3', 'status': 'success', 'printer': 'POS58', 'printed_at': f"{yesterday}T10:00:00"},
+        ])
+
+        self.assertEqual(stats.today(), {'success': 2})
+        self.assertEqual([row['prints'] for row in stats.last_days(7)], [1, 2])
+        self.assertEqual(stats.daily(store_id='10'), [{'day': self.today, 'prints': 1}])
+        self.assertEqual(stats.daily(group_by='store_id'),
+                         [{'store_id': '', 'prints': 1}, {'store_id': '10', 'prints': 1},
+                          {'store_id': '20', 'prints': 1}])
+        self.assertTrue(stats.was_printed('2'))
+        self.assertFalse(stats.was_printed('4'))
+
+        with self.conn:
+            self.conn.execute("DELETE FROM print_history WHERE order_id = '1'")
+        self.assertEqual(stats.today(), {'success': 1})
+
+    def test_rebuild(self):
+        """rebuild recalcula os totais a partir do histórico após alterações sem triggers."""
+        stats = PrintStats(self.storage)
+        write_print_history_batch(self.storage, [{'order_id': '1', 'status': 'success'}])
+        with self.conn:
+            self.conn.execute(f"UPDATE {ROLLUP_TABLE} SET prints = 99")
+        self.assertEqual(stats.today(), {'success': 99})
+
+        stats.rebuild()
+        self.assertEqual(stats.today(), {'success': 1})
+
+    def test_invalid_group_by(self):
+        """Agrupamentos fora da lista são rejeitados (a coluna entra no SQL)."""
+        stats = PrintStats(self.storage)
+        with self.assertRaises(ValueError):
+            stats.daily(group_by='printed_at; DROP TABLE print_history')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Testes unitários para o módulo core/print_throttle.py.
+
+Testa o custo dos trabalhos em segundos de impressora, a fila por impressora
+e o intervalo de polling sugerido pela contrapressão.
+"""
+import unittest
+
+from core.print_throttle import PrinterThrottle, PrinterThrottleRegistry, estimate_order_cost
+
+
+class TestPrinterThrottle(unittest.TestCase):
+    """Testes para o controle de vazão das impressoras."""
+
+    def test_order_cost_grows_with_items(self):
+        """Pedidos com mais itens custam mais bytes e mais papel."""
+        small = estimate_order_cost({'itens': [{}]})
+        large = estimate_order_cost({'itens': [{}] * 10})
+        self.assertGreater(large['bytes'], small['bytes'])
+        self.assertGreater(large['paper_mm'], small['paper_mm'])
+        self.assertEqual(estimate_order_cost({}), small)
+
+    def test_job_seconds_uses_slowest_limit(self):
+        """O custo é o maior entre a transmissão e o avanço do papel."""
+        throttle = PrinterThrottle('POS58', bytes_per_second=100, paper_mm_per_second=10)
+        self.assertAlmostEqual(throttle.job_seconds({'bytes': 500, 'paper_mm': 20}), 5.0)
+        self.assertAlmostEqual(throttle.job_seconds({'bytes': 100, 'paper_mm': 80}), 8.0)
+
+    def test_queue_and_measured_rate(self):
+        """complete remove o trabalho da fila e ajusta a taxa com as escritas acumuladas."""
+        throttle = PrinterThrottle('POS58', bytes_per_second=1000)
+        seconds = throttle.enqueue({'bytes': 2000, 'paper_mm': 0})
+        self.assertEqual(throttle.queued_jobs, 1)
+
+        throttle.complete(seconds, bytes_sent=2000, elapsed=0.1)
+        self.assertEqual(throttle.queued_jobs, 0)
+        self.assertAlmostEqual(throttle.queued_seconds, 0.0)
+        self.assertAlmostEqual(throttle.bytes_per_second, 1000.0)
+
+        throttle.complete(0, bytes_sent=1000, elapsed=2.0)
+        self.assertAlmostEqual(throttle.bytes_per_second, 0.8 * 1000 + 0.2 * (3000 / 2.1))
+
+    def test_short_writes_accumulate(self):
+        """Várias escritas curtas somadas atualizam a taxa medida."""
+        throttle = PrinterThrottle('POS58', bytes_per_second=960)
+        for _ in range(4):
+            throttle.complete(0, bytes_sent=50, elapsed=0.1)
+        self.assertAlmostEqual(throttle.bytes_per_second, 960.0)
+
+        throttle.complete(0, bytes_sent=50, elapsed=0.1)
+        self.assertAlmostEqual(throttle.bytes_per_second, 0.8 * 960 + 0.2 * 500)
+
+    def test_registry_from_config(self):
+        """O baudrate da configuração vira bytes por segundo (8N1)."""
+        registry = PrinterThrottleRegistry.from_printer_config({'baudrate': 19200})
+        self.assertAlmostEqual(registry.bytes_per_second, 1920.0)
+        self.assertAlmostEqual(registry.for_printer(None).bytes_per_second, 1920.0)
+
+    def test_suggested_poll_interval(self):
+        """O polling só desacelera quando a fila passa do limite configurado."""
+        registry = PrinterThrottleRegistry(bytes_per_second=100, slowdown_after_seconds=30)
+        registry.for_printer('POS58').enqueue({'bytes': 1000, 'paper_mm': 0})
+        self.assertEqual(registry.suggested_poll_interval(15), 15)
+
+        registry.for_printer('POS80').enqueue({'bytes': 5000, 'paper_mm': 0})
+        self.assertEqual(registry.queued_jobs(), 2)
+        self.assertGreaterEqual(registry.suggested_poll_interval(15), 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Testes unitários para o módulo core/print_worker.py.
+
+Testa o protocolo de mensagens com prefixo de tamanho e o tratamento dos
+trabalhos pelo despachante, sem iniciar o processo worker.
+"""
+import io
+import threading
+import unittest
+
+from core.print_worker import (
+    PrintWorkerClient, PrintWorkerError, PrintWorkerTimeout,
+    send_message, receive_message, _HEADER, MAX_MESSAGE_SIZE,
+)
+
+
+class TestMessageFraming(unittest.TestCase):
+    """Testes para o protocolo de mensagens do canal de impressão."""
+
+    def test_round_trip(self):
+        """Mensagens escritas em sequência são lidas na mesma ordem."""
+        stream = io.BytesIO()
+        send_message(stream, {'type': 'print', 'id': 1, 'order': {'numero': 'ç1'}})
+        send_message(stream, {'type': 'shutdown'})
+        stream.seek(0)
+
+        self.assertEqual(receive_message(stream), {'type': 'print', 'id': 1, 'order': {'numero': 'ç1'}})
+        self.assertEqual(receive_message(stream), {'type': 'shutdown'})
+        self.assertIsNone(receive_message(stream))
+
+    def test_truncated_message(self):
+        """Um corpo incompleto (worker encerrado no meio da escrita) retorna None."""
+        stream = io.BytesIO()
+        send_message(stream, {'type': 'result', 'success': True})
+        data = stream.getvalue()
+        self.assertIsNone(receive_message(io.BytesIO(data[:-3])))
+
+    def test_oversized_message(self):
+        """Um cabeçalho acima do limite é rejeitado antes de ler o corpo."""
+        stream = io.BytesIO(_HEADER.pack(MAX_MESSAGE_SIZE + 1))
+        with self.assertRaises(ValueError):
+            receive_message(stream)
+
+
+class TestDispatch(unittest.TestCase):
+    """Testes para o despachante de trabalhos."""
+
+    def _dispatch(self, client, request):
+        """Executa o despachante com `_request` substituído até o primeiro trabalho terminar."""
+        results = []
+        done = threading.Event()
+
+        def callback(order, success, message):
+            results.append((success, message))
+            done.set()
+
+        client._request = request
+        client._running = True
+        client.submit({'numero': '42'}, 'POS58', callback=callback)
+        client._jobs.put(None)
+        client._dispatch_loop()
+        self.assertTrue(done.is_set())
+        return results[0]
+
+    def test_job_timeout_scales_with_cost(self):
+        """O tempo limite cresce com o tempo estimado de impressão."""
+        client = PrintWorkerClient(request_timeout=30, timeout_per_job_second=2)
+        self.assertEqual(client.job_timeout(0), 30)
+        self.assertEqual(client.job_timeout(45), 120)
+
+    def test_timeout_counts_as_sent(self):
+        """Sem resposta a tempo, o trabalho é entregue como enviado para não ser reimpresso."""
+        def request(message, timeout=None):
+            raise PrintWorkerTimeout("Tempo limite excedido")
+
+        success, message = self._dispatch(PrintWorkerClient(), request)
+        self.assertTrue(success)
+        self.assertIn("sem confirmação", message)
+
+    def test_worker_error_is_failure(self):
+        """Um erro do canal de impressão é entregue como falha."""
+        def request(message, timeout=None):
+            raise PrintWorkerError("Worker encerrou")
+
+        success, _ = self._dispatch(PrintWorkerClient(), request)
+        self.assertFalse(success)
+
+    def test_printer_error_is_failure(self):
+        """Uma falha de escrita informada pelo worker não é tratada como sucesso parcial."""
+        def request(message, timeout=None):
+            return {'type': 'result', 'success': False, 'message': 'WritePrinter falhou'}
+
+        success, message = self._dispatch(PrintWorkerClient(), request)
+        self.assertFalse(success)
+        self.assertEqual(message, 'WritePrinter falhou')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Testes unitários para o módulo utils/rate_limit.py.
+
+Testa o reabastecimento, o consumo e a espera do balde de fichas com um
+relógio simulado.
+"""
+import threading
+import unittest
+from unittest import mock
+
+from utils.rate_limit import TokenBucket
+
+
+class _Clock:
+    """Relógio simulado: o tempo só avança em sleep() ou advance()."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Testes para TokenBucket."""
+
+    def setUp(self):
+        self.clock = _Clock()
+        patcher = mock.patch('utils.rate_limit.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invalid_rate(self):
+        """Taxa zero ou negativa é rejeitada."""
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0, capacity=1)
+        bucket = TokenBucket(rate=1, capacity=1)
+        with self.assertRaises(ValueError):
+            bucket.set_rate(-1)
+
+    def test_refill_is_capped(self):
+        """O balde reabastece na taxa configurada, sem passar da capacidade."""
+        bucket = TokenBucket(rate=2, capacity=5, initial=0)
+        self.clock.advance(1)
+        self.assertAlmostEqual(bucket.available(), 2.0)
+        self.clock.advance(10)
+        self.assertAlmostEqual(bucket.available(), 5.0)
+
+    def test_try_consume(self):
+        """try_consume não bloqueia e só consome quando há fichas suficientes."""
+        bucket = TokenBucket(rate=1, capacity=3)
+        self.assertTrue(bucket.try_consume(2))
+        self.assertFalse(bucket.try_consume(2))
+        self.assertAlmostEqual(bucket.available(), 1.0)
+        self.assertAlmostEqual(bucket.time_until(3), 2.0)
+
+    def test_consume_waits_for_refill(self):
+        """consume espera o tempo necessário para reabastecer as fichas."""
+        bucket = TokenBucket(rate=2, capacity=4, initial=0)
+        self.assertTrue(bucket.consume(3))
+        self.assertAlmostEqual(self.clock.now, 1001.5)
+        self.assertAlmostEqual(bucket.available(), 0.0)
+
+    def test_oversized_request_goes_negative(self):
+        """Pedido maior que a capacidade passa com o balde cheio e deixa saldo negativo."""
+        bucket = TokenBucket(rate=1, capacity=2)
+        self.assertTrue(bucket.consume(5))
+        self.assertAlmostEqual(bucket.available(), -3.0)
+        self.assertAlmostEqual(bucket.time_until(1), 4.0)
+
+    def test_consume_timeout(self):
+        """consume retorna False quando o tempo máximo de espera se esgota."""
+        bucket = TokenBucket(rate=1, capacity=10, initial=0)
+        self.assertFalse(bucket.consume(5, timeout=2))
+        self.assertAlmostEqual(self.clock.now, 1002.0)
+
+    def test_consume_stop_event(self):
+        """consume retorna False sem consumir quando o evento de parada está sinalizado."""
+        bucket = TokenBucket(rate=1, capacity=10, initial=0)
+        stop_event = threading.Event()
+        stop_event.set()
+        self.assertFalse(bucket.consume(1, stop_event=stop_event))
+        self.assertAlmostEqual(bucket.available(), 0.0)
+
+    def test_set_rate_keeps_tokens(self):
+        """Alterar a taxa preserva as fichas acumuladas até o momento."""
+        bucket = TokenBucket(rate=1, capacity=10, initial=0)
+        self.clock.advance(2)
+        bucket.set_rate(4)
+        self.clock.advance(1)
+        self.assertAlmostEqual(bucket.available(), 6.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
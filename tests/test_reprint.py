@@ -0,0 +1,98 @@
+"""
+Testes unitários para o módulo core/reprint.py.
+
+Testa a seleção de pedidos para reimpressão, com o filtro de loja aplicado
+na consulta e conferido no pedido apenas para registros antigos sem loja.
+"""
+import os
+import json
+import sqlite3
+import tempfile
+import unittest
+
+from core.reprint import ReprintEngine
+
+HISTORY_SCHEMA = """
+    CREATE TABLE print_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id TEXT NOT NULL,
+        items TEXT NOT NULL,
+        printer TEXT NOT NULL,
+        status TEXT NOT NULL,
+        printed_at TEXT NOT NULL
+    )
+"""
+
+CACHE_SCHEMA = """
+    CREATE TABLE orders_cache (
+        order_id TEXT PRIMARY KEY,
+        order_number TEXT,
+        order_data TEXT NOT NULL
+    )
+"""
+
+
+class _Storage:
+    """Storage mínimo: banco em arquivo temporário e pedidos gravados em JSON puro."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(HISTORY_SCHEMA)
+        self.conn.execute(CACHE_SCHEMA)
+
+    def _decrypt(self, value):
+        return value
+
+
+class TestReprintSelection(unittest.TestCase):
+    """Testes para ReprintEngine.select_orders."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.storage = _Storage(os.path.join(self.tmpdir.name, 'app_data.db'))
+        self.engine = ReprintEngine(self.storage, send_raw=lambda *_: True)
+
+    def tearDown(self):
+        self.storage.conn.close()
+        self.tmpdir.cleanup()
+
+    def _add(self, number, store_id, printed_at, cached_store=None):
+        self.storage.conn.execute(
+            "INSERT INTO print_history (order_id, items, printer, status, printed_at, store_id) "
+            "VALUES (?, '[]', 'POS58', 'success', ?, ?)",
+            (number, printed_at, store_id)
+        )
+        if cached_store is not None:
+            order = {'numero': number, 'loja': {'id': cached_store}}
+            self.storage.conn.execute(
+                "INSERT INTO orders_cache (order_id, order_number, order_data) VALUES (?, ?, ?)",
+                (f"id-{number}", number, json.dumps(order))
+            )
+
+    def test_store_filter(self):
+        """Registros de outra loja ficam fora; sem loja no histórico vale a loja do pedido."""
+        self._add('1', '10', '2025-04-16T08:00:00', cached_store=10)
+        self._add('2', '20', '2025-04-16T08:01:00', cached_store=20)
+        self._add('3', None, '2025-04-16T08:02:00', cached_store=10)
+        self._add('4', None, '2025-04-16T08:03:00', cached_store=20)
+        self._add('5', None, '2025-04-16T08:04:00')
+        self._add('6', '10', '2025-04-16T08:05:00')
+
+        selected = [entry['order_number'] for entry in self.engine.select_orders(store_id='10')]
+
+        self.assertEqual(selected, ['1', '3', '6'])
+
+    def test_without_store_filter(self):
+        """Sem filtro de loja todos os pedidos do período são selecionados, na ordem de impressão."""
+        self._add('2', '20', '2025-04-16T08:01:00')
+        self._add('1', '10', '2025-04-16T08:00:00')
+        self._add('1', '10', '2025-04-16T09:00:00')
+
+        entries = list(self.engine.select_orders(since='2025-04-16T00:00', chunk_size=1))
+
+        self.assertEqual([entry['order_number'] for entry in entries], ['1', '2'])
+        self.assertEqual(entries[0]['printed_at'], '2025-04-16T08:00:00')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Testes unitários para o módulo core/webhook_server.py.
+
+Testa a rejeição de entregas com assinatura HMAC inválida, o descarte de
+entregas repetidas (mesmo evento ou mesmo pedido), o filtro de eventos e o
+recebimento dos arquivos pedido_*.json enviados ao receptor local.
+"""
+import os
+import json
+import queue
+import unittest
+
+from core.webhook_server import (
+    BlingWebhookServer, RecentIdSet, sign_payload, verify_signature, post_order_file, DEFAULT_PATH,
+)
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = 'segredo-de-teste'
+
+
+def _envelope(event, order, event_id='evt-1'):
+    return json.dumps({'eventId': event_id, 'event': event, 'data': order}).encode('utf-8')
+
+
+class TestWebhookDelivery(unittest.TestCase):
+    """Testes para BlingWebhookServer.handle_delivery (sem abrir a porta)."""
+
+    def setUp(self):
+        self.server = BlingWebhookServer(on_order=lambda order: None, secret=SECRET)
+
+    def _deliver(self, body, secret=SECRET):
+        return self.server.handle_delivery(body, sign_payload(body, secret) if secret else None)
+
+    def _queued(self):
+        orders = []
+        while not self.server._queue.empty():
+            orders.append(self.server._queue.get_nowait())
+        return orders
+
+    def test_invalid_signature_rejected(self):
+        """Assinatura ausente, de outro segredo ou de outro corpo é rejeitada com 401."""
+        body = _envelope('order.created', {'id': 1, 'numero': '100'})
+        self.assertEqual(self._deliver(body, secret=None)[0], 401)
+        self.assertEqual(self._deliver(body, secret='outro')[0], 401)
+        self.assertEqual(self.server.handle_delivery(body + b' ', sign_payload(body, SECRET))[0], 401)
+        self.assertEqual(self._queued(), [])
+
+        self.assertEqual(self._deliver(body), (202, "aceito"))
+        self.assertTrue(verify_signature(body, f"  {sign_payload(body, SECRET)}\n", SECRET))
+
+    def test_duplicates_dropped(self):
+        """O mesmo evento reenviado e o mesmo pedido em outro evento são aceitos uma única vez."""
+        order = {'id': 1, 'numero': '100'}
+        self.assertEqual(self._deliver(_envelope('order.created', order, 'evt-1'))[0], 202)
+        self.assertEqual(self._deliver(_envelope('order.created', order, 'evt-1')), (200, "duplicado"))
+        self.assertEqual(self._deliver(_envelope('order.created', order, 'evt-2')), (200, "duplicado"))
+        self.assertEqual(self._queued(), [order])
+
+    def test_shared_seen_orders(self):
+        """Pedidos já entregues pelo polling (conjunto compartilhado) não são aceitos de novo."""
+        seen = RecentIdSet()
+        seen.add(7)
+        server = BlingWebhookServer(on_order=lambda order: None, seen_orders=seen)
+        self.assertEqual(server.handle_delivery(_envelope('order.created', {'id': 7}), None), (200, "duplicado"))
+
+    def test_only_created_events_print(self):
+        """Atualizações e outros eventos são ignorados; só a criação do pedido é impressa."""
+        order = {'id': 1, 'numero': '100'}
+        self.assertEqual(self._deliver(_envelope('order.updated', order, 'evt-1')), (200, "ignorado"))
+        self.assertEqual(self._deliver(_envelope('order.deleted', order, 'evt-2')), (200, "ignorado"))
+        self.assertEqual(self._deliver(_envelope('product.created', {'id': 5}, 'evt-3')), (200, "ignorado"))
+        self.assertEqual(self._deliver(b'[1, 2]')[0], 400)
+        self.assertEqual(self._queued(), [])
+
+        # A atualização ignorada não marca o pedido: a criação ainda é aceita
+        self.assertEqual(self._deliver(_envelope('order.created', order, 'evt-4'))[0], 202)
+
+
+class TestWebhookServer(unittest.TestCase):
+    """Teste de ponta a ponta: arquivos pedido_*.json enviados ao receptor em uma porta local."""
+
+    def setUp(self):
+        self.received = queue.Queue()
+        self.server = BlingWebhookServer(on_order=self.received.put, secret=SECRET, port=0)
+        self.server.start()
+        self.url = f"http://127.0.0.1:{self.server.port}{DEFAULT_PATH}"
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_post_order_files(self):
+        """O pedido puro é aceito uma vez, entregue com os itens e recusado sem assinatura."""
+        path = os.path.join(APP_ROOT, 'pedido_114152.json')
+        self.assertEqual(post_order_file(path, self.url)[0], 401)
+        self.assertEqual(post_order_file(path, self.url, SECRET)[0], 202)
+        self.assertEqual(post_order_file(path, self.url, SECRET)[0], 200)
+
+        order = self.received.get(timeout=5)
+        self.assertEqual(str(order['numero']), '114152')
+        self.assertTrue(order['itens'])
+        self.assertTrue(self.received.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Limitador de taxa por balde de fichas (token bucket).
+"""
+
+import time
+import threading
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Balde de fichas thread-safe.
+
+    O balde é reabastecido continuamente a `rate` fichas por segundo até o
+    limite `capacity`. Cada operação consome um número de fichas; quando não
+    há fichas suficientes o chamador espera (ou recebe False sem bloquear).
+    """
+
+    def __init__(self, rate: float, capacity: float, initial: Optional[float] = None):
+        """
+        Args:
+            rate: Fichas adicionadas por segundo
+            capacity: Máximo de fichas acumuladas (tamanho da rajada)
+            initial: Fichas iniciais (padrão: balde cheio)
+        """
+        if rate <= 0:
+            raise ValueError("A taxa do balde de fichas deve ser positiva")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity if initial is None else float(initial)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """Atualiza as fichas disponíveis conforme o tempo decorrido."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float) -> None:
+        """Altera a taxa de reabastecimento preservando as fichas acumuladas."""
+        if rate <= 0:
+            raise ValueError("A taxa do balde de fichas deve ser positiva")
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+
+    def available(self) -> float:
+        """Retorna as fichas disponíveis no momento."""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def time_until(self, tokens: float) -> float:
+        """Retorna quantos segundos faltam para haver `tokens` fichas disponíveis."""
+        with self._lock:
+            self._refill()
+            missing = tokens - self._tokens
+            return max(0.0, missing / self.rate)
+
+    def try_consume(self, tokens: float = 1.0) -> bool:
+        """
+        Consome fichas sem bloquear.
+
+        Returns:
+            bool: True se as fichas foram consumidas
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def consume(self, tokens: float = 1.0, timeout: Optional[float] = None,
+                stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        Consome fichas, aguardando o reabastecimento se necessário.
+
+        Pedidos maiores que a capacidade são aceitos quando o balde está cheio,
+        deixando o saldo negativo (o próximo pedido espera proporcionalmente).
+
+        Args:
+            tokens: Fichas a consumir
+            timeout: Tempo máximo de espera em segundos (None = sem limite)
+            stop_event: Evento que interrompe a espera quando sinalizado
+
+        Returns:
+            bool: True se consumiu, False se o tempo esgotou ou a espera foi interrompida
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                needed = min(tokens, self.capacity)
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return True
+                wait = (needed - self._tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)